@@ -129,4 +129,101 @@ STATIC_URL = '/static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# SPARQL endpoint (Fuseki)
+# When the parser is installed at corpus nummorum, change the endpoint to "https://data.corpus-nummorum.eu/sparql"
+
+SPARQL_ENDPOINT = "http://localhost:3030/db_cn/sparql"
+
+# Maximum number of keep-alive connections to the endpoint shared by all threads
+SPARQL_POOL_SIZE = 10
+
+# Timeouts in seconds for establishing a connection and for waiting on the response
+SPARQL_CONNECT_TIMEOUT = 3.05
+SPARQL_READ_TIMEOUT = 60
+
+# Number of worker threads answering the queries of a triple context bundle concurrently
+SPARQL_BUNDLE_WORKERS = 8
+
+# Number of worker threads running independent queries of a single recommendation request in parallel
+SPARQL_QUERY_WORKERS = 16
+
+# In-process cache for the results of the recommendation queries
+# Maximum number of cached results, the least recently used result is evicted first
+SPARQL_CACHE_SIZE = 2048
+
+# Seconds a cached result is served without asking the endpoint
+SPARQL_CACHE_TTL = 3600
+
+# Seconds an expired result may still be served while it is refreshed in the background
+SPARQL_CACHE_STALE_TTL = 86400
+
+# On-disk cache for the query results, shared by all worker processes and kept across restarts
+SPARQL_DISK_CACHE_PATH = BASE_DIR / "sparql_cache.sqlite3"
+
+# Number of results kept in the on-disk cache, it uses the same TTLs as the in-process cache
+SPARQL_DISK_CACHE_SIZE = 100000
+
+# Result cursors of the coin searches: the matched coins of a search are kept, so its pages, orders and download
+# are served without running the search again. Maximum number of kept searches, the least recently used is dropped first
+SPARQL_CURSOR_COUNT = 32
+
+# Seconds a search is kept after it was run
+SPARQL_CURSOR_TTL = 1800
+
+# Number of coins on a page of the search results, and the maximum number a page request may ask for
+SPARQL_PAGE_SIZE = 100
+SPARQL_MAX_PAGE_SIZE = 1000
+
+# Cheap query whose result changes whenever the dataset is changed, e.g. a triple count or a version triple.
+# Cached results and indexes are bound to the hash of its result and dropped when it changes.
+# The default counts the triples of the stored data, which the config.ttl of the apache folder provides as the named graph
+# urn:igc:base, so the reasoner does not compute all inferences for it.
+SPARQL_DATASET_PROBE_QUERY = "SELECT (COUNT(*) AS ?count) WHERE { GRAPH <urn:igc:base> { ?s ?p ?o } }"
+
+# Seconds between two runs of the probe query, it runs in the background
+SPARQL_DATASET_PROBE_INTERVAL = 300
+
+# Time budgets in seconds of the callback actions. All queries of an action together may take at most its budget,
+# then the requests to the endpoint are aborted (and fuseki is asked to cancel the query) and the action reports "timedOut"
+SPARQL_ACTION_BUDGETS = {
+    # recommendations while typing
+    "getRecommendationsPredicate": 2,
+    "getRecommendationsSubObj": 5,
+    "areGeneraliseRecommendationsAvailable": 5,
+    "areSpecialiseRecommendationsAvailable": 5,
+    "areEquivalentRecommendationsAvailable": 5,
+    "areRecommendationsAvailable": 5,
+    "getTripleContextBundle": 5,
+    "searchCoin": 30,
+    "download": 300,
+}
+
+# Time budget in seconds of actions not listed above, None for no limit
+SPARQL_DEFAULT_BUDGET = 30
+
+# Circuit breaker for the SPARQL endpoint: it opens when within SPARQL_BREAKER_WINDOW seconds at least
+# SPARQL_BREAKER_MIN_CALLS queries were sent and the share of failed or slow (> SPARQL_BREAKER_SLOW_CALL seconds)
+# queries reached the given rate. While open, only cached results are served (marked "degraded"),
+# after SPARQL_BREAKER_OPEN_SECONDS a few trial queries decide whether it closes again.
+SPARQL_BREAKER_WINDOW = 30
+SPARQL_BREAKER_MIN_CALLS = 10
+SPARQL_BREAKER_FAILURE_RATE = 0.5
+SPARQL_BREAKER_SLOW_CALL = 5
+SPARQL_BREAKER_SLOW_RATE = 0.8
+SPARQL_BREAKER_OPEN_SECONDS = 15
+SPARQL_BREAKER_HALF_OPEN_CALLS = 2
+
+# Build in-memory indexes of the class hierarchy, of the names, of the triples on the coin sides and a full text
+# index of the iconography descriptions at startup (in the background) and answer the generalise, specialise and
+# equivalent recommendations, the autocomplete, the coin occurrence checks of the candidates and the keywords from them.
+SPARQL_LOCAL_INDEXES = True
+
+# Read timeout in seconds of the queries the local indexes are built from
+SPARQL_INDEX_TIMEOUT = 300
+
+# Snapshot of the local indexes written by "python manage.py buildindexsnapshot". If it exists and belongs to the current
+# dataset version, the indexes are opened from it (memory mapped and shared by all worker processes) instead of built.
+# When the dataset changes, a newer snapshot is opened, otherwise only the indexes whose data changed are rebuilt.
+SPARQL_INDEX_SNAPSHOT = BASE_DIR / "indexes.snapshot"
@@ -0,0 +1,86 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from services.DatasetVersionProbe import DatasetVersionProbe
+from services.DumpIngest import DumpIngest
+from services.LocalIndexes import LocalIndexes
+from services.SparqlTransport import SparqlTransport
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the local indexes from a SPARQL endpoint and writes them as an index snapshot. "
+        "The web workers open the snapshot (SPARQL_INDEX_SNAPSHOT) at startup instead of building the indexes themselves. "
+        "With --refresh, an existing snapshot is updated: only the indexes whose data changed are rebuilt. "
+        "Given Corpus Nummorum dumps, the indexes are built from the dumps instead, streamed and parsed by a pool of worker "
+        "processes. The snapshot is replaced atomically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dumps", nargs="*", help="Dump files (N-Triples, Turtle, ..., optionally gzipped) the indexes are built from instead of the endpoint")
+        parser.add_argument("--output", default=str(settings.SPARQL_INDEX_SNAPSHOT), help="File the snapshot is written to")
+        parser.add_argument("--endpoint", default=settings.SPARQL_ENDPOINT, help="SPARQL endpoint the indexes are built from")
+        parser.add_argument("--timeout", type=float, default=settings.SPARQL_INDEX_TIMEOUT, help="Read timeout in seconds of the index queries")
+        parser.add_argument("--refresh", action="store_true", help="Update the snapshot at --output instead of building all indexes")
+        parser.add_argument("--format", default=None, help="rdflib format of the dumps, guessed from the file names if omitted")
+        parser.add_argument("--workers", type=int, default=None, help="Number of processes parsing the dumps, the number of CPUs if omitted")
+        parser.add_argument("--dataset-version", default=None, help="Dataset version recorded for the dumps, probed from --endpoint if omitted")
+
+    def handle(self, *args, **options):
+        if options["dumps"]:
+            if options["refresh"]:
+                raise CommandError("--refresh compares the snapshot with the endpoint, it can not be combined with dumps")
+            indexes = self._ingest(options)
+        else:
+            indexes = self._query(options)
+        self.stdout.write(f"  {indexes}")
+
+        indexes.write(options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Index snapshot generation {indexes.generation} written to {options['output']}"))
+
+    def _query(self, options):
+        transport = SparqlTransport(options["endpoint"])
+        version = self._probe(transport)
+        if version is None:
+            raise CommandError(f"The dataset version of {options['endpoint']} could not be probed")
+
+        if options["refresh"] and os.path.exists(options["output"]):
+            previous = LocalIndexes.open(options["output"])
+            self.stdout.write(f"Comparing generation {previous.generation} of {options['output']} with {options['endpoint']} ...")
+            changed = previous.changedIndexes(transport, options["timeout"])
+            self.stdout.write(f"  changed: {', '.join(sorted(changed)) or 'none'}")
+            return previous.refreshed(transport, options["timeout"], version, changed)
+        self.stdout.write(f"Building the indexes from {options['endpoint']} ...")
+        return LocalIndexes.build(transport, options["timeout"], version)
+
+    def _ingest(self, options):
+        for path in options["dumps"]:
+            if not os.path.isfile(path):
+                raise CommandError(f"Dump {path} does not exist")
+        # the version of the endpoint serving the dumps, so running workers can tell whether the snapshot matches their data
+        version = options["dataset_version"] or self._probe(SparqlTransport(options["endpoint"]))
+
+        ingest = DumpIngest()
+        reported = [0.0]
+
+        def progress(path, share, triples, kept):
+            now = time.monotonic()
+            if share >= 1.0 or now - reported[0] >= 5:
+                reported[0] = now
+                self.stdout.write(f"  {path}: {share:.0%}, {triples} triples read, {kept} kept")
+
+        self.stdout.write(f"Reading {len(options['dumps'])} dump(s) ...")
+        ingest.read(options["dumps"], format=options["format"], workers=options["workers"], progress=progress)
+        self.stdout.write("Building the indexes ...")
+        return ingest.localIndexes(version)
+
+    def _probe(self, transport):
+        """
+        Returns the dataset version of the endpoint, None if it can not be probed.
+        """
+        probe = DatasetVersionProbe(transport, probe_query=settings.SPARQL_DATASET_PROBE_QUERY)
+        probe.check()
+        return probe.version
@@ -0,0 +1,113 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from services.CoinSearchHandler import CoinSearchHandler
+from services.RuleMaterializer import RuleMaterializer
+from services.SparqlTransport import SparqlTransport
+from services.TaxonomyIndex import LABEL_QUERY, SUBCLASS_QUERY, TYPE_QUERY, TaxonomyIndex
+
+
+# recommendation functions whose answers depend on the inferred triples
+VERIFIED_FUNCTIONS = [
+    "getSimpleGeneraliseRecommendationsOfCurrentSubObj",
+    "getSimpleSpecializRecommendationsOfCurrentSubObj",
+    "getAbsoluteGeneraliseRecommendationsOfCurrentSubObj",
+    "getAbsoluteSpecializRecommendationsOfCurrentSubObj",
+    "getEquivalentRecommendationsToCurrentSubObj",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Materializes the inferences of apache/rules.ttl for a CN dump, so the data can be served without the GenericRuleReasoner. "
+        "The inferred triples are written as N-Triples to load them together with the dump into a plain TDB dataset. "
+        "With --verify, the answers of an endpoint with reasoner and one with the materialized data are compared instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dumps", nargs="*", help="Dump files (N-Triples, Turtle, RDF/XML, ..., optionally .gz)")
+        parser.add_argument("--output", default="inferred.nt.gz", help="File the inferred triples are written to (.gz to compress)")
+        parser.add_argument("--format", default=None, help="rdflib format of the dumps, guessed from the file names by default")
+        parser.add_argument("--verify", action="store_true", help="Compare the answers of two endpoints instead of materializing")
+        parser.add_argument("--reasoner-endpoint", default=settings.SPARQL_ENDPOINT, help="SPARQL endpoint with the GenericRuleReasoner")
+        parser.add_argument("--endpoint", help="SPARQL endpoint serving the dump and the materialized triples without reasoner")
+        parser.add_argument("--samples", type=int, default=25, help="Number of classes and of entities whose recommendations are compared")
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            self.verify(options)
+        else:
+            self.materialize(options)
+
+    def materialize(self, options):
+        if not options["dumps"]:
+            raise CommandError("No dump given")
+
+        materializer = RuleMaterializer()
+        for dump in options["dumps"]:
+            self.stdout.write(f"Reading {dump} ...")
+            read = materializer.read(dump, format=options["format"])
+            self.stdout.write(f"  {read} triples")
+
+        written = materializer.write(options["output"])
+        self.stdout.write(self.style.SUCCESS(f"{written} inferred triples written to {options['output']}"))
+
+    def verify(self, options):
+        if not options["endpoint"]:
+            raise CommandError("--verify needs the --endpoint without reasoner")
+
+        reasoner = SparqlTransport(options["reasoner_endpoint"])
+        plain = SparqlTransport(options["endpoint"])
+        differences = []
+
+        # the hierarchy, memberships and labels as a whole
+        for name, query in (("subclass", SUBCLASS_QUERY), ("type", TYPE_QUERY), ("label", LABEL_QUERY)):
+            self.stdout.write(f"Comparing {name} triples ...")
+            expected_rows = set(tuple(row) for row in reasoner.stream(query, timeout=300))
+            actual_rows = set(tuple(row) for row in plain.stream(query, timeout=300))
+            for row in sorted(expected_rows - actual_rows):
+                differences.append(f"{name} triple only with reasoner: {' '.join(row)}")
+            for row in sorted(actual_rows - expected_rows):
+                differences.append(f"{name} triple only without reasoner: {' '.join(row)}")
+
+        expected = TaxonomyIndex.fromEndpoint(reasoner)
+
+        # the answers of the recommendation queries for a sample of classes and entities
+        classes = [expected.uri(node) for node in range(len(expected)) if expected.isClass[node]]
+        entities = [expected.uri(node) for node in range(len(expected)) if not expected.isClass[node]]
+        samples = _spread(classes, options["samples"]) + _spread(entities, options["samples"])
+        self.stdout.write(f"Comparing recommendations of {len(samples)} classes and entities ...")
+        expected_handler = CoinSearchHandler(reasoner)
+        actual_handler = CoinSearchHandler(plain)
+        answers = 0
+        for uri in samples:
+            for function in VERIFIED_FUNCTIONS:
+                for is_subject in ("true", "false"):
+                    subj_uri, obj_uri = (uri, "") if is_subject == "true" else ("", uri)
+                    expected_answer = getattr(expected_handler, function)(subj_uri, "", obj_uri, is_subject, "obverse")
+                    actual_answer = getattr(actual_handler, function)(subj_uri, "", obj_uri, is_subject, "obverse")
+                    answers += 1
+                    if _normalize(expected_answer) != _normalize(actual_answer):
+                        differences.append(f"{function} {uri} (subject {is_subject}): {expected_answer} != {actual_answer}")
+
+        for difference in differences[:50]:
+            self.stdout.write(difference)
+        if differences:
+            raise CommandError(f"{len(differences)} differences between {options['reasoner_endpoint']} and {options['endpoint']}")
+        self.stdout.write(self.style.SUCCESS(f"{len(expected)} entities and {answers} recommendation answers are identical"))
+
+
+def _spread(items, count):
+    """
+    Picks up to count items evenly spread over the list.
+    """
+    if len(items) <= count:
+        return list(items)
+    return [items[i * len(items) // count] for i in range(count)]
+
+
+def _normalize(answer):
+    """
+    Makes a recommendation answer comparable, entities with the same name may come in any order.
+    """
+    return {category: sorted((item["name_en"], item["link"]) for item in items) for category, items in answer.items()}
@@ -13,17 +13,19 @@ $(document).ready(function () {
     _coins: [],
     latestResponse: null,
     latestCoinResult: null,
-    sortedCoinResult: null,
+    latestSearch: null,
     currentSearchType: "NumismaticObject",
     currentCoin: {
       obverse: { coin: [], keywords: [] },
       reverse: { coin: [], keywords: [] },
     },
     relationString: "",
+    generatedQuery: "",
     cursorPosition: null,
     currentPage: 1,
     resultsPerPage: 100,
     totalPages: 1,
+    totalResults: 0,
 
     /**
      * Getter for _coins array.
@@ -87,8 +89,7 @@ $(document).ready(function () {
      * @Author: Danilo Pantic
      */
     setPage: function (page) {
-      this.currentPage = page;
-      renderResults();
+      requestResultPage(page);
     },
 
     /**
@@ -98,8 +99,7 @@ $(document).ready(function () {
      */
     nextPage: function () {
       if (this.currentPage < this.totalPages) {
-        this.currentPage++;
-        this.renderCurrentPage();
+        requestResultPage(this.currentPage + 1);
       }
     },
 
@@ -110,26 +110,20 @@ $(document).ready(function () {
      */
     previousPage: function () {
       if (this.currentPage > 1) {
-        this.currentPage--;
-        this.renderCurrentPage();
+        requestResultPage(this.currentPage - 1);
       }
     },
 
     /**
-     * Renders the results of the current page based on the current page number and results per page settings.
-     * This function handles sorting of the results, slicing them for the current page, grouping them according to selected criteria,
-     * and finally rendering them on the webpage. It also updates the pagination controls and resets the scroll position of the results container.
+     * Renders the results of the current page, which the server sent already sorted and sliced.
+     * This function groups them according to selected criteria and renders them on the webpage.
+     * It also updates the pagination controls and resets the scroll position of the results container.
      *
      * @Author: Danilo Pantic
      */
     renderCurrentPage: function () {
-      sortResults();
-
-      const start = (this.currentPage - 1) * this.resultsPerPage;
-      const end = start + this.resultsPerPage;
-      const currentItems = appState.sortedCoinResult.slice(start, end);
       const groupedResults = groupResults(
-        currentItems,
+        appState.latestCoinResult,
         $("#groupSelect").val()
       );
 
@@ -347,7 +341,8 @@ $(document).ready(function () {
       },
       success: function (response) {
         if (response.success) {
-          editor.setValue(spfmt(response.result));
+          appState.generatedQuery = spfmt(response.result);
+          editor.setValue(appState.generatedQuery);
         } else {
           console.error("Failed to generate query: ", response.error);
         }
@@ -434,6 +429,7 @@ $(document).ready(function () {
       },
       success: function (r) {
         appState.latestResponse = r.result;
+        showServiceNotice(r);
         
         if (r.success) {
           $.each(r.result, (category, items) => {
@@ -569,6 +565,7 @@ $(document).ready(function () {
       },
       success: function (r) {
         appState.latestResponse = r.result;
+        showServiceNotice(r);
 
         if (r.success) {
           $.each(r.result, (category, items) => {
@@ -1178,39 +1175,145 @@ $(document).ready(function () {
 
   
   /**
-   * Performs a search based on the current query in the SPARQL editor.
+   * Returns the coins and the relation string of the search, if the query in the SPARQL editor is still the generated one.
+   * The server can then evaluate the search without the query.
+   * @returns {Object} The coins and relation string, empty if the query was edited.
+   */
+  function searchDescription() {
+    if (editor.getValue() !== appState.generatedQuery) {
+      return {};
+    }
+    return {
+      coins: JSON.stringify(appState.coins),
+      relationString: appState.relationString,
+    };
+  }
+
+  /**
+   * Performs a search based on the current query in the SPARQL editor and shows its first page.
+   * The server keeps the result of the search, so other pages and sort orders are requested without searching again.
    * @returns {void}
    *
    * @Author: Danilo Pantic
    */
   function performSearch() {
-    $("#loadingSymbol").removeClass("hidden");
+    appState.latestSearch = Object.assign(
+      {
+        q: editor.getValue(),
+        searchType: appState.currentSearchType,
+      },
+      searchDescription()
+    );
     $("#moveableStage").attr("data-state", "results");
+    requestResultPage(1);
+  }
+
+  /**
+   * Returns the sort options of the results for the searchCoin and download actions.
+   * @returns {Object} The sort options.
+   */
+  function sortOptions() {
+    return {
+      sortBy: $("#sortSelect").val(),
+      sortDirection: $("#sortDirection").val(),
+    };
+  }
+
+  /**
+   * Requests one page of the results of the latest search, sorted by the current sort settings, and renders it.
+   * @param {number} page - The page number, starting at 1.
+   * @returns {void}
+   */
+  function requestResultPage(page) {
+    if (!appState.latestSearch) {
+      return;
+    }
+    $("#loadingSymbol").removeClass("hidden");
     $.ajax({
       method: "POST",
       url: "callback",
-      data: {
-        action: "searchCoin",
-        q: editor.getValue(),
-        searchType: appState.currentSearchType,
-      },
+      data: Object.assign(
+        {
+          action: "searchCoin",
+          page: page,
+          pageSize: appState.resultsPerPage,
+        },
+        appState.latestSearch,
+        sortOptions()
+      ),
       success: function (r) {
         $("#loadingSymbol").addClass("hidden");
-        $("#numSearchResults").html(r.result.length);
 
-        if (r.success) {
+        if (r.result) {
+          // a timed out search only knows a part of the matching coins
+          $("#numSearchResults").html(r.timedOut ? `at least ${r.total}` : r.total);
           appState.latestCoinResult = r.result;
-          appState.sortedCoinResult = [...r.result];
-          appState.totalPages = Math.ceil(
-            appState.sortedCoinResult.length / appState.resultsPerPage
-          );
-          appState.currentPage = 1;
+          appState.totalResults = r.total;
+          appState.totalPages = r.pages;
+          appState.currentPage = r.page;
           appState.renderCurrentPage();
         }
+        showResultNotice(r);
       },
     });
   }
 
+  /**
+   * Returns a notice for a response of the callback endpoint whose answer is incomplete or outdated.
+   * @param {Object} r - The response, with "timedOut" and "degraded" set by the server (for the bundle "timedOut" and "errors" are part of the result).
+   * @returns {string} The notice, empty if the answer is complete.
+   */
+  function responseNotice(r) {
+    let notices = [];
+    if (r.timedOut || (r.result && r.result.timedOut)) {
+      notices.push("The request took too long, the answer is incomplete.");
+    } else if (r.result && r.result.errors) {
+      notices.push("A part of the request failed, the answer is incomplete.");
+    }
+    if (r.degraded) {
+      notices.push("The SPARQL endpoint is currently unavailable, the answer may be incomplete or outdated.");
+    }
+    return notices.join(" ");
+  }
+
+  /**
+   * Shows above the results whether the shown page belongs to a truncated or degraded search result, or why the search failed.
+   * @param {Object} r - The response of the searchCoin action.
+   * @returns {void}
+   */
+  function showResultNotice(r) {
+    let notice = "";
+    if (!r.result) {
+      notice = r.message || r.error || "The search failed.";
+      if (r.degraded) {
+        notice = "The SPARQL endpoint is currently unavailable, please try again later.";
+      }
+    } else if (r.timedOut) {
+      notice = `The time budget of the search was used up, only the ${r.total} coins matched until then are shown.`;
+      if (r.degraded) {
+        notice += " The SPARQL endpoint is currently unavailable, the results may be outdated.";
+      }
+    } else {
+      notice = responseNotice(r);
+    }
+    $("#resultNotice").text(notice).toggleClass("hidden", notice === "");
+  }
+
+  /**
+   * Shows a notice for some seconds if the response of a recommendation or check is incomplete or outdated.
+   * @param {Object} r - The response of the callback endpoint.
+   * @returns {void}
+   */
+  function showServiceNotice(r) {
+    const notice = responseNotice(r);
+    if (notice === "") {
+      return;
+    }
+    clearTimeout(appState.serviceNoticeTimer);
+    $("#serviceNotice").text(notice).removeClass("hidden");
+    appState.serviceNoticeTimer = setTimeout(() => $("#serviceNotice").addClass("hidden"), 8000);
+  }
+
   /**
    * Adds the currently described coin to the query state.
    * @returns {void}
@@ -1264,36 +1367,6 @@ $(document).ready(function () {
     }, {});
   }
 
-  /**
-   * Sorts the results based on the current sort settings.
-   * @returns {void}
-   * @async
-   *
-   * @Author: Mohammed Sayed Mahmod
-   */
-  function sortResults() {
-    const sortBy = $("#sortSelect").val();
-    const sortDirection = $("#sortDirection").val();
-
-    appState.sortedCoinResult.sort((a, b) => {
-      let valueA = a[sortBy];
-      let valueB = b[sortBy];
-
-      if (typeof valueA === "number" && typeof valueB === "number") {
-        return sortDirection === "ascending"
-          ? valueA - valueB
-          : valueB - valueA;
-      } else {
-        valueA = String(valueA || "").toLowerCase();
-        valueB = String(valueB || "").toLowerCase();
-
-        if (valueA < valueB) return sortDirection === "ascending" ? -1 : 1;
-        if (valueA > valueB) return sortDirection === "ascending" ? 1 : -1;
-        return 0;
-      }
-    });
-  }
-
   /**
    * Renders the grouped results into the UI.
    * @param {Object} groupedResults - The grouped results to render.
@@ -1990,12 +2063,25 @@ $(document).ready(function () {
   $("[data-action=downloadResults]").click((e) => {
     e.preventDefault();
 
-    var data = {
-      action: "download",
-      fileType: "csv",
-      searchType: appState.currentSearchType,
-      q: editor.getValue(),
-    };
+    // the results of the latest search in the order they are shown, the server does not search again
+    var search =
+      appState.latestSearch ||
+      Object.assign(
+        {
+          q: editor.getValue(),
+          searchType: appState.currentSearchType,
+        },
+        searchDescription()
+      );
+
+    var data = Object.assign(
+      {
+        action: "download",
+        fileType: "csv",
+      },
+      search,
+      sortOptions()
+    );
 
     var form = $("<form>", {
       method: "POST",
@@ -2020,9 +2106,15 @@ $(document).ready(function () {
   });
 
 
-  $("#sortSelect, #sortDirection, #groupSelect").change(function () {
-    sortResults();
-    appState.renderCurrentPage();
+  // the server sorts all results, grouping only changes the current page
+  $("#sortSelect, #sortDirection").change(function () {
+    requestResultPage(1);
+  });
+
+  $("#groupSelect").change(function () {
+    if (appState.latestCoinResult) {
+      appState.renderCurrentPage();
+    }
   });
 
   $("#returnToQuery").click(function () {
@@ -2057,6 +2149,7 @@ $(document).ready(function () {
 
 /**
  * Function that checks if hierachy buttons for a search field should be active or deactive based on if the buttons effect the return at least one recommendation 
+ * All checks for the side are answered by a single getTripleContextBundle request instead of one request per check.
  * 
  * @param {String} side - side of the inputs fields for which the function is performed
  * @returns {void}
@@ -2079,242 +2172,65 @@ function disableHierarchyButtons(side){
       pred_uri = appState.currentCoin[side].coin[i].item.link 
     }
   }
-  
-  //Changes URI's into a format usable in SPARQL Querries  
-  if (subj_uri == ""){
-    subj_uri = "?s"
-  }else{
-    subj_uri = "<"+subj_uri+">"
-  }
-        
-  if (pred_uri == ""){
-    pred_uri = "?p"
-  }else{
-    pred_uri = "<"+pred_uri+">"
-  }
-    
-  if (obj_uri == ""){
-    obj_uri = "?o" 
-  }else{
-    obj_uri = "<"+obj_uri+">"
-  }
 
-  // Steven Nowak adapting if check 
-  // (now one for subject and one for object (because maybe through the changed entity also the buttons of the other triple element have to be disabled / enabled)) 
-
-  if (subj_uri != "?s"){
-    if(pred_uri == "?p" && obj_uri == "?o"){      
-      //Request that checks if at least one recommandation exists for predicate and object based on the current subject
-      //Reason: Subjects when not connected with a predicate or object can also be singular entities that appear on a coin but do not exist in a triple relation with any othere URI   
-      $.ajax({
-        method: "POST",
-        url: "callback",
-        data: {
-          action: "areRecommendationsAvailable",
-          subj_uri: subj_uri,
-          side: side,
-        },
-        success: function (r) {
-          appState.latestResponse = r.result;
-          if (r.success) {
-            if (r.result == "true"){
-              document.querySelector('[data-side="'+side+'"][data-action="listAllPredicates"]').disabled = false;
-              document.querySelector('[data-side="'+side+'"][data-action="listAllObj"]').disabled = false;  
-            }else{
-              document.querySelector('[data-side="'+side+'"][data-action="listAllPredicates"]').disabled = true;
-              document.querySelector('[data-side="'+side+'"][data-action="listAllObj"]').disabled = true;
-            }
-          }
-          onComplete();
-        },
-      });
-    }
-    //Request that checks if at least one recommandation exists for the generalisation of the current subject
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areGeneraliseRecommendationsAvailable",
-        q: subj_uri.substring(1, subj_uri.length - 1),
-        subj_uri: subj_uri,
-				pred_uri: pred_uri,
-				obj_uri: obj_uri,
-				is_subject: "true", 
-				side: side,
-      },
-      success: function (r) {
-        appState.latestResponse = r.result;
-        
-        if (r.success) {
-          
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseSubject"]').disabled = false;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseSubject"]').disabled = false;
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseSubject"]').disabled = true;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseSubject"]').disabled = true;
-          }
-        }
-  
-        onComplete();
-      },
-    });
-    //Request that checks if at least one recommandation exists for the specialisation of the current subject
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areSpecialiseRecommendationsAvailable",
-        q: subj_uri.substring(1, subj_uri.length - 1),
-        subj_uri: subj_uri,
-        pred_uri: pred_uri,
-        obj_uri: obj_uri,
-        is_subject: "true",
-        side: side,
-      },
-      success: function (r) {
-       
-        appState.latestResponse = r.result;
-        
-        if (r.success) {
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseSubject"]').disabled = false;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseSubject"]').disabled = false;
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseSubject"]').disabled = true;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseSubject"]').disabled = true;
-          }
-        }
-        onComplete();
-      },
-    });
-    /*
-    ----------------------------------------------------------------------- (START) UPDATE by Steven Nowak --------------------------------------------------------
-    */
-    //Request that checks if at least one recommandation exists for equivalent entities of the current subject
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areEquivalentRecommendationsAvailable",
-        q: subj_uri.substring(1, subj_uri.length - 1),
-        subj_uri: subj_uri,
-        pred_uri: pred_uri,
-        obj_uri:obj_uri,
-        is_subject: "true",
-        side: side,
-      },
-      success: function (r) {
-        appState.latestResponse = r.result;
-        if (r.success) {
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="similarSubject"]').disabled = false; 
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="similarSubject"]').disabled = true;
-          }
-        }
-        onComplete();
-      },
-    });
-    /*
-    ----------------------------------------------------------------------- (END) UPDATE by Steven Nowak --------------------------------------------------------
-    */
-  } else {
-    if (pred_uri == "?p"){
+  if (subj_uri == ""){
+    if (pred_uri == ""){
       document.querySelector('[data-side="'+side+'"][data-action="listAllPredicates"]').disabled = false;
     }
-    if (obj_uri == "?o"){
+    if (obj_uri == ""){
       document.querySelector('[data-side="'+side+'"][data-action="listAllObj"]').disabled = false;
     }
   }
-  if (obj_uri != "?o"){
-    //Request that checks if at least one recommandation exists for the generalisation of the current object
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areGeneraliseRecommendationsAvailable",
-        q: obj_uri.substring(1, obj_uri.length - 1),
-        subj_uri: subj_uri,
-				pred_uri: pred_uri,
-				obj_uri: obj_uri,
-				is_subject: "false", 
-				side: side,
-      },
-      success: function (r) {
-        appState.latestResponse = r.result;
-        
-        if (r.success) {
-          
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseObject"]').disabled = false;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseObject"]').disabled = false;
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseObject"]').disabled = true;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseObject"]').disabled = true;
-          }
-        }
-  
-        onComplete();
-      },
-    });
-    //Request that checks if at least one recommandation exists for the specialisation of the current object
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areSpecialiseRecommendationsAvailable",
-        q: obj_uri.substring(1, obj_uri.length - 1),
-        subj_uri: subj_uri,
-        pred_uri: pred_uri,
-        obj_uri: obj_uri,
-        is_subject: "false",
-        side: side,
-      },
-      success: function (r) {
-        appState.latestResponse = r.result;
-        
-        if (r.success) {
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseObject"]').disabled = false;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseObject"]').disabled = false;
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseObject"]').disabled = true;
-            document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseObject"]').disabled = true;
-          }
-        }
-        onComplete();
-      },
-    });
-   //Request that checks if at least one recommandation exists for equivalent entities of the current object
-    $.ajax({
-      method: "POST",
-      url: "callback",
-      data: {
-        action: "areEquivalentRecommendationsAvailable",
-        q: obj_uri.substring(1, obj_uri.length - 1),
-        subj_uri: subj_uri,
-        pred_uri: pred_uri,
-        obj_uri: obj_uri,
-        is_subject: "false",
-        side: side,
-      },
-      success: function (r) {
-        appState.latestResponse = r.result;
-        if (r.success) {
-          if (r.result == "true"){
-            document.querySelector('[data-side="'+side+'"][data-action="similarObject"]').disabled = false; 
-          }else{
-            document.querySelector('[data-side="'+side+'"][data-action="similarObject"]').disabled = true;
-          }
-        }
-  
-        onComplete();
-      },
-    });
+
+  if (subj_uri == "" && obj_uri == ""){
+    return;
   }
 
-}  
+  //Request that checks for the current subject and object at once, if at least one recommandation exists for their generalisation, specialisation and equivalent entities
+  //and for a subject without predicate and object, if at least one recommandation exists for predicate and object
+  //Reason: Subjects when not connected with a predicate or object can also be singular entities that appear on a coin but do not exist in a triple relation with any othere URI   
+  $.ajax({
+    method: "POST",
+    url: "callback",
+    data: {
+      action: "getTripleContextBundle",
+      subj_uri: subj_uri,
+      pred_uri: pred_uri,
+      obj_uri: obj_uri,
+      side: side,
+    },
+    success: function (r) {
+      appState.latestResponse = r.result;
+      showServiceNotice(r);
+      if (!r.success) {
+        return;
+      }
+      // a check that was not answered (timed out or failed) is null, its buttons stay enabled
+
+      if (r.result.subject) {
+        const subject = r.result.subject;
+        if (subject.recommendationsAvailable !== undefined) {
+          document.querySelector('[data-side="'+side+'"][data-action="listAllPredicates"]').disabled = subject.recommendationsAvailable == "false";
+          document.querySelector('[data-side="'+side+'"][data-action="listAllObj"]').disabled = subject.recommendationsAvailable == "false";
+        }
+        document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseSubject"]').disabled = subject.generalise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseSubject"]').disabled = subject.generalise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseSubject"]').disabled = subject.specialise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseSubject"]').disabled = subject.specialise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="similarSubject"]').disabled = subject.equivalent == "false";
+      }
+
+      if (r.result.object) {
+        const object = r.result.object;
+        document.querySelector('[data-side="'+side+'"][data-action="simpleGeneraliseObject"]').disabled = object.generalise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="absoluteGeneraliseObject"]').disabled = object.generalise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="simpleSpecialiseObject"]').disabled = object.specialise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="absoluteSpecialiseObject"]').disabled = object.specialise == "false";
+        document.querySelector('[data-side="'+side+'"][data-action="similarObject"]').disabled = object.equivalent == "false";
+      }
+    },
+  });
+}
 
 
 
@@ -1,3 +1,1942 @@
-from django.test import TestCase
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import itertools
+import os
+import re
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+import numpy as np
+from rdflib import RDF, RDFS, BNode, Graph, Literal, Namespace, URIRef
+import requests
+
+from newapp.management.commands.materializeinferences import Command as MaterializeInferencesCommand
+from services.AppearanceIndex import SIDES
+from services.BooleanTerm import Leaf, Node, formatBooleanTerm, parseBooleanTerm
+from services.CircuitBreaker import CircuitBreaker, CircuitOpen, degradedScope
+from services.CoinSearchHandler import CoinSearchHandler, keywordRegex
+from services.DatasetVersionProbe import DatasetVersionProbe
+from services.DiskResultCache import DiskResultCache
+from services.DumpIngest import DumpIngest
+from services.IndexSnapshot import IndexSnapshot, SnapshotWriter, StringTable
+from services.KeywordIndex import KeywordIndex, matchExpression
+from services.LabelIndex import PrefixTable
+from services.LocalIndexes import LocalIndexes
+from services.QueryBudget import QueryTimeout, currentDeadline, queryBudget, remainingBudget, submitWithBudget, waitForResult
+from services.QueryResultCache import QueryResultCache, queryFingerprint
+from services.QueryTemplates import QueryTemplate, sparqlIri, sparqlLiteral
+from services.ResultCursor import ResultCursor
+from services.RuleMaterializer import RuleMaterializer
+from services.SingleFlight import SingleFlight
+from services.SparqlTransport import SparqlTransport, parseTerm
+from services.TaxonomyIndex import TaxonomyIndex, displayName
+from services.UriDictionary import UriDictionary, splitUri
+
+
+CNT = Namespace("http://www.dbis.cs.uni-frankfurt.de/cnt/id/")
+NMO = Namespace("http://nomisma.org/ontology#")
+DCTERMS = Namespace("http://purl.org/dc/terms/")
+SKOS = Namespace("http://www.w3.org/2004/02/skos/core#")
+RDF_LI = URIRef("http://www.w3.org/1999/02/22-rdf-syntax-ns#li")
+PERSON = URIRef("http://xmlns.com/foaf/0.1/#term_Person")
+OBJECT = URIRef("https://www.wikidata.org/wiki/Q488383")
+
+# (coin, type, side, subject, predicate, object, description of the iconography)
+COINS = [
+    ("c1", "t1", "obverse", "artemis", "holding", "bow", "Artemis holding bow, deer at her feet"),
+    ("c2", "t1", "reverse", "zeus", "holding", "spear", "Zeus holding spear"),
+    ("c3", "t2", "obverse", "apollo", "standing", "bow", "Apollo standing with bow"),
+    ("c4", "t2", "reverse", "hercules", "fighting", "zeus", "Hercules fighting Zeus (seated)"),
+]
+
+
+def coinGraph(coins=COINS):
+    """
+    Builds a small dataset like the one of the endpoint, with the inferences of the class hierarchy materialized.
+
+    Parameters:
+        coins (list): The coins, see COINS.
+
+    Returns:
+        Graph: The dataset.
+    """
+    graph = Graph()
+    classes = [(CNT.deities, PERSON), (CNT.greek_deities, CNT.deities), (CNT.heroes, PERSON), (CNT.weapons, OBJECT)]
+    entities = [
+        ("artemis", CNT.greek_deities), ("zeus", CNT.greek_deities), ("apollo", CNT.greek_deities), ("hercules", CNT.heroes),
+        ("hercules", CNT.greek_deities), ("bow", CNT.weapons), ("spear", CNT.weapons),
+    ]
+    for sub, sup in classes + [(CNT.greek_deities, PERSON)]:
+        graph.add((sub, RDFS.subClassOf, sup))
+    for node in {node for pair in classes for node in pair}:
+        graph.add((node, RDF.type, RDFS.Class))
+        graph.add((node, SKOS.prefLabel, Literal(str(node).rsplit("/", 1)[-1])))
+    for name, cls in entities:
+        for node in [cls] + [sup for sub, sup in graph.subject_objects(RDFS.subClassOf) if sub == cls]:
+            graph.add((CNT[name], RDF.type, node))
+        graph.add((CNT[name], SKOS.prefLabel, Literal(name)))
+    for predicate in ("holding", "standing", "fighting"):
+        graph.add((CNT[predicate], SKOS.prefLabel, Literal(predicate)))
+        graph.add((CNT[predicate], SKOS.prefLabel, Literal("predicate_id_" + predicate)))
+
+    for coin, coin_type, side, subject, predicate, obj, description in coins:
+        url, side_node, iconography = CNT["coin_" + coin], CNT[coin + "_" + side], CNT[coin + "_iconography"]
+        bag, appearance, entities_node = CNT[coin + "_bag"], CNT[coin + "_appearance"], CNT[coin + "_entities"]
+        graph.add((url, RDF.type, NMO.NumismaticObject))
+        graph.add((url, DCTERMS.identifier, Literal(coin)))
+        graph.add((url, NMO.hasTypeSeriesItem, CNT[coin_type]))
+        graph.add((CNT[coin_type], RDF.type, NMO.TypeSeriesItem))
+        graph.add((CNT[coin_type], DCTERMS.identifier, Literal(coin_type)))
+        graph.add((url, NMO["has" + side.capitalize()], side_node))
+        graph.add((CNT[coin_type], NMO["has" + side.capitalize()], side_node))
+        graph.add((side_node, NMO.hasIconography, iconography))
+        graph.add((iconography, DCTERMS.description, Literal(description, lang="en")))
+        graph.add((iconography, NMO.hasIconography, bag))
+        graph.add((bag, RDF.type, RDF.Bag))
+        graph.add((bag, RDF_LI, appearance))
+        graph.add((appearance, RDF.subject, CNT[subject]))
+        graph.add((appearance, RDF.predicate, CNT[predicate]))
+        graph.add((appearance, RDF.object, CNT[obj]))
+        graph.add((iconography, NMO.hasAppearance, entities_node))
+        graph.add((entities_node, RDF_LI, CNT[subject]))
+        graph.add((entities_node, RDF_LI, CNT[obj]))
+    return graph
+
+
+class GraphTransport():
+    """
+    Transport answering the queries from an rdflib graph instead of an endpoint, see SparqlTransport.
+    The queries are serialized, because the query parser of rdflib is not thread-safe. The sent queries are recorded.
+    """
+
+    endpoint = "memory:"
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.lock = threading.Lock()
+        self.queries = []
+
+    def query(self, query, timeout=None, server_timeout=None):
+        with self.lock:
+            self.queries.append(query)
+            result = self.graph.query(query)
+            result.bindings
+        return result
+
+    def stream(self, query, timeout=None, server_timeout=None, deadline=None):
+        with self.lock:
+            self.queries.append(query)
+            result = self.graph.query(query)
+            result.bindings
+        row_type = namedtuple("SparqlRow", [str(var) for var in result.vars], rename=True)
+        for row in result:
+            yield row_type(*[None if term is None else str(term) for term in row])
+
+
+def evaluateTerm(term, values):
+    """
+    Evaluates a parsed boolean term.
+
+    Parameters:
+        term (Leaf or Node): The term.
+        values (dict): Number of a coin description -> truth value.
+
+    Returns:
+        bool: The truth value of the term.
+    """
+    if isinstance(term, Leaf):
+        return values[term.coin] != term.negated
+    results = (evaluateTerm(child, values) for child in term.children)
+    return all(results) if term.operator == "AND" else any(results)
+
+
+def evaluateText(booleanTerm, values):
+    """
+    Evaluates a boolean term as Python, without the parser. The term has to be bracketed where AND and OR are mixed,
+    because Python binds AND stronger than OR.
+    """
+    expression = re.sub(r"C(\d+)", r"values[\1]", booleanTerm).replace("AND", "and").replace("OR", "or").replace("NOT", "not")
+    return eval(expression, {"values": values})
+
+
+class BooleanTermTests(SimpleTestCase):
+    def test_or_binds_stronger_than_and(self):
+        self.assertEqual(
+            parseBooleanTerm("C1 AND C2 OR C3"),
+            Node("AND", (Leaf(1, False), Node("OR", (Leaf(2, False), Leaf(3, False)))))
+        )
+        self.assertEqual(
+            parseBooleanTerm("C1 OR C2 AND C3"),
+            Node("AND", (Leaf(3, False), Node("OR", (Leaf(1, False), Leaf(2, False)))))
+        )
+        self.assertEqual(parseBooleanTerm("C1 AND C2 OR C3"), parseBooleanTerm("C1 AND (C2 OR C3)"))
+        self.assertNotEqual(parseBooleanTerm("C1 AND C2 OR C3"), parseBooleanTerm("(C1 AND C2) OR C3"))
+
+    def test_not_of_a_bracketed_term(self):
+        self.assertEqual(parseBooleanTerm("NOT (C1 OR C2)"), Node("AND", (Leaf(1, True), Leaf(2, True))))
+        self.assertEqual(parseBooleanTerm("NOT (C1 AND C2)"), Node("OR", (Leaf(1, True), Leaf(2, True))))
+        self.assertEqual(
+            parseBooleanTerm("NOT (C1 AND NOT (C2 OR C3))"),
+            Node("OR", (Leaf(1, True), Leaf(2, False), Leaf(3, False)))
+        )
+        self.assertEqual(parseBooleanTerm("NOT NOT C1"), Leaf(1, False))
+        # NOT only applies to the next description or bracket
+        self.assertEqual(parseBooleanTerm("NOT C1 OR C2"), Node("OR", (Leaf(1, True), Leaf(2, False))))
+
+    def test_malformed_terms(self):
+        for booleanTerm in ["C1 AND", "AND C1", "(C1 OR C2", "C1 OR C2)", "C1 C2", "C1 XOR C2", "NOT", "()", "C1 AND ()", "X1"]:
+            with self.subTest(booleanTerm=booleanTerm):
+                with self.assertRaises(ValueError):
+                    parseBooleanTerm(booleanTerm)
+
+    def test_unknown_description(self):
+        with self.assertRaises(ValueError):
+            parseBooleanTerm("C1 AND C3", [{"a": 1}, {"b": 2}])
+        with self.assertRaises(ValueError):
+            parseBooleanTerm("C0", [{"a": 1}])
+
+    def test_empty_term(self):
+        self.assertIsNone(parseBooleanTerm(""))
+        self.assertIsNone(parseBooleanTerm("   "))
+
+    def test_equal_descriptions_are_merged(self):
+        self.assertEqual(parseBooleanTerm("C1 AND C2", [{"a": 1}, {"a": 1}]), Leaf(1, False))
+        self.assertEqual(parseBooleanTerm("C2 OR NOT C3", [{"a": 1}, {"b": 2}, {"a": 1}]), Node("OR", (Leaf(1, True), Leaf(2, False))))
+
+    def test_normalization_keeps_the_truth_table(self):
+        terms = [
+            "C1",
+            "NOT C1",
+            "C2 OR C1 OR C2",
+            "C1 AND (C1 OR C2)",
+            "C1 OR (C1 AND C2)",
+            "(C1 AND C2) OR (C1 AND C3)",
+            "(C1 OR C2) AND (C1 OR C3)",
+            "(C1 AND C2) OR (C1 AND C2 AND C3)",
+            "(C1 AND NOT C2) OR (C1 AND C3) OR (C1 AND C4)",
+            "(C1 OR C2) AND (C1 OR C3) AND NOT C4",
+            "NOT (C1 AND NOT (C2 OR C3))",
+            "NOT ((C1 OR C2) AND (C3 OR NOT C4))",
+            "(C1 AND C2) OR (C3 AND C4) OR (C1 AND C4)",
+            "((C1 OR C2) AND C3) OR ((C1 OR C2) AND C4)",
+            "NOT NOT C1 AND (NOT C2 OR C3)",
+        ]
+        for booleanTerm in terms:
+            term = parseBooleanTerm(booleanTerm)
+            formatted = parseBooleanTerm(formatBooleanTerm(term))
+            for assignment in itertools.product([False, True], repeat=4):
+                values = dict(enumerate(assignment, 1))
+                with self.subTest(booleanTerm=booleanTerm, values=values):
+                    expected = evaluateText(booleanTerm, values)
+                    self.assertEqual(evaluateTerm(term, values), expected)
+                    self.assertEqual(evaluateTerm(formatted, values), expected)
+
+    def test_normalized_terms_are_equal(self):
+        self.assertEqual(parseBooleanTerm("C2 AND C1"), parseBooleanTerm("C1 AND C2 AND C1"))
+        self.assertEqual(parseBooleanTerm("(C1 AND C2) OR (C1 AND C3)"), parseBooleanTerm("C1 AND (C3 OR C2)"))
+        self.assertEqual(parseBooleanTerm("C1 AND (C1 OR C2)"), Leaf(1, False))
+
+
+def item(kind, name, category=None):
+    """
+    Returns a subject, predicate or object of a coin description, as sent by the frontend.
+    """
+    return {"type": kind, "item": {"link": str(CNT[name]), "name_en": name}, "category": category}
+
+
+def description(obverse=(), reverse=(), obverse_keywords=(), reverse_keywords=()):
+    """
+    Returns a coin description, the keywords are (text, negated) pairs.
+    """
+    return {
+        "obverse": {"coin": list(obverse), "keywords": [{"text": text, "negated": negated} for text, negated in obverse_keywords]},
+        "reverse": {"coin": list(reverse), "keywords": [{"text": text, "negated": negated} for text, negated in reverse_keywords]},
+    }
+
+
+# (coin descriptions, boolean term) of the searches compared with the query of the endpoint. The keywords are written like in
+# the descriptions, as the keyword index matches case insensitive at the beginning of a word and the query case sensitive
+# anywhere in a description (negated keywords case insensitive)
+SEARCHES = [
+    ([description(obverse=[item("Subj", "artemis", "list_person")])], "C1"),
+    ([description(obverse=[item("Subj", "artemis", "list_person")])], "NOT C1"),
+    ([description(obverse=[item("Subj", "greek_deities", "list_class")])], "C1"),
+    ([description(reverse=[item("Subj", "deities", "list_class"), item("Predicate", "holding"), item("Obj", "weapons", "list_class")])], "C1"),
+    ([description(obverse=[item("Obj", "bow", "list_object")]), description(obverse=[item("Predicate", "standing")])], "C1 AND NOT C2"),
+    ([description(obverse=[item("Obj", "bow", "list_object")]), description(reverse=[item("Subj", "zeus", "list_person")])], "C1 OR C2"),
+    ([description(reverse=[item("Subj", "heroes", "list_class")]), description(reverse=[item("Subj", "deities", "list_class")])], "NOT C1 AND C2"),
+    ([description(obverse_keywords=[("bow", False)])], "C1"),
+    ([description(obverse_keywords=[("Artemis", False), ("deer", True)])], "C1"),
+    ([description(obverse_keywords=[("hold", False)], reverse_keywords=[("spear", True)])], "C1"),
+    ([description(reverse_keywords=[("(seated", False)]), description(obverse_keywords=[("Apollo st", False)])], "C1 OR C2"),
+    ([description(obverse=[item("Subj", "artemis", "list_person")]), description(obverse_keywords=[("bow", False)]),
+      description(obverse=[item("Subj", "apollo", "list_person")])], "C1 OR C2 AND NOT C3"),
+]
+
+
+class LocalIndexesTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.graph = coinGraph()
+        cls.transport = GraphTransport(cls.graph)
+        cls.indexes = LocalIndexes.build(cls.transport)
+        # without loaded indexes the handler only generates the query of the endpoint
+        cls.handler = CoinSearchHandler(cls.transport)
+
+    def assertSameCoins(self, indexes, graph):
+        for coins, booleanTerm in SEARCHES:
+            for searchType in ("NumismaticObject", "TypeSeriesItem"):
+                with self.subTest(booleanTerm=booleanTerm, searchType=searchType, coins=coins):
+                    query = self.handler.generateQuery(coins, booleanTerm, searchType)
+                    expected = sorted({str(row.url) for row in graph.query(query)})
+                    self.assertEqual(indexes.coinIndex.evaluate(coins, booleanTerm, searchType), expected)
+
+    def test_evaluate_matches_the_query(self):
+        self.assertSameCoins(self.indexes, self.graph)
+        # the searches are not trivial
+        query = self.handler.generateQuery(*SEARCHES[0], "NumismaticObject")
+        self.assertEqual([str(row.url) for row in self.graph.query(query)], [str(CNT.coin_c1)])
+
+    def test_availability_matches_the_recommendations(self):
+        handler = CoinSearchHandler(self.transport)
+        handler.indexes = self.indexes
+        kinds = {
+            "generalise": [handler.getSimpleGeneraliseRecommendationsOfCurrentSubObj],
+            "specialise": [handler.getAbsoluteSpecializRecommendationsOfCurrentSubObj, handler.getSimpleSpecializRecommendationsOfCurrentSubObj],
+            "equivalent": [handler.getEquivalentRecommendationsToCurrentSubObj],
+        }
+        names = ["artemis", "zeus", "hercules", "bow", "spear", "greek_deities", "deities", "heroes", "weapons"]
+        # (is_subject, entered predicate, entered other element)
+        positions = [("true", "", ""), ("true", "holding", ""), ("false", "", ""), ("false", "holding", "zeus"), ("false", "", "hercules")]
+        available = set()
+        for kind, functions in kinds.items():
+            for name, (is_subject, predicate, other), side in itertools.product(names, positions, ("obverse", "reverse")):
+                uris = [str(CNT[name]), str(CNT[predicate]) if predicate else "", str(CNT[other]) if other else ""]
+                if is_subject == "false":
+                    uris = [uris[2], uris[1], uris[0]]
+                terms = [f"<{uri}>" if uri else variable for uri, variable in zip(uris, ("?s", "?p", "?o"))]
+                with self.subTest(kind=kind, name=name, is_subject=is_subject, predicate=predicate, other=other, side=side):
+                    expected = any(function(*uris, is_subject, side) for function in functions)
+                    self.assertEqual(handler._availableFromIndexes(kind, *terms, is_subject, side), "true" if expected else "false")
+                    if expected:
+                        available.add(kind)
+        # every kind is available for some of the inputs
+        self.assertEqual(available, set(kinds))
+        self.assertEqual(handler._availableFromIndexes("generalise", "<" + str(CNT.unknown) + ">", "?p", "?o", "true", "obverse"), "false")
+
+    def test_opened_snapshot_has_the_fingerprints_of_a_build(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "indexes.snapshot")
+            self.indexes.write(path)
+            opened = LocalIndexes.open(path)
+            self.assertEqual(opened.fingerprints(), LocalIndexes.build(self.transport).fingerprints())
+            self.assertSameCoins(opened, self.graph)
+
+    def test_refreshed_indexes_have_the_fingerprints_of_a_build(self):
+        graph = coinGraph(COINS + [("c5", "t3", "obverse", "zeus", "standing", "spear", "Zeus standing with spear")])
+        # a changed description and a removed appearance
+        graph.set((CNT.c2_iconography, DCTERMS.description, Literal("Zeus standing, holding spear", lang="en")))
+        graph.remove((CNT.c3_appearance, RDF.object, None))
+        transport = GraphTransport(graph)
+
+        self.assertEqual(self.indexes.refreshed(self.transport).fingerprints(), self.indexes.fingerprints())
+        self.assertTrue(self.indexes.changedIndexes(transport))
+        refreshed = self.indexes.refreshed(transport)
+        self.assertEqual(refreshed.generation, self.indexes.generation + 1)
+        self.assertEqual(refreshed.fingerprints(), LocalIndexes.build(transport).fingerprints())
+        self.assertSameCoins(refreshed, graph)
+
+
+class QueryTemplatesTests(SimpleTestCase):
+    def test_iri_is_percent_encoded(self):
+        self.assertEqual(sparqlIri("http://nomisma.org/ontology#hasObverse"), "<http://nomisma.org/ontology#hasObverse>")
+        self.assertEqual(sparqlIri("http://example.org/a>b"), "<http://example.org/a%3Eb>")
+        self.assertEqual(sparqlIri("http://example.org/a b"), "<http://example.org/a%20b>")
+        self.assertEqual(sparqlIri('http://example.org/a"b'), "<http://example.org/a%22b>")
+        # non-ASCII characters are allowed in an IRI and have to stay as they are to match the data
+        self.assertEqual(sparqlIri("http://nomisma.org/id/athēna"), "<http://nomisma.org/id/athēna>")
+        self.assertEqual(sparqlIri("http://example.org/Kröte €"), "<http://example.org/Kröte%20€>")
+        self.assertEqual(sparqlIri("http://example.org/{a}|\\^`<"), "<http://example.org/%7Ba%7D%7C%5C%5E%60%3C>")
+
+    def test_literal_is_escaped(self):
+        self.assertEqual(sparqlLiteral("Artemis"), '"Artemis"')
+        self.assertEqual(sparqlLiteral('say "hi"'), '"say \\"hi\\""')
+        self.assertEqual(sparqlLiteral("a\\b"), '"a\\\\b"')
+        self.assertEqual(sparqlLiteral("a\nb\rc"), '"a\\nb\\rc"')
+        self.assertEqual(sparqlLiteral('\\" } DROP ALL #'), '"\\\\\\" } DROP ALL #"')
+
+    def test_arguments_do_not_change_the_query(self):
+        template = QueryTemplate("test_arguments", "SELECT ?s WHERE { ?s ${iri:predicate} ${literal:text} . }")
+        query = template.render(predicate='http://example.org/p> } DROP ALL { <x', text='" } DROP ALL { "')
+        self.assertEqual(
+            query, 'SELECT ?s WHERE { ?s <http://example.org/p%3E%20%7D%20DROP%20ALL%20%7B%20%3Cx> "\\" } DROP ALL { \\"" . }'
+        )
+
+    def test_malformed_sections(self):
+        texts = [
+            "SELECT ?s WHERE { ${#filter} ?s ?p ?o . }",
+            "SELECT ?s WHERE { ?s ?p ?o . ${/filter} }",
+            "SELECT ?s WHERE { ${#filter} ?s ?p ?o . ${/other} }",
+            "SELECT ?s WHERE { ${#outer} ${^inner} ?s ?p ?o . ${/outer} ${/inner} }",
+            "SELECT ?s WHERE { ${#outer} ${#inner} ?s ?p ?o . ${/inner} }",
+            "SELECT ?s WHERE { ?s ${unknown:predicate} ?o . }",
+            "SELECT ?s WHERE { ?s ${iri:} ?o . }",
+            "SELECT ?s WHERE { ?s ${term:predicate} ?o . }",
+            "SELECT ?s WHERE { ${>undefined_template} }",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    QueryTemplate("test_malformed", text)
+
+    def test_sections(self):
+        template = QueryTemplate("test_sections", "SELECT ?s WHERE { ${#predicate} ?s ${iri:predicate} ?o . ${/predicate} ${^predicate} ?s ?p ?o . ${/predicate} }")
+        self.assertEqual(template.render(predicate="http://example.org/p"), "SELECT ?s WHERE { ?s <http://example.org/p> ?o . }")
+        self.assertEqual(template.render(predicate=None), "SELECT ?s WHERE { ?s ?p ?o . }")
+        with self.assertRaises(ValueError):
+            template.render()
+
+    def test_rendering_is_byte_stable(self):
+        template = QueryTemplate("test_stable", """
+            # the coins of some entities
+            SELECT ?coin WHERE {
+                VALUES ?entity { ${iris:entities} }
+                ?coin   ${term:predicate:?predicate}   ?entity .
+                ${#text} FILTER (str(?label) = ${literal:text}) ${/text}
+            }
+            """)
+        arguments = {"entities": ["http://example.org/b", "http://example.org/a", "http://example.org/b"], "predicate": None, "text": "Zeus  (seated)"}
+        query = template.render(**arguments)
+        self.assertEqual(query.encode("utf-8"), template.render(**arguments).encode("utf-8"))
+        self.assertEqual(query.encode("utf-8"), template.render(**dict(reversed(list(arguments.items())))).encode("utf-8"))
+        self.assertEqual(
+            query.encode("utf-8"),
+            template.render(entities=["http://example.org/a", "http://example.org/b"], predicate=None, text="Zeus  (seated)").encode("utf-8")
+        )
+        self.assertEqual(
+            query,
+            'SELECT ?coin WHERE { VALUES ?entity { <http://example.org/a> <http://example.org/b> } ?coin ?predicate ?entity . '
+            'FILTER (str(?label) = "Zeus  (seated)" ) }'
+        )
+
+
+class KeywordRegexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.graph = coinGraph()
+        # without loaded indexes the keywords are searched with regex filters
+        cls.handler = CoinSearchHandler(GraphTransport(cls.graph))
+
+    def search(self, side, keyword, negated=False):
+        coins = [description(**{side + "_keywords": [(keyword, negated)]})]
+        query = self.handler.generateQuery(coins, "C1", "NumismaticObject")
+        return sorted(str(row.url).rsplit("_", 1)[-1] for row in self.graph.query(query))
+
+    def test_pattern_is_escaped(self):
+        self.assertEqual(keywordRegex("Zeus (seated)"), '"Zeus \\\\(seated\\\\)"')
+        self.assertEqual(keywordRegex('say "hi" [.*]'), '"say \\"hi\\" \\\\[\\\\.\\\\*\\\\]"')
+        self.assertEqual(keywordRegex("deer", True), '"deer", "i"')
+
+    def test_keywords_match_substrings_case_sensitive(self):
+        self.assertEqual(self.search("obverse", "bow"), ["c1", "c3"])
+        self.assertEqual(self.search("obverse", "old"), ["c1"])
+        self.assertEqual(self.search("obverse", "ing bow"), ["c1"])
+        self.assertEqual(self.search("obverse", "artemis"), [])
+        self.assertEqual(self.search("reverse", "Zeus (seated)"), ["c4"])
+        self.assertEqual(self.search("reverse", ".*"), [])
+
+    def test_negated_keywords_match_case_insensitive(self):
+        self.assertEqual(self.search("obverse", "ARTEMIS", negated=True), ["c2", "c3", "c4"])
+        self.assertEqual(self.search("reverse", "eus", negated=True), ["c1", "c3"])
+
+
+class TripleContextBundleTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.transport = GraphTransport(coinGraph())
+
+    def test_failed_part_keeps_the_other_parts(self):
+        handler = CoinSearchHandler(self.transport)
+
+        def broken(*args):
+            raise ValueError("broken check")
+        handler.areEquivalentRecommendationsOfCurrentTagAvailable = broken
+
+        bundle = handler.getTripleContextBundle(str(CNT.artemis), "", "", "obverse")
+        self.assertIsNone(bundle["subject"]["equivalent"])
+        self.assertEqual(bundle["errors"], {"subject.equivalent": "broken check"})
+        self.assertEqual(bundle["subject"]["generalise"], "true")
+        self.assertIn(bundle["subject"]["specialise"], ("true", "false"))
+        self.assertNotIn("timedOut", bundle)
+
+    def test_parts_match_the_single_actions(self):
+        handler = CoinSearchHandler(self.transport)
+        subject, obj = f"<{CNT.artemis}>", f"<{CNT.bow}>"
+        bundle = handler.getTripleContextBundle(str(CNT.artemis), "", str(CNT.bow), "obverse", "predicate")
+        for key, uri, is_subject in (("subject", str(CNT.artemis), "true"), ("object", str(CNT.bow), "false")):
+            with self.subTest(key=key):
+                self.assertEqual(bundle[key], {
+                    "generalise": handler.areGeneraliseRecommendationsOfCurrentTagAvailable(subject, "?p", obj, is_subject, uri, "obverse"),
+                    "specialise": handler.areSpecialiseRecommendationsOfCurrentTagAvailable(subject, "?p", obj, is_subject, uri, "obverse"),
+                    "equivalent": handler.areEquivalentRecommendationsOfCurrentTagAvailable(subject, "?p", obj, is_subject, uri, "obverse"),
+                })
+        self.assertEqual(bundle["recommendations"], handler.getRecommendationsPredicate(str(CNT.artemis), str(CNT.bow), "", "obverse"))
+        self.assertEqual(bundle["recommendations"], {"list_verb": [{"link": str(CNT.holding), "name_en": "holding"}]})
+        self.assertNotIn("errors", bundle)
+
+    def test_parts_not_answered_in_time(self):
+        handler = CoinSearchHandler(SlowTransport(coinGraph(), 0.3))
+        with queryBudget(0.1):
+            bundle = handler.getTripleContextBundle(str(CNT.artemis), "", "", "obverse")
+        self.assertTrue(bundle["timedOut"])
+        self.assertEqual(bundle["subject"], dict.fromkeys(["generalise", "specialise", "equivalent", "recommendationsAvailable"]))
+
+    def test_unknown_search_type(self):
+        handler = CoinSearchHandler(self.transport)
+        bundle = handler.getTripleContextBundle(str(CNT.artemis), "", "", "obverse", "subject", "hierarchy-unknown")
+        self.assertIsNone(bundle["recommendations"])
+        self.assertIn("recommendations", bundle["errors"])
+        self.assertEqual(bundle["subject"]["generalise"], "true")
+
+
+class FailingTransport():
+    """
+    Transport whose queries raise an error, after a delay.
+    """
+
+    endpoint = "memory:"
+
+    def __init__(self, error=None, delay=0):
+        self.error = error
+        self.delay = delay
+
+    def query(self, query, timeout=None, server_timeout=None):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return []
+
+    def stream(self, query, timeout=None, server_timeout=None, deadline=None):
+        yield from self.query(query)
+
+
+def httpError(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def call(self, breaker, failed, latency=0):
+        self.assertTrue(breaker.allow())
+        if failed:
+            breaker.recordFailure()
+        else:
+            breaker.recordSuccess(latency)
+
+    def test_opens_at_the_failure_rate(self):
+        breaker = CircuitBreaker(min_calls=4, failure_rate=0.5, open_seconds=60)
+        for failed in (False, True, False):
+            self.call(breaker, failed)
+        self.assertEqual(breaker.state, "closed")
+        self.call(breaker, True)
+        self.assertEqual(breaker.state, "open")
+        self.assertTrue(breaker.isOpen())
+        self.assertFalse(breaker.allow())
+
+    def test_opens_at_the_slow_call_rate(self):
+        breaker = CircuitBreaker(min_calls=2, slow_call=1, slow_rate=1, open_seconds=60)
+        self.call(breaker, False, latency=2)
+        self.assertEqual(breaker.state, "closed")
+        self.call(breaker, False, latency=3)
+        self.assertEqual(breaker.state, "open")
+
+    def test_half_open_trial_calls(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=0, half_open_calls=1)
+        self.call(breaker, True)
+        self.assertEqual(breaker.state, "open")
+        # the open period has passed, one trial call passes
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, "half-open")
+        self.assertFalse(breaker.allow())
+        breaker.recordFailure()
+        self.assertEqual(breaker.state, "open")
+
+        self.assertTrue(breaker.allow())
+        breaker.recordSuccess(0)
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats()["calls"], 0)
+
+    def test_release_frees_the_trial_slot(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=0, half_open_calls=1)
+        self.call(breaker, True)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release()
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+
+    def outcome(self, transport, budget=None):
+        """
+        Runs a query through the breaker of a handler and returns the calls and failures the breaker recorded.
+        """
+        handler = CoinSearchHandler(transport, breaker=CircuitBreaker(min_calls=100))
+        try:
+            with queryBudget(budget):
+                handler._fetchQuery("ASK {}", remaining=budget)
+        except Exception:
+            pass
+        stats = handler.breaker.stats()
+        return stats["calls"], stats["failures"]
+
+    def test_recorded_outcomes(self):
+        self.assertEqual(self.outcome(FailingTransport()), (1, 0))
+        self.assertEqual(self.outcome(FailingTransport(httpError(400))), (1, 0))
+        self.assertEqual(self.outcome(FailingTransport(httpError(500))), (1, 1))
+        self.assertEqual(self.outcome(FailingTransport(requests.exceptions.ConnectionError())), (1, 1))
+        # the transport timed out at its own timeout
+        self.assertEqual(self.outcome(FailingTransport(QueryTimeout("read timeout"))), (1, 1))
+
+    def test_budget_abort_is_not_a_failure(self):
+        self.assertEqual(self.outcome(FailingTransport(QueryTimeout("read timeout"), delay=0.1), budget=0.05), (0, 0))
+        # a timeout long before the deadline is a failure of the endpoint
+        self.assertEqual(self.outcome(FailingTransport(QueryTimeout("read timeout")), budget=30), (1, 1))
+
+    def test_budget_abort_releases_the_trial_slot(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=0, half_open_calls=1)
+        self.call(breaker, True)
+        handler = CoinSearchHandler(FailingTransport(QueryTimeout("read timeout"), delay=0.1), breaker=breaker)
+        with self.assertRaises(QueryTimeout):
+            with queryBudget(0.05):
+                handler._fetchQuery("ASK {}", remaining=0.05)
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+
+    def test_open_breaker_refuses_the_query(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        self.call(breaker, True)
+        handler = CoinSearchHandler(FailingTransport(), breaker=breaker)
+        with self.assertRaises(CircuitOpen):
+            handler._fetchQuery("ASK {}")
+        with self.assertRaises(CircuitOpen):
+            handler.executeQueryStreaming("SELECT * {}")
+
+    def test_stale_answers_are_degraded_while_the_breaker_is_open(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        transport = GraphTransport(coinGraph())
+        handler = CoinSearchHandler(transport, cache=QueryResultCache(ttl=0.1, stale_ttl=60), breaker=breaker)
+        query = "SELECT ?coin WHERE { ?coin a <http://nomisma.org/ontology#NumismaticObject> }"
+        with degradedScope() as flags:
+            coins = len(handler.executeQuery(query))
+        self.assertFalse(flags["degraded"])
+
+        self.call(breaker, True)
+        time.sleep(0.2)
+        with degradedScope() as flags:
+            self.assertEqual(len(handler.executeQuery(query)), coins)
+        self.assertTrue(flags["degraded"])
+        # the stale result is not refreshed while the endpoint is unavailable
+        handler.queryExecutor.shutdown(wait=True)
+        self.assertEqual(len(transport.queries), 1)
+
+        with degradedScope() as flags:
+            with self.assertRaises(CircuitOpen):
+                handler.executeQuery("ASK { ?s ?p ?o }")
+        self.assertTrue(flags["degraded"])
+
+    def test_bundle_parts_are_left_out_while_the_breaker_is_open(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        self.call(breaker, True)
+        handler = CoinSearchHandler(GraphTransport(coinGraph()), breaker=breaker)
+        with degradedScope() as flags:
+            bundle = handler.getTripleContextBundle(str(CNT.artemis), "", "", "obverse")
+        # marked on the worker threads of the bundle
+        self.assertTrue(flags["degraded"])
+        self.assertEqual(bundle["subject"], dict.fromkeys(["generalise", "specialise", "equivalent", "recommendationsAvailable"]))
+        self.assertNotIn("errors", bundle)
+        self.assertNotIn("timedOut", bundle)
+
+
+class SlowTransport(GraphTransport):
+    """
+    GraphTransport whose queries take at least a delay. The highest number of queries running at the same time is recorded.
+    """
+
+    def __init__(self, graph, delay):
+        super().__init__(graph)
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.counter_lock = threading.Lock()
+
+    def query(self, query, timeout=None, server_timeout=None):
+        with self.counter_lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            return super().query(query, timeout, server_timeout)
+        finally:
+            with self.counter_lock:
+                self.running -= 1
+
+
+class DatasetVersionProbeTests(SimpleTestCase):
+    COUNT = "SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"
+
+    def test_listeners_are_called_when_the_version_changes(self):
+        graph = coinGraph()
+        probe = DatasetVersionProbe(GraphTransport(graph), probe_query=self.COUNT)
+        changes = []
+        probe.addListener(lambda old, new: changes.append((old, new)))
+        self.assertTrue(probe.check())
+        first = probe.version
+        self.assertFalse(probe.check())
+        graph.add((CNT.coin_c9, RDF.type, NMO.NumismaticObject))
+        self.assertTrue(probe.check())
+        self.assertEqual(changes, [(None, first), (first, probe.version)])
+        self.assertNotEqual(probe.version, first)
+
+    def test_current_does_not_wait_for_the_endpoint(self):
+        probe = DatasetVersionProbe(SlowTransport(coinGraph(), 0.5), probe_query=self.COUNT)
+        started = time.monotonic()
+        self.assertIsNone(probe.current())
+        self.assertLess(time.monotonic() - started, 0.25)
+        probe.stop()
+        # the probe ran in the background meanwhile
+        self.assertIsNotNone(probe.version)
+
+    def test_cached_results_are_dropped_when_the_version_changes(self):
+        graph = coinGraph()
+        transport = GraphTransport(graph)
+        probe = DatasetVersionProbe(GraphTransport(graph), probe_query=self.COUNT, interval=3600)
+        handler = CoinSearchHandler(transport, cache=QueryResultCache(), version_probe=probe)
+        query = "SELECT ?coin WHERE { ?coin a <http://nomisma.org/ontology#NumismaticObject> }"
+
+        # a single probe
+        probe.start()
+        probe.stop()
+        coins = len(handler.executeQuery(query))
+        handler.executeQuery(query)
+        self.assertEqual(len(transport.queries), 1)
+
+        graph.add((CNT.coin_c9, RDF.type, NMO.NumismaticObject))
+        self.assertTrue(probe.check())
+        self.assertEqual(handler.cache.stats()["size"], 0)
+        self.assertEqual(len(handler.executeQuery(query)), coins + 1)
+        self.assertEqual(len(transport.queries), 2)
+
+    def test_probe_pauses_while_the_breaker_is_open(self):
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        probe = DatasetVersionProbe(GraphTransport(coinGraph()), probe_query=self.COUNT, breaker=breaker)
+        self.assertTrue(breaker.allow())
+        breaker.recordFailure()
+        probe.start()
+        probe.stop()
+        self.assertIsNone(probe.version)
+        breaker.state = "closed"
+        probe.start()
+        probe.stop()
+        self.assertIsNotNone(probe.version)
+
+
+# answer of the EndpointServer: status, content type, body chunks, seconds before the headers and before each chunk
+Answer = namedtuple("Answer", ["status", "content_type", "chunks", "delay", "chunk_delay"], defaults=[0, 0])
+
+
+class EndpointServer():
+    """
+    Local HTTP server standing in for the SPARQL endpoint. Every POST is answered with the next of the queued answers,
+    the body is sent chunked. The client address and the form of every request are recorded.
+    """
+
+    def __init__(self):
+        self.answers = []
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+                server.requests.append((self.client_address, form))
+                answer = server.answers.pop(0)
+                time.sleep(answer.delay)
+                self.send_response(answer.status)
+                self.send_header("Content-Type", answer.content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in answer.chunks:
+                        time.sleep(answer.chunk_delay)
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except ConnectionError:
+                    # the client gave up, e.g. after its timeout
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.httpd.server_port}/sparql"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class SparqlTransportTests(SimpleTestCase):
+    def setUp(self):
+        self.server = EndpointServer()
+        self.addCleanup(self.server.close)
+        self.transport = SparqlTransport(self.server.endpoint, pool_size=2, read_timeout=5)
+
+    def test_terms_are_parsed(self):
+        self.assertEqual(parseTerm("<http://nomisma.org/id/zeus>"), "http://nomisma.org/id/zeus")
+        self.assertEqual(parseTerm('"Zeus"@en'), "Zeus")
+        self.assertEqual(parseTerm('"12.5"^^<http://www.w3.org/2001/XMLSchema#decimal>'), "12.5")
+        self.assertEqual(parseTerm('"say \\"hi\\"\\tnow"@en'), 'say "hi"\tnow')
+        self.assertEqual(parseTerm('"a\\\\nb \\u00e9 \\U0001F600 \\n"'), "a\\nb \u00e9 \U0001F600 \n")
+        self.assertEqual(parseTerm('"ends with a quote \\""'), 'ends with a quote "')
+        self.assertEqual(parseTerm("12.5"), "12.5")
+        self.assertEqual(parseTerm("_:b0"), "_:b0")
+        # an unbound variable is an empty column
+        self.assertIsNone(parseTerm(""))
+
+    def test_queries_reuse_the_connection(self):
+        body = b'{"head": {"vars": ["count"]}, "results": {"bindings": [{"count": {"type": "literal", "value": "3"}}]}}'
+        for _ in range(3):
+            self.server.answers.append(Answer(200, "application/sparql-results+json", [body]))
+            result = self.transport.query("SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }", server_timeout=2.5)
+            self.assertEqual([str(row[0]) for row in result], ["3"])
+        addresses = {address for address, _ in self.server.requests}
+        self.assertEqual(len(addresses), 1)
+        form = self.server.requests[0][1]
+        self.assertTrue(form["query"][0].endswith("SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"))
+        self.assertIn("PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>", form["query"][0])
+        self.assertEqual(form["timeout"], ["2500"])
+
+    def test_timeouts_raise_query_timeout(self):
+        self.server.answers.append(Answer(200, "application/sparql-results+json", [b"{}"], delay=0.5))
+        with self.assertRaises(QueryTimeout):
+            self.transport.query("ASK {}", timeout=0.1)
+        # fuseki cancelled the query after the server timeout
+        self.server.answers.append(Answer(503, "text/plain", [b"Query cancelled"]))
+        with self.assertRaises(QueryTimeout):
+            self.transport.query("ASK {}", server_timeout=1)
+        self.server.answers.append(Answer(503, "text/plain", [b"Service unavailable"]))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.transport.query("ASK {}")
+
+
+class StreamingTests(SimpleTestCase):
+    def setUp(self):
+        self.server = EndpointServer()
+        self.addCleanup(self.server.close)
+        self.transport = SparqlTransport(self.server.endpoint, read_timeout=5)
+
+    def test_rows_are_parsed_across_chunks(self):
+        body = '?url\t?label\t?weight\r\n<http://example.org/c1>\t"Zeus, \\"Olympios\\""@en\t12.5\r\n<http://example.org/c2>\t\t\n<http://example.org/c3>\t"Athēna"\t"3"^^<http://www.w3.org/2001/XMLSchema#integer>'
+        data = body.encode("utf-8")
+        # the chunks end within lines and within a multibyte character
+        split = data.index("ē".encode("utf-8")) + 1
+        self.server.answers.append(Answer(200, "text/tab-separated-values", [data[:7], data[7:split], data[split:]]))
+        rows = list(self.transport.stream("SELECT ?url ?label ?weight WHERE { }"))
+        self.assertEqual([row._fields for row in rows], [("url", "label", "weight")] * 3)
+        self.assertEqual([tuple(row) for row in rows], [
+            ("http://example.org/c1", 'Zeus, "Olympios"', "12.5"),
+            ("http://example.org/c2", None, None),
+            ("http://example.org/c3", "Athēna", "3"),
+        ])
+        self.assertEqual(self.server.requests[0][1]["query"][0].rsplit("\n", 1)[-1], "SELECT ?url ?label ?weight WHERE { }")
+
+    def test_rows_before_the_deadline_are_kept(self):
+        chunks = [b"?url\n", b"<http://example.org/c1>\n", b"<http://example.org/c2>\n", b"<http://example.org/c3>\n"]
+        self.server.answers.append(Answer(200, "text/tab-separated-values", chunks, chunk_delay=0.2))
+        handler = CoinSearchHandler(self.transport)
+        rows = []
+        with self.assertRaises(QueryTimeout):
+            with queryBudget(0.5):
+                generator = handler.executeQueryStreaming("SELECT ?url WHERE { }")
+            # the rows are read after the request returned, the deadline is taken along
+            for row in generator:
+                rows.append(row.url)
+        self.assertTrue(rows)
+        self.assertLess(len(rows), 3)
+        self.assertEqual(rows, ["http://example.org/c1", "http://example.org/c2"][:len(rows)])
+
+
+class AvailabilityQueryTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # without loaded indexes the checks are answered by ASK queries
+        cls.handler = CoinSearchHandler(GraphTransport(coinGraph()))
+
+    def test_ask_queries_match_the_recommendations(self):
+        handler = self.handler
+        kinds = {
+            "generalise": (handler.areGeneraliseRecommendationsOfCurrentTagAvailable, [handler.getSimpleGeneraliseRecommendationsOfCurrentSubObj]),
+            "specialise": (
+                handler.areSpecialiseRecommendationsOfCurrentTagAvailable,
+                [handler.getAbsoluteSpecializRecommendationsOfCurrentSubObj, handler.getSimpleSpecializRecommendationsOfCurrentSubObj]
+            ),
+            "equivalent": (handler.areEquivalentRecommendationsOfCurrentTagAvailable, [handler.getEquivalentRecommendationsToCurrentSubObj]),
+        }
+        names = ["artemis", "hercules", "bow", "greek_deities", "weapons"]
+        for (kind, (check, functions)), name, is_subject, side in itertools.product(kinds.items(), names, ("true", "false"), ("obverse", "reverse")):
+            uri = str(CNT[name])
+            uris = [uri, "", ""] if is_subject == "true" else ["", "", uri]
+            terms = [f"<{uri}>" if uri else variable for uri, variable in zip(uris, ("?s", "?p", "?o"))]
+            with self.subTest(kind=kind, name=name, is_subject=is_subject, side=side):
+                expected = any(function(*uris, is_subject, side) for function in functions)
+                self.assertEqual(check(*terms, is_subject, uri, side), "true" if expected else "false")
+
+    def test_checks_are_ask_queries(self):
+        handler = self.handler
+        queries = [
+            handler.sparqlQueryAreGeneraliseRecommendationsOfCurrentTagAvailable(f"<{CNT.zeus}>", "?p", "?o", "true", str(CNT.zeus), "obverse"),
+            handler.sparqlQueryAreSpecialiseRecommendationsOfCurrentTagAvailable("?s", "?p", f"<{CNT.bow}>", "false", str(CNT.bow), "obverse"),
+            handler.sparqlQueryAreEquivalentRecommendationsOfCurrentTagAvailable(f"<{CNT.zeus}>", "?p", "?o", "true", str(CNT.zeus), "reverse"),
+            handler.sparqlQueryAreRecommendationsAvailable(f"<{CNT.zeus}>", "reverse"),
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertRegex(query, r"^(PREFIX \w*: <[^>]*> )*ASK\b")
+        self.assertEqual(handler.areRecommendationsAvailable(f"<{CNT.zeus}>", "reverse"), "true")
+        self.assertEqual(handler.areRecommendationsAvailable(f"<{CNT.bow}>", "reverse"), "false")
+
+
+class FanOutTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.graph = coinGraph()
+        cls.reference = CoinSearchHandler(GraphTransport(cls.graph), query_workers=1)
+
+    def test_entity_and_class_queries_run_at_once(self):
+        transport = SlowTransport(self.graph, 0.2)
+        handler = CoinSearchHandler(transport)
+        for side, q in (("obverse", ""), ("reverse", "d")):
+            with self.subTest(side=side, q=q):
+                result = handler.getRecommendationsSubObj("", "", "", "true", q, side)
+                # also the order of the categories stays the same, entities before classes
+                self.assertEqual(list(result.items()), list(self.reference.getRecommendationsSubObj("", "", "", "true", q, side).items()))
+        self.assertEqual(transport.peak, 2)
+
+    def test_specialise_fallback_is_sent_with_the_first_query(self):
+        transport = SlowTransport(self.graph, 0.2)
+        handler = CoinSearchHandler(transport)
+        # weapons has no subclasses, so its entities are recommended
+        result = handler.getSimpleSpecializRecommendationsOfCurrentSubObj(str(CNT.weapons), "", "", "true", "obverse")
+        self.assertEqual(result, {"list_obj": [{"link": str(CNT.bow), "name_en": "Bow"}]})
+        self.assertEqual(transport.peak, 2)
+        result = handler.getSimpleSpecializRecommendationsOfCurrentSubObj(str(CNT.deities), "", "", "true", "obverse")
+        self.assertEqual(result, self.reference.getSimpleSpecializRecommendationsOfCurrentSubObj(str(CNT.deities), "", "", "true", "obverse"))
+        self.assertEqual(list(result), ["list_class"])
+
+
+class QueryResultCacheTests(SimpleTestCase):
+    def test_fingerprint_ignores_whitespace_outside_of_literals(self):
+        query = 'SELECT ?s WHERE { ?s <http://example.org/p> "a  b" . }'
+        self.assertEqual(queryFingerprint(query), queryFingerprint('  SELECT ?s\n  WHERE {\n\t?s <http://example.org/p>   "a  b" .\n}\n'))
+        self.assertNotEqual(queryFingerprint(query), queryFingerprint('SELECT ?s WHERE { ?s <http://example.org/p> "a b" . }'))
+        self.assertNotEqual(queryFingerprint("SELECT ?s WHERE { ?s ?p 'x  y' }"), queryFingerprint("SELECT ?s WHERE { ?s ?p 'x y' }"))
+
+    def test_entries_are_fresh_then_stale_then_missing(self):
+        cache = QueryResultCache(ttl=10, stale_ttl=20)
+        cache.set("fresh", 1)
+        cache.set("stale", 2, age=15)
+        cache.set("expired", 3, age=31)
+        self.assertEqual(cache.get("fresh"), (1, True))
+        self.assertEqual(cache.get("stale"), (2, False))
+        self.assertIsNone(cache.get("expired"))
+        self.assertIsNone(cache.get("unknown"))
+        self.assertEqual(cache.stats(), {"size": 2, "max_size": 2048, "hits": 1, "stale_hits": 1, "misses": 2, "evictions": 0})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = QueryResultCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), (1, True))
+        self.assertEqual(cache.get("c"), (3, True))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        # setting an existing entry uses it as well
+        cache.set("a", 4)
+        cache.set("d", 5)
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.get("a"), (4, True))
+
+    def test_only_one_refresh_per_entry(self):
+        cache = QueryResultCache()
+        self.assertTrue(cache.startRefresh("a"))
+        self.assertFalse(cache.startRefresh("a"))
+        self.assertTrue(cache.startRefresh("b"))
+        cache.finishRefresh("a")
+        self.assertTrue(cache.startRefresh("a"))
+
+    def test_stale_result_is_served_while_it_is_refreshed(self):
+        graph = coinGraph()
+        transport = GraphTransport(graph)
+        handler = CoinSearchHandler(transport, cache=QueryResultCache(ttl=0.2, stale_ttl=60))
+        query = "SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"
+        count = str(handler.executeQuery(query).bindings[0]["count"])
+        self.assertEqual(str(handler.executeQuery("SELECT (COUNT(*) AS ?count)\n    WHERE { ?s ?p ?o }").bindings[0]["count"]), count)
+        self.assertEqual(len(transport.queries), 1)
+
+        graph.add((CNT.coin_c9, RDF.type, NMO.NumismaticObject))
+        time.sleep(0.3)
+        self.assertEqual(str(handler.executeQuery(query).bindings[0]["count"]), count)
+        # the refresh runs on the query workers
+        handler.queryExecutor.shutdown(wait=True)
+        self.assertEqual(len(transport.queries), 2)
+        self.assertEqual(int(handler.executeQuery(query).bindings[0]["count"]), int(count) + 1)
+        self.assertEqual(handler.cache.stats()["stale_hits"], 1)
+
+
+class DiskResultCacheTests(SimpleTestCase):
+    QUERY = "SELECT ?coin ?id WHERE { ?coin <http://purl.org/dc/terms/identifier> ?id } ORDER BY ?id"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "results.sqlite3")
+        self.graph = coinGraph()
+
+    def test_results_are_shared_between_caches_of_a_file(self):
+        result = self.graph.query(self.QUERY)
+        DiskResultCache(self.path).set("key", "v1", result)
+        # e.g. another worker process
+        other = DiskResultCache(self.path)
+        stored, age = other.get("key", "v1")
+        self.assertLess(age, 5)
+        self.assertEqual(stored.vars, result.vars)
+        self.assertEqual([tuple(row) for row in stored], [tuple(row) for row in result])
+        self.assertIsNone(other.get("key", "v2"))
+        self.assertIsNone(other.get("other key", "v1"))
+
+    def test_expired_entries_are_not_returned(self):
+        cache = DiskResultCache(self.path, ttl=10, stale_ttl=20)
+        cache.set("stale", "v1", self.graph.query(self.QUERY))
+        cache.set("expired", "v1", self.graph.query(self.QUERY))
+        with sqlite3.connect(self.path) as connection:
+            connection.execute("UPDATE results SET stored = stored - 15 WHERE key = 'stale'")
+            connection.execute("UPDATE results SET stored = stored - 31 WHERE key = 'expired'")
+        self.assertGreater(cache.get("stale", "v1")[1], 10)
+        self.assertIsNone(cache.get("expired", "v1"))
+
+    def test_prune_keeps_the_newest_entries_of_the_version(self):
+        cache = DiskResultCache(self.path, max_entries=2, prune_interval=1000)
+        result = self.graph.query(self.QUERY)
+        for key in ("a", "b", "c"):
+            cache.set(key, "v2", result)
+            time.sleep(0.01)
+        cache.set("old version", "v1", result)
+        cache.prune("v2")
+        self.assertEqual([key for key in ("a", "b", "c") if cache.get(key, "v2") is not None], ["b", "c"])
+        self.assertIsNone(cache.get("old version", "v1"))
+
+    def test_handler_takes_over_results_of_another_process(self):
+        transport = GraphTransport(self.graph)
+        first = CoinSearchHandler(transport, cache=QueryResultCache(), disk_cache=DiskResultCache(self.path))
+        second = CoinSearchHandler(transport, cache=QueryResultCache(), disk_cache=DiskResultCache(self.path))
+        expected = [tuple(row) for row in first.executeQuery(self.QUERY)]
+        self.assertEqual([tuple(row) for row in second.executeQuery(self.QUERY)], expected)
+        self.assertEqual(len(transport.queries), 1)
+        # the result is taken over into the in-process cache of the second handler
+        self.assertEqual(second.cache.stats()["size"], 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def concurrently(self, calls, function):
+        """
+        Runs function(index) for calls threads that start at the same time and returns their results or exceptions.
+        """
+        barrier = threading.Barrier(calls)
+        results = [None] * calls
+
+        def run(index):
+            barrier.wait()
+            try:
+                results[index] = function(index)
+            except Exception as e:
+                results[index] = e
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        executions = []
+
+        def slow(value):
+            executions.append(value)
+            time.sleep(0.2)
+            return value
+
+        self.assertEqual(self.concurrently(5, lambda index: flight.do("key", slow, "result")), ["result"] * 5)
+        self.assertEqual(executions, ["result"])
+        self.assertEqual(flight.inFlight(), 0)
+        # nothing is kept after the call
+        self.assertEqual(flight.do("key", slow, "next"), "next")
+        self.assertEqual(len(executions), 2)
+        # other keys are executed on their own
+        self.concurrently(3, lambda index: flight.do(index, slow, index))
+        self.assertEqual(len(executions), 5)
+
+    def test_waiting_callers_receive_the_exception(self):
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("failed")
+
+        results = self.concurrently(3, lambda index: flight.do("key", failing))
+        self.assertEqual([str(result) for result in results], ["failed"] * 3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    def test_waiting_caller_gives_up_after_its_timeout(self):
+        flight = SingleFlight()
+        leader = threading.Thread(target=flight.do, args=("key", time.sleep, 0.5))
+        leader.start()
+        time.sleep(0.05)
+        with self.assertRaises(FutureTimeoutError):
+            flight.do("key", time.sleep, 0.5, timeout=0.1)
+        leader.join()
+
+    def test_identical_queries_are_sent_once(self):
+        transport = SlowTransport(coinGraph(), 0.2)
+        handler = CoinSearchHandler(transport)
+        queries = ["SELECT ?s WHERE { ?s a <http://nomisma.org/ontology#NumismaticObject> }"] * 3
+        queries.append("SELECT ?s\n    WHERE { ?s a <http://nomisma.org/ontology#NumismaticObject> }")
+        results = self.concurrently(4, lambda index: handler.executeQuery(queries[index]))
+        self.assertEqual(len(transport.queries), 1)
+        self.assertEqual({len(result) for result in results}, {4})
+
+
+class QueryBudgetTests(SimpleTestCase):
+    def test_nested_budget_only_shortens_the_deadline(self):
+        self.assertIsNone(currentDeadline())
+        self.assertIsNone(remainingBudget())
+        with queryBudget(10):
+            outer = currentDeadline()
+            with queryBudget(20):
+                self.assertEqual(currentDeadline(), outer)
+            with queryBudget(1):
+                self.assertLess(currentDeadline(), outer)
+                self.assertLessEqual(remainingBudget(), 1)
+            with queryBudget(None):
+                self.assertEqual(currentDeadline(), outer)
+            self.assertEqual(currentDeadline(), outer)
+        self.assertIsNone(currentDeadline())
+
+    def test_used_up_budget_raises(self):
+        with queryBudget(0.05):
+            time.sleep(0.1)
+            with self.assertRaises(QueryTimeout):
+                remainingBudget()
+
+    def test_budget_is_taken_along_to_worker_threads(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with queryBudget(5):
+            deadline = currentDeadline()
+            self.assertEqual(waitForResult(submitWithBudget(executor, currentDeadline)), deadline)
+            # a plain submit does not know the budget
+            self.assertIsNone(executor.submit(currentDeadline).result())
+        with queryBudget(0.1):
+            with self.assertRaises(QueryTimeout):
+                waitForResult(executor.submit(time.sleep, 0.5))
+
+    def test_endpoint_is_asked_to_stop_at_the_deadline(self):
+        server = EndpointServer()
+        self.addCleanup(server.close)
+        handler = CoinSearchHandler(SparqlTransport(server.endpoint))
+        body = b'{"head": {}, "boolean": true}'
+        server.answers.append(Answer(200, "application/sparql-results+json", [body]))
+        with queryBudget(2):
+            self.assertTrue(handler.executeQuery("ASK { ?s ?p ?o }").askAnswer)
+        self.assertTrue(1000 < int(server.requests[0][1]["timeout"][0]) <= 2000)
+        # without a budget the default timeout of the endpoint applies
+        server.answers.append(Answer(200, "application/sparql-results+json", [body]))
+        handler.executeQuery("ASK { ?s ?p ?o . }")
+        self.assertNotIn("timeout", server.requests[1][1])
+        # the client gives up at the deadline as well
+        server.answers.append(Answer(200, "application/sparql-results+json", [body], delay=1))
+        started = time.monotonic()
+        with self.assertRaises(QueryTimeout):
+            with queryBudget(0.3):
+                handler.executeQuery("ASK { ?s ?p ?o . ?s ?p ?x }")
+        self.assertLess(time.monotonic() - started, 0.9)
+
+
+class TaxonomyIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        subclasses = [
+            ("greek_deities", "deities"), ("roman_deities", "deities"), ("heroes", "persons"), ("deities", "persons"),
+            # already transitively closed, like the reasoner delivers it
+            ("greek_deities", "persons"),
+        ]
+        types = [
+            ("artemis", "greek_deities"), ("zeus", "greek_deities"), ("zeus", "deities"), ("jupiter", "roman_deities"),
+            ("hercules", "heroes"), ("hercules", "greek_deities"), ("bow", "weapons_outside_the_hierarchy"),
+        ]
+        labels = [("artemis", "Artemis"), ("zeus", "ZEUS"), ("zeus", "zeus"), ("greek_deities", "Greek_Deities"), ("bow", "bow")]
+        cls.taxonomy = TaxonomyIndex(
+            [(str(CNT[sub]), str(CNT[sup])) for sub, sup in subclasses],
+            [(str(CNT[entity]), str(CNT[cls])) for entity, cls in types],
+            [(str(CNT[uri]), label) for uri, label in labels],
+        )
+
+    def node(self, name):
+        return self.taxonomy.nodeId(str(CNT[name]))
+
+    def names(self, nodes):
+        return sorted(self.taxonomy.uri(int(node))[len(CNT):] for node in nodes)
+
+    def test_classes_are_numbered_before_the_entities(self):
+        taxonomy = self.taxonomy
+        classes = ["greek_deities", "deities", "roman_deities", "heroes", "persons"]
+        self.assertEqual(sorted(self.node(name) for name in classes), list(range(len(classes))))
+        self.assertTrue(all(taxonomy.isClass[self.node(name)] for name in classes))
+        self.assertFalse(taxonomy.isClass[self.node("zeus")])
+        # the class of bow is in no subClassOf relation
+        self.assertNotIn(str(CNT.bow), taxonomy)
+        self.assertIsNone(self.node("weapons_outside_the_hierarchy"))
+        self.assertEqual(len(taxonomy), len(classes) + 4)
+
+    def test_relations(self):
+        taxonomy = self.taxonomy
+        self.assertEqual(self.names(taxonomy.ancestorsOf(self.node("greek_deities"))), ["deities", "persons"])
+        self.assertEqual(self.names(taxonomy.parentsOf(self.node("greek_deities"))), ["deities"])
+        self.assertEqual(self.names(taxonomy.childrenOf(self.node("deities"))), ["greek_deities", "roman_deities"])
+        self.assertEqual(self.names(taxonomy.topsOf(self.node("greek_deities"))), ["persons"])
+        self.assertEqual(self.names(taxonomy.topsOf(self.node("persons"))), [])
+        # deities is an ancestor of greek_deities, so it is no direct parent of zeus
+        self.assertEqual(self.names(taxonomy.parentsOf(self.node("zeus"))), ["greek_deities"])
+        self.assertEqual(self.names(taxonomy.parentsOf(self.node("hercules"))), ["greek_deities", "heroes"])
+        self.assertEqual(self.names(taxonomy.instancesOf(self.node("deities"))), ["artemis", "hercules", "jupiter", "zeus"])
+        self.assertEqual(self.names(taxonomy.instancesOf(self.node("heroes"))), ["hercules"])
+        self.assertEqual([int(taxonomy.depth[self.node(name)]) for name in ("persons", "deities", "greek_deities", "zeus")], [0, 1, 2, 3])
+
+    def test_siblings(self):
+        taxonomy = self.taxonomy
+        siblings = [(self.names([sibling])[0], self.names([parent])[0]) for sibling, parent in taxonomy.siblingsOf(self.node("artemis"))]
+        self.assertEqual(sorted(siblings), [("hercules", "greek_deities"), ("zeus", "greek_deities")])
+        siblings = [(self.names([sibling])[0], self.names([parent])[0]) for sibling, parent in taxonomy.siblingsOf(self.node("greek_deities"))]
+        self.assertEqual(siblings, [("roman_deities", "deities")])
+
+    def test_names(self):
+        self.assertEqual(displayName("http://example.org/a#Greek_deities"), "Deities")
+        self.assertEqual(displayName("bOW"), "Bow")
+        self.assertEqual(self.taxonomy.names[self.node("zeus")], ("Zeus",))
+        self.assertEqual(self.taxonomy.names[self.node("greek_deities")], ("Deities",))
+        self.assertEqual(self.taxonomy.names[self.node("jupiter")], ())
+
+    def test_fingerprint_only_covers_the_used_triples(self):
+        transport = GraphTransport(coinGraph())
+        taxonomy = TaxonomyIndex.fromEndpoint(transport)
+        self.assertEqual(TaxonomyIndex.sourceFingerprint(transport), taxonomy.fingerprint)
+        graph = coinGraph()
+        graph.add((CNT.unrelated, SKOS.prefLabel, Literal("unrelated")))
+        self.assertEqual(TaxonomyIndex.sourceFingerprint(GraphTransport(graph)), taxonomy.fingerprint)
+        graph.add((CNT.athena, RDF.type, CNT.greek_deities))
+        self.assertNotEqual(TaxonomyIndex.sourceFingerprint(GraphTransport(graph)), taxonomy.fingerprint)
+
+    def test_dictionary_has_to_be_empty(self):
+        dictionary = UriDictionary()
+        dictionary.encode(str(CNT.zeus))
+        with self.assertRaises(ValueError):
+            TaxonomyIndex([], [], [], dictionary)
+
+
+def assertedGraph():
+    """
+    Builds the triples of a dump: the class hierarchy and memberships of coinGraph without the inferred ones.
+    """
+    graph = Graph()
+    for sub, sup in [(CNT.greek_deities, CNT.deities), (CNT.deities, PERSON), (CNT.heroes, PERSON)]:
+        graph.add((sub, RDFS.subClassOf, sup))
+    for name, cls in [("artemis", CNT.greek_deities), ("hercules", CNT.heroes), ("hercules", CNT.greek_deities)]:
+        graph.add((CNT[name], RDF.type, cls))
+        graph.add((CNT[name], SKOS.prefLabel, Literal(name.capitalize(), lang="en")))
+    graph.add((CNT.greek_deities, SKOS.prefLabel, Literal("greek deities\nof \"Olympus\"")))
+    graph.add((CNT.coin_c1, DCTERMS.title, Literal("unrelated")))
+    return graph
+
+
+class RuleMaterializerTests(SimpleTestCase):
+    EXPECTED = {
+        (CNT.greek_deities, RDFS.subClassOf, PERSON),
+        (CNT.artemis, RDF.type, CNT.deities), (CNT.artemis, RDF.type, PERSON),
+        (CNT.hercules, RDF.type, CNT.deities), (CNT.hercules, RDF.type, PERSON),
+        (CNT.greek_deities, RDF.type, RDFS.Class), (CNT.deities, RDF.type, RDFS.Class),
+        (CNT.heroes, RDF.type, RDFS.Class), (PERSON, RDF.type, RDFS.Class),
+        (CNT.deities, SKOS.prefLabel, Literal(str(CNT.deities))), (CNT.heroes, SKOS.prefLabel, Literal(str(CNT.heroes))),
+        (PERSON, SKOS.prefLabel, Literal(str(PERSON))),
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def materialize(self, name, format):
+        path = os.path.join(self.directory, name)
+        data = assertedGraph().serialize(format=format, encoding="utf-8")
+        opener = gzip.open if name.endswith(".gz") else open
+        with opener(path, "wb") as f:
+            f.write(data)
+        materializer = RuleMaterializer()
+        self.assertEqual(materializer.read(path, batch_lines=2), len(assertedGraph()))
+        return materializer
+
+    def test_inferred_triples(self):
+        for name, format in (("dump.nt.gz", "nt"), ("dump.ttl", "turtle")):
+            with self.subTest(name=name):
+                inferred = list(self.materialize(name, format).inferredTriples())
+                self.assertEqual(len(inferred), len(set(inferred)))
+                self.assertEqual(set(inferred), self.EXPECTED)
+
+    def test_written_triples_can_be_loaded(self):
+        output = os.path.join(self.directory, "inferred.nt.gz")
+        self.assertEqual(self.materialize("dump.nt", "nt").write(output), len(self.EXPECTED))
+        graph = Graph()
+        with gzip.open(output, "rb") as f:
+            graph.parse(f, format="nt")
+        self.assertEqual(set(graph), self.EXPECTED)
+
+    def test_materialized_dataset_answers_like_the_reasoner(self):
+        materializer = RuleMaterializer()
+        graph = assertedGraph()
+        for triple in graph:
+            materializer.add(*triple)
+        for triple in materializer.inferredTriples():
+            graph.add(triple)
+        taxonomy = TaxonomyIndex.fromEndpoint(GraphTransport(graph))
+        expected = TaxonomyIndex.fromEndpoint(GraphTransport(coinGraph()))
+        for name in ("artemis", "hercules", "greek_deities"):
+            with self.subTest(name=name):
+                node, expected_node = taxonomy.nodeId(str(CNT[name])), expected.nodeId(str(CNT[name]))
+                self.assertEqual(
+                    sorted(taxonomy.uri(int(parent)) for parent in taxonomy.parentsOf(node)),
+                    sorted(expected.uri(int(parent)) for parent in expected.parentsOf(expected_node)),
+                )
+                self.assertEqual(
+                    sorted(taxonomy.uri(int(top)) for top in taxonomy.topsOf(node)),
+                    sorted(expected.uri(int(top)) for top in expected.topsOf(expected_node)),
+                )
+
+    def test_command_writes_the_inferred_triples(self):
+        dump = os.path.join(self.directory, "dump.ttl")
+        assertedGraph().serialize(dump, format="turtle")
+        output = os.path.join(self.directory, "inferred.nt")
+        stdout = io.StringIO()
+        command = MaterializeInferencesCommand(stdout=stdout)
+        command.handle(dumps=[dump], output=output, format=None, verify=False)
+        self.assertIn(f"{len(self.EXPECTED)} inferred triples written", stdout.getvalue())
+        self.assertEqual(set(Graph().parse(output, format="nt")), self.EXPECTED)
+
+        with self.assertRaises(CommandError):
+            command.handle(dumps=[], output=output, format=None, verify=False)
+        with self.assertRaises(CommandError):
+            command.handle(dumps=[], verify=True, endpoint=None)
+
+
+class LabelIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.transport = GraphTransport(coinGraph())
+        cls.indexes = LocalIndexes.build(cls.transport)
+
+    def test_prefix_table(self):
+        table = PrefixTable([("Zeus", 1), ("zebra", 2), ("Artemis", 3), ("ze", 4)])
+        self.assertEqual([table.names[i] for i in table.lookup("ZE")], ["ze", "zebra", "Zeus"])
+        self.assertEqual([int(table.ids[i]) for i in table.lookup("zeu")], [1])
+        self.assertEqual(len(table.lookup("")), len(table))
+        self.assertEqual(len(table.lookup("x")), 0)
+
+    def test_entity_names(self):
+        labels = self.indexes.labels
+        taxonomy = labels.taxonomy
+        self.assertEqual([(name, taxonomy.uri(node)) for name, node in labels.entityNames("AR")], [("Artemis", str(CNT.artemis))])
+        self.assertEqual(sorted(name for name, _ in labels.entityNames("he")), ["Hercules", "Heroes"])
+        # an entity is listed in the top level classes of its classes, classes in none
+        self.assertEqual(sorted(taxonomy.uri(top) for top in labels.categoriesOf(taxonomy.nodeId(str(CNT.hercules)))), [str(PERSON)])
+        self.assertEqual(len(labels.categoriesOf(taxonomy.nodeId(str(CNT.heroes)))), 0)
+
+    def test_predicate_names(self):
+        labels = self.indexes.labels
+        self.assertEqual(labels.predicateCount, 3)
+        self.assertEqual(labels.predicateNames("HOL"), [("holding", str(CNT.holding))])
+        # the predicate_id labels are only found when they are typed
+        self.assertEqual(sorted(name for name, _ in labels.predicateNames("")), ["fighting", "holding", "standing"])
+        self.assertEqual(labels.predicateNames("predicate_id_s"), [("predicate_id_standing", str(CNT.standing))])
+
+    def sameOrder(self, recommendations):
+        # the order of equal names is the order of the endpoint
+        return {category: sorted(items, key=lambda item: (item["name_en"], item["link"])) for category, items in recommendations.items()}
+
+    def test_autocomplete_matches_the_queries(self):
+        handler = CoinSearchHandler(self.transport)
+        indexed = CoinSearchHandler(self.transport)
+        indexed.indexes = self.indexes
+        for input, side in itertools.product(("", "a", "HE", "zeu", "x"), ("obverse", "reverse")):
+            with self.subTest(input=input, side=side):
+                self.assertEqual(
+                    indexed.getRecommendationsSubObj("", "", "", "true", input, side),
+                    self.sameOrder(handler.getRecommendationsSubObj("", "", "", "true", input, side)),
+                )
+                self.assertEqual(
+                    indexed.getRecommendationsSubObj("", str(CNT.holding), "", "false", input, side),
+                    self.sameOrder(handler.getRecommendationsSubObj("", str(CNT.holding), "", "false", input, side)),
+                )
+        for input, subject, side in itertools.product(("", "hol", "F"), ("", str(CNT.zeus)), ("obverse", "reverse")):
+            with self.subTest(input=input, subject=subject, side=side):
+                self.assertEqual(
+                    indexed.getRecommendationsPredicate(subject, "", input, side),
+                    handler.getRecommendationsPredicate(subject, "", input, side),
+                )
+
+
+class AppearanceIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        graph = coinGraph(COINS + [("c5", "t3", "obverse", "zeus", "standing", "spear", "Zeus standing with spear")])
+        # c5 is no nmo:NumismaticObject, its triples only count for the verbs
+        graph.remove((CNT.coin_c5, RDF.type, NMO.NumismaticObject))
+        cls.appearances = LocalIndexes.build(GraphTransport(graph)).appearances
+
+    def occurring(self, names, match, side, position, **entered):
+        entered = {key: str(CNT[value]) for key, value in entered.items()}
+        found = self.appearances.occurring([str(CNT[name]) for name in names], match, side, position, **entered)
+        return [name for name, occurs in zip(names, found) if occurs]
+
+    def test_occurring(self):
+        names = ["artemis", "zeus", "hercules", "apollo", "bow", "spear", "greek_deities", "deities", "heroes", "weapons", "unknown"]
+        self.assertEqual(self.occurring(names, "entity", "obverse", "subject"), ["artemis", "apollo"])
+        self.assertEqual(self.occurring(names, "class", "obverse", "subject"), ["greek_deities", "deities"])
+        self.assertEqual(self.occurring(names, "either", "reverse", "object"), ["zeus", "spear", "greek_deities", "deities", "weapons"])
+        self.assertEqual(self.occurring(names, "entity", "reverse", "subject", predicate="holding"), ["zeus"])
+        # an entered class matches its entities
+        self.assertEqual(self.occurring(names, "entity", "obverse", "object", subject="greek_deities"), ["bow"])
+        self.assertEqual(self.occurring(names, "entity", "obverse", "object", subject="artemis", predicate="standing"), [])
+        self.assertEqual(self.occurring(names, "entity", "obverse", "entity"), ["artemis", "apollo", "bow"])
+
+    def test_any_occurring_matches_occurring(self):
+        names = ["hercules", "spear", "weapons", "heroes", "deities", "unknown", "bow", "zeus"]
+        entered = [{}, {"predicate": "holding"}, {"subject": "greek_deities"}, {"obj": "zeus"}, {"predicate": "standing"}]
+        for match, side, position, constraints in itertools.product(("entity", "class", "either"), SIDES, ("subject", "object", "entity"), entered):
+            for start in range(len(names)):
+                candidates = names[start:start + 2]
+                with self.subTest(match=match, side=side, position=position, entered=constraints, candidates=candidates):
+                    expected = bool(self.occurring(candidates, match, side, position, **constraints))
+                    uris = [str(CNT[name]) for name in candidates]
+                    constraints_uris = {key: str(CNT[value]) for key, value in constraints.items()}
+                    self.assertEqual(self.appearances.anyOccurring(uris, match, side, position, **constraints_uris), expected)
+
+    def test_occurring_predicates(self):
+        verbs = [str(CNT[name]) for name in ("holding", "standing", "fighting")]
+        self.assertEqual(list(self.appearances.occurringPredicates(verbs, "obverse")), [True, True, False])
+        # the verbs count the triples of every coin
+        self.assertEqual(list(self.appearances.occurringPredicates(verbs, "obverse", subject=str(CNT.zeus))), [False, True, False])
+        self.assertEqual(list(self.appearances.occurringPredicates(verbs, "reverse", obj=str(CNT.greek_deities))), [False, False, True])
+
+
+class KeywordIndexTests(SimpleTestCase):
+    ROWS = [
+        (str(CNT.coin_c1), "obverse", "Artemis holding bow, deer at her feet"),
+        (str(CNT.coin_c2), "reverse", "Zeus holding spear"),
+        (str(CNT.coin_c3), "obverse", "Apollo standing with bow"),
+        (str(CNT.coin_c4), "reverse", "Héraclès fighting Zeus (seated)"),
+        (str(CNT.coin_c5), "obverse", ""),
+    ]
+
+    def setUp(self):
+        self.dictionary = UriDictionary()
+        self.index = KeywordIndex(self.ROWS, self.dictionary)
+
+    def coins(self, ids):
+        return sorted(self.dictionary.decode(coin)[len(CNT) + len("coin_"):] for coin in ids)
+
+    def test_match_expression(self):
+        self.assertEqual(matchExpression("holding bo"), '"holding bo" *')
+        self.assertEqual(matchExpression('"holding bow"'), '"holding bow"')
+        self.assertEqual(matchExpression(' Zeus (seated'), '"Zeus seated" *')
+        self.assertIsNone(matchExpression("()"))
+        self.assertIsNone(matchExpression('"'))
+
+    def test_matching_coins(self):
+        index = self.index
+        self.assertEqual(len(index), 4)
+        self.assertEqual(self.coins(index.matchingCoins("obverse", ["BOW"])), ["c1", "c3"])
+        self.assertEqual(self.coins(index.matchingCoins("obverse", ["holding bo"])), ["c1"])
+        self.assertEqual(self.coins(index.matchingCoins("obverse", ['"holding bo"'])), [])
+        self.assertEqual(self.coins(index.matchingCoins("obverse", ["bow", "deer"])), ["c1"])
+        self.assertEqual(self.coins(index.matchingCoins("reverse", ["heracles"])), ["c4"])
+        self.assertEqual(self.coins(index.matchingCoins("reverse", ["bow"])), [])
+        self.assertEqual(index.matchingCoins("obverse", ["bow", "!"]), set())
+        self.assertEqual(index.matchingCoins("obverse", []), set())
+
+    def test_keyword_coins(self):
+        included, excluded = self.index.keywordCoins("reverse", [{"text": "zeus", "negated": False}, {"text": "seated", "negated": True}])
+        self.assertEqual((self.coins(included), self.coins(excluded)), (["c2", "c4"], ["c4"]))
+        included, excluded = self.index.keywordCoins("obverse", [{"text": "bow", "negated": True}])
+        self.assertIsNone(included)
+        self.assertEqual(self.coins(excluded), ["c1", "c3"])
+
+    def test_updated_only_changes_the_copy(self):
+        rows = self.ROWS[1:] + [(str(CNT.coin_c6), "obverse", "Artemis with bow")]
+        updated = self.index.updated(rows, self.dictionary)
+        self.assertEqual(self.coins(updated.matchingCoins("obverse", ["artemis"])), ["c6"])
+        self.assertEqual(self.coins(self.index.matchingCoins("obverse", ["artemis"])), ["c1"])
+        self.assertEqual(updated.fingerprint, KeywordIndex(rows, UriDictionary()).fingerprint)
+        self.assertNotEqual(updated.fingerprint, self.index.fingerprint)
+
+    def test_copy_is_opened_read_only(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keywords.sqlite3")
+            self.index.copyTo(path)
+            opened = KeywordIndex.open(path, self.dictionary, self.index.fingerprint)
+            self.assertEqual(len(opened), len(self.index))
+            self.assertEqual(opened.matchingCoins("obverse", ["bow"]), self.index.matchingCoins("obverse", ["bow"]))
+            with self.assertRaises(sqlite3.OperationalError):
+                opened._connection.execute("DELETE FROM descriptions")
+            opened._connection.close()
+
+
+class UriDictionaryTests(SimpleTestCase):
+    URIS = [str(CNT.zeus), str(CNT.artemis), str(NMO.hasObverse), "urn:igc:base", str(OBJECT), str(CNT["héra"]), str(CNT.zeus) + "/"]
+
+    def dictionary(self):
+        dictionary = UriDictionary()
+        for uri in self.URIS:
+            dictionary.encode(uri)
+        return dictionary
+
+    def test_split_uri(self):
+        self.assertEqual(splitUri(str(NMO.hasObverse)), ("http://nomisma.org/ontology#", "hasObverse"))
+        self.assertEqual(splitUri(str(CNT.zeus) + "/"), (str(CNT.zeus) + "/", ""))
+        self.assertEqual(splitUri("urn:igc:base"), ("", "urn:igc:base"))
+
+    def assertEncoded(self, dictionary):
+        self.assertEqual(len(dictionary), len(self.URIS))
+        self.assertEqual([dictionary.lookup(uri) for uri in self.URIS], list(range(len(self.URIS))))
+        self.assertEqual(dictionary.decodeAll(range(len(self.URIS))), self.URIS)
+        self.assertEqual(list(dictionary.lookupAll([str(CNT.artemis), str(CNT.hera), "urn:igc:other", str(OBJECT)])), [1, -1, -1, 4])
+        self.assertNotIn(str(CNT.hera), dictionary)
+        self.assertIsNone(dictionary.lookup("http://unknown.org/zeus"))
+
+    def test_ids_are_assigned_in_order(self):
+        dictionary = self.dictionary()
+        self.assertEqual(dictionary.encode(str(CNT.zeus)), 0)
+        # the namespace is stored once
+        self.assertEqual(dictionary.prefixes.count(str(CNT)), 1)
+        self.assertEncoded(dictionary)
+
+    def test_frozen(self):
+        dictionary = self.dictionary()
+        dictionary.freeze()
+        self.assertTrue(dictionary.frozen)
+        self.assertEncoded(dictionary)
+        self.assertEqual(dictionary.encode(str(CNT.artemis)), 1)
+        with self.assertRaises(RuntimeError):
+            dictionary.encode(str(CNT.hera))
+
+    def test_hash_collisions(self):
+        with mock.patch("services.UriDictionary.uriHash", lambda uri: 7):
+            dictionary = self.dictionary()
+            dictionary.freeze()
+            self.assertEncoded(dictionary)
+
+    def test_extended_copy_keeps_the_ids(self):
+        dictionary = self.dictionary()
+        dictionary.freeze()
+        extended = dictionary.extended()
+        self.assertFalse(extended.frozen)
+        self.assertEqual(extended.encode(str(CNT.hera)), len(self.URIS))
+        self.assertEqual([extended.lookup(uri) for uri in self.URIS], list(range(len(self.URIS))))
+        self.assertNotIn(str(CNT.hera), dictionary)
+        extended.freeze()
+        self.assertEqual(extended.lookup(str(CNT.hera)), len(self.URIS))
+        self.assertEqual(extended.decode(len(self.URIS)), str(CNT.hera))
+
+
+class IndexSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_string_table(self):
+        table = StringTable.fromStrings(["", "Zeus", "Héra", "宙斯"])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table), ["", "Zeus", "Héra", "宙斯"])
+        self.assertEqual(table[-1], "宙斯")
+        self.assertEqual(bytes(table.raw(2)), "Héra".encode("utf-8"))
+        with self.assertRaises(IndexError):
+            table[4]
+
+    def test_arrays_are_mapped_back(self):
+        path = os.path.join(self.directory, "test.snapshot")
+        writer = SnapshotWriter()
+        writer.metadata["version"] = "v1"
+        writer.add("bools", np.array([True, False, True]))
+        writer.add("matrix", np.arange(12, dtype=np.int16).reshape(3, 4))
+        writer.add("big", np.array([1, 2], dtype=">i8"))
+        writer.addStrings("names", ["a", "Héra"])
+        writer.addCsr("relation", (np.array([0, 1, 1], dtype=np.int32), np.array([7], dtype=np.int32)))
+        writer.add("empty", np.zeros(0, dtype=np.float64))
+        with self.assertRaises(ValueError):
+            writer.add("bools", np.zeros(1))
+        writer.write(path)
+        self.assertEqual(os.listdir(self.directory), ["test.snapshot"])
+
+        snapshot = IndexSnapshot(path)
+        self.assertEqual(snapshot.metadata, {"version": "v1"})
+        self.assertEqual(snapshot.array("bools").tolist(), [True, False, True])
+        self.assertEqual(snapshot.array("matrix").tolist(), np.arange(12).reshape(3, 4).tolist())
+        self.assertEqual(snapshot.array("big").tolist(), [1, 2])
+        self.assertEqual(list(snapshot.strings("names")), ["a", "Héra"])
+        self.assertEqual([array.tolist() for array in snapshot.csr("relation")], [[0, 1, 1], [7]])
+        self.assertEqual(snapshot.array("empty").shape, (0,))
+        self.assertIn("matrix", snapshot)
+        self.assertNotIn("missing", snapshot)
+        # the views are read-only and aligned
+        self.assertFalse(snapshot.array("matrix").flags.writeable)
+        self.assertEqual(snapshot.array("matrix").ctypes.data % 64, snapshot.array("bools").ctypes.data % 64)
+
+    def test_other_files_are_not_opened(self):
+        path = os.path.join(self.directory, "other.snapshot")
+        for content in (b"", b"not a snapshot at all", struct.pack("<8sIQ", b"IGCINDEX", 1, 2) + b"{}"):
+            with self.subTest(content=content):
+                with open(path, "wb") as file:
+                    file.write(content)
+                with self.assertRaises(ValueError):
+                    IndexSnapshot(path)
+
+    def test_handler_opens_the_snapshot_of_its_dataset_version(self):
+        transport = GraphTransport(coinGraph())
+        path = os.path.join(self.directory, "indexes.snapshot")
+        LocalIndexes.build(transport, dataset_version="v1").write(path)
+        LocalIndexes.build(transport, dataset_version="v1", generation=2).write(path)
+        # the keyword database of the replaced snapshot is removed
+        self.assertEqual(len([file for file in os.listdir(self.directory) if file.endswith(".keywords")]), 1)
+
+        sent = len(transport.queries)
+        handler = CoinSearchHandler(transport, dataset_version="v1", index_snapshot=path)
+        self.assertTrue(handler.loadIndexes())
+        self.assertEqual(handler.indexes.generation, 2)
+        self.assertEqual(len(transport.queries), sent)
+
+        # a snapshot of another dataset version is ignored and the indexes are built
+        handler = CoinSearchHandler(transport, dataset_version="v2", index_snapshot=path)
+        self.assertTrue(handler.loadIndexes())
+        self.assertEqual(handler.indexes.generation, 1)
+        self.assertEqual(handler.indexes.datasetVersion, "v2")
+        self.assertGreater(len(transport.queries), sent)
+
+
+class IndexRefreshTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = coinGraph()
+        self.transport = GraphTransport(self.graph)
+        self.indexes = LocalIndexes.build(self.transport, dataset_version="v1")
+
+    def test_changed_indexes(self):
+        self.assertEqual(self.indexes.changedIndexes(self.transport), set())
+        self.graph.set((CNT.c2_iconography, DCTERMS.description, Literal("Zeus standing, holding spear", lang="en")))
+        self.assertEqual(self.indexes.changedIndexes(self.transport), {"keywords"})
+        self.graph.add((CNT.seated, SKOS.prefLabel, Literal("predicate_id_seated")))
+        self.assertEqual(self.indexes.changedIndexes(self.transport), {"keywords", "labels"})
+        self.graph.add((CNT.roman_deities, RDFS.subClassOf, CNT.deities))
+        self.assertIn("taxonomy", self.indexes.changedIndexes(self.transport))
+
+    def test_unchanged_indexes_are_reused(self):
+        self.graph.set((CNT.c2_iconography, DCTERMS.description, Literal("Zeus standing, holding spear", lang="en")))
+        refreshed = self.indexes.refreshed(self.transport, dataset_version="v2")
+        self.assertEqual((refreshed.generation, refreshed.datasetVersion), (2, "v2"))
+        self.assertIs(refreshed.taxonomy.ancestors, self.indexes.taxonomy.ancestors)
+        self.assertIs(refreshed.appearances.triples, self.indexes.appearances.triples)
+        self.assertIs(refreshed.labels.taxonomy, refreshed.taxonomy)
+        self.assertIs(refreshed.keywords.dictionary, refreshed.dictionary)
+        self.assertEqual(self.indexes.coinIndex.evaluate([description(reverse_keywords=[("standing", False)])], "C1", "NumismaticObject"), [])
+        self.assertEqual(
+            refreshed.coinIndex.evaluate([description(reverse_keywords=[("standing", False)])], "C1", "NumismaticObject"), [str(CNT.coin_c2)]
+        )
+
+    def test_changed_hierarchy_rebuilds_all_indexes(self):
+        self.graph.add((CNT.roman_deities, RDFS.subClassOf, CNT.deities))
+        self.graph.add((CNT.roman_deities, RDF.type, RDFS.Class))
+        refreshed = self.indexes.refreshed(self.transport)
+        self.assertEqual(refreshed.generation, 2)
+        self.assertIsNot(refreshed.taxonomy.ancestors, self.indexes.taxonomy.ancestors)
+        self.assertEqual(refreshed.fingerprints(), LocalIndexes.build(self.transport).fingerprints())
+        self.assertIn(str(CNT.roman_deities), refreshed.taxonomy)
+        self.assertNotIn(str(CNT.roman_deities), self.indexes.taxonomy)
+
+    def test_running_requests_keep_their_generation(self):
+        handler = CoinSearchHandler(self.transport, dataset_version="v1")
+        handler.indexes = self.indexes
+        self.graph.add((CNT.seated, SKOS.prefLabel, Literal("predicate_id_seated")))
+        self.graph.add((CNT.seated, SKOS.prefLabel, Literal("seated")))
+        with handler.pinnedIndexes():
+            self.assertTrue(handler.refreshIndexes())
+            self.assertIs(handler.currentIndexes(), self.indexes)
+            self.assertEqual(handler.labels.predicateNames("sea"), [])
+            # tasks of the request run on the same generation
+            future = submitWithBudget(handler.queryExecutor, handler.currentIndexes)
+            self.assertIs(waitForResult(future), self.indexes)
+        self.assertEqual(handler.currentIndexes().generation, 2)
+        self.assertEqual(handler.labels.predicateNames("sea"), [("seated", str(CNT.seated))])
+
+
+class DumpIngestTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def dump(self, graph, name, format):
+        path = os.path.join(self.directory, name)
+        data = graph.serialize(format=format, encoding="utf-8")
+        with (gzip.open if name.endswith(".gz") else open)(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_indexes_match_the_ones_of_the_endpoint(self):
+        graph = coinGraph()
+        # blank nodes of one dump are the same in every chunk
+        appearance = BNode()
+        for predicate, obj in list(graph.predicate_objects(CNT.c1_appearance)):
+            graph.add((appearance, predicate, obj))
+        graph.remove((CNT.c1_appearance, None, None))
+        graph.set((CNT.c1_bag, RDF_LI, appearance))
+        graph.add((CNT.coin_c1, DCTERMS.title, Literal("skipped")))
+        expected = LocalIndexes.build(GraphTransport(graph))
+        for name, format in (("dump.nt.gz", "nt"), ("dump.ttl", "turtle")):
+            with self.subTest(name=name):
+                ingest = DumpIngest()
+                progress = []
+                ingest.read([self.dump(graph, name, format)], workers=2, chunk_lines=7, progress=lambda *args: progress.append(args))
+                self.assertEqual(ingest.triples, len(graph))
+                self.assertLess(ingest.kept, ingest.triples)
+                self.assertEqual(progress[-1][1:], (1.0, ingest.triples, ingest.kept))
+                indexes = ingest.localIndexes("v1")
+                self.assertEqual(indexes.datasetVersion, "v1")
+                self.assertEqual(indexes.fingerprints(), expected.fingerprints())
+                for coins, booleanTerm in SEARCHES:
+                    self.assertEqual(
+                        indexes.coinIndex.evaluate(coins, booleanTerm, "NumismaticObject"), expected.coinIndex.evaluate(coins, booleanTerm, "NumismaticObject")
+                    )
+
+    def test_inferences_are_computed(self):
+        # the dump only holds the asserted triples, the endpoint the ones inferred by the reasoner as well
+        graph = assertedGraph()
+        materializer = RuleMaterializer()
+        for triple in graph:
+            materializer.add(*triple)
+        inferred = Graph()
+        for triple in itertools.chain(graph, materializer.inferredTriples()):
+            inferred.add(triple)
+        ingest = DumpIngest()
+        ingest.read([self.dump(graph, "asserted.nt", "nt")], workers=1)
+        self.assertEqual(ingest.files, 1)
+        self.assertEqual(ingest.localIndexes().taxonomy.fingerprint, TaxonomyIndex.fromEndpoint(GraphTransport(inferred)).fingerprint)
+
+    def test_blank_nodes_of_different_dumps_differ(self):
+        ingest = DumpIngest()
+        paths = []
+        for number in range(2):
+            path = os.path.join(self.directory, f"dump{number}.nt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"_:b0 <{RDFS.subClassOf}> <{CNT.deities}> .\n_:b0 <{SKOS.prefLabel}> \"class{number}\" .\n")
+            paths.append(path)
+        ingest.read(paths, workers=1)
+        taxonomy = ingest.localIndexes().taxonomy
+        self.assertEqual(len(taxonomy.childrenOf(taxonomy.nodeId(str(CNT.deities)))), 2)
+
+
+class SlowStreamTransport(SlowTransport):
+    """
+    SlowTransport whose streamed queries take at least the delay as well.
+    """
+
+    def stream(self, query, timeout=None, server_timeout=None, deadline=None):
+        with self.counter_lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            rows = list(super().stream(query, timeout, server_timeout, deadline))
+        finally:
+            with self.counter_lock:
+                self.running -= 1
+        yield from rows
+
+
+def metadataGraph():
+    """
+    Builds the dataset of coinGraph with the metadata shown in the search results.
+    """
+    graph = coinGraph()
+    for coin, weight, mint in (("c1", "17.2", "athens"), ("c2", "4.1", "rome"), ("c3", "9", "athens"), ("c4", None, "corinth")):
+        if weight is not None:
+            graph.add((CNT["coin_" + coin], NMO.hasWeight, Literal(weight)))
+        graph.add((CNT["coin_" + coin], NMO.hasMint, CNT[mint]))
+    return graph
+
+
+class SearchHydrationTests(SimpleTestCase):
+    SEARCH = ([description(obverse=[item("Obj", "bow", "list_object")]), description(reverse=[item("Subj", "zeus", "list_person")])], "C1 OR C2")
+
+    def setUp(self):
+        self.graph = metadataGraph()
+        self.transport = SlowStreamTransport(self.graph, 0.05)
+        self.handler = CoinSearchHandler(self.transport, hydration_batch=1, hydration_workers=2)
+
+    def rows(self, rows):
+        return sorted(tuple("" if value is None else value for value in row) for row in rows)
+
+    def test_rows_match_one_metadata_query(self):
+        for indexed in (False, True):
+            handler = CoinSearchHandler(GraphTransport(self.graph), hydration_batch=1, hydration_workers=2)
+            if indexed:
+                handler.indexes = LocalIndexes.build(handler.transport)
+            for coins, booleanTerm in SEARCHES:
+                for searchType in ("NumismaticObject", "TypeSeriesItem"):
+                    with self.subTest(indexed=indexed, booleanTerm=booleanTerm, coins=coins, searchType=searchType):
+                        query = handler.generateQuery(coins, booleanTerm, searchType)
+                        uris = sorted({str(row.url) for row in self.graph.query(query)})
+                        expected = self.graph.query(handler.sparqlQuerySearchResultMetadata(uris, searchType)) if uris else []
+                        rows = list(handler.searchCoins(query, searchType, coins, booleanTerm))
+                        self.assertEqual(self.rows(rows), self.rows([[None if value is None else str(value) for value in row] for row in expected]))
+                        if indexed:
+                            # the coin index matches the coins in the order of their URIs
+                            self.assertEqual(list(dict.fromkeys(row.url for row in rows)), uris)
+
+    def test_batches_run_concurrently(self):
+        query = self.handler.generateQuery(*self.SEARCH, "NumismaticObject")
+        cursor = self.handler.searchCursor(query, "NumismaticObject", *self.SEARCH)
+        self.assertEqual(len(cursor), 4)
+        self.transport.peak = 0
+        sent = len(self.transport.queries)
+        rows = list(self.handler.cursorRows(cursor))
+        self.assertEqual([row.url for row in rows], cursor.uris)
+        self.assertEqual(len(self.transport.queries), sent + 4)
+        self.assertEqual(self.transport.peak, 2)
+        # the metadata of a download is not kept
+        self.assertEqual(cursor.rows, {})
+
+    def test_page_metadata_is_queried_once(self):
+        query = self.handler.generateQuery(*self.SEARCH, "NumismaticObject")
+        cursor = self.handler.searchCursor(query, "NumismaticObject", *self.SEARCH)
+        sent = len(self.transport.queries)
+        page = self.handler.searchPage(cursor, cursor.uris, 1, 2)
+        self.assertEqual([row.url for row in page], cursor.uris[1:3])
+        self.assertEqual(len(self.transport.queries), sent + 2)
+        self.assertEqual(self.handler.searchPage(cursor, cursor.uris, 1, 2), page)
+        self.assertEqual(len(self.transport.queries), sent + 2)
+        self.assertEqual(set(cursor.rows), set(cursor.uris[1:3]))
+
+    def test_rows_of_an_edited_query_are_kept(self):
+        query = "PREFIX nmo: <http://nomisma.org/ontology#> SELECT ?url ?weight WHERE { ?url nmo:hasWeight ?weight . }"
+        cursor = self.handler.searchCursor(query, "NumismaticObject")
+        self.assertEqual(sorted(cursor.uris), [str(CNT.coin_c1), str(CNT.coin_c2), str(CNT.coin_c3)])
+        sent = len(self.transport.queries)
+        page = self.handler.searchPage(cursor, cursor.uris, 0, 3)
+        self.assertEqual(sorted(row.weight for row in page), ["17.2", "4.1", "9"])
+        self.assertEqual(len(self.transport.queries), sent)
+
+
+class ResultCursorTests(SimpleTestCase):
+    SEARCH = SearchHydrationTests.SEARCH
+
+    def setUp(self):
+        self.transport = GraphTransport(metadataGraph())
+        self.handler = CoinSearchHandler(self.transport, dataset_version="v1", cursors=QueryResultCache(ttl=60))
+        self.query = self.handler.generateQuery(*self.SEARCH, "NumismaticObject")
+
+    def test_ordered(self):
+        cursor = ResultCursor("key", "NumismaticObject", ["a", "b", "c", "d", "e"])
+        cursor.sortValues["weight"] = {"a": "2", "b": "1", "c": "2", "e": "x"}
+        key = lambda value: float(value) if value != "x" else None
+        self.assertEqual(cursor.ordered("weight", key), ["b", "a", "c", "d", "e"])
+        # coins without a value come last, equal values keep the order of the search
+        self.assertEqual(cursor.ordered("weight", key, descending=True), ["a", "c", "b", "d", "e"])
+        self.assertIs(cursor.ordered("weight", key), cursor.ordered("weight", key))
+
+    def test_pages_and_orders_reuse_the_cursor(self):
+        cursor = self.handler.searchCursor(self.query, "NumismaticObject", *self.SEARCH)
+        self.assertEqual(sorted(cursor.uris), [str(CNT["coin_c" + number]) for number in "1234"])
+        sent = len(self.transport.queries)
+        self.assertIs(self.handler.searchCursor(self.query, "NumismaticObject", *self.SEARCH), cursor)
+        self.assertEqual(len(self.transport.queries), sent)
+
+        order = self.handler.cursorOrder(cursor, "weight", float, descending=True)
+        self.assertEqual(order, [str(CNT["coin_c" + number]) for number in "1324"])
+        # the values are queried for all coins at once
+        self.assertEqual(len(self.transport.queries), sent + 1)
+        self.assertEqual(self.handler.cursorOrder(cursor, "weight", float), [str(CNT["coin_c" + number]) for number in "2314"])
+        self.assertEqual(len(self.transport.queries), sent + 1)
+
+        # the values of coins whose page was shown are taken from their rows
+        self.handler.searchPage(cursor, cursor.uris, 0, len(cursor))
+        sent = len(self.transport.queries)
+        self.assertEqual(self.handler.cursorOrder(cursor, "mint", str)[-1], str(CNT.coin_c2))
+        self.assertEqual(len(self.transport.queries), sent)
+
+    def test_cursor_belongs_to_the_dataset_version(self):
+        cursor = self.handler.searchCursor(self.query, "NumismaticObject", *self.SEARCH)
+        self.handler.datasetVersion = "v2"
+        self.assertIsNot(self.handler.searchCursor(self.query, "NumismaticObject", *self.SEARCH), cursor)
+        self.handler._onDatasetChanged("v2", "v3")
+        self.assertIsNone(self.handler.cursors.get(cursor.key))
+
+    def test_partial_cursor_is_not_kept(self):
+        server = EndpointServer()
+        self.addCleanup(server.close)
+        chunks = [b"?url\t?id\n", b"<http://example.org/c1>\t\"1\"\n", b"<http://example.org/c2>\t\"2\"\n", b"<http://example.org/c3>\t\"3\"\n"]
+        server.answers.append(Answer(200, "text/tab-separated-values", chunks, chunk_delay=0.2))
+        handler = CoinSearchHandler(SparqlTransport(server.endpoint, read_timeout=5), dataset_version="v1", cursors=QueryResultCache(ttl=60))
+        with queryBudget(0.5):
+            cursor = handler.searchCursor("SELECT ?url ?id WHERE { }", "NumismaticObject")
+        self.assertFalse(cursor.complete)
+        self.assertTrue(cursor.uris)
+        self.assertLess(len(cursor), 3)
+        self.assertIsNone(handler.cursors.get(cursor.key))
+
+        rows = []
+        with self.assertRaises(QueryTimeout):
+            for row in handler.cursorRows(cursor):
+                rows.append(row.url)
+        # the rows of the matched coins come first
+        self.assertEqual(rows, cursor.uris)
+        self.assertEqual(len(server.requests), 1)
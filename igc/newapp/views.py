@@ -1,18 +1,81 @@
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.template import loader
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 
 from services.CoinSearchHandler import CoinSearchHandler
+from services.CircuitBreaker import CircuitBreaker, CircuitOpen, degradedScope
+from services.DatasetVersionProbe import DatasetVersionProbe
+from services.DiskResultCache import DiskResultCache
 from services.Helper import Helper
+from services.QueryBudget import QueryTimeout, queryBudget
+from services.QueryResultCache import QueryResultCache
+from services.SparqlTransport import SparqlTransport
 
 import json
 import csv
+from functools import wraps
+import math
+import re
+import threading
 
 import pandas as pd
 
 
-coinSearchHandler = CoinSearchHandler()
+# one pooled keep-alive transport to fuseki, shared by all handlers
+sparqlTransport = SparqlTransport(
+	settings.SPARQL_ENDPOINT,
+	pool_size=settings.SPARQL_POOL_SIZE,
+	connect_timeout=settings.SPARQL_CONNECT_TIMEOUT,
+	read_timeout=settings.SPARQL_READ_TIMEOUT,
+)
+
+# shared with the version probe, which pauses while the endpoint is unavailable
+sparqlBreaker = CircuitBreaker(
+	window=settings.SPARQL_BREAKER_WINDOW,
+	min_calls=settings.SPARQL_BREAKER_MIN_CALLS,
+	failure_rate=settings.SPARQL_BREAKER_FAILURE_RATE,
+	slow_call=settings.SPARQL_BREAKER_SLOW_CALL,
+	slow_rate=settings.SPARQL_BREAKER_SLOW_RATE,
+	open_seconds=settings.SPARQL_BREAKER_OPEN_SECONDS,
+	half_open_calls=settings.SPARQL_BREAKER_HALF_OPEN_CALLS,
+)
+
+coinSearchHandler = CoinSearchHandler(
+	sparqlTransport,
+	bundle_workers=settings.SPARQL_BUNDLE_WORKERS,
+	query_workers=settings.SPARQL_QUERY_WORKERS,
+	cache=QueryResultCache(
+		max_size=settings.SPARQL_CACHE_SIZE,
+		ttl=settings.SPARQL_CACHE_TTL,
+		stale_ttl=settings.SPARQL_CACHE_STALE_TTL,
+	),
+	disk_cache=DiskResultCache(
+		settings.SPARQL_DISK_CACHE_PATH,
+		ttl=settings.SPARQL_CACHE_TTL,
+		stale_ttl=settings.SPARQL_CACHE_STALE_TTL,
+		max_entries=settings.SPARQL_DISK_CACHE_SIZE,
+	),
+	version_probe=DatasetVersionProbe(
+		sparqlTransport,
+		probe_query=settings.SPARQL_DATASET_PROBE_QUERY,
+		interval=settings.SPARQL_DATASET_PROBE_INTERVAL,
+		breaker=sparqlBreaker,
+	),
+	breaker=sparqlBreaker,
+	index_snapshot=settings.SPARQL_INDEX_SNAPSHOT,
+	index_timeout=settings.SPARQL_INDEX_TIMEOUT,
+	cursors=QueryResultCache(
+		max_size=settings.SPARQL_CURSOR_COUNT,
+		ttl=settings.SPARQL_CURSOR_TTL,
+		stale_ttl=0,
+	),
+)
+if settings.SPARQL_LOCAL_INDEXES:
+	# until the indexes are built, the recommendations are queried from the endpoint
+	threading.Thread(target=coinSearchHandler.loadIndexes, name="indexes", daemon=True).start()
+
 helper = Helper("newapp/ressources/mintMap.csv") 
 
 #mintMap_df = pd.read_csv("newapp/ressources/mintMap.csv")
@@ -57,9 +120,192 @@ def convertId(id_str):
 		return id_str
 
 
+class Echo:
+	"""
+	Pseudo buffer for the csv writer, which returns the written line instead of storing it.
+	Used to stream csv files row by row.
+	"""
+	def write(self, value):
+		return value
+
+
+def searchResultCsvRows(results, searchType):
+	"""
+	Converts search results into csv lines.
+
+	Parameters:
+		results (iterable): Rows of the search query.
+		searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+
+	Returns:
+		generator: The csv lines, beginning with the header. If the rows can not be read to the end (time budget used up,
+		           endpoint unavailable), the last line says that the results are truncated.
+	"""
+	writer = csv.writer(Echo())
+	yield writer.writerow([
+		"Type", "URL", "Thumbnail Obverse", "Thumbnail Reverse", "ID", 
+		"Weight", "Obverse Description", "Reverse Description", 
+		"Date", "Max Diameter", "Location", "Region"
+	])
+
+	# the header is already sent, so a partial export is marked in the file itself
+	try:
+		for row in results:
+			yield writer.writerow([
+				searchType,
+				str(row.url) if row.url else "",
+				str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
+				str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
+				convertId(str(row.id)),
+				f"{row.weight} g" if row.weight else "",
+				str(row.descriptionObverse) if row.descriptionObverse else "",
+				str(row.descriptionReverse) if row.descriptionReverse else "",
+				str(row.date) if row.date else "",
+				f"{row.maxDiameter} mm" if row.maxDiameter else "",
+				mintMap.get(str(row.mint), "") if row.mint else "",
+				""
+			])
+	except QueryTimeout:
+		yield writer.writerow(["results truncated: time budget exceeded"])
+	except CircuitOpen:
+		yield writer.writerow(["results truncated: SPARQL endpoint unavailable"])
+
+
+def searchDescription(request):
+	"""
+	Reads the coin descriptions and the relation string a search query was generated from.
+	The frontend only sends them if the query in the editor was not edited.
+
+	Parameters:
+		request: The HTTP request object.
+
+	Returns:
+		tuple: (coins, relationString), (None, None) if they were not sent.
+	"""
+	if "coins" not in request.POST or "relationString" not in request.POST:
+		return None, None
+	return json.loads(request.POST["coins"]), request.POST["relationString"]
+
+
+def numberSortKey(value):
+	"""
+	Converts a weight or diameter of a search result into the value it is sorted by.
+
+	Parameters:
+		value (str): The value.
+
+	Returns:
+		float: The number, None if the value is not a number.
+	"""
+	try:
+		return float(value)
+	except ValueError:
+		return None
+
+
+def dateSortKey(value):
+	"""
+	Converts a date of a search result (e.g. "350-300 BC") into the value it is sorted by: its first year, negative before Christ.
+
+	Parameters:
+		value (str): The date.
+
+	Returns:
+		int: The year, None if the date does not contain one.
+	"""
+	year = re.search(r"\d+", value)
+	if year is None:
+		return None
+	return -int(year.group(0)) if re.search(r"\bBC\b|\bBCE\b", value) else int(year.group(0))
+
+
+def mintSortKey(value):
+	"""
+	Converts a mint of a search result into the value it is sorted by, the name of its region.
+
+	Parameters:
+		value (str): URI of the mint.
+
+	Returns:
+		str: The lower case name, None if the mint is unknown.
+	"""
+	return mintMap.get(value, "").lower() or None
+
+
+# the sort options of the results -> (variable of the search results, function converting its values)
+SEARCH_SORT_KEYS = {
+	"weight": ("weight", numberSortKey),
+	"maxDiameter": ("maxDiameter", numberSortKey),
+	"date": ("date", dateSortKey),
+	"location": ("mint", mintSortKey),
+}
+
+
+def searchOrder(request, cursor):
+	"""
+	Sorts the coins of a search like requested with the sortBy and sortDirection parameters.
+
+	Parameters:
+		request: The HTTP request object.
+		cursor (ResultCursor): The result cursor of the search.
+
+	Returns:
+		list: The URIs of the coins, in the order of the search if no (known) sort option was requested.
+	"""
+	sortBy = request.POST.get("sortBy", "")
+	if sortBy not in SEARCH_SORT_KEYS or (sortBy == "location" and cursor.searchType != "NumismaticObject"):
+		# the location of all types is "TYPE"
+		return coinSearchHandler.cursorOrder(cursor)
+	variable, key = SEARCH_SORT_KEYS[sortBy]
+	return coinSearchHandler.cursorOrder(cursor, variable, key, request.POST.get("sortDirection") == "descending")
+
+
+def intParameter(request, name, default, minimum, maximum):
+	"""
+	Reads an integer parameter of a request, clamped to a range.
+
+	Parameters:
+		request: The HTTP request object.
+		name (str): Name of the parameter.
+		default (int): Value if the parameter is missing or not an integer.
+		minimum (int): Smallest value.
+		maximum (int): Largest value, None for no limit.
+
+	Returns:
+		int: The value.
+	"""
+	try:
+		value = int(request.POST.get(name, default))
+	except ValueError:
+		value = default
+	value = max(minimum, value)
+	return value if maximum is None else min(maximum, value)
+
+
+def withPinnedIndexes(view):
+	"""
+	Runs a view on one generation of the local indexes: a refresh of the indexes while the request
+	is answered does not mix the old and the new indexes, the request finishes on the old ones.
+
+	Parameters:
+		view (function): The view handling the actions.
+
+	Returns:
+		function: The wrapped view.
+	"""
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		with coinSearchHandler.pinnedIndexes():
+			return view(request, *args, **kwargs)
+	return wrapper
+
+
+@withPinnedIndexes
 def download_search_results(request):
 	"""
 	Handles the downloading of search results in various formats.
+	The file is streamed, rows are written while the SPARQL endpoint is still sending results.
+	The rows are in the order of the results page, the coins are taken from the result cursor of the search.
 
 	Parameters:
 		request: The HTTP request object.
@@ -74,35 +320,17 @@ def download_search_results(request):
 		searchType = request.POST["searchType"]
 		query = request.POST["q"]
 
-		results = coinSearchHandler.executeQuery(query)
-		
 		if fileType == "csv":
-			response = HttpResponse(content_type='text/csv')
+			coins, relationString = searchDescription(request)
+			cursor = coinSearchHandler.searchCursor(query, searchType, coins, relationString)
+			# a partial result is not passed off as the complete export
+			if not cursor.complete:
+				return JsonResponse({"success": False, "timedOut": True, "message": "The time budget of the request is used up"}, status=504)
+			results = coinSearchHandler.cursorRows(cursor, searchOrder(request, cursor))
+
+			response = StreamingHttpResponse(searchResultCsvRows(results, searchType), content_type='text/csv')
 			response['Content-Disposition'] = f'attachment; filename="{searchType}_search_results.csv"'
 
-			writer = csv.writer(response)
-			writer.writerow([
-				"Type", "URL", "Thumbnail Obverse", "Thumbnail Reverse", "ID", 
-				"Weight", "Obverse Description", "Reverse Description", 
-				"Date", "Max Diameter", "Location", "Region"
-			])
-
-			for row in results:
-				writer.writerow([
-					searchType,
-					str(row.url) if row.url else "",
-					str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
-					str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
-					convertId(str(row.id)),
-					f"{row.weight} g" if row.weight else "",
-					str(row.descriptionObverse) if row.descriptionObverse else "",
-					str(row.descriptionReverse) if row.descriptionReverse else "",
-					str(row.date) if row.date else "",
-					f"{row.maxDiameter} mm" if row.maxDiameter else "",
-					mintMap.get(str(row.mint), "") if row.mint else "",
-					""
-				])
-
 			return response
 		else:
 			return JsonResponse({"error": "Unsupported fileType"}, status=400)
@@ -110,6 +338,69 @@ def download_search_results(request):
 		return HttpResponse(status=405)
 
 
+def convertSearchResult(row, searchType):
+	"""
+	Converts a row of the search query into the dictionary sent to the frontend.
+
+	Parameters:
+		row: A row of the search query.
+		searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+
+	Returns:
+		dict: The search result.
+	"""
+	category = row.type if searchType == "NumismaticObject" else "TYPE" if searchType == "TypeSeriesItem" else None
+
+	return {
+		"type": searchType,
+		"url": str(row.url) if row.url else None,
+		"thumbnailObverse": str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
+		"thumbnailReverse": str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
+		"descriptionObverse": str(row.descriptionObverse) if row.descriptionObverse else None,
+		"descriptionReverse": str(row.descriptionReverse) if row.descriptionReverse else None,
+		"date": str(row.date) if row.date else None,
+		"maxDiameter": float(row.maxDiameter) if row.maxDiameter else None,
+		"id": convertId(row.id),
+		"category": category,
+		"weight": float(row.weight) if row.weight else None,
+		"location": mintMap.get(str(row.mint), None) if searchType == "NumismaticObject" else "TYPE",
+		"region": None if searchType == "NumismaticObject" else convertId(row.id)
+	}
+
+
+def searchResultPage(request, cursor):
+	"""
+	Returns one page of the results of a search for the searchCoin action.
+
+	Parameters:
+		request: The HTTP request object, with the page number (page, from 1), the page size (pageSize) and the sort options.
+		cursor (ResultCursor): The result cursor of the search.
+
+	Returns:
+		dict: The response {"result": [...], "length": int, "total": int, "page": int, "pages": int, "success": bool},
+			  with "timedOut": true if only a part of the coins was matched in time.
+	"""
+	pageSize = intParameter(request, "pageSize", settings.SPARQL_PAGE_SIZE, 1, settings.SPARQL_MAX_PAGE_SIZE)
+	order = searchOrder(request, cursor)
+	pages = max(1, math.ceil(len(order) / pageSize))
+	page = intParameter(request, "page", 1, 1, pages)
+	rows = coinSearchHandler.searchPage(cursor, order, (page - 1) * pageSize, pageSize)
+
+	response = {
+		"result": [convertSearchResult(row, cursor.searchType) for row in rows],
+		"length": len(rows),
+		"total": len(order),
+		"page": page,
+		"pages": pages,
+		"success": cursor.complete,
+	}
+	if not cursor.complete:
+		# the page is part of a partial result
+		response["timedOut"] = True
+		response["error"] = "The time budget of the request was used up before all coins were matched"
+	return response
+
+
 @csrf_exempt
 def log(request):
 	"""
@@ -145,7 +436,61 @@ def log(request):
 		return JsonResponse({"success": False, "message": "Only POST method allowed"})
 
 
+def withActionBudget(view):
+	"""
+	Runs a view with the time budget configured for its action in SPARQL_ACTION_BUDGETS.
+	If the budget is used up, a json response with "timedOut": true is returned instead of the result.
+
+	Parameters:
+		view (function): The view handling the actions.
+
+	Returns:
+		function: The wrapped view.
+	"""
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		action = request.POST.get("action", "") if request.method == "POST" else ""
+		budget = settings.SPARQL_ACTION_BUDGETS.get(action, settings.SPARQL_DEFAULT_BUDGET)
+		try:
+			with queryBudget(budget):
+				return view(request, *args, **kwargs)
+		except QueryTimeout as e:
+			return JsonResponse({"success": False, "timedOut": True, "message": str(e)})
+	return wrapper
+
+
+def withDegradedFlag(view):
+	"""
+	Adds "degraded": true to the json response of a view if parts of it were served from stale caches
+	or left out because the SPARQL endpoint is unavailable. While the endpoint is unavailable,
+	actions without any cached answer fail fast with "degraded": true.
+
+	Parameters:
+		view (function): The view handling the actions.
+
+	Returns:
+		function: The wrapped view.
+	"""
+	@wraps(view)
+	def wrapper(request, *args, **kwargs):
+		with degradedScope() as flags:
+			try:
+				response = view(request, *args, **kwargs)
+			except CircuitOpen as e:
+				return JsonResponse({"success": False, "degraded": True, "message": str(e)})
+		if flags["degraded"] and isinstance(response, JsonResponse):
+			data = json.loads(response.content)
+			if isinstance(data, dict):
+				data["degraded"] = True
+				response = JsonResponse(data)
+		return response
+	return wrapper
+
+
 @csrf_exempt
+@withDegradedFlag
+@withActionBudget
+@withPinnedIndexes
 def callback(request):
 	"""
 	The main callback endpoint for handling various actions from the frontend.
@@ -254,44 +599,41 @@ def callback(request):
 				response["success"] = True
 			#---------------------------------------------------------------------------------- (-END-) NEW by Nico Lambert --------------------------------#
 
+			# Answers all availability checks (and optionally the recommendations of one slot) for a triple context in one request
+			elif a == "getTripleContextBundle":
+				subj_uri = request.POST["subj_uri"]
+				pred_uri = request.POST["pred_uri"]
+				obj_uri = request.POST["obj_uri"]
+				side = request.POST["side"]
+				slot = request.POST.get("slot", "")
+				search_type = request.POST.get("search_type", "standard")
+				q = request.POST.get("q", "")
+
+				response["result"] = coinSearchHandler.getTripleContextBundle(subj_uri, pred_uri, obj_uri, side, slot, search_type, q)
+				response["success"] = True
+
 			elif a == "generateQuery":
 				coins = json.loads(request.POST["coins"])
 				relationString = request.POST["relationString"]
 				searchType = request.POST["searchType"]
-				response["result"] = coinSearchHandler.generateQuery(coins, relationString, searchType)
-				response["success"] = True
+				try:
+					response["result"] = coinSearchHandler.generateQuery(coins, relationString, searchType)
+					response["success"] = True
+				except ValueError as error:
+					# e.g. a relation string that is still being edited
+					response["error"] = str(error)
 			elif a == "searchCoin":
 
 				searchType = request.POST["searchType"]
-				results = coinSearchHandler.executeQuery(request.POST["q"])
+				coins, relationString = searchDescription(request)
+				cursor = coinSearchHandler.searchCursor(request.POST["q"], searchType, coins, relationString)
 
-				result = []
-				
-				for row in results:
-					category = row.type if searchType == "NumismaticObject" else "TYPE" if searchType == "TypeSeriesItem" else None
-
-					result_item = {
-						"type": searchType,
-						"url": str(row.url) if row.url else None,
-						"thumbnailObverse": str(row.thumbnailObverse) if row.thumbnailObverse else "static/no_image.jpg",
-						"thumbnailReverse": str(row.thumbnailReverse) if row.thumbnailReverse else "static/no_image.jpg",
-						"descriptionObverse": str(row.descriptionObverse) if row.descriptionObverse else None,
-						"descriptionReverse": str(row.descriptionReverse) if row.descriptionReverse else None,
-						"date": str(row.date) if row.date else None,
-						"maxDiameter": float(row.maxDiameter) if row.maxDiameter else None,
-						"id": convertId(row.id),
-						"category": category,
-						"weight": float(row.weight) if row.weight else None,
-						"location": mintMap.get(str(row.mint), None) if searchType == "NumismaticObject" else "TYPE",
-						"region": None if searchType == "NumismaticObject" else convertId(row.id)
-					}
-
-					result.append(result_item)
-
-				response["success"] = True
-				response["result"] = result
-				response["length"] = len(results)
+				response = searchResultPage(request, cursor)
 			elif a == "download":
 				return download_search_results(request)
+			# Reports the counters of the query result cache
+			elif a == "getCacheStats":
+				response["result"] = coinSearchHandler.cache.stats() if coinSearchHandler.cache is not None else None
+				response["success"] = True
 
 	return JsonResponse(response, safe=False)
\ No newline at end of file
@@ -0,0 +1,439 @@
+import numpy as np
+
+from services.SourceFingerprint import SourceFingerprint
+
+
+# coin sides in the order of their side codes
+SIDES = ("obverse", "reverse")
+
+_SIDE_VALUES = """
+        VALUES (?side ?hasSide) {
+            ("obverse" nmo:hasObverse)
+            ("reverse" nmo:hasReverse)
+        }
+    """
+
+# the triples of the coin designs, the same chain the Filter Exists blocks of the recommendation queries follow
+TRIPLE_QUERY = f"""
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?coin ?side ?subject ?predicate ?object WHERE {{
+        {_SIDE_VALUES}
+        ?coin ?hasSide ?coinSide .
+        ?coinSide nmo:hasIconography ?coinIconography .
+        ?coinIconography nmo:hasIconography ?coinDesignIconography .
+        ?coinDesignIconography rdf:type rdf:Bag .
+        ?coinDesignIconography rdf:li ?coinAppearance .
+        OPTIONAL {{ ?coinAppearance rdf:subject ?subject . }}
+        OPTIONAL {{ ?coinAppearance rdf:predicate ?predicate . }}
+        OPTIONAL {{ ?coinAppearance rdf:object ?object . }}
+    }}
+    """
+
+# the entities of the coin designs regardless of their triples, used by the single word search
+ENTITY_QUERY = f"""
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?coin ?side ?entity WHERE {{
+        {_SIDE_VALUES}
+        ?coin ?hasSide ?coinSide .
+        ?coinSide nmo:hasIconography ?coinIconography .
+        ?coinIconography nmo:hasAppearance ?coinAppearance .
+        ?coinAppearance rdf:li ?entity .
+    }}
+    """
+
+NUMISMATIC_OBJECT_QUERY = """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT ?coin WHERE {
+        ?coin rdf:type nmo:NumismaticObject .
+    }
+    """
+
+
+def _gather(relation, ids):
+    """
+    Returns the related ids of several nodes of a compressed sparse row relation at once.
+
+    Parameters:
+        relation (tuple): (indptr, indices) arrays, see TaxonomyIndex.
+        ids (ndarray): Node ids.
+
+    Returns:
+        ndarray: The concatenated related ids, with duplicates.
+    """
+    indptr, indices = relation
+    starts = indptr[ids].astype(np.int64)
+    counts = indptr[ids + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return indices[:0]
+    # position of every related id: start of its node plus its offset within the node
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[np.repeat(starts, counts) + offsets]
+
+
+class AppearanceIndex():
+    """
+    In-memory index of the triples and entities on the coin sides, so the coin occurrence constraint of the recommendations
+    ("does the entity occur with this predicate and this object on the reverse of a coin?") is answered without the
+    Filter Exists join in the endpoint.
+
+    Every (side, subject, predicate, object, coin) design triple is one row of integer columns, sorted by side, so the rows
+    of one side are a slice and a lookup is a vectorized comparison of these columns. Entities are the ids of the URI dictionary
+    of the taxonomy index, entities that are not part of it (e.g. verbs or entities without class) are added to the dictionary.
+    The class expanded variant of a lookup ("an entity of the class occurs") uses the ancestors and instances of the taxonomy.
+
+    Attributes:
+        taxonomy (TaxonomyIndex): The index of the classes, the entity ids up to its length are its node ids.
+        dictionary (UriDictionary): URI encoding of the entities and coins, shared with the taxonomy.
+        coins (ndarray): int32 dictionary id of every coin, indexed by coin id.
+        isNumismatic (ndarray): bool per coin, True if the coin has the type nmo:NumismaticObject.
+        triples (dict): Column name ("subject", "predicate", "object", "coin") -> int32 array of the design triples, -1 for unbound.
+        tripleSides (ndarray): Start row of every side in triples and one past the last row, see SIDES.
+        entities (dict): Column name ("entity", "coin") -> int32 array of the design entities of the single word search.
+        entitySides (ndarray): Start row of every side in entities and one past the last row.
+        fingerprint (str): SourceFingerprint of the rows the index is built from.
+    """
+
+    def __init__(self, taxonomy, triple_rows, entity_rows, numismatic_coins):
+        """
+        Builds the index.
+
+        Parameters:
+            taxonomy (TaxonomyIndex): Index of the classes and entities.
+            triple_rows (iterable): (coin URI, side, subject URI, predicate URI, object URI) rows, side is "obverse" or "reverse",
+                                    unbound elements are None.
+            entity_rows (iterable): (coin URI, side, entity URI) rows.
+            numismatic_coins (iterable): URIs of the coins with the type nmo:NumismaticObject.
+        """
+        self.taxonomy = taxonomy
+        self.dictionary = taxonomy.dictionary
+        self.coins = []
+        # dictionary id -> coin id
+        self._coinIds = {}
+        fingerprint = SourceFingerprint()
+
+        sides = {side: code for code, side in enumerate(SIDES)}
+        columns = ([], [], [], [], [])
+        for coin, side, subject, predicate, obj in fingerprint.rows("triple", triple_rows):
+            if side not in sides:
+                continue
+            for column, value in zip(columns, (sides[side], self._entity(subject), self._entity(predicate), self._entity(obj), self._coin(coin))):
+                column.append(value)
+        self.triples, self.tripleSides = self._table(("subject", "predicate", "object", "coin"), columns)
+
+        columns = ([], [], [])
+        for coin, side, entity in fingerprint.rows("entity", entity_rows):
+            if side not in sides:
+                continue
+            for column, value in zip(columns, (sides[side], self._entity(entity), self._coin(coin))):
+                column.append(value)
+        self.entities, self.entitySides = self._table(("entity", "coin"), columns)
+
+        self.isNumismatic = np.zeros(len(self.coins), dtype=bool)
+        for coin in numismatic_coins:
+            fingerprint.add("numismatic", coin)
+            coin = self._coinIds.get(self.dictionary.lookup(coin))
+            if coin is not None:
+                self.isNumismatic[coin] = True
+        self.coins = np.array(self.coins, dtype=np.int32)
+        # only needed while the coins are numbered
+        self._coinIds = None
+        self.fingerprint = str(fingerprint)
+
+    @classmethod
+    def fromEndpoint(cls, transport, taxonomy, timeout=300):
+        """
+        Builds the index from the coin designs of a SPARQL endpoint. The rows are streamed, so the result sets are never held as a whole.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            taxonomy (TaxonomyIndex): Index of the classes and entities.
+            timeout (float): Read timeout of each query in seconds.
+
+        Returns:
+            AppearanceIndex: The built index.
+        """
+        return cls(
+            taxonomy,
+            (tuple(row) for row in transport.stream(TRIPLE_QUERY, timeout=timeout)),
+            (tuple(row) for row in transport.stream(ENTITY_QUERY, timeout=timeout)),
+            (row.coin for row in transport.stream(NUMISMATIC_OBJECT_QUERY, timeout=timeout)),
+        )
+
+    @staticmethod
+    def sourceFingerprint(transport, timeout=300):
+        """
+        Returns the fingerprint an index built from the endpoint now would have, without building it.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of each query in seconds.
+
+        Returns:
+            str: The fingerprint, see SourceFingerprint.
+        """
+        fingerprint = SourceFingerprint()
+        for row in transport.stream(TRIPLE_QUERY, timeout=timeout):
+            fingerprint.add("triple", *row)
+        for row in transport.stream(ENTITY_QUERY, timeout=timeout):
+            fingerprint.add("entity", *row)
+        for row in transport.stream(NUMISMATIC_OBJECT_QUERY, timeout=timeout):
+            fingerprint.add("numismatic", row.coin)
+        return str(fingerprint)
+
+    def addTo(self, writer, name):
+        """
+        Adds the index to a snapshot, the taxonomy is added separately.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        writer.metadata[name] = {"fingerprint": self.fingerprint}
+        for column, array in self.triples.items():
+            writer.add(f"{name}.triples.{column}", array)
+        writer.add(name + ".tripleSides", self.tripleSides)
+        for column, array in self.entities.items():
+            writer.add(f"{name}.entities.{column}", array)
+        writer.add(name + ".entitySides", self.entitySides)
+        writer.add(name + ".isNumismatic", self.isNumismatic)
+        writer.add(name + ".coins", self.coins)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name, taxonomy):
+        """
+        Opens an index of a snapshot without copying its arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+            taxonomy (TaxonomyIndex): The taxonomy of the snapshot.
+
+        Returns:
+            AppearanceIndex: The index.
+        """
+        appearances = cls.__new__(cls)
+        appearances.taxonomy = taxonomy
+        appearances.dictionary = taxonomy.dictionary
+        appearances.triples = {column: snapshot.array(f"{name}.triples.{column}") for column in ("subject", "predicate", "object", "coin")}
+        appearances.tripleSides = snapshot.array(name + ".tripleSides")
+        appearances.entities = {column: snapshot.array(f"{name}.entities.{column}") for column in ("entity", "coin")}
+        appearances.entitySides = snapshot.array(name + ".entitySides")
+        appearances.isNumismatic = snapshot.array(name + ".isNumismatic")
+        appearances.coins = snapshot.array(name + ".coins")
+        appearances._coinIds = None
+        appearances.fingerprint = snapshot.metadata[name]["fingerprint"]
+        return appearances
+
+    def _entity(self, uri):
+        """
+        Returns the id of an entity, adding it if it is not known yet.
+
+        Parameters:
+            uri (str): The URI, None if unbound.
+
+        Returns:
+            int: The entity id, -1 for None.
+        """
+        if uri is None:
+            return -1
+        return self.dictionary.encode(uri)
+
+    def _coin(self, uri):
+        """
+        Returns the id of a coin, adding it if it is not known yet.
+
+        Parameters:
+            uri (str): The URI of the coin.
+
+        Returns:
+            int: The coin id.
+        """
+        id = self.dictionary.encode(uri)
+        coin = self._coinIds.get(id)
+        if coin is None:
+            coin = len(self.coins)
+            self._coinIds[id] = coin
+            self.coins.append(id)
+        return coin
+
+    def _table(self, names, columns):
+        """
+        Turns the collected columns into int32 arrays sorted by side.
+
+        Parameters:
+            names (tuple): Names of the columns after the side column.
+            columns (tuple): Lists of the side codes and of the named columns.
+
+        Returns:
+            tuple: (dict of the named arrays, ndarray of the start row of every side and one past the last row)
+        """
+        side = np.array(columns[0], dtype=np.int8)
+        order = np.argsort(side, kind="stable")
+        table = {name: np.array(column, dtype=np.int32)[order] for name, column in zip(names, columns[1:])}
+        bounds = np.searchsorted(side[order], np.arange(len(SIDES) + 1))
+        return table, bounds
+
+    def __len__(self):
+        return len(self.triples["coin"])
+
+    def entityId(self, uri):
+        """
+        Returns the id of an entity.
+
+        Parameters:
+            uri (str): The URI.
+
+        Returns:
+            int: The entity id, None if the URI is not part of the dictionary.
+        """
+        return self.dictionary.lookup(uri)
+
+    def _withInstances(self, uri):
+        """
+        Returns the ids matching an entered triple element: the entity itself and, for a class, its entities.
+
+        Parameters:
+            uri (str): The URI of the entered element.
+
+        Returns:
+            ndarray: The entity ids, empty if the URI is unknown.
+        """
+        entity = self.dictionary.lookup(uri)
+        if entity is None:
+            return np.zeros(0, dtype=np.int32)
+        if entity < len(self.taxonomy):
+            return np.append(self.taxonomy.instancesOf(entity), np.int32(entity))
+        return np.array([entity], dtype=np.int32)
+
+    def _sideRows(self, side, subject=None, predicate=None, obj=None, numismatic=True):
+        """
+        Returns the design triples of a coin side matching the entered triple elements.
+
+        Parameters:
+            side (str): Coin side, 'obverse' or 'reverse'.
+            subject (str): URI the subject has to be, or be an entity of, None for any subject.
+            predicate (str): URI of the predicate, None for any predicate.
+            obj (str): URI the object has to be, or be an entity of, None for any object.
+            numismatic (bool): Whether only triples on coins with the type nmo:NumismaticObject are kept.
+
+        Returns:
+            tuple: (dict of the column slices of the side, bool mask of the matching rows)
+        """
+        code = SIDES.index(side)
+        rows = slice(self.tripleSides[code], self.tripleSides[code + 1])
+        columns = {name: column[rows] for name, column in self.triples.items()}
+        mask = np.ones(len(columns["coin"]), dtype=bool)
+        if numismatic:
+            mask &= self.isNumismatic[columns["coin"]]
+        if predicate is not None:
+            predicate = self.dictionary.lookup(predicate)
+            predicate = -2 if predicate is None else predicate
+            mask &= columns["predicate"] == predicate
+        if subject is not None:
+            mask &= np.isin(columns["subject"], self._withInstances(subject))
+        if obj is not None:
+            mask &= np.isin(columns["object"], self._withInstances(obj))
+        return columns, mask
+
+    def _found(self, side, position, subject=None, predicate=None, obj=None):
+        """
+        Returns the entities occurring at a position on the coins with the type nmo:NumismaticObject for a coin side.
+
+        Parameters:
+            side, position, subject, predicate, obj: see occurring
+
+        Returns:
+            ndarray: The entity ids, with duplicates.
+        """
+        if position == "entity":
+            code = SIDES.index(side)
+            rows = slice(self.entitySides[code], self.entitySides[code + 1])
+            found = self.entities["entity"][rows][self.isNumismatic[self.entities["coin"][rows]]]
+        else:
+            columns, mask = self._sideRows(side, subject, predicate, obj)
+            found = columns[position][mask]
+        return found[found >= 0]
+
+    def occurring(self, candidates, match, side, position, subject=None, predicate=None, obj=None):
+        """
+        Checks which candidates occur on the coins with the type nmo:NumismaticObject for a coin side.
+
+        Parameters:
+            candidates (list): URIs of the candidate entities.
+            match (str): How a candidate has to occur - "entity": the candidate itself, "class": an entity of the candidate class,
+                         "either": the candidate itself or an entity of it.
+            side (str): Coin side, 'obverse' or 'reverse'.
+            position (str): "subject" or "object" of a design triple, "entity" for the entities of the single word search.
+            subject (str): URI the subject has to be, or be an entity of, None for any subject.
+            predicate (str): URI of the predicate, None for any predicate.
+            obj (str): URI the object has to be, or be an entity of, None for any object.
+
+        Returns:
+            ndarray: bool per candidate, True if it occurs.
+        """
+        found = self._found(side, position, subject, predicate, obj)
+        present = np.zeros(len(self.dictionary), dtype=bool)
+        present[found] = True
+        if match != "entity":
+            # the classes of the found entities occur in the class expanded sense
+            taxonomy = self.taxonomy
+            instances = np.unique(found[found < len(taxonomy)])
+            classes = np.zeros(len(self.dictionary), dtype=bool)
+            classes[_gather(taxonomy.ancestors, instances[~taxonomy.isClass[instances]])] = True
+            present = classes if match == "class" else present | classes
+
+        ids = self.dictionary.lookupAll(candidates)
+        return (ids >= 0) & present[np.maximum(ids, 0)]
+
+    def anyOccurring(self, candidates, match, side, position, subject=None, predicate=None, obj=None):
+        """
+        Checks whether at least one candidate occurs, with the same constraints as occurring. The candidates are checked in their
+        order and the check stops at the first occurring one. The found entities are not expanded to their classes, for a
+        candidate class its own entities are looked up instead.
+
+        Parameters:
+            candidates (iterable): URIs of the candidate entities.
+            match, side, position, subject, predicate, obj: see occurring
+
+        Returns:
+            bool: True if a candidate occurs.
+        """
+        present = np.zeros(len(self.dictionary), dtype=bool)
+        present[self._found(side, position, subject, predicate, obj)] = True
+        taxonomy = self.taxonomy
+        for uri in candidates:
+            candidate = self.dictionary.lookup(uri)
+            if candidate is None:
+                continue
+            if match != "class" and present[candidate]:
+                return True
+            if match != "entity" and candidate < len(taxonomy) and taxonomy.isClass[candidate]:
+                if present[taxonomy.instancesOf(candidate)].any():
+                    return True
+        return False
+
+    def occurringPredicates(self, candidates, side, subject=None, obj=None):
+        """
+        Checks which candidate verbs occur in a design triple for a coin side, with any coin type like the verb queries.
+
+        Parameters:
+            candidates (list): URIs of the candidate verbs.
+            side (str): Coin side, 'obverse' or 'reverse'.
+            subject (str): URI the subject has to be, or be an entity of, None for any subject.
+            obj (str): URI the object has to be, or be an entity of, None for any object.
+
+        Returns:
+            ndarray: bool per candidate, True if it occurs.
+        """
+        columns, mask = self._sideRows(side, subject, None, obj, numismatic=False)
+        # like in the verb queries, a triple without subject or object does not count even if they are not entered
+        mask &= (columns["subject"] >= 0) & (columns["object"] >= 0)
+        found = columns["predicate"][mask]
+        present = np.zeros(len(self.dictionary), dtype=bool)
+        present[found[found >= 0]] = True
+        ids = self.dictionary.lookupAll(candidates)
+        return (ids >= 0) & present[np.maximum(ids, 0)]
@@ -0,0 +1,184 @@
+from collections import namedtuple
+import json
+import re
+
+
+_TOKEN_PATTERN = re.compile(r"C\d+|AND|OR|NOT|\(|\)|\S")
+
+# a coin description of the boolean term, coin is its number (C1 is 1)
+Leaf = namedtuple("Leaf", ["coin", "negated"])
+
+# AND respectively OR of at least two terms
+Node = namedtuple("Node", ["operator", "children"])
+
+_DUAL = {"AND": "OR", "OR": "AND"}
+
+
+def parseBooleanTerm(booleanTerm, coins=None):
+    """
+    Parses the boolean term combining the coin descriptions of a search, e.g. "C1 AND NOT (C2 OR C3)", into a normalized term.
+
+    OR binds stronger than AND, like in the generated query (UNION binds stronger than the join of groups). The term is normalized:
+        - NOT is moved to the descriptions with De Morgan's laws (a negated description is answered by its own query part)
+        - nested terms of the same operator are flattened, repeated terms removed and the terms sorted, so equal terms are equal tuples
+        - descriptions that are equal to an earlier one are replaced by it
+        - terms shared by all branches are factored out, e.g. (C1 AND C2) OR (C1 AND C3) becomes C1 AND (C2 OR C3), and
+          absorbed terms are removed, e.g. C1 AND (C1 OR C2) becomes C1
+
+    Parameters:
+        booleanTerm (str): The boolean term.
+        coins (list): The coin descriptions, C1 is the first one. If given, the descriptions are checked and compared.
+
+    Returns:
+        Leaf or Node: The normalized term, None if the boolean term is empty.
+
+    Raises:
+        ValueError: If the boolean term is malformed or refers to a missing description.
+    """
+    tokens = _TOKEN_PATTERN.findall(booleanTerm)
+    if not tokens:
+        return None
+
+    canonical = {}
+    if coins is not None:
+        first = {}
+        for number, coin in enumerate(coins, 1):
+            canonical[number] = first.setdefault(json.dumps(coin, sort_keys=True), number)
+
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take(expected=None):
+        nonlocal position
+        token = peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f"Malformed boolean term: {booleanTerm}")
+        position += 1
+        return token
+
+    # returns the term, negated pushes a NOT down to the descriptions
+    def conjunction(negated):
+        children = [disjunction(negated)]
+        while peek() == "AND":
+            take()
+            children.append(disjunction(negated))
+        return children[0] if len(children) == 1 else Node("OR" if negated else "AND", tuple(children))
+
+    def disjunction(negated):
+        children = [unary(negated)]
+        while peek() == "OR":
+            take()
+            children.append(unary(negated))
+        return children[0] if len(children) == 1 else Node("AND" if negated else "OR", tuple(children))
+
+    def unary(negated):
+        token = take()
+        if token == "NOT":
+            return unary(not negated)
+        if token == "(":
+            term = conjunction(negated)
+            take(")")
+            return term
+        if re.fullmatch(r"C\d+", token):
+            number = int(token[1:])
+            if coins is not None:
+                if not 1 <= number <= len(coins):
+                    raise ValueError(f"Unknown coin description {token}")
+                number = canonical[number]
+            return Leaf(number, negated)
+        raise ValueError(f"Malformed boolean term: {booleanTerm}")
+
+    term = conjunction(False)
+    if peek() is not None:
+        raise ValueError(f"Malformed boolean term: {booleanTerm}")
+    return _normalized(term)
+
+
+def _key(term):
+    """
+    Returns the sort key of a term, leaves before nodes.
+    """
+    if isinstance(term, Leaf):
+        return (0, term.coin, term.negated)
+    return (1, term.operator, tuple(_key(child) for child in term.children))
+
+
+def _combined(operator, children):
+    """
+    Returns the flattened term of an operator over normalized terms, without repeated terms and sorted.
+
+    Parameters:
+        operator (str): "AND" or "OR".
+        children (iterable): The normalized terms.
+
+    Returns:
+        Leaf or Node: The term, the only child if there is just one.
+    """
+    flat = []
+    for child in children:
+        if isinstance(child, Node) and child.operator == operator:
+            flat.extend(child.children)
+        else:
+            flat.append(child)
+    flat = sorted(dict.fromkeys(flat), key=_key)
+    return flat[0] if len(flat) == 1 else Node(operator, tuple(flat))
+
+
+def _normalized(term):
+    """
+    Normalizes a term with NOT already moved to the descriptions, see parseBooleanTerm.
+    """
+    if isinstance(term, Leaf):
+        return term
+    term = _combined(term.operator, (_normalized(child) for child in term.children))
+    if isinstance(term, Leaf):
+        return term
+    # absorption: A AND (A OR B) is A, A OR (A AND B) is A
+    dual = _DUAL[term.operator]
+    siblings = set(term.children)
+    children = [
+        child for child in term.children
+        if not (isinstance(child, Node) and child.operator == dual and siblings.intersection(child.children))
+    ]
+    if len(children) < len(term.children):
+        term = _combined(term.operator, children)
+        if isinstance(term, Leaf):
+            return term
+    return _factored(term)
+
+
+def _factored(term):
+    """
+    Factors the terms all branches of a normalized node share out of it: (A AND B) OR (A AND C) is A AND (B OR C),
+    (A OR B) AND (A OR C) is A OR (B AND C). If a branch only consists of the shared terms, the other branches are absorbed.
+    """
+    dual = _DUAL[term.operator]
+    branches = [child.children if isinstance(child, Node) and child.operator == dual else (child,) for child in term.children]
+    shared = set(branches[0]).intersection(*branches[1:])
+    if not shared:
+        return term
+    remainders = [tuple(child for child in branch if child not in shared) for branch in branches]
+    shared = sorted(shared, key=_key)
+    if not all(remainders):
+        return _combined(dual, shared)
+    rest = Node(term.operator, tuple(remainder[0] if len(remainder) == 1 else Node(dual, remainder) for remainder in remainders))
+    return _combined(dual, shared + [_normalized(rest)])
+
+
+def formatBooleanTerm(term):
+    """
+    Returns the text of a term, every nested term in brackets.
+
+    Parameters:
+        term (Leaf or Node): The term.
+
+    Returns:
+        str: The boolean term, e.g. "C1 AND (NOT C2 OR C3)".
+    """
+    if isinstance(term, Leaf):
+        return ("NOT " if term.negated else "") + f"C{term.coin}"
+    return f" {term.operator} ".join(
+        formatBooleanTerm(child) if isinstance(child, Leaf) else f"({formatBooleanTerm(child)})" for child in term.children
+    )
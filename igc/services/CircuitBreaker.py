@@ -0,0 +1,200 @@
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import threading
+import time
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of sending a query while the circuit breaker is open.
+    """
+
+
+# flags of the current request, shared with the worker threads its queries run on
+_response_flags = contextvars.ContextVar("response_flags", default=None)
+
+
+@contextmanager
+def degradedScope():
+    """
+    Collects for the block whether any answer was degraded, i.e. served from a stale cache or left out
+    because the endpoint was unavailable.
+
+    Yields:
+        dict: {"degraded": bool}, updated by markDegraded.
+    """
+    flags = {"degraded": False}
+    token = _response_flags.set(flags)
+    try:
+        yield flags
+    finally:
+        _response_flags.reset(token)
+
+
+def markDegraded():
+    """
+    Marks the answer of the current request as degraded.
+    """
+    flags = _response_flags.get()
+    if flags is not None:
+        flags["degraded"] = True
+
+
+class CircuitBreaker():
+    """
+    Circuit breaker for the SPARQL endpoint.
+
+    In the closed state all calls pass and their outcome and latency is recorded for a sliding time window.
+    If enough calls in the window failed or were slow, the breaker opens and calls are refused for open_seconds,
+    so worker threads do not pile up on a stalled endpoint. Afterwards it is half open: a few trial calls pass,
+    if they succeed the breaker closes again, if one fails it opens again.
+
+    Attributes:
+        window (float): Seconds of calls considered for the failure and slow call rates.
+        min_calls (int): Minimum number of calls in the window before the breaker may open.
+        failure_rate (float): Share of failed calls in the window at which the breaker opens.
+        slow_call (float): Seconds after which a successful call counts as slow.
+        slow_rate (float): Share of slow calls in the window at which the breaker opens.
+        open_seconds (float): Seconds calls are refused after the breaker opened.
+        half_open_calls (int): Number of trial calls allowed at the same time in the half open state.
+        state (str): "closed", "open" or "half-open".
+    """
+
+    def __init__(self, window=30, min_calls=10, failure_rate=0.5, slow_call=5, slow_rate=0.8, open_seconds=15, half_open_calls=2):
+        """
+        Initializes a closed circuit breaker.
+
+        Parameters:
+            window (float): Seconds of calls considered for the failure and slow call rates.
+            min_calls (int): Minimum number of calls in the window before the breaker may open.
+            failure_rate (float): Share of failed calls in the window at which the breaker opens.
+            slow_call (float): Seconds after which a successful call counts as slow.
+            slow_rate (float): Share of slow calls in the window at which the breaker opens.
+            open_seconds (float): Seconds calls are refused after the breaker opened.
+            half_open_calls (int): Number of trial calls allowed at the same time in the half open state.
+        """
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = "closed"
+        self._calls = deque()
+        self._opened = 0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Decides whether a call may be sent. In the half open state an allowed call is a trial call,
+        whose outcome has to be recorded with recordSuccess or recordFailure.
+
+        Returns:
+            bool: True if the call may be sent.
+        """
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened < self.open_seconds:
+                    return False
+                self.state = "half-open"
+                self._trials = 0
+                print("SPARQL circuit breaker half open")
+            if self.state == "half-open":
+                if self._trials >= self.half_open_calls:
+                    return False
+                self._trials += 1
+            return True
+
+    def isOpen(self):
+        """
+        Returns whether calls are currently refused, without claiming a trial call.
+
+        Returns:
+            bool: True if the breaker is open and its open period has not passed yet.
+        """
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened < self.open_seconds
+
+    def recordSuccess(self, latency):
+        """
+        Records a successful call.
+
+        Parameters:
+            latency (float): Duration of the call in seconds.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self.state = "closed"
+                self._calls.clear()
+                print("SPARQL circuit breaker closed")
+                return
+            self._record(False, latency >= self.slow_call)
+
+    def release(self):
+        """
+        Ends a call without recording an outcome, e.g. a call aborted because the time budget of its request was used up.
+        A trial call of the half open state frees its slot for the next call.
+        """
+        with self._lock:
+            if self.state == "half-open" and self._trials > 0:
+                self._trials -= 1
+
+    def recordFailure(self):
+        """
+        Records a failed call, i.e. the endpoint was not reachable, timed out or answered with a server error.
+        """
+        with self._lock:
+            if self.state == "half-open":
+                self._open()
+                return
+            self._record(True, False)
+
+    def _record(self, failed, slow):
+        """
+        Adds a call to the window and opens the breaker if the failure or slow call rate is reached. Requires the lock.
+
+        Parameters:
+            failed (bool): Whether the call failed.
+            slow (bool): Whether the call was slow.
+        """
+        if self.state != "closed":
+            return
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for call in self._calls if call[1])
+        slow_calls = sum(1 for call in self._calls if call[2])
+        if failures >= self.failure_rate * calls or slow_calls >= self.slow_rate * calls:
+            self._open()
+
+    def _open(self):
+        """
+        Opens the breaker. Requires the lock.
+        """
+        self.state = "open"
+        self._opened = time.monotonic()
+        self._calls.clear()
+        print("SPARQL circuit breaker opened")
+
+    def stats(self):
+        """
+        Returns the state of the breaker.
+
+        Returns:
+            dict: state and the number of calls, failures and slow calls in the current window
+        """
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "failures": sum(1 for call in self._calls if call[1]),
+                "slow_calls": sum(1 for call in self._calls if call[2]),
+            }
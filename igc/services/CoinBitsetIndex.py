@@ -0,0 +1,445 @@
+import numpy as np
+
+from services.AppearanceIndex import SIDES
+from services.BooleanTerm import Leaf, parseBooleanTerm
+from services.SourceFingerprint import SourceFingerprint
+
+
+# the coins and types a search can return, types only if a coin refers to them (like the thumbnail part of the search query)
+SEARCH_ITEM_QUERY = """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT DISTINCT ?url ?searchType WHERE {
+        {
+            ?url rdf:type nmo:NumismaticObject .
+            BIND("NumismaticObject" AS ?searchType)
+        }
+        UNION
+        {
+            ?url rdf:type nmo:TypeSeriesItem .
+            ?numismaticObject nmo:hasTypeSeriesItem ?url .
+            ?numismaticObject rdf:type nmo:NumismaticObject .
+            BIND("TypeSeriesItem" AS ?searchType)
+        }
+        FILTER EXISTS { ?url dcterms:identifier ?id . }
+    }
+    """
+
+
+class _Postings():
+    """
+    Sorted postings of one integer column: the rows with a value are one range of the column order.
+    """
+
+    def __init__(self, order, values):
+        self.order = order
+        self.values = values
+
+    @classmethod
+    def ofColumn(cls, column):
+        """
+        Sorts a column.
+
+        Parameters:
+            column (ndarray): The integer column.
+
+        Returns:
+            _Postings: The postings of the column.
+        """
+        order = np.argsort(column, kind="stable").astype(np.int32)
+        return cls(order, column[order])
+
+    def rows(self, values):
+        """
+        Returns the rows holding one of the values.
+
+        Parameters:
+            values (ndarray): The values.
+
+        Returns:
+            ndarray: Sorted row numbers.
+        """
+        starts = np.searchsorted(self.values, values, side="left")
+        ends = np.searchsorted(self.values, values, side="right")
+        if len(values) == 1:
+            return np.sort(self.order[starts[0]:ends[0]])
+        return np.unique(np.concatenate([self.order[start:end] for start, end in zip(starts, ends)] or [self.order[:0]]))
+
+
+class CoinBitsetIndex():
+    """
+    Evaluates the coin searches of generateQuery locally: every coin description resolves to a bitset of the matching coins
+    (respectively types) and the boolean term combines these bitsets with AND, OR and AND NOT. Only the metadata of the
+    resulting coins is queried from the endpoint afterwards.
+
+    The bitsets are numpy bool arrays packed to one bit per coin (np.packbits), the postings are the design triples of the
+    appearance index sorted by subject, predicate and object per side, so a triple of a description is an intersection of
+    sorted row lists.
+
+    A description matches like its query part of generateCoinQuery: subject and object are the given entity or, for a class
+    (category "list_class"), one of its entities, a subject alone is searched among the entities of the coin side, and all
+    positive keywords of a side have to match the same description of the iconography of the side. A negated description
+    matches the coins having triples (respectively entities) on the side of which none matches, a negated keyword matches
+    the coins without a description of the side containing it. The keywords are looked up in the keyword index.
+
+    Attributes:
+        appearances (AppearanceIndex): Design triples and entities of the coin sides, the coin ids up to its number of coins are its coin ids.
+        dictionary (UriDictionary): URI encoding of the coins, shared with the appearance index.
+        coins (ndarray): int32 dictionary id of every coin and type, indexed by coin id.
+        searchItems (dict): Search type ("NumismaticObject", "TypeSeriesItem") -> bitset of the coins a search of this type returns.
+        keywords (KeywordIndex): Full text index of the iconography descriptions.
+        fingerprint (str): SourceFingerprint of the search items, the design triples belong to the appearance index.
+    """
+
+    def __init__(self, appearances, search_items, keywords):
+        """
+        Builds the index.
+
+        Parameters:
+            appearances (AppearanceIndex): Design triples and entities of the coin sides.
+            search_items (iterable): (URI, search type) pairs of the coins and types a search can return.
+            keywords (KeywordIndex): Full text index of the iconography descriptions.
+        """
+        self.appearances = appearances
+        self.dictionary = appearances.dictionary
+        self.coins = appearances.coins.tolist()
+        # dictionary id -> coin id, only needed while the coins are numbered
+        self._coinIds = {id: coin for coin, id in enumerate(self.coins)}
+
+        items = {}
+        fingerprint = SourceFingerprint()
+        for uri, search_type in fingerprint.rows("searchItem", search_items):
+            items.setdefault(search_type, []).append(self._coin(uri))
+
+        self.keywords = keywords
+        self.fingerprint = str(fingerprint)
+        self.coins = np.array(self.coins, dtype=np.int32)
+        self._coinIds = None
+        self._coinOrder = np.argsort(self.coins, kind="stable").astype(np.int32)
+        self.searchItems = {search_type: self._bitset(coins) for search_type, coins in items.items()}
+
+        # postings of the design triples and entities per side, row numbers are relative to the side
+        self._triples = {}
+        self._entities = {}
+        self._sideCoins = {}
+        self._appearanceCoins = {}
+        for code, side in enumerate(SIDES):
+            rows = slice(appearances.tripleSides[code], appearances.tripleSides[code + 1])
+            columns = {name: column[rows] for name, column in appearances.triples.items()}
+            self._triples[side] = (columns["coin"], {name: _Postings.ofColumn(columns[name]) for name in ("subject", "predicate", "object")})
+            self._sideCoins[side] = self._bitset(columns["coin"])
+
+            rows = slice(appearances.entitySides[code], appearances.entitySides[code + 1])
+            entity_coins = appearances.entities["coin"][rows]
+            self._entities[side] = (entity_coins, _Postings.ofColumn(appearances.entities["entity"][rows]))
+            self._appearanceCoins[side] = self._bitset(entity_coins)
+
+    @classmethod
+    def fromEndpoint(cls, transport, appearances, keywords, timeout=300):
+        """
+        Builds the index from the search items of a SPARQL endpoint, the appearance index and the keyword index.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            appearances (AppearanceIndex): Design triples and entities of the coin sides.
+            keywords (KeywordIndex): Full text index of the iconography descriptions.
+            timeout (float): Read timeout of the query in seconds.
+
+        Returns:
+            CoinBitsetIndex: The built index.
+        """
+        return cls(
+            appearances,
+            (tuple(row) for row in transport.stream(SEARCH_ITEM_QUERY, timeout=timeout)),
+            keywords,
+        )
+
+    @staticmethod
+    def sourceFingerprint(transport, timeout=300):
+        """
+        Returns the fingerprint an index built from the endpoint now would have, without building it.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of the query in seconds.
+
+        Returns:
+            str: The fingerprint, see SourceFingerprint.
+        """
+        fingerprint = SourceFingerprint()
+        for row in transport.stream(SEARCH_ITEM_QUERY, timeout=timeout):
+            fingerprint.add("searchItem", *row)
+        return str(fingerprint)
+
+    def addTo(self, writer, name):
+        """
+        Adds the index to a snapshot, the appearance index is added separately and the keyword index is no part of it.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        writer.metadata[name] = {"searchTypes": list(self.searchItems), "fingerprint": self.fingerprint}
+        writer.add(name + ".coins", self.coins)
+        writer.add(name + ".coinOrder", self._coinOrder)
+        for search_type, bitset in self.searchItems.items():
+            writer.add(f"{name}.searchItems.{search_type}", bitset)
+        for side in SIDES:
+            _, postings = self._triples[side]
+            for column, posting in postings.items():
+                writer.add(f"{name}.{side}.{column}.order", posting.order)
+                writer.add(f"{name}.{side}.{column}.values", posting.values)
+            posting = self._entities[side][1]
+            writer.add(f"{name}.{side}.entity.order", posting.order)
+            writer.add(f"{name}.{side}.entity.values", posting.values)
+            writer.add(f"{name}.{side}.sideCoins", self._sideCoins[side])
+            writer.add(f"{name}.{side}.appearanceCoins", self._appearanceCoins[side])
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name, appearances, keywords):
+        """
+        Opens an index of a snapshot without copying its arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+            appearances (AppearanceIndex): The appearance index of the snapshot.
+            keywords (KeywordIndex): The keyword index of the snapshot.
+
+        Returns:
+            CoinBitsetIndex: The index.
+        """
+        index = cls.__new__(cls)
+        index.appearances = appearances
+        index.dictionary = appearances.dictionary
+        index.keywords = keywords
+        index.fingerprint = snapshot.metadata[name]["fingerprint"]
+        index.coins = snapshot.array(name + ".coins")
+        index._coinIds = None
+        index._coinOrder = snapshot.array(name + ".coinOrder")
+        index.searchItems = {search_type: snapshot.array(f"{name}.searchItems.{search_type}") for search_type in snapshot.metadata[name]["searchTypes"]}
+        index._triples, index._entities, index._sideCoins, index._appearanceCoins = {}, {}, {}, {}
+        for code, side in enumerate(SIDES):
+            def postings(column):
+                return _Postings(snapshot.array(f"{name}.{side}.{column}.order"), snapshot.array(f"{name}.{side}.{column}.values"))
+            rows = slice(appearances.tripleSides[code], appearances.tripleSides[code + 1])
+            index._triples[side] = (appearances.triples["coin"][rows], {column: postings(column) for column in ("subject", "predicate", "object")})
+            rows = slice(appearances.entitySides[code], appearances.entitySides[code + 1])
+            index._entities[side] = (appearances.entities["coin"][rows], postings("entity"))
+            index._sideCoins[side] = snapshot.array(f"{name}.{side}.sideCoins")
+            index._appearanceCoins[side] = snapshot.array(f"{name}.{side}.appearanceCoins")
+        return index
+
+    def _coin(self, uri):
+        """
+        Returns the id of a coin, adding it if it is not known yet.
+
+        Parameters:
+            uri (str): The URI of the coin or type.
+
+        Returns:
+            int: The coin id.
+        """
+        id = self.dictionary.encode(uri)
+        coin = self._coinIds.get(id)
+        if coin is None:
+            coin = len(self.coins)
+            self._coinIds[id] = coin
+            self.coins.append(id)
+        return coin
+
+    def __len__(self):
+        return len(self.coins)
+
+    def _coinsOf(self, ids):
+        """
+        Returns the coin ids of dictionary ids.
+
+        Parameters:
+            ids (iterable): Dictionary ids.
+
+        Returns:
+            ndarray: The coin ids of the dictionary ids that are coins or types of the index.
+        """
+        ids = np.fromiter(ids, dtype=np.int64)
+        positions = np.searchsorted(self.coins, ids, sorter=self._coinOrder)
+        positions = np.minimum(positions, len(self.coins) - 1)
+        coins = self._coinOrder[positions]
+        return coins[self.coins[coins] == ids] if len(self.coins) else coins[:0]
+
+    def _bitset(self, coins):
+        """
+        Returns the bitset of coin ids.
+
+        Parameters:
+            coins (iterable): Coin ids, duplicates are allowed.
+
+        Returns:
+            ndarray: uint8 array with one bit per coin.
+        """
+        flags = np.zeros(len(self.coins), dtype=bool)
+        flags[np.asarray(coins, dtype=np.int64)] = True
+        return np.packbits(flags)
+
+    def members(self, bitset):
+        """
+        Returns the coin ids of a bitset.
+
+        Parameters:
+            bitset (ndarray): Bitset of coin ids.
+
+        Returns:
+            ndarray: Sorted coin ids.
+        """
+        return np.flatnonzero(np.unpackbits(bitset, count=len(self.coins)))
+
+    def _entityIds(self, uri, category):
+        """
+        Returns the entity ids an entered subject or object stands for.
+
+        Parameters:
+            uri (str): URI of the entity or class.
+            category (str): Category of the entered element, "list_class" for a class.
+
+        Returns:
+            ndarray: The entity ids, for a class the ids of its entities.
+        """
+        appearances = self.appearances
+        entity = appearances.entityId(uri)
+        if entity is None:
+            return np.zeros(0, dtype=np.int32)
+        if category == "list_class":
+            if entity >= len(appearances.taxonomy):
+                return np.zeros(0, dtype=np.int32)
+            return appearances.taxonomy.instancesOf(entity)
+        return np.array([entity], dtype=np.int32)
+
+    def _matchingCoins(self, side, items):
+        """
+        Returns the coins with a triple, respectively for a subject alone an entity, of the description on the side.
+
+        Parameters:
+            side (str): Coin side, 'obverse' or 'reverse'.
+            items (list): Subject, predicate and object items of the coin side, as sent by the frontend.
+
+        Returns:
+            ndarray: Bitset of the matching coins.
+        """
+        subject = subject_category = predicate = obj = object_category = None
+        for item in items:
+            if item["type"] == "Subj":
+                subject, subject_category = item["item"]["link"], item["category"]
+            elif item["type"] == "Predicate":
+                predicate = item["item"]["link"]
+            else:
+                obj, object_category = item["item"]["link"], item["category"]
+
+        if subject and not (predicate or obj):
+            coins, postings = self._entities[side]
+            return self._bitset(coins[postings.rows(self._entityIds(subject, subject_category))])
+
+        coins, postings = self._triples[side]
+        rows = None
+        for name, ids in (
+            ("subject", self._entityIds(subject, subject_category) if subject else None),
+            ("predicate", self._entityIds(predicate, None) if predicate else None),
+            ("object", self._entityIds(obj, object_category) if obj else None),
+        ):
+            if ids is None:
+                continue
+            matches = postings[name].rows(ids)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        if rows is None:
+            return self._sideCoins[side]
+        return self._bitset(coins[rows])
+
+    def _keywordCoins(self, side, keywords):
+        """
+        Returns the coins whose iconography descriptions of the side fulfil the keywords.
+
+        Parameters:
+            side (str): Coin side, 'obverse' or 'reverse'.
+            keywords (list): {"text": str, "negated": bool} keywords, as sent by the frontend.
+
+        Returns:
+            ndarray: Bitset of the coins, None if there are no keywords.
+        """
+        if not keywords:
+            return None
+        included, excluded = self.keywords.keywordCoins(side, keywords)
+        # coins that are neither coins nor types of the search items are not in the universe of the bitsets
+        result = None
+        if included is not None:
+            result = self._bitset(self._coinsOf(included))
+        if excluded:
+            excluded = self._bitset(self._coinsOf(excluded))
+            result = ~excluded if result is None else result & ~excluded
+        elif result is None:
+            result = ~self._bitset([])
+        return result
+
+    def descriptionCoins(self, coin, search_type, negated=False):
+        """
+        Returns the coins (respectively types) matching one coin description of the search.
+
+        Parameters:
+            coin (dict): The description with the items and keywords of both sides, as sent by the frontend.
+            search_type (str): "NumismaticObject" or "TypeSeriesItem".
+            negated (bool): Whether the description is negated in the boolean term.
+
+        Returns:
+            ndarray: Bitset of the matching coins.
+        """
+        result = self.searchItems.get(search_type, self._bitset([])).copy()
+        for side in SIDES:
+            if coin[side]["coin"]:
+                matching = self._matchingCoins(side, coin[side]["coin"])
+                if negated:
+                    single_word = all(item["type"] == "Subj" for item in coin[side]["coin"])
+                    present = self._appearanceCoins[side] if single_word else self._sideCoins[side]
+                    matching = present & ~matching
+                result &= matching
+            keywords = self._keywordCoins(side, coin[side]["keywords"])
+            if keywords is not None:
+                result &= keywords
+        return result
+
+    def evaluate(self, coins, booleanTerm, search_type):
+        """
+        Evaluates a search of generateQuery.
+
+        The boolean term is parsed and normalized like for the generated query (see parseBooleanTerm), a description is evaluated
+        once however often it occurs in the term.
+
+        Parameters:
+            coins (list): The coin descriptions, C1 is the first one.
+            booleanTerm (str): The boolean term combining the descriptions, e.g. "C1 AND (C2 OR NOT C3)".
+            search_type (str): "NumismaticObject" or "TypeSeriesItem".
+
+        Returns:
+            list: URIs of the matching coins, sorted.
+
+        Raises:
+            ValueError: If the boolean term is malformed or refers to a missing description.
+        """
+        term = parseBooleanTerm(booleanTerm, coins)
+        if term is None:
+            raise ValueError("Empty boolean term")
+
+        cache = {}
+
+        # returns the bitset of a term of the normalized boolean term
+        def bitset(term):
+            if isinstance(term, Leaf):
+                if term not in cache:
+                    cache[term] = self.descriptionCoins(coins[term.coin - 1], search_type, term.negated)
+                return cache[term]
+            results = [bitset(child) for child in term.children]
+            result = results[0]
+            for other in results[1:]:
+                result = result & other if term.operator == "AND" else result | other
+            return result
+
+        result = bitset(term)
+        return sorted(self.dictionary.decodeAll(self.coins[coin] for coin in self.members(result)))
@@ -1,6 +1,73 @@
-from rdflib import Graph
-from rdflib.plugins.stores import sparqlstore
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+import contextvars
+import hashlib
+import itertools
+import json
+import os
 import re
+import threading
+import time
+
+import requests
+
+from services.BooleanTerm import Leaf, parseBooleanTerm
+from services.CircuitBreaker import CircuitOpen, markDegraded
+from services.LocalIndexes import LocalIndexes
+from services.QueryBudget import QueryTimeout, currentDeadline, remainingBudget, submitWithBudget, waitForResult
+from services.QueryResultCache import queryFingerprint
+from services.QueryTemplates import sparqlIri, sparqlLiteral
+from services.RecommendationQueries import (
+    ABSOLUTE_GENERALISE, ABSOLUTE_SPECIALISE, EQUIVALENT, EQUIVALENT_AVAILABLE, PREDICATES, PREDICATES_OCCURRING_ON_COINS,
+    RECOMMENDATIONS_AVAILABLE, SIMPLE_GENERALISE, SIMPLE_GENERALISE_AVAILABLE, SIMPLE_SPECIALISE, SPECIALISE_AVAILABLE,
+    SUBJECT_OR_OBJECT_CLASSES, SUBJECTS_OR_OBJECTS_APART_FROM_CLASSES, SUBJECTS_OR_OBJECTS_OCCURRING_ON_COINS, sideProperty,
+)
+from services.ResultCursor import ResultCursor
+from services.SingleFlight import SingleFlight
+from services.SparqlTransport import SparqlTransport
+
+# not recommended as a generalisation or specialisation
+OCRE_OBJECT_OBJECT = "http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object"
+
+# seconds before the deadline of a request from which a timed out call counts as aborted by the budget, see _breakerCall
+BUDGET_ABORT_MARGIN = 0.05
+
+# variables of a SPARQL pattern
+_VARIABLE_PATTERN = re.compile(r"\?\w+")
+
+# metacharacters of the regular expressions of SPARQL (XPath and Java syntax)
+_REGEX_META_PATTERN = re.compile(r"[\\.^$|?*+()\[\]{}-]")
+
+# variables of the coin search results
+SEARCH_VARIABLES = "?url ?thumbnailObverse ?thumbnailReverse ?descriptionObverse ?descriptionReverse ?date ?maxDiameter ?id ?weight ?type ?mint"
+
+# query parts of the search result variables the results can be sorted by
+SORT_VARIABLE_PARTS = {
+    "weight": "OPTIONAL { ?url nmo:hasWeight ?weight . }",
+    "mint": "OPTIONAL { ?url nmo:hasMint ?mint . }",
+    "date": "OPTIONAL { ?url nmo:hasDate ?date . FILTER (lang(?date) = 'en') }",
+    "maxDiameter": "OPTIONAL { ?url nmo:hasMaxDiameter ?maxDiameter . }",
+}
+
+
+def keywordRegex(keyword, negated=False):
+    """
+    Turns a keyword into the pattern of a SPARQL regex filter, used while the keyword index is not loaded.
+    The keyword is matched literally as a substring of the description, regex metacharacters are escaped. As in the original
+    search, a keyword matches case sensitive and a negated keyword case insensitive, so "apollo" does not find "Apollo",
+    but "NOT apollo" excludes it.
+
+    Parameters:
+        keyword (str): The keyword as entered.
+        negated (bool): Whether the keyword is negated.
+
+    Returns:
+        str: The arguments of regex after the text, e.g. '"Zeus \\\\(seated"' or '"apollo", "i"'.
+    """
+    pattern = sparqlLiteral(_REGEX_META_PATTERN.sub(lambda match: "\\" + match.group(0), keyword))
+    return pattern + ', "i"' if negated else pattern
+
 
 class CoinSearchHandler():
     """
@@ -9,17 +76,66 @@ class CoinSearchHandler():
 
     Attributes:
         endpoint (str): SPARQL endpoint URL.
-        store (SPARQLStore): The SPARQL store connected to the endpoint.
-        g (Graph): RDFLib Graph connected to the SPARQL store.
+        transport (SparqlTransport): Pooled HTTP transport used to send the queries to the endpoint.
+        bundleExecutor (ThreadPoolExecutor): Bounded worker pool on which the queries of a triple context bundle run concurrently.
+        queryExecutor (ThreadPoolExecutor): Worker pool for independent queries of a single recommendation function.
+                                            Separate from bundleExecutor, because bundle tasks wait on these queries.
+        cache (QueryResultCache): In-process cache for the results of executeQuery, None if results are not cached in process.
+        diskCache (DiskResultCache): On-disk cache for the results of executeQuery shared by all worker processes, None if not used.
+        datasetVersion (str): Version of the dataset the cached results belong to, used if there is no versionProbe.
+        versionProbe (DatasetVersionProbe): Detects changes of the dataset, cached results are namespaced by its version.
+        singleFlight (SingleFlight): Coalesces identical queries running at the same time into one request to the endpoint.
+        breaker (CircuitBreaker): Refuses queries while the endpoint fails or stalls, None if every query is sent.
+        indexes (LocalIndexes): Current generation of the local indexes, None while they are not loaded. A request uses the
+                                generation that was current when it pinned them (see pinnedIndexes), the attributes below read from it.
+        taxonomy (TaxonomyIndex): Class hierarchy the generalise, specialise and equivalent recommendations are answered from,
+                                  None while it is not loaded, then these recommendations are queried from the endpoint.
+        labels (LabelIndex): Prefix index of the names for the subject, object and predicate recommendations, None while it is not loaded.
+        appearances (AppearanceIndex): Triples and entities on the coin sides the coin occurrence of the recommendations is checked with,
+                                       None while it is not loaded, then the occurrence is checked by the endpoint.
+        keywords (KeywordIndex): Full text index the keywords of generateQuery are resolved to candidate coins with,
+                                 None while it is not loaded, then the keywords are regex filters of the query.
+        coinIndex (CoinBitsetIndex): Bitsets the coin searches of generateQuery are evaluated with, None while it is not loaded.
+        index_snapshot (str): Path of the snapshot the local indexes are opened from instead of building them, None to always build them.
+        index_timeout (float): Read timeout in seconds of the queries the local indexes are built from.
+        occurrence_batch (int): Maximum number of candidate entities checked for coin occurrence by one query.
+        hydration_batch (int): Maximum number of matched coins whose metadata is queried by one query.
+        hydration_workers (int): Maximum number of metadata queries of one search running at the same time.
+        cursors (QueryResultCache): Cache for the result cursors of the coin searches, None if every page runs the search again.
         _query_head (str): Common prefixes and initial part of the SPARQL query.
     
     Author: ??? , UPDATE by Nico Lambert
     """
 
-    def __init__(self):
+    def __init__(self, transport=None, bundle_workers=8, query_workers=16, cache=None, disk_cache=None, dataset_version="", version_probe=None, breaker=None, taxonomy=None, labels=None, appearances=None, keywords=None, coin_index=None, index_snapshot=None, index_timeout=300, occurrence_batch=500, hydration_batch=500, hydration_workers=4, cursors=None):
         """
         Initializes the CoinSearchHandler with a specific SPARQL endpoint.
 
+        Parameters:
+            transport (SparqlTransport): Transport to send the queries with. Handlers sharing a transport share its connection pool.
+                                         If None, a transport for the default endpoint is created.
+            bundle_workers (int): Size of the worker pool for getTripleContextBundle.
+            query_workers (int): Size of the worker pool for independent queries of a recommendation function.
+            cache (QueryResultCache): In-process cache for the results of executeQuery.
+            disk_cache (DiskResultCache): On-disk cache consulted when the in-process cache has no fresh result.
+                                          If both caches are None, every query is sent to the endpoint.
+            dataset_version (str): Version of the dataset the cached results belong to, if version_probe is None.
+            version_probe (DatasetVersionProbe): Probe for the dataset version. When the version changes, cached results are no longer served.
+            breaker (CircuitBreaker): Circuit breaker for the queries to the endpoint. While it is open, cached results are served
+                                      and marked as degraded, queries without a cached result fail with CircuitOpen.
+            taxonomy (TaxonomyIndex): Class hierarchy for the hierarchy recommendations, see also loadIndexes.
+            labels (LabelIndex): Prefix index of the names for the subject, object and predicate recommendations.
+            appearances (AppearanceIndex): Triples and entities on the coin sides for the coin occurrence checks.
+            keywords (KeywordIndex): Full text index of the iconography descriptions for the keywords.
+            coin_index (CoinBitsetIndex): Bitsets for the local evaluation of the coin searches.
+            index_snapshot (str): Path of an index snapshot written by LocalIndexes.write (manage.py buildindexsnapshot).
+            index_timeout (float): Read timeout in seconds of the queries the local indexes are built from.
+            occurrence_batch (int): Maximum number of candidate entities checked for coin occurrence by one query.
+            hydration_batch (int): Maximum number of matched coins whose metadata is queried by one query.
+            hydration_workers (int): Maximum number of metadata queries of one search running at the same time.
+            cursors (QueryResultCache): Cache for the result cursors of the coin searches (see searchCursor), None to run the search
+                                        for every page.
+
         Author: Danilo Pantic
         """
         
@@ -29,8 +145,32 @@ class CoinSearchHandler():
         self.endpoint = "http://localhost:3030/db_cn/sparql"
         #------------------------------------------------------------- (END) UPDATE by Nico Lambert and Steven Nowak ------------------------------------------------------------
         
-        self.store = sparqlstore.SPARQLStore(self.endpoint)
-        self.g = Graph(self.store)
+        if transport is None:
+            transport = SparqlTransport(self.endpoint)
+        self.transport = transport
+        self.endpoint = transport.endpoint
+        self.bundleExecutor = ThreadPoolExecutor(max_workers=bundle_workers, thread_name_prefix="bundle")
+        self.queryExecutor = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix="query")
+        self.cache = cache
+        self.diskCache = disk_cache
+        self.datasetVersion = dataset_version
+        self.versionProbe = version_probe
+        if version_probe is not None:
+            version_probe.addListener(self._onDatasetChanged)
+        self.singleFlight = SingleFlight()
+        self.breaker = breaker
+        self.indexes = None
+        if taxonomy is not None or coin_index is not None:
+            dictionary = taxonomy.dictionary if taxonomy is not None else coin_index.dictionary
+            self.indexes = LocalIndexes(dictionary, taxonomy, labels, appearances, keywords, coin_index)
+        self._pinnedIndexes = contextvars.ContextVar(f"pinned_indexes_{id(self)}", default=None)
+        self.index_snapshot = index_snapshot
+        self.index_timeout = index_timeout
+        self.occurrence_batch = occurrence_batch
+        self.hydration_batch = hydration_batch
+        self.hydration_workers = hydration_workers
+        self.cursors = cursors
+        self._index_lock = threading.Lock()
         self._query_head = """
         PREFIX nmo: <http://nomisma.org/ontology#>
         PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
@@ -41,20 +181,402 @@ class CoinSearchHandler():
     def executeQuery(self, query):
         """
         Executes a SPARQL query against the configured endpoint and returns the results.
+        The query is aborted when the time budget of the current request (see QueryBudget) is used up.
         
         Parameters:
             query (str): The SPARQL query to be executed.
 
         Returns:
             list: A list of results obtained from the query execution.
+
+        Raises:
+            QueryTimeout: If the time budget of the current request was used up.
+            CircuitOpen: If the endpoint is considered unavailable and there is no cached result.
         
         Author: Danilo Pantic
         """
-        return self.g.query(query)
+        remaining = remainingBudget()
+        key = queryFingerprint(query)
+        if self.cache is None and self.diskCache is None:
+            return self._coalesce(key, remaining, self._fetchQuery, query, remaining)
+
+        version = self.currentDatasetVersion()
+        if version is None:
+            # the dataset version is unknown, so a cached result might belong to other data
+            return self._coalesce(key, remaining, self._fetchQuery, query, remaining)
+
+        cached = self._getCachedResult(key, version)
+        if cached is not None:
+            result, fresh = cached
+            if not fresh:
+                if self.breaker is not None and self.breaker.isOpen():
+                    # the endpoint is unavailable, the stale result is the best answer there is
+                    markDegraded()
+                elif self.cache is None or self.cache.startRefresh(f"{version}:{key}"):
+                    # serve the stale result now and replace it once the endpoint answered
+                    self.queryExecutor.submit(self._refreshCachedQuery, key, version, query)
+            return result
+
+        # concurrent misses of the same query wait for the first one instead of querying the endpoint themselves
+        return self._coalesce(f"{version}:{key}", remaining, self._fetchCachedQuery, key, version, query, remaining)
+
+    def _coalesce(self, key, remaining, function, *args):
+        """
+        Runs function(*args) through the single flight registry, waiting at most for the remaining budget.
+
+        Parameters:
+            key (str): Key identifying identical queries.
+            remaining (float): Remaining budget of the request in seconds, None for no limit.
+            function (function): The function executing the query.
+            *args: Arguments of the function.
+
+        Returns:
+            Result: The rdflib query result.
+        """
+        for attempt in range(3):
+            try:
+                return self.singleFlight.do(key, function, *args, timeout=remaining)
+            except FutureTimeoutError:
+                raise QueryTimeout("The time budget of the request is used up")
+            except QueryTimeout:
+                # the running query may have belonged to a request with a shorter budget,
+                # it is only retried if this request has time left
+                remaining = remainingBudget()
+                if attempt == 2:
+                    raise
+                args = args[:-1] + (remaining,)
+
+    def _fetchQuery(self, query, remaining=None):
+        """
+        Executes a query against the endpoint. With a budget, the endpoint is asked to abort the query when it is used up.
+
+        Parameters:
+            query (str): The SPARQL query.
+            remaining (float): Remaining budget of the request in seconds, None for the default timeouts.
+
+        Returns:
+            Result: The rdflib query result.
+
+        Raises:
+            CircuitOpen: If the circuit breaker refuses the query.
+        """
+        with self._breakerCall():
+            return self.transport.query(query, timeout=remaining, server_timeout=remaining)
+
+    @contextmanager
+    def _breakerCall(self):
+        """
+        Runs a call to the endpoint in the block through the circuit breaker. Every allowed call records exactly one outcome
+        or is released, also if the block is left by KeyboardInterrupt or GeneratorExit, so a trial call of the half open state
+        is never lost.
+
+        Connection errors, timeouts of the transport and server errors count as failures. A call aborted because the time
+        budget of the request is used up (e.g. the short budget of the autocomplete) says nothing about the endpoint, it is
+        released without an outcome. A client error means the query is wrong, not that the endpoint is unhealthy, it counts
+        as a success like every other outcome.
+
+        Raises:
+            CircuitOpen: If the circuit breaker refuses the call.
+        """
+        if self.breaker is None:
+            yield
+            return
+
+        if not self.breaker.allow():
+            markDegraded()
+            raise CircuitOpen("The SPARQL endpoint is unavailable at the moment")
+        start = time.monotonic()
+        outcome = "success"
+        try:
+            yield
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code >= 500:
+                outcome = "failure"
+            raise
+        except QueryTimeout:
+            # with a budget the transport times out at its deadline, the endpoint may just not have been fast enough for it
+            deadline = currentDeadline()
+            outcome = "aborted" if deadline is not None and time.monotonic() >= deadline - BUDGET_ABORT_MARGIN else "failure"
+            raise
+        except requests.exceptions.RequestException:
+            outcome = "failure"
+            raise
+        finally:
+            if outcome == "failure":
+                self.breaker.recordFailure()
+            elif outcome == "aborted":
+                self.breaker.release()
+            else:
+                self.breaker.recordSuccess(time.monotonic() - start)
+
+    def _fetchCachedQuery(self, key, version, query, remaining=None):
+        """
+        Executes a query against the endpoint and stores its result in the caches.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version the result belongs to.
+            query (str): The SPARQL query.
+            remaining (float): Remaining budget of the request in seconds, None for the default timeouts.
+
+        Returns:
+            Result: The rdflib query result.
+        """
+        result = self._fetchQuery(query, remaining)
+        self._setCachedResult(key, version, result)
+        return result
+
+    def currentDatasetVersion(self):
+        """
+        Returns the version of the dataset behind the endpoint. Caches and indexes use it to tell apart results of different data.
+
+        Returns:
+            str: The dataset version, None if the version probe has not succeeded yet.
+        """
+        if self.versionProbe is None:
+            return self.datasetVersion
+        return self.versionProbe.current()
+
+    def _onDatasetChanged(self, old_version, new_version):
+        """
+        Drops the cached results of the old dataset version. Called by the version probe.
+
+        Parameters:
+            old_version (str): The previous dataset version, None on the first successful probe.
+            new_version (str): The new dataset version.
+        """
+        if self.cache is not None:
+            self.cache.clear()
+        if self.cursors is not None:
+            self.cursors.clear()
+        if self.diskCache is not None and old_version is not None:
+            self.diskCache.prune(new_version)
+        if self.indexes is not None and old_version is not None:
+            # the old indexes keep answering until the new ones are ready
+            threading.Thread(target=self.refreshIndexes, name="indexes", daemon=True).start()
+
+    @property
+    def taxonomy(self):
+        indexes = self.currentIndexes()
+        return None if indexes is None else indexes.taxonomy
+
+    @property
+    def labels(self):
+        indexes = self.currentIndexes()
+        return None if indexes is None else indexes.labels
+
+    @property
+    def appearances(self):
+        indexes = self.currentIndexes()
+        return None if indexes is None else indexes.appearances
+
+    @property
+    def keywords(self):
+        indexes = self.currentIndexes()
+        return None if indexes is None else indexes.keywords
+
+    @property
+    def coinIndex(self):
+        indexes = self.currentIndexes()
+        return None if indexes is None else indexes.coinIndex
+
+    def currentIndexes(self):
+        """
+        Returns the generation of the local indexes the running request uses.
+
+        Returns:
+            LocalIndexes: The generation pinned by pinnedIndexes, otherwise the current one. None while they are not loaded.
+        """
+        pinned = self._pinnedIndexes.get()
+        return self.indexes if pinned is None else pinned
+
+    @contextmanager
+    def pinnedIndexes(self):
+        """
+        Pins the current generation of the local indexes for a request: until the block is left, the request (and the tasks it
+        submits with submitWithBudget) keeps using it, even if a refresh switches to a new generation meanwhile.
+        """
+        token = self._pinnedIndexes.set(self.indexes)
+        try:
+            yield
+        finally:
+            self._pinnedIndexes.reset(token)
+
+    def _snapshotIndexes(self, version):
+        """
+        Opens the indexes of index_snapshot if it exists and belongs to the dataset version.
+
+        Parameters:
+            version (str): The current dataset version, None if unknown.
+
+        Returns:
+            LocalIndexes: The indexes, None if there is no suitable snapshot.
+        """
+        if self.index_snapshot is None or not os.path.exists(self.index_snapshot):
+            return None
+        try:
+            indexes = LocalIndexes.open(self.index_snapshot)
+        except Exception as e:
+            print(f"Index snapshot {self.index_snapshot} could not be opened: {e}")
+            return None
+        if version is not None and indexes.datasetVersion not in (None, version):
+            print(f"Index snapshot {self.index_snapshot} belongs to another dataset version")
+            return None
+        return indexes
+
+    def loadIndexes(self):
+        """
+        Loads the local indexes (taxonomy, labels, coin appearances, keywords and coin bitsets), the recommendations are answered
+        from them afterwards. They are opened from index_snapshot if it exists and belongs to the current dataset version,
+        otherwise they are built from the endpoint. If another thread is already loading them, nothing is done.
+
+        Returns:
+            bool: True if the indexes were loaded.
+        """
+        if not self._index_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.monotonic()
+            version = self.currentDatasetVersion()
+            indexes = self._snapshotIndexes(version)
+            source = "opened from the snapshot"
+            if indexes is None:
+                indexes = LocalIndexes.build(self.transport, self.index_timeout, version)
+                source = "built"
+        except Exception as e:
+            print(f"Local indexes could not be built: {e}")
+            return False
+        finally:
+            self._index_lock.release()
+        self.indexes = indexes
+        print(f"Local indexes with {indexes} {source} in {time.monotonic() - started:.1f}s")
+        return True
+
+    def refreshIndexes(self):
+        """
+        Switches to a new generation of the local indexes for the current data of the endpoint, e.g. after new coins were added.
+        A snapshot of the current dataset version is opened if there is one, otherwise only the indexes whose rows changed are
+        rebuilt (see LocalIndexes.refreshed). The new generation replaces the current one with a single assignment, requests
+        running on the old generation finish on it. If another thread is already loading the indexes, nothing is done.
+
+        Returns:
+            bool: True if a new generation is used.
+        """
+        current = self.indexes
+        if current is None:
+            return self.loadIndexes()
+        if not self._index_lock.acquire(blocking=False):
+            return False
+        try:
+            started = time.monotonic()
+            version = self.currentDatasetVersion()
+            indexes = self._snapshotIndexes(version)
+            source = "opened from the snapshot"
+            # a snapshot of the version the current indexes already have is no newer generation
+            if indexes is None or indexes.datasetVersion in (None, current.datasetVersion):
+                changed = current.changedIndexes(self.transport, self.index_timeout)
+                indexes = current.refreshed(self.transport, self.index_timeout, version, changed)
+                rebuilt = "all" if "taxonomy" in changed else ", ".join(sorted(changed)) or "none"
+                source = f"refreshed (rebuilt: {rebuilt})"
+        except Exception as e:
+            print(f"Local indexes could not be refreshed: {e}")
+            return False
+        finally:
+            self._index_lock.release()
+        self.indexes = indexes
+        print(f"Local indexes generation {indexes.generation} with {indexes} {source} in {time.monotonic() - started:.1f}s")
+        return True
+
+    def _getCachedResult(self, key, version):
+        """
+        Looks up a query result in the in-process cache and then in the on-disk cache.
+        A result found on disk is taken over into the in-process cache.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version the result must belong to.
+
+        Returns:
+            tuple: (result, fresh) if a cached result exists, otherwise None.
+        """
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.get(f"{version}:{key}")
+            if cached is not None and cached[1]:
+                return cached
+
+        if self.diskCache is not None:
+            # another worker process may already have refreshed a result that is stale in this process
+            stored = self.diskCache.get(key, version)
+            if stored is not None and (cached is None or stored[1] <= self.diskCache.ttl):
+                result, age = stored
+                if self.cache is not None:
+                    self.cache.set(f"{version}:{key}", result, age)
+                return result, age <= self.diskCache.ttl
+        return cached
+
+    def _setCachedResult(self, key, version, result):
+        """
+        Stores a query result in all configured caches.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version the result belongs to.
+            result (Result): The rdflib query result.
+        """
+        if self.cache is not None:
+            self.cache.set(f"{version}:{key}", result)
+        if self.diskCache is not None:
+            self.diskCache.set(key, version, result)
+
+    def _refreshCachedQuery(self, key, version, query):
+        """
+        Executes a query again and replaces its cached result. If the query fails, the stale result is kept.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version of the cached result.
+            query (str): The SPARQL query.
+        """
+        try:
+            self.singleFlight.do(f"{version}:{key}", self._fetchCachedQuery, key, version, query)
+        except Exception as e:
+            print(f"Refresh of cached query failed: {e}")
+        finally:
+            if self.cache is not None:
+                self.cache.finishRefresh(f"{version}:{key}")
+
+    def executeQueryStreaming(self, query):
+        """
+        Executes a SPARQL SELECT query and yields the result rows incrementally, while the endpoint is still sending.
+        Unlike executeQuery the rows are not converted to rdflib terms.
+
+        Parameters:
+            query (str): The SPARQL SELECT query to be executed.
+
+        The rows are read after the caller returned (e.g. by a StreamingHttpResponse), so the deadline of the
+        current request is taken along; the generator raises QueryTimeout once it has passed.
+
+        Returns:
+            generator: namedtuples with one field per query variable, values are strings or None if unbound.
+
+        Raises:
+            CircuitOpen: If the circuit breaker is open. The call itself passes the breaker (see _breakerCall) when the
+                         first row is read, so a generator that is never read does not claim a trial call.
+        """
+        self._checkBreaker()
+        remaining = remainingBudget()
+        deadline = currentDeadline()
+
+        def rows():
+            with self._breakerCall():
+                yield from self.transport.stream(query, timeout=remaining, server_timeout=remaining, deadline=deadline)
+        return rows()
     
     def generateCoinQuery(self, id, coin, searchType, isNegated=False):
         """
         Generates a SPARQL query part for a specific coin based on its attributes.
+        The part only matches the coins, their metadata is queried afterwards for the matching coins (see sparqlQuerySearchResultMetadata).
         
         Parameters:
             id (str): The identifier of the coin.
@@ -72,39 +594,6 @@ class CoinSearchHandler():
 
         id_part = "?url dcterms:identifier ?id ."
 
-        design_part = """OPTIONAL {
-            ?url nmo:hasObverse ?obverse .
-            ?obverse nmo:hasIconography ?obverseIconography .
-        }"""
-
-        thumbnail_obverse_part = """OPTIONAL {
-            ?url nmo:hasObverse ?obverseSide .
-            ?obverseSide foaf:thumbnail ?thumbnailObverse .
-        }"""
-
-        thumbnail_reverse_part = """OPTIONAL {
-            ?url nmo:hasReverse ?reverseSide .
-            ?reverseSide foaf:thumbnail ?thumbnailReverse .
-        }"""
-
-        description_obverse_part = """OPTIONAL {
-            ?url nmo:hasObverse ?obverseSide .
-            ?obverseSide dcterms:description ?descriptionObverse .
-            FILTER (lang(?descriptionObverse) = "en")
-        }"""
-
-        description_reverse_part = """OPTIONAL {
-            ?url nmo:hasReverse ?reverseSide .
-            ?reverseSide dcterms:description ?descriptionReverse .
-            FILTER (lang(?descriptionReverse) = "en")
-        }"""
-
-        weight_part = "OPTIONAL { ?url nmo:hasWeight ?weight . }"
-        location_part = "OPTIONAL { ?url nmo:hasMint ?mint . }"
-        date_part = "OPTIONAL { ?url nmo:hasDate ?date . FILTER (lang(?date) = 'en') }"
-        max_diameter_part = "OPTIONAL { ?url nmo:hasMaxDiameter ?maxDiameter . }"
-
-        
         #----------------------------------------------------------- (START) UPDATE by Nico Lambert -----------------------------------------------------------------------------
         # I changed the function "_extract_spo" to "_extract_spo_sc_oc" to extract next to subject, predicate and obj also the categories of subject and obj, because these are 
         # necessary to seperate in the "_create_sparql_part" function between a "normal" subject/obj or a "class of" subjects/objects
@@ -118,23 +607,74 @@ class CoinSearchHandler():
             reverse_subject, reverse_subject_category, reverse_predicate, reverse_object, reverse_object_category = self._extract_spo_sc_oc(coin["reverse"]["coin"])
             reverse_part = self._create_sparql_part(id, "reverse", reverse_subject, reverse_subject_category, reverse_predicate, reverse_object, reverse_object_category, isNegated)
         #------------------------------------------------------------- (END) UPDATE by Nico Lambert -----------------------------------------------------------------------------
-        
-
-        type_part = "OPTIONAL { ?url nmo:hasTypeSeriesItem ?type . }"
 
         keywords_part = ""
 
-        for kw in coin["obverse"]["keywords"]:
-            if kw["negated"]:
-                keywords_part += f"FILTER NOT EXISTS {{ ?obverseIconography dcterms:description ?obvDesc . FILTER regex(?obvDesc, \"{kw['text']}\", \"i\") }}\n"
-            else:
-                keywords_part += f"?obverseIconography dcterms:description ?obvDesc . FILTER regex(?obvDesc, \"{kw['text']}\")\n"
+        # the keywords are searched in the descriptions of the iconographies of the coin side: all positive keywords of a side
+        # in the same description, a negated keyword in none of them
+        keyword_index = self.keywords
+        for side, desc in (("obverse", "obvDesc"), ("reverse", "revDesc")):
+            keywords = coin[side]["keywords"]
+            if keyword_index is not None:
+                # the keyword index resolves the keywords to the candidate coins, the endpoint only joins them
+                if keywords:
+                    included, excluded = keyword_index.keywordCoins(side, keywords)
+                    if included is not None and not included:
+                        keywords_part += "FILTER (?url IN ())\n"
+                    elif included is not None:
+                        keywords_part += "VALUES ?url { " + " ".join(sparqlIri(uri) for uri in sorted(keyword_index.dictionary.decodeAll(included))) + " }\n"
+                    if excluded:
+                        keywords_part += "FILTER (?url NOT IN (" + ", ".join(sparqlIri(uri) for uri in sorted(keyword_index.dictionary.decodeAll(excluded))) + "))\n"
+                continue
+            if any(not kw["negated"] for kw in keywords):
+                keywords_part += f"?url nmo:has{side.capitalize()} ?{side}KeywordSide{id} . ?{side}KeywordSide{id} nmo:hasIconography ?{side}KeywordIconography{id} . ?{side}KeywordIconography{id} dcterms:description ?{desc}{id} .\n"
+            for kw in keywords:
+                if kw["negated"]:
+                    keywords_part += self._negatedPattern("?url", f"?url nmo:has{side.capitalize()} ?{side}NegatedSide . ?{side}NegatedSide nmo:hasIconography ?{side}NegatedIconography . ?{side}NegatedIconography dcterms:description ?{desc}Negated . FILTER regex(?{desc}Negated, {keywordRegex(kw['text'], True)})\n")
+                else:
+                    keywords_part += f"FILTER regex(?{desc}{id}, {keywordRegex(kw['text'])})\n"
 
-        for kw in coin["reverse"]["keywords"]:
-            if kw["negated"]:
-                keywords_part += f"FILTER NOT EXISTS {{ ?reverseIconography dcterms:description ?revDesc . FILTER regex(?revDesc, \"{kw['text']}\", \"i\") }}\n"
-            else:
-                keywords_part += f"?reverseIconography dcterms:description ?revDesc . FILTER regex(?revDesc, \"{kw['text']}\")\n"
+        query = f"""
+        {{
+        ?url rdf:type nmo:{searchType} .
+        {id_part}
+        {obverse_part}
+        {reverse_part}
+        {keywords_part}
+        }}
+        """
+        return query
+
+    def _metadataQueryPart(self, searchType):
+        """
+        Generates the SPARQL query part that fetches the metadata of the search results bound to ?url.
+
+        Parameters:
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+
+        Returns:
+            str: A SPARQL query part binding the variables of SEARCH_VARIABLES.
+        """
+        id_part = "?url dcterms:identifier ?id ."
+
+        description_obverse_part = """OPTIONAL {
+            ?url nmo:hasObverse ?obverseSide .
+            ?obverseSide dcterms:description ?descriptionObverse .
+            FILTER (lang(?descriptionObverse) = "en")
+        }"""
+
+        description_reverse_part = """OPTIONAL {
+            ?url nmo:hasReverse ?reverseSide .
+            ?reverseSide dcterms:description ?descriptionReverse .
+            FILTER (lang(?descriptionReverse) = "en")
+        }"""
+
+        weight_part = SORT_VARIABLE_PARTS["weight"]
+        location_part = SORT_VARIABLE_PARTS["mint"]
+        date_part = SORT_VARIABLE_PARTS["date"]
+        max_diameter_part = SORT_VARIABLE_PARTS["maxDiameter"]
+
+        type_part = "OPTIONAL { ?url nmo:hasTypeSeriesItem ?type . }"
 
         if searchType == "TypeSeriesItem":
             thumbnail_obverse_part = """
@@ -191,13 +731,9 @@ class CoinSearchHandler():
 
 
         query = f"""
-        {{
         ?url rdf:type nmo:{searchType} .
         {id_part}
-        {design_part}
         {location_part}
-        {obverse_part}
-        {reverse_part}
         {thumbnail_obverse_part}
         {thumbnail_reverse_part}
         {description_obverse_part}
@@ -206,8 +742,6 @@ class CoinSearchHandler():
         {date_part}
         {max_diameter_part}
         {type_part}
-        {keywords_part}
-        }}
         """
         return query
 
@@ -278,13 +812,10 @@ class CoinSearchHandler():
             sparql_part = f"""
             ?url nmo:has{side.capitalize()} ?{side}Side .
             ?{side}Side nmo:hasIconography ?{side}Iconography .
-            ?{side}Iconography nmo:hasAppearance ?{side}DesignAppearance .
+            ?{side}Iconography nmo:hasAppearance ?{side}DesignAppearance{id} .
             """
             if (isNegated):
-                sparql_part += f"""
-                FILTER NOT EXISTS {{
-                ?{side}Iconography nmo:hasAppearance ?{side}DesignAppearance2 .
-                """
+                negated_part = f"?{side}Iconography nmo:hasAppearance ?{side}DesignAppearance{id}2 .\n"
 
                 #----------------------------------------------------------- (START) UPDATE by Steven Nowak (based on code from Nico Lambert) ----------------------------------------
                 # if the category of the subject is "list_class" it means, the subject uri is of a class and so the instances of the class need to be filtered
@@ -292,14 +823,14 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if subject_category == "list_class":
                     if subject:
-                        sparql_part += f"?{side}DesignAppearance2 rdf:li ?instancesOfSubjectClass2 .\n"
-                        sparql_part += f"?instancesOfSubjectClass2 rdf:type <{subject}> .\n"
+                        negated_part += f"?{side}DesignAppearance{id}2 rdf:li ?instancesOfSubjectClass{side.capitalize()}{id}2 .\n"
+                        negated_part += f"?instancesOfSubjectClass{side.capitalize()}{id}2 rdf:type <{subject}> .\n"
                 #----------------------------------------------------------- (-END-) UPDATE by Steven Nowak (based on code from Nico Lambert) ----------------------------------------
                 else:
                     if subject:
-                        sparql_part += f"?{side}DesignAppearance2 rdf:li <{subject}> .\n"
+                        negated_part += f"?{side}DesignAppearance{id}2 rdf:li <{subject}> .\n"
 
-                sparql_part += "}"
+                sparql_part += self._negatedPattern(sparql_part, negated_part)
             else:
                 #----------------------------------------------------------- (START) UPDATE by Steven Nowak (based on code from Nico Lambert) ----------------------------------------
                 # if the category of the subject is "list_class" it means, the subject uri is of a class and so the instances of the class need to be filtered
@@ -307,12 +838,12 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if subject_category == "list_class":
                     if subject:
-                        sparql_part += f"?{side}DesignAppearance rdf:li ?instancesOfSubjectClass .\n"
-                        sparql_part += f"?instancesOfSubjectClass rdf:type <{subject}> .\n"
+                        sparql_part += f"?{side}DesignAppearance{id} rdf:li ?instancesOfSubjectClass{side.capitalize()}{id} .\n"
+                        sparql_part += f"?instancesOfSubjectClass{side.capitalize()}{id} rdf:type <{subject}> .\n"
                 #----------------------------------------------------------- (-END-) UPDATE by Steven Nowak (based on code from Nico Lambert) ----------------------------------------
                 else:
                     if subject:
-                        sparql_part += f"?{side}DesignAppearance rdf:li <{subject}> .\n"
+                        sparql_part += f"?{side}DesignAppearance{id} rdf:li <{subject}> .\n"
 
         #----------------------------------------------------------- (-END-) UPDATE by Steven Nowak -----------------------------------------------------------------------------
         #----------------------------------------------------------- (START) UPDATE by Nico Lambert -----------------------------------------------------------------------------
@@ -329,10 +860,7 @@ class CoinSearchHandler():
             """
 
             if (isNegated):
-                sparql_part += f"""
-                FILTER NOT EXISTS {{
-                ?{side}DesignIconography rdf:li ?{side}Description{id}2 .
-                """
+                negated_part = f"?{side}DesignIconography rdf:li ?{side}Description{id}2 .\n"
                 
                 #----------------------------------------------------------- (START) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 # if the category of the subject is "list_class" it means, the subject uri is of a class and so the instances of the class need to be filtered
@@ -340,14 +868,14 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if subject_category == "list_class":
                     if subject:
-                        sparql_part += f"?{side}Description{id}2 rdf:subject ?instancesOfSubjectClass2 .\n"
-                        sparql_part += f"?instancesOfSubjectClass2 rdf:type <{subject}> .\n"
+                        negated_part += f"?{side}Description{id}2 rdf:subject ?instancesOfSubjectClass{side.capitalize()}{id}2 .\n"
+                        negated_part += f"?instancesOfSubjectClass{side.capitalize()}{id}2 rdf:type <{subject}> .\n"
                 #------------------------------------------------------------- (END) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 else:
                     if subject:
-                        sparql_part += f"?{side}Description{id}2 rdf:subject <{subject}> .\n"
+                        negated_part += f"?{side}Description{id}2 rdf:subject <{subject}> .\n"
                 if predicate:
-                    sparql_part += f"?{side}Description{id}2 rdf:predicate <{predicate}> .\n"
+                    negated_part += f"?{side}Description{id}2 rdf:predicate <{predicate}> .\n"
 
                 #----------------------------------------------------------- (START) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 # if the category of the object is "list_class" it means, the object uri is of a class and so the instances of the class need to be filtered
@@ -355,14 +883,14 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if object_category == "list_class":
                     if obj:
-                        sparql_part += f"?{side}Description{id}2 rdf:object ?instancesOfObjectClass2 .\n"
-                        sparql_part += f"?instancesOfObjectClass2 rdf:type <{obj}> .\n"
+                        negated_part += f"?{side}Description{id}2 rdf:object ?instancesOfObjectClass{side.capitalize()}{id}2 .\n"
+                        negated_part += f"?instancesOfObjectClass{side.capitalize()}{id}2 rdf:type <{obj}> .\n"
                 #------------------------------------------------------------- (END) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 else:
                     if obj:
-                        sparql_part += f"?{side}Description{id}2 rdf:object <{obj}> .\n"
+                        negated_part += f"?{side}Description{id}2 rdf:object <{obj}> .\n"
 
-                sparql_part += "}"
+                sparql_part += self._negatedPattern(sparql_part, negated_part)
             else:
                 #----------------------------------------------------------- (START) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 # if the category of the subject is "list_class" it means, the subject uri is of a class and so the instances of the class need to be filtered
@@ -370,8 +898,8 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if subject_category == "list_class":
                     if subject:
-                        sparql_part += f"?{side}Description{id} rdf:subject ?instancesOfSubjectClass .\n"
-                        sparql_part += f"?instancesOfSubjectClass rdf:type <{subject}> .\n"
+                        sparql_part += f"?{side}Description{id} rdf:subject ?instancesOfSubjectClass{side.capitalize()}{id} .\n"
+                        sparql_part += f"?instancesOfSubjectClass{side.capitalize()}{id} rdf:type <{subject}> .\n"
                 #------------------------------------------------------------- (END) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 else:
                     if subject:
@@ -385,8 +913,8 @@ class CoinSearchHandler():
                 # for this case rdf:type is used
                 if object_category == "list_class":
                     if obj:
-                        sparql_part += f"?{side}Description{id} rdf:object ?instancesOfObjectClass .\n"
-                        sparql_part += f"?instancesOfObjectClass rdf:type <{obj}> .\n"
+                        sparql_part += f"?{side}Description{id} rdf:object ?instancesOfObjectClass{side.capitalize()}{id} .\n"
+                        sparql_part += f"?instancesOfObjectClass{side.capitalize()}{id} rdf:type <{obj}> .\n"
                 #------------------------------------------------------------- (END) UPDATE by Nico Lambert -----------------------------------------------------------------------------
                 else:
                     if obj:
@@ -394,41 +922,33 @@ class CoinSearchHandler():
         #----------------------------------------------------------- (-END-) UPDATE by Nico Lambert -----------------------------------------------------------------------------
         return sparql_part
 
-    def _eliminate_not_brackets(self, expression):
+    def _negatedPattern(self, required, pattern):
         """
-        Eliminates NOT brackets from a boolean term and returns the resulting expression.
+        Generates the negation of a pattern within a group graph pattern.
+
+        MINUS is used if the pattern is joined with the group only through variables of its required patterns and filters none of
+        them: then it removes the same solutions as FILTER NOT EXISTS, but Fuseki evaluates it once as an anti join instead of once
+        per solution. Otherwise FILTER NOT EXISTS is used.
 
         Parameters:
-            expression (str): A boolean expression to be transformed.
-        
+            required (str): The required patterns of the group before the negation.
+            pattern (str): The pattern that must not match.
+
         Returns:
-            str: The transformed boolean expression with eliminated NOT brackets.
-        
-        Author: Mohammed Sayed Mahmod
+            str: The MINUS or FILTER NOT EXISTS block.
         """
-        while "NOT (" in expression:
-            pattern = r"NOT \(([^)]+)\)"
-
-            def replace_negated_expression(match):
-                inner_expression = match.group(1)
-                transformed = re.sub(r"\bAND\b", " TEMP_AND ", inner_expression)
-                transformed = re.sub(r"\bOR\b", " AND ", transformed)
-                transformed = re.sub(r" TEMP_AND ", " OR ", transformed)
-                transformed = re.sub(r"(\bC\d+\b)", r"NOT \1", transformed)
-                transformed = re.sub(r"NOT NOT ", "", transformed)
-                return f"({transformed})"
-
-            booleanTerm = re.sub(pattern, replace_negated_expression, booleanTerm)
-            booleanTerm = re.sub(r"NOT NOT ", "", booleanTerm)
-            expression = booleanTerm
-
-        expression = re.sub(r"\s+", " ", expression).strip()
-
-        return expression
+        shared = set(_VARIABLE_PATTERN.findall(required)) & set(_VARIABLE_PATTERN.findall(pattern))
+        filtered = set(_VARIABLE_PATTERN.findall(" ".join(re.findall(r"FILTER.*", pattern))))
+        if shared and not shared & filtered:
+            return f"MINUS {{\n{pattern}}}\n"
+        return f"FILTER NOT EXISTS {{\n{pattern}}}\n"
 
     def generateQuery(self, coins, booleanTerm, searchType):
         """
         Generates a complete SPARQL query based on a list of coins and a boolean term combining them.
+
+        The boolean term is parsed and normalized (see parseBooleanTerm), so a description shared by all branches of an OR is joined
+        once instead of being repeated in every branch. AND joins the query parts of its terms, OR is a UNION of them.
         
         Parameters:
             coins (list): A list of dictionaries, each representing attributes of a coin.
@@ -437,32 +957,373 @@ class CoinSearchHandler():
 
         Returns:
             str: A complete SPARQL query constructed from the provided coins and boolean term.
+
+        Raises:
+            ValueError: If the boolean term is malformed or refers to a missing coin.
         
         Author: Mohammed Sayed Mahmod
         """
-        booleanTerm = self._eliminate_not_brackets(booleanTerm)
-        booleanTerm = booleanTerm.replace("(", "{").replace(")", "}")
+        term = parseBooleanTerm(booleanTerm, coins)
+        where = "" if term is None else self._compileBooleanTerm(term, coins, searchType, itertools.count(1))
 
-        coin_dict = {f"C{i+1}": (i+1, coin) for i, coin in enumerate(coins)}
+        combined_query = self._query_head
+        combined_query += f"SELECT DISTINCT ?url WHERE {{ {where} }}"
 
-        for placeholder, (id, coin_data) in coin_dict.items():
-            isNegated = "NOT " + placeholder in booleanTerm
-            coinQueryPart = self.generateCoinQuery(id, coin_data, searchType, isNegated)
-            booleanTerm = booleanTerm.replace("NOT " + placeholder if isNegated else placeholder, coinQueryPart)
+        return combined_query
 
+    def _compileBooleanTerm(self, term, coins, searchType, ids):
+        """
+        Generates the SPARQL query part of a normalized boolean term.
 
-        operators = {
-            "AND": "",
-            "OR": "UNION"
-        }
+        Parameters:
+            term (Leaf or Node): The term, see parseBooleanTerm.
+            coins (list): The coin descriptions, C1 is the first one.
+            searchType (str): The type of search to be performed.
+            ids (iterator): Yields the identifiers of the query parts of the descriptions, which name their variables.
 
-        for operator, sparql_operator in operators.items():
-            booleanTerm = booleanTerm.replace(operator, sparql_operator)
+        Returns:
+            str: A group graph pattern.
+        """
+        if isinstance(term, Leaf):
+            return self.generateCoinQuery(next(ids), coins[term.coin - 1], searchType, term.negated)
+        parts = [self._compileBooleanTerm(child, coins, searchType, ids) for child in term.children]
+        if term.operator == "AND":
+            return "{\n" + "\n".join(parts) + "\n}"
+        return "{\n" + "\nUNION\n".join(parts) + "\n}"
 
-        combined_query = self._query_head
-        combined_query += f"SELECT DISTINCT ?url ?thumbnailObverse ?thumbnailReverse ?descriptionObverse ?descriptionReverse ?date ?maxDiameter ?id ?weight ?type ?mint WHERE {{ {booleanTerm} }}"
+    def searchCoins(self, query, searchType, coins=None, booleanTerm=None):
+        """
+        Executes a coin search and yields its result rows in the order of the search, see searchCursor.
 
-        return combined_query
+        Parameters:
+            query (str): The SPARQL query of the search.
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+            coins (list): The coin descriptions of the search, None if the query was edited.
+            booleanTerm (str): The boolean term combining the coin descriptions, None if the query was edited.
+
+        Returns:
+            generator: namedtuples with one field per variable of SEARCH_VARIABLES, like executeQueryStreaming.
+        """
+        return self.cursorRows(self.searchCursor(query, searchType, coins, booleanTerm))
+
+    def searchCursor(self, query, searchType, coins=None, booleanTerm=None):
+        """
+        Returns the result cursor of a coin search. The cursor of a search is kept in the cursors cache, so the pages and orders of
+        the search are served from it without running the search again.
+
+        A search runs in two phases: the coins are matched first, then the metadata of the matching coins is queried in batches of
+        hydration_batch coins (see sparqlQuerySearchResultMetadata), up to hydration_workers batches at the same time. The cursor
+        only holds the matched coins, the metadata is queried for the pages that are requested (see searchPage and cursorRows).
+        If the search is given as coin descriptions and boolean term (the query is the one generateQuery generated for them) and the
+        coin bitset index is loaded, the coins are matched locally. Otherwise, e.g. for a query edited by the user, the query matches
+        them on the endpoint; the rows of a query that selects more than ?url are kept in the cursor as they are.
+
+        Parameters:
+            query (str): The SPARQL query of the search.
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+            coins (list): The coin descriptions of the search, None if the query was edited.
+            booleanTerm (str): The boolean term combining the coin descriptions, None if the query was edited.
+
+        Returns:
+            ResultCursor: The cursor, not complete if the time budget was used up while the coins were matched.
+        """
+        version = self.currentDatasetVersion()
+        coin_index = self.coinIndex if coins is not None and booleanTerm else None
+        description = json.dumps([searchType, coins, booleanTerm], sort_keys=True)
+        key = ":".join((
+            "cursor",
+            str(version),
+            str(self.currentIndexes().generation) if coin_index is not None else "",
+            queryFingerprint(query),
+            hashlib.sha1(description.encode("utf-8")).hexdigest(),
+        ))
+        # the dataset version is unknown, so a kept cursor might belong to other data
+        cache = self.cursors if version is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached[0]
+
+        # concurrent requests of the same search, e.g. the first page and a sort, wait for the first one
+        try:
+            cursor = self.singleFlight.do(key, self._matchCoins, key, query, searchType, coin_index, coins, booleanTerm, timeout=remainingBudget())
+        except FutureTimeoutError:
+            raise QueryTimeout("The time budget of the request is used up")
+        if cache is not None and cursor.complete:
+            cache.set(key, cursor)
+        return cursor
+
+    def _matchCoins(self, key, query, searchType, coin_index, coins, booleanTerm):
+        """
+        Matches the coins of a search, see searchCursor.
+
+        Parameters:
+            key (str): Fingerprint of the search.
+            query (str): The SPARQL query of the search.
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+            coin_index (CoinBitsetIndex): The index to match the coins with, None to match them on the endpoint.
+            coins (list): The coin descriptions of the search.
+            booleanTerm (str): The boolean term combining the coin descriptions.
+
+        Returns:
+            ResultCursor: The cursor of the search.
+        """
+        if coin_index is not None:
+            try:
+                return ResultCursor(key, searchType, list(coin_index.evaluate(coins, booleanTerm, searchType)))
+            except ValueError:
+                # let the endpoint report the malformed search
+                pass
+
+        uris = {}
+        rows = {}
+        complete = True
+        try:
+            for row in self.executeQueryStreaming(query):
+                uris[row.url] = None
+                if row._fields != ("url",):
+                    rows.setdefault(row.url, []).append(row)
+        except QueryTimeout:
+            # the coins matched so far are a partial result
+            complete = False
+        return ResultCursor(key, searchType, list(uris), rows, complete)
+
+    def cursorOrder(self, cursor, variable=None, key=None, descending=False):
+        """
+        Returns the coins of a result cursor sorted by a variable of the search results (see ResultCursor.ordered).
+        The values of the coins whose metadata was not queried yet are queried in batches like the metadata, only the variable.
+
+        Parameters:
+            cursor (ResultCursor): The cursor.
+            variable (str): The variable, one of SORT_VARIABLE_PARTS, None for the order of the search.
+            key (function): Converts a value of the variable into the value compared, None if it can not be compared.
+            descending (bool): True to sort in descending order.
+
+        Returns:
+            list: The URIs of the coins.
+
+        Raises:
+            QueryTimeout: If the time budget was used up before all values were read.
+        """
+        if variable is None:
+            return cursor.uris
+        if variable not in cursor.sortValues:
+            values = {}
+            # other requests of the cursor may add metadata meanwhile
+            for uri, rows in list(cursor.rows.items()):
+                for row in rows:
+                    value = getattr(row, variable, None)
+                    if value is not None:
+                        values[uri] = value
+                        break
+            missing = [uri for uri in cursor.uris if uri not in cursor.rows]
+            if missing:
+                self._checkBreaker()
+                for row in self._batchRows(missing, lambda batch: self.sparqlQuerySortValues(batch, variable), currentDeadline()):
+                    if getattr(row, variable) is not None:
+                        values.setdefault(row.url, getattr(row, variable))
+            cursor.sortValues[variable] = values
+        return cursor.ordered(variable, key, descending)
+
+    def searchPage(self, cursor, order, offset, limit):
+        """
+        Returns the result rows of one page of a result cursor. The metadata of the coins on the page is queried once and kept in
+        the cursor.
+
+        Parameters:
+            cursor (ResultCursor): The cursor.
+            order (list): The coins of the cursor in the order of the pages, see cursorOrder.
+            offset (int): Number of coins before the page.
+            limit (int): Number of coins on the page.
+
+        Returns:
+            list: The rows with the variables of SEARCH_VARIABLES, one or more per coin.
+
+        Raises:
+            QueryTimeout: If the time budget was used up before the metadata was read.
+        """
+        uris = order[offset:offset + limit]
+        if any(uri not in cursor.rows for uri in uris):
+            self._checkBreaker()
+        return list(self._cursorRows(cursor, uris, currentDeadline(), keep=True))
+
+    def cursorRows(self, cursor, order=None):
+        """
+        Yields the result rows of all coins of a result cursor while their metadata arrives, e.g. for a download.
+        The metadata is not kept in the cursor.
+
+        Parameters:
+            cursor (ResultCursor): The cursor.
+            order (list): The coins of the cursor in the order of the rows, see cursorOrder. None for the order of the search.
+
+        Returns:
+            generator: The rows with the variables of SEARCH_VARIABLES. If the cursor is not complete, it raises QueryTimeout after
+                       the rows of the matched coins.
+        """
+        self._checkBreaker()
+        deadline = currentDeadline()
+
+        def rows():
+            yield from self._cursorRows(cursor, cursor.uris if order is None else order, deadline, keep=False)
+            if not cursor.complete:
+                raise QueryTimeout("The time budget of the request was used up before all coins were matched")
+        return rows()
+
+    def _cursorRows(self, cursor, uris, deadline, keep):
+        """
+        Yields the result rows of coins of a result cursor in the given order, the metadata not kept in the cursor is queried
+        (see _hydrate) for hydration_workers batches at a time.
+
+        Parameters:
+            cursor (ResultCursor): The cursor.
+            uris (list): The coins.
+            deadline (float): time.monotonic() value after which reading is stopped, None for no limit.
+            keep (bool): True to keep the queried metadata in the cursor.
+
+        Returns:
+            generator: The rows with the variables of SEARCH_VARIABLES.
+        """
+        step = self.hydration_batch * self.hydration_workers
+        for start in range(0, len(uris), step):
+            chunk = uris[start:start + step]
+            fetched = {}
+            missing = [uri for uri in chunk if uri not in cursor.rows]
+            for row in self._hydrate(missing, cursor.searchType, deadline):
+                fetched.setdefault(row.url, []).append(row)
+            if keep:
+                for uri in missing:
+                    cursor.rows[uri] = fetched.get(uri, [])
+            for uri in chunk:
+                yield from cursor.rows.get(uri) or fetched.get(uri, ())
+
+    def _checkBreaker(self):
+        """
+        Fails fast while the circuit breaker is open. The queries themselves pass the breaker with _breakerCall,
+        which records their outcomes.
+
+        Raises:
+            CircuitOpen: If the endpoint is unavailable at the moment.
+        """
+        if self.breaker is not None and self.breaker.isOpen():
+            markDegraded()
+            raise CircuitOpen("The SPARQL endpoint is unavailable at the moment")
+
+    def _hydrate(self, uris, searchType, deadline):
+        """
+        Queries the metadata of the matched coins, see _batchRows and sparqlQuerySearchResultMetadata.
+
+        Parameters:
+            uris (iterable): URIs of the matched coins (respectively types), read while the batches are running.
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+            deadline (float): time.monotonic() value after which reading is stopped, None for no limit.
+
+        Returns:
+            generator: The rows with the variables of SEARCH_VARIABLES.
+        """
+        return self._batchRows(uris, lambda batch: self.sparqlQuerySearchResultMetadata(batch, searchType), deadline)
+
+    def _batchRows(self, uris, generateQuery, deadline):
+        """
+        Runs a query for the matched coins in batches of hydration_batch coins. Up to hydration_workers batches run at the
+        same time on the queryExecutor, the rows are yielded in the order of the batches.
+
+        Parameters:
+            uris (iterable): URIs of the matched coins (respectively types), read while the batches are running.
+            generateQuery (function): Returns the query for a list of URIs.
+            deadline (float): time.monotonic() value after which reading is stopped, None for no limit.
+
+        Returns:
+            generator: The rows of the queries.
+
+        Raises:
+            QueryTimeout: If the deadline passed before all batches were read. The rows yielded before are valid.
+        """
+        uris = iter(uris)
+        pending = deque()
+        try:
+            while True:
+                batch = list(itertools.islice(uris, self.hydration_batch))
+                if not batch:
+                    break
+                pending.append(self.queryExecutor.submit(self._fetchSearchRows, generateQuery(batch), deadline))
+                if len(pending) >= self.hydration_workers:
+                    yield from self._waitForRows(pending.popleft(), deadline)
+            while pending:
+                yield from self._waitForRows(pending.popleft(), deadline)
+        finally:
+            # the client went away or the budget is used up
+            for future in pending:
+                future.cancel()
+
+    def _fetchSearchRows(self, query, deadline):
+        """
+        Reads all rows of a query of _batchRows.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+            deadline (float): time.monotonic() value after which reading is stopped, None for no limit.
+
+        Returns:
+            list: The rows.
+
+        Raises:
+            CircuitOpen: If the circuit breaker refuses the query, see _breakerCall.
+        """
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise QueryTimeout("The time budget of the request is used up")
+        with self._breakerCall():
+            return list(self.transport.stream(query, timeout=remaining, server_timeout=remaining, deadline=deadline))
+
+    def _waitForRows(self, future, deadline):
+        """
+        Waits for the rows of a query of _batchRows at most until the deadline.
+
+        Parameters:
+            future (Future): The future of _fetchSearchRows.
+            deadline (float): time.monotonic() value after which waiting is stopped, None for no limit.
+
+        Returns:
+            list: The rows.
+        """
+        try:
+            return future.result(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            raise QueryTimeout("The time budget of the request is used up")
+
+    def sparqlQuerySearchResultMetadata(self, uris, searchType):
+        """
+        Generates the query for the metadata of the coins matched by a search, with the result rows of SEARCH_VARIABLES.
+
+        Parameters:
+            uris (list): URIs of the coins (respectively types).
+            searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+
+        Returns:
+            str: SPARQL Query
+        """
+        values = " ".join(sparqlIri(uri) for uri in uris)
+        query = self._query_head
+        query += f"SELECT DISTINCT {SEARCH_VARIABLES} WHERE {{ VALUES ?url {{ {values} }} {self._metadataQueryPart(searchType)} }}"
+        return query
+
+    def sparqlQuerySortValues(self, uris, variable):
+        """
+        Generates the query for the values of a search result variable the results are sorted by.
+
+        Parameters:
+            uris (list): URIs of the coins (respectively types).
+            variable (str): The variable, one of SORT_VARIABLE_PARTS.
+
+        Returns:
+            str: SPARQL Query
+        """
+        values = " ".join(sparqlIri(uri) for uri in uris)
+        query = self._query_head
+        query += f"SELECT ?url ?{variable} WHERE {{ VALUES ?url {{ {values} }} {SORT_VARIABLE_PARTS[variable]} }}"
+        return query
     
     
     
@@ -493,6 +1354,25 @@ class CoinSearchHandler():
         else:
             obj_uri = "<"+obj_uri+">"
 
+        labels = self.labels
+        if labels is not None:
+            rows = {(name, uri) for name, uri in labels.predicateNames(input)}
+            if subj_uri != "?s" or obj_uri != "?o":
+                candidates = sorted({uri for _, uri in rows})
+                appearances = self.appearances
+                if appearances is not None:
+                    found = appearances.occurringPredicates(candidates, side, subject=self._termUri(subj_uri), obj=self._termUri(obj_uri))
+                    occurring = {candidate for candidate, occurs in zip(candidates, found) if occurs}
+                else:
+                    occurring = set()
+                    for start in range(0, len(candidates), self.occurrence_batch):
+                        query = self.sparqlQueryFilterPredicatesOccurringOnCoins(candidates[start:start + self.occurrence_batch], subj_uri, obj_uri, side)
+                        occurring.update(str(row.pre) for row in self.executeQuery(query))
+                rows = {(name, uri) for name, uri in rows if uri in occurring}
+            if not rows:
+                return {}
+            return {"list_verb": [{"link": uri, "name_en": name} for name, uri in sorted(rows)]}
+
         # If there is an input, then the query needs to be filtered, otherwise all verbs are returned (the button for "all verbs" is clicked)
         if input != "":
             query = self.sparqlQueryGetRecomendationsPrediacteWithFilter(input, subj_uri, obj_uri , side)
@@ -533,58 +1413,11 @@ class CoinSearchHandler():
         Author : Nico Lambert
         """
 
-        # ?pre = URI of the verb 
-        # ?preName = Name of the verb
-
         # search after all verbs, which start with the given input
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT DISTINCT ?pre ?preName WHERE{{
-                    ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?preName .
-                    ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?Type .
-                    FILTER(STRSTARTS(LCASE(?preName), LCASE("{input}")) && STRSTARTS(LCASE(?Type), LCASE("predicate_id"))) .
-                """
-        
-        # user input for subject or object -> extra filter for predicates
-        # predicate has to occour (on at least one coin) for the given coin side with the other entered triple elements
-        # if for examaple the entered subject is a class like Deities , the predicate has to occur with at least one deity like artemis as subject on the specific coin side
-        # if there is no entered object , that mneans it can be any object, doesn't matter which, but it has to be at least once, which is part of a coin triple with the 
-        #    the entered subject and the recommendation for the verb.
-        if subj_uri != "?s" or obj_uri != "?o":
-            query += f"""
-                Filter Exists {{
-                    ?coinAppearance rdf:predicate ?pre.
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    {{
-                        ?coinAppearance rdf:object {obj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?objEntity rdf:type {obj_uri} .
-                        ?coinAppearance rdf:object ?objEntity. 
-                    }}
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                }}
-                }} ORDER BY ASC(?preName)
-                """
-        # no entered subject / object -> no extra filter
-        else:
-            query += f"""
-                }} ORDER BY ASC(?preName)
-                """
-        return query
-    
+        # user input for subject or object -> the verb has to occur (on at least one coin) for the given coin side with the other entered triple elements
+        arguments = self._queryArguments(subj_uri, "?p", obj_uri, "true", side)
+        return PREDICATES.render(input=input, withSubjectOrObject=arguments["subject"] is not None or arguments["object"] is not None, **arguments)
+
 
     def sparqlQueryGetRecomendationsAllPrediacte(self, subj_uri, obj_uri, side):
         """
@@ -602,58 +1435,29 @@ class CoinSearchHandler():
         Author: Nico Lambert
         """
 
-        # ?pre = URI of the verb 
-        # ?preName = Name of the verb
-
         # search after all verbs
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT DISTINCT ?pre ?preName WHERE{{
-                    ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?preName .
-                    ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?Type .
-                    FILTER(!STRSTARTS(LCASE(?preName), LCASE("predicate_id")) && STRSTARTS(LCASE(?Type), LCASE("predicate_id"))) .
-                """
-        
-        # user input for subject or object -> extra filter for predicates
-        # predicate has to occour (on at least one coin) for the given coin side with the other entered triple elements
-        # if for examaple the entered subject is a class like Deities , the predicate has to occur with at least one deity like artemis as subject on the specific coin side
-        # if there is no entered object , that mneans it can be any object, doesn't matter which, but it has to be at least once, which is part of a coin triple with the 
-        #    the entered subject and the recommendation for the verb.
-        if subj_uri != "?s" or obj_uri != "?o":
-            query += f"""
-                Filter Exists {{
-                    ?coinAppearance rdf:predicate ?pre.
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    {{
-                        ?coinAppearance rdf:object {obj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?objEntity rdf:type {obj_uri} .
-                        ?coinAppearance rdf:object ?objEntity. 
-                    }}
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                }}
-                }} ORDER BY ASC(?preName)
-                """
-        # no entered subject / object -> no extra filter
-        else:
-            query += f"""
-                }} ORDER BY ASC(?preName)
-                """
-        return query
-    
+        # user input for subject or object -> the verb has to occur (on at least one coin) for the given coin side with the other entered triple elements
+        arguments = self._queryArguments(subj_uri, "?p", obj_uri, "true", side)
+        return PREDICATES.render(input=None, withSubjectOrObject=arguments["subject"] is not None or arguments["object"] is not None, **arguments)
+
+
+    def sparqlQueryFilterPredicatesOccurringOnCoins(self, candidates, subj_uri, obj_uri, side):
+        """
+        Function that generates a SPARQL Query, that keeps those of the given verbs which occur in a triple with the entered subject and object 
+        on the corresponding coin side. It is the coin occurrence constraint of the verb queries, used when the verbs come from the label index.
+
+        Parameters:
+            candidates (list): URIs of the candidate verbs
+            subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on, "?s" if not entered
+            obj_uri (str): The URI of the Current Object on the Coin Side the Function is triggered on, "?o" if not entered
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+
+        Returns:
+            str: SPARQL Query whose ?pre results are the occurring verbs
+        """
+
+        return PREDICATES_OCCURRING_ON_COINS.render(candidates=candidates, **self._queryArguments(subj_uri, "?p", obj_uri, "true", side))
+
 
     def categoryConverter(self, category):
         """
@@ -698,121 +1502,8 @@ class CoinSearchHandler():
         Author: Nico Lambert
         """
 
-        # ?subOrObj = URI of the entity
-        # ?subOrObjName = edit label of the entity / name of the entity
-        # ?subOrObjSuperClass = URI of the top Class / Category of the entity
+        return SUBJECTS_OR_OBJECTS_APART_FROM_CLASSES.render(input=input, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
-        # search after all entities, which start with the given input and which are only an instance of a class and not a class 
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT DISTINCT ?subOrObj ?subOrObjName ?subOrObjSuperClass WHERE{{
-                    ?subOrObj rdf:type ?subOrObjClass .
-                    ?subOrObjClass rdfs:subClassOf ?subOrObjSuperClass.
-                    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?subOrObjNameVar.
-                    FILTER(!CONTAINS(str(?subOrObjSuperClass), "http://www.w3.org/2000/01/rdf-schema#")).
-                    FILTER NOT EXISTS {{
-                            ?subOrObjSuperClass rdfs:subClassOf ?anyClass.
-                            FILTER(?subOrObjSuperClass != ?anyClass).
-                    }}.
-                    FILTER((?subOrObjClass != ?subOrObjSuperClass) && (?subOrObj != ?subOrObjSuperClass))
-                    BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?subOrObjNameVar), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?subOrObjNameVar), "^.*[/_#]", ""), 2))     
-                        ) AS ?subOrObjName
-                    ).
-                    FILTER(STRSTARTS(LCASE(?subOrObjName), LCASE("{input}"))).
-                """
-         
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject 
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        ?coinAppearance rdf:subject ?subOrObj .   
-                    """
-                if pred_uri != "?p":
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-                if obj_uri != "?o":
-                    query += f"""
-                        {{
-                            ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.
-                query += f"""
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                    ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?coinAppearance rdf:li ?subOrObj .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object 
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?coinAppearance rdf:object ?subOrObj .
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.
-            query += f"""
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                    ?coinURI rdf:type nmo:NumismaticObject . 
-                }}
-                """
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjName)
-                """
-        
-        return query
-    
 
     def sparqlQueryGetRecommendationsSubObjClasses(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
@@ -833,118 +1524,7 @@ class CoinSearchHandler():
         Author: Nico Lambert
         """
 
-        # ?subOrObjClass = URI of the entity
-        # ?subOrObjClassName = edit label of the entity / name of the entity
-
-        # search after all entities, which start with the given input and which are only a class and not an instance of a class 
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT DISTINCT ?subOrObjClass ?subOrObjClassName WHERE{{
-                    ?subOrObjClass rdf:type rdfs:Class .
-  					?subOrObjClass <http://www.w3.org/2004/02/skos/core#prefLabel> ?subOrObjClassNameVar.
-  					BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?subOrObjClassNameVar), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?subOrObjClassNameVar), "^.*[/_#]", ""), 2))     
-                        ) AS ?subOrObjClassName
-                    ).
-                    FILTER(STRSTARTS(LCASE(STR(?subOrObjClassName)), LCASE("{input}"))).
-                    Filter(?subOrObjClass != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
-                    
-                """
-        
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObjClass.
-                        ?coinAppearance rdf:subject ?subjEntity .
-                    """
-                if pred_uri != "?p":
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-                if obj_uri != "?o":
-                    query += f"""
-                        {{
-                            ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObjClass.
-                        ?coinAppearance rdf:li ?subjEntity .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?objEntity rdf:type ?subOrObjClass.
-                    ?coinAppearance rdf:object ?objEntity.
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-            query += f"""
-                ?coinDesignIconography rdf:li ?coinAppearance .
-                ?coinDesignIconography rdf:type rdf:Bag .
-                ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                ?coinSide nmo:hasIconography ?coinIconography .
-                ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                ?coinURI rdf:type nmo:NumismaticObject . 
-                }}
-                """
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjClassName)
-                """
-        
-        return query
+        return SUBJECT_OR_OBJECT_CLASSES.render(input=input, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
 
     def getRecommendationsSubObj(self, subj_uri, pred_uri, obj_uri, is_subject,  input, side):
@@ -953,6 +1533,7 @@ class CoinSearchHandler():
         results of the three sparql queries that are called in this function :  
             - sparqlQueryGetRecommendationsSubObjApartFromClasses,
             - sparqlQueryGetRecommendationsSubObjClasses
+        Both queries are independent and run in parallel.
         
         Parameters: 
             subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
@@ -982,8 +1563,35 @@ class CoinSearchHandler():
         else:
             obj_uri = "<"+obj_uri+">"
 
+        labels = self.labels
+        if labels is not None:
+            taxonomy = labels.taxonomy
+            entity_rows = set()
+            class_rows = set()
+            ocre = taxonomy.nodeId(OCRE_OBJECT_OBJECT)
+            for name, node in labels.entityNames(input):
+                uri = taxonomy.uri(node)
+                if taxonomy.isClass[node]:
+                    if node != ocre:
+                        class_rows.add((name, uri, None))
+                else:
+                    entity_rows.update((name, uri, taxonomy.uri(top)) for top in labels.categoriesOf(node))
+            # both checks are sent at once, the entities come first like before
+            entity_checks = self._submitOccurrenceChecks([uri for _, uri, _ in entity_rows], "entity", subj_uri, pred_uri, obj_uri, is_subject, side)
+            class_checks = self._submitOccurrenceChecks([uri for _, uri, _ in class_rows], "class", subj_uri, pred_uri, obj_uri, is_subject, side)
+            for uri, name, superClass in self._sortedRows(entity_rows, self._collectOccurring(entity_checks)):
+                result_dict.setdefault(self.categoryConverter(superClass), []).append({"link": uri, "name_en": name})
+            for uri, name, _ in self._sortedRows(class_rows, self._collectOccurring(class_checks)):
+                result_dict.setdefault("list_class", []).append({"link": uri, "name_en": name})
+            return result_dict
+
+        # both queries are sent at once, the results are merged in the same order as before
         query = self.sparqlQueryGetRecommendationsSubObjApartFromClasses(subj_uri,pred_uri,obj_uri, is_subject, input, side)
-        query_results = self.executeQuery(query)
+        entities_future = submitWithBudget(self.queryExecutor, self.executeQuery, query)
+        query = self.sparqlQueryGetRecommendationsSubObjClasses(subj_uri,pred_uri,obj_uri, is_subject, input, side)
+        classes_future = submitWithBudget(self.queryExecutor, self.executeQuery, query)
+
+        query_results = waitForResult(entities_future)
         
         category = ""
         for row in query_results:
@@ -998,8 +1606,7 @@ class CoinSearchHandler():
             else:
                 result_dict[category] = [result_item]
 
-        query = self.sparqlQueryGetRecommendationsSubObjClasses(subj_uri,pred_uri,obj_uri, is_subject, input, side)
-        query_results = self.executeQuery(query)
+        query_results = waitForResult(classes_future)
         
         category = "list_class"
         for row in query_results:
@@ -1040,150 +1647,8 @@ class CoinSearchHandler():
         Author: Steven Nowak
         """
 
-        # ?subOrObj = URI of the entity
-        # ?subOrObjName = edit label of the entity / name of the entity
+        return SIMPLE_GENERALISE.render(input=input, filter=filter, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
-        # search after all entities, respectively after all which start with a given filter if the filter isn't empty, 
-        #   which are exactly one level higher in the hierarchy and related to the current selected subject / object
-        # The entities also have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-        query = f"""
-                PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-                PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT Distinct ?subOrObj ?subOrObjName WHERE{{
-                    {{
-                        <{input}> rdfs:subClassOf ?subOrObj.
-                        Filter not exists {{
-                            <{input}> rdfs:subClassOf ?anyClass.
-                            ?anyClass rdfs:subClassOf ?subOrObj.
-                            FILTER(?anyClass != ?subOrObj && ?anyClass != <{input}>).
-                        }}
-                    }}
-                    UNION
-                    {{
-                        <{input}> rdf:type ?subOrObj.
-                        Filter not exists {{
-                            <{input}> rdf:type rdfs:Class.
-                        }}
-                        Filter not exists{{
-                            ?subOrObj rdfs:subClassOf <{input}>.
-                        }}
-                        Filter not exists {{
-                            ?subOrObj rdf:type <{input}>.  
-                        }}
-                        Filter not exists {{
-                            <{input}> rdf:type ?anyClass.
-                            ?anyClass rdfs:subClassOf ?subOrObj.
-                            FILTER(?anyClass != ?subOrObj && ?anyClass != <{input}>).
-                        }}
-                    }}
-                    Filter(?subOrObj != <{input}>).
-                    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?superClassName.
-                    BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 2))    
-                        ) AS ?subOrObjName
-                    ).
-                    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase("{filter}"))).
-                    Filter(?subOrObj != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
-                """
-        
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:subject ?subjEntity .
-                    """
-                if pred_uri != "?p":
-                    
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-
-                if obj_uri != "?o":
-                    query += f"""
-                        {{
-                            ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                        }}
-                        """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:li ?subjEntity .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object       
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?objEntity rdf:type ?subOrObj.
-                    ?coinAppearance rdf:object ?objEntity.
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side 
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-            query += f""" 
-                ?coinDesignIconography rdf:li ?coinAppearance .
-                ?coinDesignIconography rdf:type rdf:Bag .
-                ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                ?coinSide nmo:hasIconography ?coinIconography .
-                ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                ?coinURI rdf:type nmo:NumismaticObject .
-                }}
-                """
-
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjName)
-                """
-        return query
-
-    
 
     def sparqlQueryGetSimpleSpecializRecommendationsOfCurrentSubObj(self, input, subj_uri, pred_uri, obj_uri, is_subject, side, filter = ""): 
         """
@@ -1207,126 +1672,9 @@ class CoinSearchHandler():
         Author: Steven Nowak
         """
 
-        # ?subOrObj = URI of the entity
-        # ?subOrObjName = edit label of the entity / name of the entity
-        # search after all entities, respectively after all which start with a given filter if the filter isn't empty, 
-        #   which are exactly one level lower in the hierarchy and related to the current selected subject / object
-        # The entities also have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT Distinct ?subOrObj ?subOrObjName WHERE{{
-                    ?subOrObj rdfs:subClassOf <{input}> .
-                    Filter not exists {{
-                        ?subOrObj rdfs:subClassOf ?anyClass.
-                        ?anyClass rdfs:subClassOf <{input}>.
-                        FILTER(?subOrObj != ?anyClass && ?anyClass != <{input}>).
-                    }}
-                    Filter(?subOrObj != <{input}>).
-                    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?subClassName .
-  					BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?subClassName), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?subClassName), "^.*[/_#]", ""), 2))     
-                        ) AS ?subOrObjName
-                    ).
-                    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase("{filter}"))).
-                    Filter(?subOrObj != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
-                """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:subject ?subjEntity .
-                    """
-                if pred_uri != "?p":
-                    
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-
-                if obj_uri != "?o":
-
-                    query += f"""
-                        {{
-                            ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                        }}
-                        """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:li ?subjEntity .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object        
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?objEntity rdf:type ?subOrObj.
-                    ?coinAppearance rdf:object ?objEntity.
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-            query += f""" 
-                ?coinDesignIconography rdf:li ?coinAppearance .
-                ?coinDesignIconography rdf:type rdf:Bag .
-                ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                ?coinSide nmo:hasIconography ?coinIconography .
-                ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                ?coinURI rdf:type nmo:NumismaticObject .
-                }}
-                """
-
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjName)
-                """
-        return query
-    
+        return SIMPLE_SPECIALISE.render(input=input, filter=filter, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
+
+
     def sparqlQueryGetAbsoluteGeneraliseRecommendationsOfCurrentSubObj(self, input, subj_uri, pred_uri, obj_uri, is_subject, side, filter = ""):
         """
         Function to generate a Query which extracts the Parent Categorie
@@ -1349,134 +1697,8 @@ class CoinSearchHandler():
         Author: Steven Nowak
         """
 
-        # ?subOrObj = URI of the entity
-        # ?subOrObjName = edit label of the entity / name of the entity
-        # search after all entities, respectively after all which start with a given filter if the filter isn't empty, 
-        #   which are on top level in the hierarchy and related to the current selected subject / object
-        # The entities also have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT Distinct ?subOrObj ?subOrObjName WHERE{{
-                    {{
-                        <{input}> rdfs:subClassOf ?subOrObj.
-                    }}
-                    UNION
-                    {{
-                        <{input}> rdf:type ?subOrObj.
-                        Filter not exists {{
-                            <{input}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.
-                        }}
-                    }}
-                    Filter not exists {{
-                        ?subOrObj rdfs:subClassOf ?anyClass.
-                        FILTER(?subOrObj != ?anyClass).
-                    }}
-                    Filter(?subOrObj != <{input}>).
-                    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?superClassName.
-                    BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 2))      
-                        ) AS ?subOrObjName
-                    ).
-                    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase("{filter}"))).
-                """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:subject ?subjEntity .
-                    """
-                if pred_uri != "?p":
-                    
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-
-                if obj_uri != "?o":
-
-                    query += f"""
-                        {{
-                            ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                        }}
-                        """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?subjEntity rdf:type ?subOrObj.
-                        ?coinAppearance rdf:li ?subjEntity .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object        
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?objEntity rdf:type ?subOrObj.
-                    ?coinAppearance rdf:object ?objEntity.
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.      
-            query += f""" 
-                ?coinDesignIconography rdf:li ?coinAppearance .
-                ?coinDesignIconography rdf:type rdf:Bag .
-                ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                ?coinSide nmo:hasIconography ?coinIconography .
-                ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                ?coinURI rdf:type nmo:NumismaticObject .
-                }}
-                """
-
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjName)
-                """
-        return query
+        return ABSOLUTE_GENERALISE.render(input=input, filter=filter, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
-    
 
     def sparqlQueryGetAbsoluteSpecializRecommendationsOfCurrentSubObj(self, input, subj_uri, pred_uri, obj_uri, is_subject, side, filter = ""):
         """
@@ -1499,126 +1721,7 @@ class CoinSearchHandler():
         Author: Steven Nowak
         """
 
-        # ?subOrObj = URI of the entity
-        # ?subOrObjName = edit label of the entity / name of the entity
-        # ?superClass = URI of the top superclass of the entity
-        # search after all entities, respectively after all which start with a given filter if the filter isn't empty, 
-        #   which are exactly on the bottom of the hierarchy and related to the current selected subject / object
-        # The entities also have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT Distinct ?subOrObj ?subOrObjName ?superClass WHERE{{
-                    OPTIONAL{{
-                        <{input}> rdfs:subClassOf ?superClass .
-                        Filter not exists {{
-                            ?superClass rdfs:subClassOf ?anyClass.
-                            FILTER(?superClass != ?anyClass).
-                        }}
-                    }}
-                    ?subOrObj rdf:type <{input}>.
-                    Filter not exists {{
-                        ?subOrObj <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.
-                    }}
-  					?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?leafName.
-  					BIND(
-                        CONCAT(
-                            UCASE(SUBSTR(REPLACE(STR(?leafName), "^.*[/_#]", ""), 1, 1)),  
-                            LCASE(SUBSTR(REPLACE(STR(?leafName), "^.*[/_#]", ""), 2))    
-                        ) AS ?subOrObjName
-                    ).
-                    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase("{filter}"))).
-                """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-
-                query += f"""
-                    Filter Exists {{
-                        ?coinAppearance rdf:subject ?subOrObj .
-                    """
-                if pred_uri != "?p":
-                    query += f"""
-                            ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-
-                if obj_uri != "?o":
-                    query += f"""
-                            {{
-                                ?coinAppearance rdf:object {obj_uri} .
-                            }}
-                            UNION
-                            {{
-                                ?objEntity rdf:type {obj_uri} .
-                                ?coinAppearance rdf:object ?objEntity. 
-                            }}
-                        """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        ?coinAppearance rdf:li ?subOrObj .
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?coinAppearance rdf:object ?subOrObj .
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.      
-            query += f"""
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                    ?coinURI rdf:type nmo:NumismaticObject . 
-                }}
-                """
-
-        query += f"""
-                }} ORDER BY ASC(?subOrObjName)
-                """
-        return query
-
- 
+        return ABSOLUTE_SPECIALISE.render(input=input, filter=filter, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
 
     def sparqlQueryGetEquivalentRecommendationsToCurrentSubObj(self, input, subj_uri, pred_uri, obj_uri, is_subject, side, filter = ""):
@@ -1641,183 +1744,238 @@ class CoinSearchHandler():
         Author: Nico Lambert
         """
 
-        # ?toInputEquivalentSubOrObj = URI of the to the selected entity equivalent entity
-        # ?toInputEquivalentSubOrObjName = edit label of the to the selected entity equivalent entity / name of the to the selected entity equivalent entity
-        # ?superClass = URI of the top superclass of the to the selected entity equivalent entity
-        # search after all entities, respectively after all which start with a given filter if the filter isn't empty, 
-        #   which are on the same level in the hierarchy and related to the current selected subject / object
-        # The entities also have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-        query = f"""
-                PREFIX nmo: <http://nomisma.org/ontology#>
-                SELECT DISTINCT ?toInputEquivalentSubOrObj ?toInputEquivalentSubOrObjName ?superClass  WHERE {{
-                    OPTIONAL{{
-                        <{input}> rdf:type ?superClass .
-                        Filter NOT EXISTS {{
-                            ?superClass rdfs:subClassOf ?anyClass.
-                            FILTER(?superClass != ?anyClass).
-                            
-                        }}
-                        FILTER NOT EXISTS {{
-                            <{input}> rdf:type rdfs:Class.
-                        }}
-                    }}
-        	        {{
-                        <{input}> rdfs:subClassOf ?simpleGeneralization.
-                        FILTER NOT EXISTS {{
-                            <{input}> rdfs:subClassOf ?anyClass.
-                            ?anyClass rdfs:subClassOf ?simpleGeneralization.
-                            FILTER(?anyClass != ?simpleGeneralization && ?anyClass != <{input}>).
-                        }}
-                        ?toInputEquivalentSubOrObj rdfs:subClassOf ?simpleGeneralization .
-
-                        Filter NOT EXISTS {{
-                            ?toInputEquivalentSubOrObj rdfs:subClassOf ?anyClass.
-                            ?anyClass rdfs:subClassOf ?simpleGeneralization.
-                            FILTER(?toInputEquivalentSubOrObj != ?anyClass && ?toInputEquivalentSubOrObj != ?simpleGeneralization).
-                        }}
-                        Filter(?toInputEquivalentSubOrObj != ?simpleGeneralization).
-                        ?toInputEquivalentSubOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?equivalentSubOrObjName .
-                        BIND(
-                            CONCAT(
-                                UCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 1, 1)),  
-                                LCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 2))     
-                            ) AS ?toInputEquivalentSubOrObjName
-                        ).
-                    }}
-                    UNION
-                    {{
-                        <{input}> rdf:type ?simpleGeneralization.
-                        FILTER NOT EXISTS {{ <{input}> rdf:type rdfs:Class. }}
-                        FILTER NOT EXISTS {{ ?simpleGeneralization rdfs:subClassOf <{input}>. }}
-                        FILTER NOT EXISTS {{ ?simpleGeneralization rdf:type <{input}>. }}
-                        FILTER NOT EXISTS {{
-                            <{input}> rdf:type ?anyClass.
-                            ?anyClass rdfs:subClassOf ?simpleGeneralization.
-                            FILTER(?anyClass != ?simpleGeneralization && ?anyClass != <{input}>).
-                        }}
-                        ?toInputEquivalentSubOrObj rdf:type ?simpleGeneralization .
-                        FILTER NOT EXISTS {{
-                            ?toInputEquivalentSubOrObj rdfs:subClassOf ?anyClass.
-                            FILTER(?simpleGeneralization != ?anyClass).
-                        }}
-                        Filter(?toInputEquivalentSubOrObj != ?simpleGeneralization).
-                        ?toInputEquivalentSubOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?equivalentSubOrObjName .
-                        BIND(
-                            CONCAT(
-                                UCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 1, 1)),  
-                                LCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 2))     
-                            ) AS ?toInputEquivalentSubOrObjName
-                        ).
-                    }}
-                    Filter(Strstarts(Lcase(STR(?toInputEquivalentSubOrObjName)), Lcase("{filter}"))) .
-                    FILTER(?simpleGeneralization != <{input}>).
-  	                FILTER(?toInputEquivalentSubOrObj != <{input}>).
-                """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a subject
-        if (is_subject == "true"): 
-            # searched entities have to occour in a triple (on at least one coin) for the given coin side with the other entered triple elements.
-            # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with 
-            #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
-            # if predicate / object isn't entered yet it can be any predicate / object
-            if pred_uri != "?p" or obj_uri != "?o":
-                query += f"""
-                    Filter Exists {{
-                        {{
-                            ?coinAppearance rdf:subject ?toInputEquivalentSubOrObj .
-                        }}
-                        UNION
-                        {{
-                            ?subjEntity rdf:type ?toInputEquivalentSubOrObj.
-                            ?coinAppearance rdf:subject ?subjEntity .
-                        }}
-                    """
-                if pred_uri != "?p":
-                    query += f"""
-                        ?coinAppearance rdf:predicate {pred_uri}.
-                        """
-                
-                if obj_uri != "?o":
-                    query += f"""
-                        {{
-                        ?coinAppearance rdf:object {obj_uri} .
-                        }}
-                        UNION
-                        {{
-                            ?objEntity rdf:type {obj_uri} .
-                            ?coinAppearance rdf:object ?objEntity. 
-                        }}
-                    """
-                # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.  
-                query += f"""
-                        ?coinDesignIconography rdf:li ?coinAppearance .
-                        ?coinDesignIconography rdf:type rdf:Bag .
-                        ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-                    }}
-                    """
-            # no entered predicate and no entered object 
-            # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
-            else:
-                query += f"""
-                    Filter Exists {{
-                        {{
-                            ?coinAppearance rdf:li ?toInputEquivalentSubOrObj .
-                        }}
-                        UNION
-                        {{
-                            ?subjEntity rdf:type ?toInputEquivalentSubOrObj.
-                            ?coinAppearance rdf:li ?subjEntity 
-                        }}
-                        ?coinIconography nmo:hasAppearance ?coinAppearance .
-                        ?coinSide nmo:hasIconography ?coinIconography .
-                        ?coinURI nmo:has{side.capitalize()} ?coinSide .   
-                        ?coinURI rdf:type nmo:NumismaticObject . 
-
-                    }}
-                    """
-        # searched entitities have to occur in a triple (on at least one coin) for the given coin side as a object      
-        else:
-            query += f"""
-                Filter Exists {{
-                    ?coinAppearance rdf:object ?toInputEquivalentSubOrObj .
-                """
-            # if the entered subject is a class like deities , the entity has to occur in a triple (on at least one coin) for the given coin side with any deity, otherwise with
-            #    the specif entered subject
-            if subj_uri != "?s":
-                query += f"""
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    """
-            # if the user entered a predicate the object has to occur with it in a triple (on at least one coin) for the given coin side
-            if pred_uri != "?p":
-                query += f"""
-                    ?coinAppearance rdf:predicate {pred_uri}.
-                    """
-            # the searched entities have to be in a triple for the given coin side, on at least one coin which has the type numismatic object.      
-            query += f"""
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                    ?coinURI rdf:type nmo:NumismaticObject . 
-                }}
-                """
-
-        query += f"""
-                }} ORDER BY ASC(?toInputEquivalentSubOrObjName)
-                """
-        return query
+        return EQUIVALENT.render(input=input, filter=filter, **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
+
+
+    def sparqlQueryFilterSubObjOccurringOnCoins(self, candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Function to generate a Query which keeps those of the given candidate entities that occur in a triple (on at least one coin) 
+        for the given coin side with the other entered triple elements. It is the coin occurrence constraint of the recommendation
+        queries, used when the candidates themselves come from the taxonomy index.
+
+        Parameters:
+            candidates (list): URIs of the candidate entities
+            match (str): How a candidate has to occur - "entity": the candidate itself, "class": an entity of the candidate class,
+                         "either": the candidate itself or an entity of it
+            subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
+            pred_uri (str): The URI of the Current Predicate on the Coin Side the Function is triggered on
+            obj_uri (str): The URI of the Current Object on the Coin Side the Function is triggered on
+            is_subject (str): Can be true or false -> true means the candidates are for the subject, otherwise the object
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+
+        Returns:
+            str: A SPARQL Query whose ?subOrObj results are the occurring candidates
+        """
+
+        return SUBJECTS_OR_OBJECTS_OCCURRING_ON_COINS.render(
+            candidates=candidates, entityMatch=match == "entity", classMatch=match == "class", eitherMatch=match == "either",
+            **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side)
+        )
+
+
+    def _filterOccurringOnCoins(self, candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Keeps the candidates that occur on at least one coin for the given coin side with the other entered triple elements.
+        Many candidates are checked in batches that run in parallel.
+
+        Parameters:
+            candidates (list): URIs of the candidate entities
+            match (str): How a candidate has to occur, see sparqlQueryFilterSubObjOccurringOnCoins
+            subj_uri (str): The URI of the Current Subject, "?s" if not entered
+            pred_uri (str): The URI of the Current Predicate, "?p" if not entered
+            obj_uri (str): The URI of the Current Object, "?o" if not entered
+            is_subject (str): Can be true or false -> true means the candidates are for the subject, otherwise the object
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+
+        Returns:
+            set: URIs of the occurring candidates
+        """
+        return self._collectOccurring(self._submitOccurrenceChecks(candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side))
+
+    def _submitOccurrenceChecks(self, candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Sends the queries of _filterOccurringOnCoins without waiting for them.
+        If the appearance index is loaded, the candidates are checked with it right away instead.
+
+        Returns:
+            list: Futures of the sets of occurring candidates, see _collectOccurring
+        """
+        # sorted, so the same candidates always give the same query text and hit the result cache
+        candidates = sorted(set(candidates))
+        appearances = self.appearances
+        if appearances is not None:
+            future = Future()
+            future.set_result(self._occurringInIndex(appearances, candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side))
+            return [future]
 
+        futures = []
+        for start in range(0, len(candidates), self.occurrence_batch):
+            query = self.sparqlQueryFilterSubObjOccurringOnCoins(candidates[start:start + self.occurrence_batch], match, subj_uri, pred_uri, obj_uri, is_subject, side)
+            futures.append(submitWithBudget(self.queryExecutor, self._queryOccurring, query))
+        return futures
 
+    def _queryOccurring(self, query):
+        """
+        Executes a query of sparqlQueryFilterSubObjOccurringOnCoins.
+
+        Returns:
+            set: URIs of the occurring candidates
+        """
+        return {str(row.subOrObj) for row in self.executeQuery(query)}
+
+    def _occurringInIndex(self, appearances, candidates, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Checks the coin occurrence of the candidates with the appearance index, with the same constraints as sparqlQueryFilterSubObjOccurringOnCoins.
+
+        Parameters:
+            appearances (AppearanceIndex): The index to check with
+            candidates (list): URIs of the candidate entities
+            match, subj_uri, pred_uri, obj_uri, is_subject, side: see _filterOccurringOnCoins
+
+        Returns:
+            set: URIs of the occurring candidates
+        """
+        if not candidates:
+            return set()
+        position, elements = self._indexPosition(subj_uri, pred_uri, obj_uri, is_subject)
+        found = appearances.occurring(candidates, match, side, position, **elements)
+        return {candidate for candidate, occurs in zip(candidates, found) if occurs}
+
+    def _indexPosition(self, subj_uri, pred_uri, obj_uri, is_subject):
+        """
+        Returns where candidates have to occur in the appearance index, with the same constraints as sparqlQueryFilterSubObjOccurringOnCoins.
+
+        Parameters:
+            subj_uri, pred_uri, obj_uri, is_subject: see _filterOccurringOnCoins
+
+        Returns:
+            tuple: (position, dict of the entered triple elements constraining it), see AppearanceIndex.occurring
+        """
+        subject, predicate, obj = (self._termUri(term) for term in (subj_uri, pred_uri, obj_uri))
+        if is_subject == "true" and predicate is None and obj is None:
+            return "entity", {}
+        if is_subject == "true":
+            return "subject", {"predicate": predicate, "obj": obj}
+        return "object", {"subject": subject, "predicate": predicate}
+
+    def _termUri(self, term):
+        """
+        Turns an entered triple element in SPARQL notation back into its URI.
+
+        Parameters:
+            term (str): "<URI>" or a variable like "?s" if the element is not entered
+
+        Returns:
+            str: The URI, None if the element is not entered
+        """
+        if term.startswith("<") and term.endswith(">"):
+            return term[1:-1]
+        return None
+
+    def _queryArguments(self, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Returns the arguments of the recommendation query templates (see RecommendationQueries) for the entered triple elements.
+        The URIs are bound by the templates, so an entered element can not change the structure of a query.
+
+        Parameters:
+            subj_uri (str): The URI of the Current Subject in SPARQL notation, "?s" if not entered
+            pred_uri (str): The URI of the Current Predicate in SPARQL notation, "?p" if not entered
+            obj_uri (str): The URI of the Current Object in SPARQL notation, "?o" if not entered
+            is_subject (str): Can be true or false -> true means the recommendations are for the subject, otherwise the object
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+
+        Returns:
+            dict: subject, predicate, object, isSubject, withPredicateOrObject and sideProperty
+        """
+        subject, predicate, obj = (self._termUri(term) for term in (subj_uri, pred_uri, obj_uri))
+        return {
+            "subject": subject,
+            "predicate": predicate,
+            "object": obj,
+            "isSubject": is_subject == "true",
+            "withPredicateOrObject": predicate is not None or obj is not None,
+            "sideProperty": sideProperty(side),
+        }
+
+    def _collectOccurring(self, futures):
+        """
+        Waits for the checks sent by _submitOccurrenceChecks.
+
+        Returns:
+            set: URIs of the occurring candidates
+        """
+        occurring = set()
+        for future in futures:
+            occurring.update(waitForResult(future))
+        return occurring
+
+    def _taxonomyInstances(self, taxonomy, node):
+        """
+        Returns the entities of a class as candidates, in the category of the top level classes of the class.
+
+        Parameters:
+            taxonomy (TaxonomyIndex): The index the class belongs to
+            node (int): Node id of the class
+
+        Returns:
+            list: (node id, category URI or None) pairs
+        """
+        superClasses = [taxonomy.uri(top) for top in taxonomy.topsOf(node)] or [None]
+        return [(instance, superClass) for instance in taxonomy.instancesOf(node) for superClass in superClasses]
+
+    def _taxonomyRecommendations(self, taxonomy, candidates, filter, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Turns candidate nodes of the taxonomy index into recommendation rows: candidates without a display name starting with the filter
+        and candidates that do not occur on a coin for the given coin side are removed.
+
+        Parameters:
+            taxonomy (TaxonomyIndex): The index the candidates belong to
+            candidates (iterable): (node id, category URI or None) pairs
+            filter (str): User based Input that Removes all Entities that dont start with the String
+            match (str): How a candidate has to occur on a coin, see sparqlQueryFilterSubObjOccurringOnCoins
+            subj_uri, pred_uri, obj_uri, is_subject, side: The entered triple elements and coin side, see _filterOccurringOnCoins
+
+        Returns:
+            list: (URI, name, category URI or None) rows, sorted by name like the results of the recommendation queries
+        """
+        prefix = filter.lower()
+        rows = set()
+        for node, category in candidates:
+            uri = taxonomy.uri(node)
+            for name in taxonomy.names[node]:
+                if name.lower().startswith(prefix):
+                    rows.add((name, uri, category))
+        return self._occurringRows(rows, match, subj_uri, pred_uri, obj_uri, is_subject, side)
+
+    def _occurringRows(self, rows, match, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Removes the recommendation rows of entities that do not occur on a coin for the given coin side and sorts the rest.
+
+        Parameters:
+            rows (set): (name, URI, category URI or None) rows
+            match (str): How an entity has to occur on a coin, see sparqlQueryFilterSubObjOccurringOnCoins
+            subj_uri, pred_uri, obj_uri, is_subject, side: The entered triple elements and coin side, see _filterOccurringOnCoins
+
+        Returns:
+            list: (URI, name, category URI or None) rows, sorted by name like the results of the recommendation queries
+        """
+        if not rows:
+            return []
+        occurring = self._filterOccurringOnCoins([uri for _, uri, _ in rows], match, subj_uri, pred_uri, obj_uri, is_subject, side)
+        return self._sortedRows(rows, occurring)
+
+    def _sortedRows(self, rows, occurring):
+        """
+        Keeps the recommendation rows of the occurring entities, sorted by name.
+
+        Parameters:
+            rows (set): (name, URI, category URI or None) rows
+            occurring (set): URIs of the entities to keep
+
+        Returns:
+            list: (URI, name, category URI or None) rows
+        """
+        return [(uri, name, category) for name, uri, category in sorted(rows, key=lambda row: (row[0], row[1], row[2] or "")) if uri in occurring]
 
     def getSimpleGeneraliseRecommendationsOfCurrentSubObj(self, subj_uri, pred_uri, obj_uri, is_subject, side, filter=""):
         """
@@ -1858,6 +2016,16 @@ class CoinSearchHandler():
         else:
             obj_uri = "<"+obj_uri+">"
         
+        taxonomy = self.taxonomy
+        if taxonomy is not None:
+            node = taxonomy.nodeId(input)
+            ocre = taxonomy.nodeId(OCRE_OBJECT_OBJECT)
+            candidates = [] if node is None else [(parent, None) for parent in taxonomy.parentsOf(node) if parent != ocre]
+            rows = self._taxonomyRecommendations(taxonomy, candidates, filter, "class", subj_uri, pred_uri, obj_uri, is_subject, side)
+            if rows:
+                result_dict["list_class"] = [{"link": uri, "name_en": name} for uri, name, _ in rows]
+            return result_dict
+
         query = self.sparqlQueryGetSimpleGeneraliseRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
         query_results = self.executeQuery(query)
         
@@ -1913,8 +2081,30 @@ class CoinSearchHandler():
         else:
             obj_uri = "<"+obj_uri+">"
 
+        taxonomy = self.taxonomy
+        if taxonomy is not None:
+            node = taxonomy.nodeId(input)
+            if node is None:
+                return result_dict
+            ocre = taxonomy.nodeId(OCRE_OBJECT_OBJECT)
+            candidates = [(child, None) for child in taxonomy.childrenOf(node) if child != ocre]
+            rows = self._taxonomyRecommendations(taxonomy, candidates, filter, "class", subj_uri, pred_uri, obj_uri, is_subject, side)
+            if rows:
+                result_dict["list_class"] = [{"link": uri, "name_en": name} for uri, name, _ in rows]
+                return result_dict
+            rows = self._taxonomyRecommendations(taxonomy, self._taxonomyInstances(taxonomy, node), filter, "entity", subj_uri, pred_uri, obj_uri, is_subject, side)
+            for uri, name, superClass in rows:
+                result_dict.setdefault(self.categoryConverter(str(superClass)), []).append({"link": uri, "name_en": name})
+            return result_dict
+
+        # the child entities are only used if there are no child classes, but both queries are sent at once 
+        # so that a miss does not cost two sequential round trips
         query = self.sparqlQueryGetSimpleSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
-        query_results = self.executeQuery(query)
+        classes_future = submitWithBudget(self.queryExecutor, self.executeQuery, query)
+        query = self.sparqlQueryGetAbsoluteSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
+        entities_future = submitWithBudget(self.queryExecutor, self.executeQuery, query)
+
+        query_results = waitForResult(classes_future)
         if len(query_results) > 0:
             category = "list_class"
             for row in query_results:
@@ -1927,8 +2117,7 @@ class CoinSearchHandler():
                 else:
                     result_dict[category] = [result_item]
         else:
-            query = self.sparqlQueryGetAbsoluteSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
-            query_results = self.executeQuery(query)
+            query_results = waitForResult(entities_future)
             for row in query_results:
                 category = self.categoryConverter(str(row.superClass))
                 result_item = {
@@ -1985,6 +2174,15 @@ class CoinSearchHandler():
             obj_uri = "<"+obj_uri+">"
 
 
+        taxonomy = self.taxonomy
+        if taxonomy is not None:
+            node = taxonomy.nodeId(input)
+            candidates = [] if node is None else [(top, None) for top in taxonomy.topsOf(node)]
+            rows = self._taxonomyRecommendations(taxonomy, candidates, filter, "class", subj_uri, pred_uri, obj_uri, is_subject, side)
+            if rows:
+                result_dict["list_class"] = [{"link": uri, "name_en": name} for uri, name, _ in rows]
+            return result_dict
+
         query = self.sparqlQueryGetAbsoluteGeneraliseRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
         query_results = self.executeQuery(query)
         
@@ -2040,6 +2238,16 @@ class CoinSearchHandler():
             obj_uri = "?o" 
         else:
             obj_uri = "<"+obj_uri+">"
+        taxonomy = self.taxonomy
+        if taxonomy is not None:
+            node = taxonomy.nodeId(input)
+            candidates = [] if node is None else self._taxonomyInstances(taxonomy, node)
+            rows = self._taxonomyRecommendations(taxonomy, candidates, filter, "entity", subj_uri, pred_uri, obj_uri, is_subject, side)
+            for uri, name, superClass in rows:
+                category = self.categoryConverter(str(superClass if superClass is not None else input))
+                result_dict.setdefault(category, []).append({"link": uri, "name_en": name})
+            return result_dict
+
         query = self.sparqlQueryGetAbsoluteSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
         query_results = self.executeQuery(query)
         for row in query_results:
@@ -2097,6 +2305,21 @@ class CoinSearchHandler():
             obj_uri = "?o" 
         else:
             obj_uri = "<"+obj_uri+">"
+        taxonomy = self.taxonomy
+        if taxonomy is not None:
+            node = taxonomy.nodeId(input)
+            if node is None:
+                return result_dict
+            # classes are recommended as classes, entities in the category of their top level class
+            superClasses = [None] if taxonomy.isClass[node] else [taxonomy.uri(top) for top in taxonomy.topsOf(node)] or [None]
+            candidates = [(sibling, superClass) for sibling, _ in taxonomy.siblingsOf(node) for superClass in superClasses]
+            match = "either" if is_subject == "true" else "entity"
+            rows = self._taxonomyRecommendations(taxonomy, candidates, filter, match, subj_uri, pred_uri, obj_uri, is_subject, side)
+            for uri, name, superClass in rows:
+                category = "list_class" if superClass is None else self.categoryConverter(superClass)
+                result_dict.setdefault(category, []).append({"link": uri, "name_en": name})
+            return result_dict
+
         query = self.sparqlQueryGetEquivalentRecommendationsToCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, filter)
         query_results = self.executeQuery(query)
 
@@ -2116,9 +2339,51 @@ class CoinSearchHandler():
         return result_dict
 
 
+    def _availableFromIndexes(self, kind, subj_uri, pred_uri, obj_uri, is_subject, side):
+        """
+        Checks with the local indexes if at least one hierarchy recommendation of a kind exists for the current Subject or Object.
+        No recommendation list is built: the candidates of the taxonomy index are checked with the appearance index until the
+        first one occurring on a coin is found (see AppearanceIndex.anyOccurring).
+
+        Parameters:
+            kind (str): "generalise" (simple), "specialise" (simple or absolute) or "equivalent"
+            subj_uri, pred_uri, obj_uri (str): The entered triple elements in SPARQL notation, see _termUri
+            is_subject (str): Can be true or false -> true means current input is for subject, otherwise object
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+
+        Returns:
+            str: "true" or "false", None if the taxonomy or the appearance index is not loaded
+        """
+        taxonomy = self.taxonomy
+        appearances = self.appearances
+        if taxonomy is None or appearances is None:
+            return None
+        input = self._termUri(subj_uri if is_subject == "true" else obj_uri)
+        node = None if input is None else taxonomy.nodeId(input)
+        if node is None:
+            return "false"
+
+        # (candidate node ids, how they have to occur) like in the recommendation functions
+        ocre = taxonomy.nodeId(OCRE_OBJECT_OBJECT)
+        if kind == "generalise":
+            checks = [([parent for parent in taxonomy.parentsOf(node) if parent != ocre], "class")]
+        elif kind == "specialise":
+            # the child classes of the simple specialisation, the child entities of both specialisations
+            checks = [([child for child in taxonomy.childrenOf(node) if child != ocre], "class"), (taxonomy.instancesOf(node), "entity")]
+        else:
+            checks = [([sibling for sibling, _ in taxonomy.siblingsOf(node)], "either" if is_subject == "true" else "entity")]
+
+        position, elements = self._indexPosition(subj_uri, pred_uri, obj_uri, is_subject)
+        for candidates, match in checks:
+            # a recommendation needs a name
+            uris = (taxonomy.uri(candidate) for candidate in candidates if taxonomy.names[candidate])
+            if appearances.anyOccurring(uris, match, side, position, **elements):
+                return "true"
+        return "false"
+
     def sparqlQueryAreGeneraliseRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
-        Function to generate a SPARQL Query, that checks if at least one generalisation recommendation exists for the current Subject or Object
+        Function to generate a SPARQL ASK Query, that checks if at least one generalisation recommendation exists for the current Subject or Object
 
         Parameters: 
             subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
@@ -2129,15 +2394,13 @@ class CoinSearchHandler():
             side (str): Coin side of the current input - 'obverse' or 'reverse'
 
         Returns:
-            str: SPARQL Query 
+            str: SPARQL ASK Query 
 
         Author: Nico Lambert
         """
-        query = self.sparqlQueryGetSimpleGeneraliseRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, "")
-        query += f"""
-            LIMIT 1
-            """
-        return query
+
+        return SIMPLE_GENERALISE_AVAILABLE.render(input=input, filter="", **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
+
 
     def areGeneraliseRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
@@ -2158,9 +2421,12 @@ class CoinSearchHandler():
         
         Author: Nico Lambert
         """
+        available = self._availableFromIndexes("generalise", subj_uri, pred_uri, obj_uri, is_subject, side)
+        if available is not None:
+            return available
         query = self.sparqlQueryAreGeneraliseRecommendationsOfCurrentTagAvailable(subj_uri, pred_uri, obj_uri, is_subject, input, side)
         query_results = self.executeQuery(query)
-        if (len(query_results) > 0):
+        if query_results.askAnswer:
             return "true"
         else:
             return "false"
@@ -2168,7 +2434,8 @@ class CoinSearchHandler():
     
     def sparqlQueryAreSpecialiseRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
-        Function to generate a SPARQL Query, that checks if at least one specialisation recommendation exists for the current Subject or Object
+        Function to generate a SPARQL ASK Query, that checks if at least one specialisation recommendation exists for the current Subject or Object.
+        Both kinds of specialisation, child entities (absolute) and child classes (simple), are checked in a single query.
 
         Parameters:
             subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
@@ -2179,40 +2446,13 @@ class CoinSearchHandler():
             side (str): Coin side of the current input - 'obverse' or 'reverse'
 
         Returns:
-            str: SPARQL Query that checks if at least one Specialisation Recommendation exists for the current Subject or Object
+            str: SPARQL ASK Query that checks if at least one Specialisation Recommendation exists for the current Subject or Object
             
         Author: Nico Lambert
         """
-        query = self.sparqlQueryGetAbsoluteSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, "")
-        query += f"""
-            LIMIT 1
-            """
-        
-        return query
-    
-    def sparqlQueryAreSpecialiseClassRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
-        """
-        Function to generate a SPARQL Query, that checks if at least one specialisation recommendation from type class exists for the current Subject or Object
 
-        Parameters:
-            subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
-            pred_uri (str): The URI of the Current Predicate on the Coin Side the Function is triggered on
-            obj_uri (str): The URI of the Current Object on the Coin Side the Function is triggered on
-            is_subject (str): Can be true or false -> true means current input is for subject, otherwise object
-            input (str): The URI of the Current Subject or Object in the Input Field
-            side (str): Coin side of the current input - 'obverse' or 'reverse'
+        return SPECIALISE_AVAILABLE.render(input=input, filter="", **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
 
-        Returns:
-            str: SPARQL Query that checks if at least one Specialisation Recommendation from type class exists for the current Subject or Object
-            
-        Author: Nico Lambert
-        """
-        query = self.sparqlQueryGetSimpleSpecializRecommendationsOfCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, "")
-        query += f"""
-            LIMIT 1
-            """
-        
-        return query
 
     def areSpecialiseRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
@@ -2233,25 +2473,19 @@ class CoinSearchHandler():
 
         Author: Nico Lambert
         """
-        
+        available = self._availableFromIndexes("specialise", subj_uri, pred_uri, obj_uri, is_subject, side)
+        if available is not None:
+            return available
         query = self.sparqlQueryAreSpecialiseRecommendationsOfCurrentTagAvailable(subj_uri, pred_uri, obj_uri, is_subject, input, side)
-
         query_results = self.executeQuery(query)
-
-        
-        if (len(query_results) > 0):
+        if query_results.askAnswer:
             return "true"
         else:
-            query = self.sparqlQueryAreSpecialiseClassRecommendationsOfCurrentTagAvailable(subj_uri, pred_uri, obj_uri, is_subject, input, side)
-            query_results = self.executeQuery(query)
-            if (len(query_results) > 0):
-                return "true"
-            else:
-                return "false"
+            return "false"
         
     def sparqlQueryAreEquivalentRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
-        Function to generate a SPARQL Query, that checks if at least one equivalent recommendation exists for the current Subject or Object
+        Function to generate a SPARQL ASK Query, that checks if at least one equivalent recommendation exists for the current Subject or Object
 
         Parameters:
             subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
@@ -2262,16 +2496,13 @@ class CoinSearchHandler():
             side (str): Coin side of the current input - 'obverse' or 'reverse'
 
         Returns:
-            str: SPARQL Query that checks if at least one Equivalent Recommendation exists
+            str: SPARQL ASK Query that checks if at least one Equivalent Recommendation exists
         
         Author: Steven Nowak
         """
-        query = self.sparqlQueryGetEquivalentRecommendationsToCurrentSubObj(input, subj_uri, pred_uri, obj_uri, is_subject, side, "")
-        query += f"""
-            LIMIT 1
-            """
-        
-        return query
+
+        return EQUIVALENT_AVAILABLE.render(input=input, filter="", **self._queryArguments(subj_uri, pred_uri, obj_uri, is_subject, side))
+
 
     def areEquivalentRecommendationsOfCurrentTagAvailable(self, subj_uri, pred_uri, obj_uri, is_subject, input, side):
         """
@@ -2293,11 +2524,13 @@ class CoinSearchHandler():
         
         Author: Steven Nowak
         """
-        
+        available = self._availableFromIndexes("equivalent", subj_uri, pred_uri, obj_uri, is_subject, side)
+        if available is not None:
+            return available
         query = self.sparqlQueryAreEquivalentRecommendationsOfCurrentTagAvailable(subj_uri, pred_uri, obj_uri, is_subject, input, side)
         query_results = self.executeQuery(query)
         
-        if (len(query_results) > 0):
+        if query_results.askAnswer:
             return "true"
         else:
             return "false"
@@ -2305,43 +2538,22 @@ class CoinSearchHandler():
 
     def sparqlQueryAreRecommendationsAvailable(self, subj_uri, side):
         """
-        Function to generate a SPARQL Query, that checks if at least one Predicate and one Object Recommendation exist for the current Subject
+        Function to generate a SPARQL ASK Query, that checks if at least one Predicate and one Object Recommendation exist for the current Subject
 
         Parameters:
             subj_uri (str): The URI of the Current Subject on the Coin Side the Function is triggered on 
             side (str): Coin side of the current input - 'obverse' or 'reverse'
 
         Returns:
-            str: SPARQL Query that checks if at least one Predicate and Object Recommendation exists for the current coin side
+            str: SPARQL ASK Query that checks if at least one Predicate and Object Recommendation exists for the current coin side
         
         Author: Steven Nowak
         """
 
-        # ?coinURI = URI of a coin which contains a triple with the current selected triple for the given coin side
-        # search after one coin uri which contains a triple with the current selected triple for the given coin side
-        query = f"""
-            PREFIX nmo: <http://nomisma.org/ontology#>
-            SELECT DISTINCT ?coinURI WHERE{{
-                Filter Exists {{
-                    {{
-                        ?coinAppearance rdf:subject {subj_uri} .
-                    }}
-                    UNION
-                    {{
-                        ?subEntity rdf:type {subj_uri} .
-                        ?coinAppearance rdf:subject ?subEntity. 
-                    }}
-                    ?coinDesignIconography rdf:li ?coinAppearance .
-                    ?coinDesignIconography rdf:type rdf:Bag .
-                    ?coinIconography nmo:hasIconography ?coinDesignIconography .
-                    ?coinSide nmo:hasIconography ?coinIconography .
-                    ?coinURI nmo:has{side.capitalize()} ?coinSide .
-                    ?coinURI rdf:type nmo:NumismaticObject . 
-                }}
-            }} Limit 1
-                """
-        return query 
-    
+        # checks if there is at least one coin which contains a triple with the current selected subject for the given coin side
+        return RECOMMENDATIONS_AVAILABLE.render(subject=self._termUri(subj_uri), sideProperty=sideProperty(side))
+
+
     def areRecommendationsAvailable(self, subj_uri, side):  
         """
         Function that checks if at least one Predicate and Object Recommendation exists for the current coin side
@@ -2358,11 +2570,96 @@ class CoinSearchHandler():
 
         Author: Steven Nowak
         """
+        appearances = self.appearances
+        uri = self._termUri(subj_uri)
+        if appearances is not None and uri is not None:
+            return "true" if appearances.occurring([uri], "either", side, "subject")[0] else "false"
+
         query = self.sparqlQueryAreRecommendationsAvailable(subj_uri, side)
 
         query_results = self.executeQuery(query)
-        if(len(query_results) > 0):
+        if query_results.askAnswer:
             return "true"
         else:
             return "false"
-        
+
+    def getTripleContextBundle(self, subj_uri, pred_uri, obj_uri, side, slot="", search_type="standard", q=""):
+        """
+        Function that answers everything the frontend needs for one triple context in a single call:
+        the availability of generalise / specialise / equivalent recommendations for the current subject and object,
+        the availability of predicate and object recommendations for the current subject and optionally the recommendations
+        for one slot of the triple. All queries run concurrently on the bounded bundleExecutor.
+
+        Parameters:
+            subj_uri (str): The URI of the Current Subject on the Coin Side, empty if there is none
+            pred_uri (str): The URI of the Current Predicate on the Coin Side, empty if there is none
+            obj_uri (str): The URI of the Current Object on the Coin Side, empty if there is none
+            side (str): Coin side of the current input - 'obverse' or 'reverse'
+            slot (str): 'subject', 'predicate' or 'object' to include the recommendations for this slot, empty for none
+            search_type (str): Type of the recommendations for subject and object slots, same values as in the callback action getRecommendationsSubObj
+            q (str): The user input for the recommendations of the slot (filter for hierarchy searches)
+
+        Returns:
+            dict: "subject" and "object" contain the availability flags ("true" / "false") of the entered entities
+                  with the keys "generalise", "specialise", "equivalent" (and "recommendationsAvailable" for the subject),
+                  "recommendations" contains the recommendations of the slot in the same format as the single actions return them.
+                  If the time budget of the request is used up, the parts that are not answered yet are None and "timedOut" is True.
+                  Parts that could not be answered because the endpoint is unavailable are None as well.
+                  A part that failed otherwise (e.g. a rejected query or an unknown search_type) is None, the other parts are
+                  still returned and "errors" maps the failed part (e.g. "subject.generalise", "recommendations") to its error.
+        """
+        # the availability checks expect the URIs in SPARQL notation
+        subj_term = "<"+subj_uri+">" if subj_uri != "" else "?s"
+        pred_term = "<"+pred_uri+">" if pred_uri != "" else "?p"
+        obj_term = "<"+obj_uri+">" if obj_uri != "" else "?o"
+
+        futures = {}
+        for key, uri, is_subject in (("subject", subj_uri, "true"), ("object", obj_uri, "false")):
+            if uri == "":
+                continue
+            futures[(key, "generalise")] = submitWithBudget(self.bundleExecutor, self.areGeneraliseRecommendationsOfCurrentTagAvailable, subj_term, pred_term, obj_term, is_subject, uri, side)
+            futures[(key, "specialise")] = submitWithBudget(self.bundleExecutor, self.areSpecialiseRecommendationsOfCurrentTagAvailable, subj_term, pred_term, obj_term, is_subject, uri, side)
+            futures[(key, "equivalent")] = submitWithBudget(self.bundleExecutor, self.areEquivalentRecommendationsOfCurrentTagAvailable, subj_term, pred_term, obj_term, is_subject, uri, side)
+
+        if subj_uri != "" and pred_uri == "" and obj_uri == "":
+            futures[("subject", "recommendationsAvailable")] = submitWithBudget(self.bundleExecutor, self.areRecommendationsAvailable, subj_term, side)
+
+        bundle = {}
+        if slot == "predicate":
+            futures[("recommendations",)] = submitWithBudget(self.bundleExecutor, self.getRecommendationsPredicate, subj_uri, obj_uri, q, side)
+        elif slot in ("subject", "object"):
+            is_subject = "true" if slot == "subject" else "false"
+            recommendation_functions = {
+                "hierarchy-generalise-simple": self.getSimpleGeneraliseRecommendationsOfCurrentSubObj,
+                "hierarchy-specialise-simple": self.getSimpleSpecializRecommendationsOfCurrentSubObj,
+                "hierarchy-generalise-absolute": self.getAbsoluteGeneraliseRecommendationsOfCurrentSubObj,
+                "hierarchy-specialise-absolute": self.getAbsoluteSpecializRecommendationsOfCurrentSubObj,
+                "hierarchy-equivalent": self.getEquivalentRecommendationsToCurrentSubObj,
+            }
+            if search_type == "standard":
+                futures[("recommendations",)] = submitWithBudget(self.bundleExecutor, self.getRecommendationsSubObj, subj_uri, pred_uri, obj_uri, is_subject, q, side)
+            elif search_type in recommendation_functions:
+                futures[("recommendations",)] = submitWithBudget(self.bundleExecutor, recommendation_functions[search_type], subj_uri, pred_uri, obj_uri, is_subject, side, q)
+            else:
+                bundle["recommendations"] = None
+                bundle["errors"] = {"recommendations": f"Unknown search type {search_type}"}
+
+        for key, future in futures.items():
+            try:
+                value = waitForResult(future)
+            except QueryTimeout:
+                # the answered parts are still returned
+                value = None
+                bundle["timedOut"] = True
+            except CircuitOpen:
+                value = None
+            except Exception as e:
+                # a failed part does not fail the other parts of the bundle
+                print(f"Part {'.'.join(key)} of the triple context bundle failed: {e}")
+                value = None
+                bundle.setdefault("errors", {})[".".join(key)] = str(e)
+            if len(key) == 1:
+                bundle[key[0]] = value
+            else:
+                bundle.setdefault(key[0], {})[key[1]] = value
+        return bundle
@@ -0,0 +1,134 @@
+import hashlib
+import threading
+
+
+BASE_GRAPH = "urn:igc:base"
+
+# counts the triples of the stored data, the inferences of the reasoner are not computed for it (see apache/config.ttl)
+BASE_GRAPH_COUNT = f"SELECT (COUNT(*) AS ?count) WHERE {{ GRAPH <{BASE_GRAPH}> {{ ?s ?p ?o }} }}"
+
+
+class DatasetVersionProbe():
+    """
+    Detects changes of the dataset behind a SPARQL endpoint with a cheap probe query, e.g. a triple count or a version triple.
+
+    The version is the hash of the probe result. The probe runs on a background thread every interval, the requests only read
+    the known version and never wait for the endpoint. While the circuit breaker is open, the probe is skipped. When the
+    version changes, the registered listeners are called, so caches and precomputed indexes built from the old data can be dropped.
+
+    Attributes:
+        transport (SparqlTransport): Transport to send the probe query with.
+        probe_query (str): SPARQL query whose result changes whenever the dataset changes.
+        interval (float): Seconds between two probes.
+        timeout (float): Read timeout of the probe query in seconds.
+        breaker (CircuitBreaker): Breaker of the endpoint, None to probe regardless of its state.
+        version (str): Current dataset version, None until the first probe succeeded.
+    """
+
+    def __init__(self, transport, probe_query=BASE_GRAPH_COUNT, interval=300, timeout=10, breaker=None):
+        """
+        Initializes the probe. The background probe starts on the first call of current or start.
+
+        Parameters:
+            transport (SparqlTransport): Transport to send the probe query with.
+            probe_query (str): SPARQL query whose result changes whenever the dataset changes.
+            interval (float): Seconds between two probes.
+            timeout (float): Read timeout of the probe query in seconds.
+            breaker (CircuitBreaker): Breaker of the endpoint, None to probe regardless of its state.
+        """
+        self.transport = transport
+        self.probe_query = probe_query
+        self.interval = interval
+        self.timeout = timeout
+        self.breaker = breaker
+        self.version = None
+        self._listeners = []
+        self._thread = None
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def addListener(self, listener):
+        """
+        Registers a function that is called with (old_version, new_version) when the dataset changed.
+
+        Parameters:
+            listener (function): The function to call.
+        """
+        self._listeners.append(listener)
+
+    def current(self):
+        """
+        Returns the dataset version known from the last successful probe, without querying the endpoint.
+        The first call starts the background probe, after the listeners have been registered. A stopped probe is not restarted.
+
+        Returns:
+            str: The current dataset version, None if the endpoint could not be probed yet.
+        """
+        if not self._started:
+            self.start()
+        return self.version
+
+    def start(self):
+        """
+        Starts the background probe, if it is not running yet. The first probe runs immediately.
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._started = True
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="dataset-version-probe", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background probe, a started probe still runs once.
+        """
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+
+    def _run(self):
+        """
+        Probes the endpoint every interval until the probe is stopped.
+        """
+        while True:
+            if self.breaker is not None and self.breaker.isOpen():
+                print("Dataset version probe skipped, the SPARQL circuit breaker is open")
+            else:
+                self.check()
+            if self._stopped.wait(self.interval):
+                return
+
+    def check(self):
+        """
+        Runs the probe query and notifies the listeners if the version changed.
+        If the probe fails, the known version is kept and the background probe retries after the interval.
+
+        Returns:
+            bool: True if the version changed.
+        """
+        try:
+            result = self.transport.query(self.probe_query, timeout=self.timeout)
+        except Exception as e:
+            print(f"Dataset version probe failed: {e}")
+            return False
+
+        if result.type == "ASK":
+            values = str(result.askAnswer)
+        else:
+            values = "\n".join("\t".join(str(value) for value in row) for row in result)
+        version = hashlib.sha1(values.encode("utf-8")).hexdigest()[:16]
+
+        old_version = self.version
+        if version == old_version:
+            return False
+        self.version = version
+        if old_version is not None:
+            print(f"Dataset changed, version {old_version} -> {version}")
+        for listener in self._listeners:
+            listener(old_version, version)
+        return True
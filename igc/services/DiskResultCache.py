@@ -0,0 +1,144 @@
+from io import BytesIO
+import sqlite3
+import threading
+import time
+
+from rdflib.query import Result
+
+
+class DiskResultCache():
+    """
+    SQLite backed cache for SPARQL query results, shared by all worker processes on a machine and kept across restarts.
+
+    The database runs in WAL mode, so readers of other processes are not blocked while a result is written.
+    Results are stored in the SPARQL 1.1 JSON results format. An entry belongs to a dataset version and is only
+    returned for that version, entries of other versions are removed by prune.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        ttl (float): Seconds an entry is fresh.
+        stale_ttl (float): Seconds an expired entry may still be served while it is refreshed.
+        max_entries (int): Number of entries kept by prune.
+        prune_interval (int): Number of writes of this process after which prune runs.
+    """
+
+    def __init__(self, path, ttl=3600, stale_ttl=86400, max_entries=100000, prune_interval=1000):
+        """
+        Initializes the cache and creates the database if it does not exist.
+
+        Parameters:
+            path (str): Path of the SQLite database file.
+            ttl (float): Seconds an entry is fresh.
+            stale_ttl (float): Seconds an expired entry may still be served while it is refreshed.
+            max_entries (int): Number of entries kept by prune.
+            prune_interval (int): Number of writes of this process after which prune runs.
+        """
+        self.path = str(path)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                stored REAL NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (key, version)
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS results_stored ON results (stored)")
+        connection.commit()
+
+    def _connection(self):
+        """
+        Returns the database connection of the current thread. SQLite connections must not be shared between threads.
+
+        Returns:
+            sqlite3.Connection: Connection of the current thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # a writer of another process holds the lock only for a single insert
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, version):
+        """
+        Looks up a cached result.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version the result must belong to.
+
+        Returns:
+            tuple: (result, age) with the parsed rdflib result and its age in seconds, None if no usable entry exists.
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT stored, payload FROM results WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Reading the result cache failed: {e}")
+            return None
+        if row is None:
+            return None
+        age = time.time() - row[0]
+        if age > self.ttl + self.stale_ttl:
+            return None
+        return Result.parse(BytesIO(row[1]), format="json"), age
+
+    def set(self, key, version, result):
+        """
+        Stores a result. A failing write is reported, but does not fail the query.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            version (str): Dataset version the result belongs to.
+            result (Result): The rdflib query result.
+        """
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (key, version, stored, payload) VALUES (?, ?, ?, ?)",
+                    (key, version, time.time(), result.serialize(format="json")),
+                )
+        except sqlite3.Error as e:
+            print(f"Writing the result cache failed: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.prune_interval == 0
+        if prune:
+            self.prune(version)
+
+    def prune(self, version):
+        """
+        Removes the entries of other dataset versions, expired entries and the oldest entries above max_entries.
+
+        Parameters:
+            version (str): The current dataset version.
+        """
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    "DELETE FROM results WHERE version != ? OR stored < ?",
+                    (version, time.time() - self.ttl - self.stale_ttl),
+                )
+                connection.execute(
+                    "DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+        except sqlite3.Error as e:
+            print(f"Pruning the result cache failed: {e}")
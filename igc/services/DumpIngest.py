@@ -0,0 +1,408 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import io
+import os
+import re
+import sys
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import DCTERMS, RDF, RDFS, SKOS, Namespace
+from rdflib.util import guess_format
+
+from services.AppearanceIndex import AppearanceIndex, SIDES
+from services.CoinBitsetIndex import CoinBitsetIndex
+from services.KeywordIndex import KeywordIndex
+from services.LabelIndex import LabelIndex, PREDICATE_ID
+from services.LocalIndexes import LocalIndexes
+from services.SparqlTransport import parseTerm
+from services.TaxonomyIndex import TaxonomyIndex
+from services.UriDictionary import UriDictionary
+
+
+NMO = Namespace("http://nomisma.org/ontology#")
+
+# predicates of the triples the local indexes are built from, all other triples of a dump are skipped
+_SUBCLASS = str(RDFS.subClassOf)
+_TYPE = str(RDF.type)
+_LABEL = str(SKOS.prefLabel)
+_SIDE_PREDICATES = {str(NMO.hasObverse): "obverse", str(NMO.hasReverse): "reverse"}
+_ICONOGRAPHY = str(NMO.hasIconography)
+_APPEARANCE = str(NMO.hasAppearance)
+_MEMBER = str(RDF) + "li"
+_STATEMENT = {str(RDF.subject): 0, str(RDF.predicate): 1, str(RDF.object): 2}
+_DESCRIPTION = str(DCTERMS.description)
+_IDENTIFIER = str(DCTERMS.identifier)
+_TYPE_SERIES_ITEM = str(NMO.hasTypeSeriesItem)
+INDEX_PREDICATES = frozenset(
+    [_SUBCLASS, _TYPE, _LABEL, _ICONOGRAPHY, _APPEARANCE, _MEMBER, _DESCRIPTION, _IDENTIFIER, _TYPE_SERIES_ITEM]
+    + list(_SIDE_PREDICATES) + list(_STATEMENT)
+)
+
+# only the English descriptions are searched, see KeywordIndex.DESCRIPTION_QUERY
+_DESCRIPTION_LANGUAGE = "en"
+
+_PREDICATE_FILTER = re.compile("|".join(re.escape(f"<{predicate}>") for predicate in sorted(INDEX_PREDICATES)))
+_TRIPLE_PATTERN = re.compile(
+    r'\s*(<[^>]*>|_:\S*[^\s.])\s*(<[^>]*>)\s*'
+    r'(<[^>]*>|_:\S*[^\s.]|"(?:[^"\\]|\\.)*"(?:@([A-Za-z0-9-]+)|\^\^<[^>]*>)?)\s*\.\s*(?:#.*)?$'
+)
+
+
+def _term(term, bnodes):
+    """
+    Returns the plain string of an N-Triples term like the endpoint returns it, blank node labels are made unique per dump.
+
+    Parameters:
+        term (str): The term in N-Triples syntax.
+        bnodes (str): Prefix of the blank node labels of the dump.
+
+    Returns:
+        str: IRI, lexical form of a literal or blank node label.
+    """
+    if term.startswith("_:"):
+        return "_:" + bnodes + term[2:]
+    return parseTerm(term)
+
+
+def _parseLines(lines, bnodes):
+    """
+    Parses N-Triples lines and keeps the triples the local indexes are built from. Runs in the worker processes.
+
+    Parameters:
+        lines (list): The lines.
+        bnodes (str): Prefix of the blank node labels of the dump.
+
+    Returns:
+        tuple: (number of triples, list of (subject, predicate, object, language) of the kept triples)
+    """
+    count = 0
+    triples = []
+    for line in lines:
+        if line.strip() and not line.lstrip().startswith("#"):
+            count += 1
+        # most lines are skipped without parsing them
+        if not _PREDICATE_FILTER.search(line):
+            continue
+        match = _TRIPLE_PATTERN.match(line)
+        if match is None:
+            continue
+        subject, predicate, obj, language = match.groups()
+        predicate = predicate[1:-1]
+        if predicate not in INDEX_PREDICATES:
+            continue
+        if predicate == _DESCRIPTION and language != _DESCRIPTION_LANGUAGE:
+            continue
+        triples.append((_term(subject, bnodes), predicate, _term(obj, bnodes), language))
+    return count, triples
+
+
+def _parseGraph(path, format, bnodes):
+    """
+    Parses a dump that is not line based (e.g. Turtle) as a whole with rdflib and keeps the triples the local indexes are built
+    from. Runs in a worker process, which holds the graph of the file while parsing it.
+
+    Parameters:
+        path (str): Path of the dump, decompressed while reading if it ends with .gz.
+        format (str): rdflib format of the dump.
+        bnodes (str): Prefix of the blank node labels of the dump.
+
+    Returns:
+        tuple: (number of triples, list of (subject, predicate, object, language) of the kept triples)
+    """
+    def term(node):
+        return "_:" + bnodes + str(node) if isinstance(node, BNode) else str(node)
+
+    graph = Graph()
+    with (gzip.open if path.endswith(".gz") else open)(path, "rb") as f:
+        graph.parse(f, format=format)
+    triples = []
+    for predicate in sorted(INDEX_PREDICATES):
+        for subject, _, obj in graph.triples((None, URIRef(predicate), None)):
+            language = obj.language if isinstance(obj, Literal) else None
+            if predicate == _DESCRIPTION and language != _DESCRIPTION_LANGUAGE:
+                continue
+            triples.append((term(subject), predicate, term(obj), language))
+    return len(graph), triples
+
+
+class DumpIngest():
+    """
+    Builds the local indexes from Corpus Nummorum dumps instead of querying the endpoint.
+
+    The dumps are streamed: N-Triples (optionally gzipped) are cut into chunks of lines that a pool of worker processes
+    parses, only the triples the indexes are built from (class edges, memberships, labels, the design triples and entities
+    of the coin sides, the descriptions and the coin metadata of the searches) are sent back. So the memory needed grows
+    with these triples, not with the dump. Other formats (e.g. Turtle) can not be cut into lines, every file is parsed as a
+    whole by one worker.
+
+    The rows given to the indexes are the ones the index queries would return from an endpoint serving the dumps with the
+    rules of apache/rules.ttl, the inferred class edges, memberships and class labels are computed here.
+
+    Attributes:
+        files (int): Number of dumps read.
+        triples (int): Number of triples read from the dumps, including skipped ones.
+        kept (int): Number of triples kept for the indexes.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.triples = 0
+        self.kept = 0
+        self._supers = {}
+        self._types = {}
+        self._labels = {}
+        # (coin, side, side node) of the nmo:hasObverse and nmo:hasReverse triples
+        self._sides = []
+        self._iconographies = {}
+        self._appearances = {}
+        self._members = {}
+        # rdf:subject, rdf:predicate and rdf:object of the appearances
+        self._statements = ({}, {}, {})
+        self._descriptions = {}
+        self._identified = set()
+        self._typeSeriesItems = []
+
+    def add(self, subject, predicate, obj, language=None):
+        """
+        Adds a triple of a dump, triples with other predicates than INDEX_PREDICATES are ignored.
+
+        Parameters:
+            subject (str): IRI or blank node label of the subject.
+            predicate (str): IRI of the predicate.
+            obj (str): IRI, blank node label or lexical form of the object.
+            language (str): Language tag of a literal object.
+        """
+        subject = sys.intern(subject)
+        if predicate == _TYPE:
+            self._types.setdefault(subject, []).append(sys.intern(obj))
+        elif predicate == _LABEL:
+            self._labels.setdefault(subject, []).append(obj)
+        elif predicate == _SUBCLASS:
+            obj = sys.intern(obj)
+            self._supers.setdefault(subject, set()).add(obj)
+            self._supers.setdefault(obj, set())
+        elif predicate in _SIDE_PREDICATES:
+            self._sides.append((subject, _SIDE_PREDICATES[predicate], sys.intern(obj)))
+        elif predicate == _ICONOGRAPHY:
+            self._iconographies.setdefault(subject, []).append(sys.intern(obj))
+        elif predicate == _APPEARANCE:
+            self._appearances.setdefault(subject, []).append(sys.intern(obj))
+        elif predicate == _MEMBER:
+            self._members.setdefault(subject, []).append(sys.intern(obj))
+        elif predicate in _STATEMENT:
+            self._statements[_STATEMENT[predicate]].setdefault(subject, []).append(sys.intern(obj))
+        elif predicate == _DESCRIPTION:
+            if language == _DESCRIPTION_LANGUAGE:
+                self._descriptions.setdefault(subject, []).append(obj)
+        elif predicate == _IDENTIFIER:
+            self._identified.add(subject)
+        elif predicate == _TYPE_SERIES_ITEM:
+            self._typeSeriesItems.append((subject, sys.intern(obj)))
+
+    def read(self, paths, format=None, workers=None, chunk_lines=20000, progress=None):
+        """
+        Reads dumps with a pool of worker processes.
+
+        Parameters:
+            paths (list): Paths of the dumps, files ending with .gz are decompressed while reading.
+            format (str): rdflib format of the dumps, guessed from the file names if None.
+            workers (int): Number of worker processes, the number of CPUs if None.
+            chunk_lines (int): Number of N-Triples lines parsed by one task.
+            progress (function): Called with (path, share of the file read, triples read, triples kept) after every task.
+        """
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path in paths:
+                path = str(path)
+                name = path[:-3] if path.endswith(".gz") else path
+                file_format = format or ("nt" if name.endswith((".nt", ".ntriples")) else guess_format(name) or "turtle")
+                bnodes = f"d{self.files}x"
+                self.files += 1
+                if file_format not in ("nt", "ntriples", "nt11"):
+                    self._collect(executor.submit(_parseGraph, path, file_format, bnodes))
+                    if progress is not None:
+                        progress(path, 1.0, self.triples, self.kept)
+                    continue
+
+                size = os.path.getsize(path) or 1
+                with open(path, "rb") as raw:
+                    stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+                    text = io.TextIOWrapper(stream, encoding="utf-8")
+                    # at most two tasks per worker are waiting, so the dump is not read ahead into memory
+                    pending = deque()
+                    chunk = []
+                    for line in text:
+                        chunk.append(line)
+                        if len(chunk) >= chunk_lines:
+                            pending.append(executor.submit(_parseLines, chunk, bnodes))
+                            chunk = []
+                            if len(pending) >= 2 * workers:
+                                self._collect(pending.popleft())
+                                if progress is not None:
+                                    progress(path, raw.tell() / size, self.triples, self.kept)
+                    if chunk:
+                        pending.append(executor.submit(_parseLines, chunk, bnodes))
+                    while pending:
+                        self._collect(pending.popleft())
+                if progress is not None:
+                    progress(path, 1.0, self.triples, self.kept)
+
+    def _collect(self, future):
+        """
+        Adds the triples of a finished parse task.
+
+        Parameters:
+            future (Future): The task, see _parseLines and _parseGraph.
+        """
+        count, triples = future.result()
+        self.triples += count
+        self.kept += len(triples)
+        for triple in triples:
+            self.add(*triple)
+
+    def _superClosure(self):
+        """
+        Returns the transitive superclasses of every class, like the subClassOf rule of the reasoner.
+
+        Returns:
+            dict: class -> set of superclasses
+        """
+        closure = {}
+        for cls, supers in self._supers.items():
+            reached = set()
+            stack = list(supers)
+            while stack:
+                sup = stack.pop()
+                if sup not in reached:
+                    reached.add(sup)
+                    stack.extend(self._supers[sup])
+            closure[cls] = reached
+        return closure
+
+    def _inferredTypes(self, node, closure):
+        """
+        Returns the classes of a node including the inherited ones, like the rdf:type rule of the reasoner.
+
+        Parameters:
+            node (str): The node.
+            closure (dict): Result of _superClosure.
+
+        Returns:
+            set: The classes.
+        """
+        types = set(self._types.get(node, ()))
+        for cls in list(types):
+            types |= closure.get(cls, set())
+        if node in closure:
+            types.add(str(RDFS.Class))
+        return types
+
+    def localIndexes(self, dataset_version=None):
+        """
+        Builds the local indexes from the triples read.
+
+        Parameters:
+            dataset_version (str): Version of the dataset of the dumps, e.g. of an endpoint serving them.
+
+        Returns:
+            LocalIndexes: The indexes.
+        """
+        closure = self._superClosure()
+        # the classes of the type and label queries: rdf:type rdfs:Class, inferred for every class of a subClassOf triple
+        classes = set(closure) | {node for node, types in self._types.items() if str(RDFS.Class) in types}
+        types = {node: self._inferredTypes(node, closure) for node in self._types}
+
+        dictionary = UriDictionary()
+        taxonomy = TaxonomyIndex(
+            ((sub, sup) for sub in closure for sup in closure[sub]),
+            ((node, cls) for node in types for cls in types[node] if cls in classes),
+            self._labelRows(classes, types),
+            dictionary,
+        )
+        labels = LabelIndex(taxonomy, self._predicateLabelRows())
+        numismatic = {node for node, node_types in types.items() if str(NMO.NumismaticObject) in node_types}
+        appearances = AppearanceIndex(taxonomy, self._tripleRows(types), self._entityRows(), sorted(numismatic))
+        keywords = KeywordIndex(self._descriptionRows(), dictionary)
+        coin_index = CoinBitsetIndex(appearances, self._searchItemRows(types, numismatic), keywords)
+        dictionary.freeze()
+        return LocalIndexes(dictionary, taxonomy, labels, appearances, keywords, coin_index, dataset_version)
+
+    def _labelRows(self, classes, types):
+        """
+        Returns the rows of TaxonomyIndex.LABEL_QUERY: the labels of the classes and of the members of classes,
+        a class without label has its IRI as label.
+        """
+        nodes = set(classes) | {node for node, node_types in types.items() if node_types & classes}
+        for node in sorted(nodes):
+            labels = self._labels.get(node)
+            if labels:
+                yield from ((node, label) for label in dict.fromkeys(labels))
+            elif node in classes and not node.startswith("_:"):
+                yield node, node
+
+    def _predicateLabelRows(self):
+        """
+        Returns the rows of LabelIndex.PREDICATE_LABEL_QUERY: all labels of the nodes with a label starting with PREDICATE_ID.
+        """
+        for node, labels in self._labels.items():
+            if any(label.lower().startswith(PREDICATE_ID) for label in labels):
+                yield from ((node, label) for label in dict.fromkeys(labels))
+
+    def _sideIconographies(self):
+        """
+        Yields (coin, side, iconography) of the iconographies of the coin sides.
+        """
+        for coin, side, side_node in self._sides:
+            if side in SIDES:
+                for iconography in self._iconographies.get(side_node, ()):
+                    yield coin, side, iconography
+
+    def _tripleRows(self, types):
+        """
+        Returns the rows of AppearanceIndex.TRIPLE_QUERY: the subject, predicate and object of the appearances in the bags of
+        the iconographies, unbound elements are None.
+        """
+        bag = str(RDF.Bag)
+        rows = set()
+        for coin, side, iconography in self._sideIconographies():
+            for design in self._iconographies.get(iconography, ()):
+                if bag not in types.get(design, ()):
+                    continue
+                for appearance in self._members.get(design, ()):
+                    subjects, predicates, objects = (statement.get(appearance, [None]) for statement in self._statements)
+                    for subject in subjects:
+                        for predicate in predicates:
+                            for obj in objects:
+                                rows.add((coin, side, subject, predicate, obj))
+        return sorted(rows, key=lambda row: tuple("" if value is None else value for value in row))
+
+    def _entityRows(self):
+        """
+        Returns the rows of AppearanceIndex.ENTITY_QUERY: the entities of the appearances of the iconographies.
+        """
+        rows = set()
+        for coin, side, iconography in self._sideIconographies():
+            for appearance in self._appearances.get(iconography, ()):
+                for entity in self._members.get(appearance, ()):
+                    rows.add((coin, side, entity))
+        return sorted(rows)
+
+    def _descriptionRows(self):
+        """
+        Returns the rows of KeywordIndex.DESCRIPTION_QUERY: the English descriptions of the iconographies.
+        """
+        for coin, side, iconography in self._sideIconographies():
+            for description in self._descriptions.get(iconography, ()):
+                yield coin, side, description
+
+    def _searchItemRows(self, types, numismatic):
+        """
+        Returns the rows of CoinBitsetIndex.SEARCH_ITEM_QUERY: the identified coins and the identified types of coins.
+        """
+        rows = {(coin, "NumismaticObject") for coin in numismatic if coin in self._identified}
+        type_series_item = str(NMO.TypeSeriesItem)
+        for coin, item in self._typeSeriesItems:
+            if coin in numismatic and item in self._identified and type_series_item in types.get(item, ()):
+                rows.add((item, "TypeSeriesItem"))
+        return sorted(rows)
@@ -0,0 +1,222 @@
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+
+# first bytes of a snapshot file and version of the layout, a snapshot of another format version is not opened
+SNAPSHOT_MAGIC = b"IGCINDEX"
+SNAPSHOT_FORMAT = 2
+
+# magic, format version and length of the JSON header
+_PREAMBLE = struct.Struct("<8sIQ")
+# arrays start at multiples of this, so every view is aligned for its dtype
+_ALIGNMENT = 64
+
+
+class StringTable():
+    """
+    Immutable sequence of strings packed into one UTF-8 byte array with an offset array, so a snapshot can hold it as two
+    arrays. Items are decoded on access; bisect works on it like on a list.
+
+    Attributes:
+        blob (ndarray): uint8 array of the concatenated UTF-8 strings.
+        offsets (ndarray): int64 start of every string in blob and one past the last string.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        # memoryviews index faster than numpy arrays element by element
+        self._bytes = memoryview(blob).cast("B")
+        self._offsets = memoryview(offsets).cast("B").cast("q")
+
+    @classmethod
+    def fromStrings(cls, strings):
+        """
+        Packs strings.
+
+        Parameters:
+            strings (iterable): The strings.
+
+        Returns:
+            StringTable: The packed strings.
+        """
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(string) for string in encoded])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, index):
+        """
+        Returns the UTF-8 bytes of a string without decoding them.
+
+        Parameters:
+            index (int): Position of the string.
+
+        Returns:
+            memoryview: The bytes.
+        """
+        return self._bytes[self._offsets[index]:self._offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StringTable index out of range")
+        return str(self.raw(index), "utf-8")
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class SnapshotWriter():
+    """
+    Collects the arrays and metadata of the indexes and writes them as one snapshot file.
+
+    The file starts with SNAPSHOT_MAGIC, the format version and the length of a JSON header. The header holds the metadata
+    and the dtype, shape and offset of every array, the arrays follow as raw little-endian bytes aligned to 64 bytes.
+    """
+
+    def __init__(self):
+        self.arrays = {}
+        self.metadata = {}
+
+    def add(self, name, array):
+        """
+        Adds an array.
+
+        Parameters:
+            name (str): Unique name of the array, e.g. "taxonomy.depth".
+            array (ndarray): The array, it is written in little-endian byte order.
+        """
+        if name in self.arrays:
+            raise ValueError(f"Duplicate snapshot array {name}")
+        array = np.ascontiguousarray(array)
+        self.arrays[name] = array.astype(array.dtype.newbyteorder("<"), copy=False)
+
+    def addStrings(self, name, strings):
+        """
+        Adds strings as a StringTable (the arrays name.blob and name.offsets).
+
+        Parameters:
+            name (str): Unique name of the table.
+            strings (iterable): The strings or a StringTable.
+        """
+        table = strings if isinstance(strings, StringTable) else StringTable.fromStrings(strings)
+        self.add(name + ".blob", table.blob)
+        self.add(name + ".offsets", table.offsets)
+
+    def addCsr(self, name, relation):
+        """
+        Adds a compressed sparse row relation (the arrays name.indptr and name.indices).
+
+        Parameters:
+            name (str): Unique name of the relation.
+            relation (tuple): (indptr, indices) arrays.
+        """
+        self.add(name + ".indptr", relation[0])
+        self.add(name + ".indices", relation[1])
+
+    def write(self, path):
+        """
+        Writes the snapshot. The file is written next to the target and renamed, so a reader never sees half a snapshot.
+
+        Parameters:
+            path (str): Path of the snapshot file.
+        """
+        entries = {}
+        offset = 0
+        for name, array in self.arrays.items():
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += array.nbytes
+        header = json.dumps({"metadata": self.metadata, "arrays": entries}).encode("utf-8")
+        data_start = -(-(_PREAMBLE.size + len(header)) // _ALIGNMENT) * _ALIGNMENT
+
+        path = str(path)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(header)))
+            file.write(header)
+            for name, array in self.arrays.items():
+                file.seek(data_start + entries[name]["offset"])
+                file.write(array.tobytes())
+            # empty arrays at the end still have to lie within the file
+            file.truncate(data_start + -(-offset // _ALIGNMENT) * _ALIGNMENT)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+
+
+class IndexSnapshot():
+    """
+    Read-only view of a snapshot file. The file is mapped with mmap and every array is a zero-copy numpy view of the mapping,
+    so opening takes milliseconds and all worker processes opening the same file share its pages in the page cache.
+
+    Attributes:
+        path (str): Path of the snapshot file.
+        metadata (dict): The metadata written with the snapshot.
+    """
+
+    def __init__(self, path):
+        """
+        Opens a snapshot.
+
+        Parameters:
+            path (str): Path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is no snapshot or has another format version.
+        """
+        self.path = str(path)
+        with open(self.path, "rb") as file:
+            self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < _PREAMBLE.size:
+            raise ValueError(f"{self.path} is no index snapshot")
+        magic, format, header_length = _PREAMBLE.unpack_from(self._mapping, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.path} is no index snapshot")
+        if format != SNAPSHOT_FORMAT:
+            raise ValueError(f"{self.path} has snapshot format {format}, expected {SNAPSHOT_FORMAT}")
+        header = json.loads(self._mapping[_PREAMBLE.size:_PREAMBLE.size + header_length].decode("utf-8"))
+        self.metadata = header["metadata"]
+        self._entries = header["arrays"]
+        self._dataStart = -(-(_PREAMBLE.size + header_length) // _ALIGNMENT) * _ALIGNMENT
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def array(self, name):
+        """
+        Returns a read-only view of an array.
+
+        Parameters:
+            name (str): Name of the array.
+
+        Returns:
+            ndarray: The view into the mapped file.
+        """
+        entry = self._entries[name]
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        view = np.frombuffer(self._mapping, dtype=dtype, count=count, offset=self._dataStart + entry["offset"])
+        return view.reshape(entry["shape"])
+
+    def strings(self, name):
+        """
+        Returns a StringTable added with SnapshotWriter.addStrings.
+        """
+        return StringTable(self.array(name + ".blob"), self.array(name + ".offsets"))
+
+    def csr(self, name):
+        """
+        Returns a relation added with SnapshotWriter.addCsr.
+        """
+        return self.array(name + ".indptr"), self.array(name + ".indices")
+
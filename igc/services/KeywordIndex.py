@@ -0,0 +1,256 @@
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from services.SourceFingerprint import SourceFingerprint
+
+
+# the English descriptions of the iconographies the keywords are searched in
+DESCRIPTION_QUERY = """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    PREFIX dcterms: <http://purl.org/dc/terms/>
+    SELECT ?coin ?side ?description WHERE {
+        VALUES (?side ?hasSide) {
+            ("obverse" nmo:hasObverse)
+            ("reverse" nmo:hasReverse)
+        }
+        ?coin ?hasSide ?coinSide .
+        ?coinSide nmo:hasIconography ?coinIconography .
+        ?coinIconography dcterms:description ?description .
+        FILTER (lang(?description) = "en")
+    }
+    """
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def matchExpression(keyword):
+    """
+    Turns a keyword into an FTS5 query. The words of the keyword are searched as a phrase, the last word as a prefix,
+    so "holding bo" finds "holding bow". A keyword in double quotes is searched as an exact phrase.
+
+    Parameters:
+        keyword (str): The keyword as entered.
+
+    Returns:
+        str: The FTS5 query, None if the keyword contains no word.
+    """
+    keyword = keyword.strip()
+    exact = len(keyword) > 1 and keyword.startswith('"') and keyword.endswith('"')
+    words = _WORD_PATTERN.findall(keyword)
+    if not words:
+        return None
+    phrase = '"' + " ".join(words) + '"'
+    return phrase if exact else phrase + " *"
+
+
+class KeywordIndex():
+    """
+    Full text index of the English iconography descriptions of the coin sides on SQLite FTS5, so keywords are looked up in the
+    inverted index of the description words instead of a regex scan over all descriptions in the endpoint.
+    Words are matched case and diacritics insensitive, see matchExpression for the keyword syntax.
+
+    The database is held in memory by default. All threads share one connection, the lookups are serialized by a lock.
+    The coins are stored as ids of the URI dictionary shared with the other local indexes.
+
+    Attributes:
+        dictionary (UriDictionary): URI encoding of the coins.
+        path (str): Path of the SQLite database, ":memory:" for an in-memory database.
+        descriptions (int): Number of indexed descriptions.
+        fingerprint (str): SourceFingerprint of the description rows the index is built from.
+    """
+
+    def __init__(self, rows, dictionary, path=":memory:"):
+        """
+        Builds the index, an existing index in the database is replaced.
+
+        Parameters:
+            rows (iterable): (coin URI, side, description) rows of the descriptions, side is "obverse" or "reverse".
+            dictionary (UriDictionary): URI dictionary the coins are encoded in.
+            path (str): Path of the SQLite database, ":memory:" for an in-memory database.
+        """
+        self.dictionary = dictionary
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("DROP TABLE IF EXISTS descriptions")
+        self._connection.execute("""
+            CREATE VIRTUAL TABLE descriptions USING fts5(
+                description,
+                coin UNINDEXED,
+                side UNINDEXED,
+                tokenize = "unicode61 remove_diacritics 2"
+            )
+        """)
+        fingerprint = SourceFingerprint()
+        self._connection.executemany(
+            "INSERT INTO descriptions (coin, side, description) VALUES (?, ?, ?)",
+            ((dictionary.encode(coin), side, description) for coin, side, description in fingerprint.rows("description", rows) if description),
+        )
+        self._connection.commit()
+        self.descriptions = self._connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        self.fingerprint = str(fingerprint)
+
+    @classmethod
+    def fromEndpoint(cls, transport, dictionary, timeout=300, path=":memory:"):
+        """
+        Builds the index from the descriptions of a SPARQL endpoint. The rows are streamed into the database.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            dictionary (UriDictionary): URI dictionary the coins are encoded in.
+            timeout (float): Read timeout of the query in seconds.
+            path (str): Path of the SQLite database, ":memory:" for an in-memory database.
+
+        Returns:
+            KeywordIndex: The built index.
+        """
+        return cls((tuple(row) for row in transport.stream(DESCRIPTION_QUERY, timeout=timeout)), dictionary, path=path)
+
+    @staticmethod
+    def sourceFingerprint(transport, timeout=300):
+        """
+        Returns the fingerprint an index built from the endpoint now would have, without building it.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of the query in seconds.
+
+        Returns:
+            str: The fingerprint, see SourceFingerprint.
+        """
+        fingerprint = SourceFingerprint()
+        for row in transport.stream(DESCRIPTION_QUERY, timeout=timeout):
+            fingerprint.add("description", *row)
+        return str(fingerprint)
+
+    def updated(self, rows, dictionary, path=":memory:"):
+        """
+        Returns a copy of the index updated to the given descriptions. Only the difference is applied: the descriptions that are
+        no longer in the rows are deleted, the new ones inserted, so a refresh does not index all descriptions again.
+        The index itself is not changed.
+
+        Parameters:
+            rows (iterable): (coin URI, side, description) rows of all descriptions, like for the constructor.
+            dictionary (UriDictionary): URI dictionary the coins are encoded in, an extension of the dictionary of this index.
+            path (str): Path of the SQLite database of the copy, ":memory:" for an in-memory database.
+
+        Returns:
+            KeywordIndex: The updated index.
+        """
+        index = self.__class__.__new__(self.__class__)
+        index.dictionary = dictionary
+        index.path = str(path)
+        index._lock = threading.Lock()
+        index._connection = sqlite3.connect(index.path, check_same_thread=False)
+        with self._lock:
+            self._connection.backup(index._connection)
+
+        fingerprint = SourceFingerprint()
+        wanted = {(dictionary.encode(coin), side, description) for coin, side, description in fingerprint.rows("description", rows) if description}
+        stale = []
+        for rowid, coin, side, description in index._connection.execute("SELECT rowid, coin, side, description FROM descriptions"):
+            if (coin, side, description) in wanted:
+                wanted.discard((coin, side, description))
+            else:
+                stale.append((rowid,))
+        index._connection.executemany("DELETE FROM descriptions WHERE rowid = ?", stale)
+        index._connection.executemany("INSERT INTO descriptions (coin, side, description) VALUES (?, ?, ?)", sorted(wanted))
+        index._connection.commit()
+        index.descriptions = index._connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        index.fingerprint = str(fingerprint)
+        return index
+
+    def updatedFromEndpoint(self, transport, dictionary, timeout=300, path=":memory:"):
+        """
+        Returns a copy of the index updated to the descriptions of a SPARQL endpoint, see updated.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            dictionary (UriDictionary): URI dictionary the coins are encoded in, an extension of the dictionary of this index.
+            timeout (float): Read timeout of the query in seconds.
+            path (str): Path of the SQLite database of the copy, ":memory:" for an in-memory database.
+
+        Returns:
+            KeywordIndex: The updated index.
+        """
+        return self.updated((tuple(row) for row in transport.stream(DESCRIPTION_QUERY, timeout=timeout)), dictionary, path=path)
+
+    @classmethod
+    def open(cls, path, dictionary, fingerprint=None):
+        """
+        Opens an index built before, read-only, e.g. the one written next to an index snapshot.
+
+        Parameters:
+            path (str): Path of the SQLite database.
+            dictionary (UriDictionary): URI dictionary the coins of the database are encoded in.
+            fingerprint (str): Fingerprint of the rows the database was built from, None if unknown.
+
+        Returns:
+            KeywordIndex: The index.
+        """
+        index = cls.__new__(cls)
+        index.dictionary = dictionary
+        index.path = str(path)
+        index._lock = threading.Lock()
+        index._connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        index.descriptions = index._connection.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+        index.fingerprint = fingerprint
+        return index
+
+    def copyTo(self, path):
+        """
+        Copies the database into a file, an existing file is replaced.
+
+        Parameters:
+            path (str): Path of the copy.
+        """
+        with self._lock, sqlite3.connect(str(path)) as target:
+            self._connection.backup(target)
+        target.close()
+
+    def __len__(self):
+        return self.descriptions
+
+    def matchingCoins(self, side, keywords):
+        """
+        Returns the coins with a description of the side that contains all keywords.
+
+        Parameters:
+            side (str): Coin side, 'obverse' or 'reverse'.
+            keywords (list): The keywords as entered.
+
+        Returns:
+            set: Dictionary ids of the coins (respectively types), empty if a keyword contains no word.
+        """
+        expressions = [matchExpression(keyword) for keyword in keywords]
+        if not expressions or None in expressions:
+            return set()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT coin FROM descriptions WHERE descriptions MATCH ? AND side = ?",
+                (" AND ".join(expressions), side),
+            ).fetchall()
+        return {coin for coin, in rows}
+
+    def keywordCoins(self, side, keywords):
+        """
+        Resolves the keywords of a coin side of a search: the positive keywords have to be in the same description,
+        the negated keywords in none of the descriptions of the side.
+
+        Parameters:
+            side (str): Coin side, 'obverse' or 'reverse'.
+            keywords (list): {"text": str, "negated": bool} keywords, as sent by the frontend.
+
+        Returns:
+            tuple: (set of the dictionary ids of the coins matching the positive keywords or None if there are none,
+                    set of the dictionary ids of the coins excluded by the negated keywords)
+        """
+        positive = [keyword["text"] for keyword in keywords if not keyword["negated"]]
+        included = self.matchingCoins(side, positive) if positive else None
+        excluded = set()
+        for keyword in keywords:
+            if keyword["negated"]:
+                excluded |= self.matchingCoins(side, [keyword["text"]])
+        return included, excluded
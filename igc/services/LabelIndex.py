@@ -0,0 +1,252 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from services.SourceFingerprint import SourceFingerprint
+
+
+# labels of the verbs, every verb has a label starting with this besides its name
+PREDICATE_ID = "predicate_id"
+
+PREDICATE_LABEL_QUERY = f"""
+    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+    SELECT DISTINCT ?pre ?label WHERE {{
+        ?pre skos:prefLabel ?type .
+        FILTER(STRSTARTS(LCASE(STR(?type)), "{PREDICATE_ID}")) .
+        ?pre skos:prefLabel ?label .
+    }}
+    """
+
+# top level classes in this namespace are no categories of the entities
+RDFS_NAMESPACE = "http://www.w3.org/2000/01/rdf-schema#"
+
+
+class PrefixTable():
+    """
+    Names sorted by their case-folded form, so all names starting with a prefix are one contiguous range found by binary search.
+
+    Attributes:
+        keys (list): Case-folded names, sorted (a StringTable if opened from a snapshot).
+        names (list): Names in the order of keys (a StringTable if opened from a snapshot).
+        ids (ndarray): int32 id of the named entity per name.
+    """
+
+    def __init__(self, entries):
+        """
+        Sorts the entries.
+
+        Parameters:
+            entries (iterable): (name, id) pairs.
+        """
+        entries = sorted((name.lower(), name, id) for name, id in entries)
+        self.keys = [key for key, _, _ in entries]
+        self.names = [name for _, name, _ in entries]
+        self.ids = np.array([id for _, _, id in entries], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def addTo(self, writer, name):
+        """
+        Adds the table to a snapshot.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        writer.addStrings(name + ".keys", self.keys)
+        writer.addStrings(name + ".names", self.names)
+        writer.add(name + ".ids", self.ids)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name):
+        """
+        Opens a table of a snapshot without copying its arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+
+        Returns:
+            PrefixTable: The table.
+        """
+        table = cls.__new__(cls)
+        table.keys = snapshot.strings(name + ".keys")
+        table.names = snapshot.strings(name + ".names")
+        table.ids = snapshot.array(name + ".ids")
+        return table
+
+    def lookup(self, prefix):
+        """
+        Returns the range of names starting with the prefix, ignoring case. O(log n).
+
+        Parameters:
+            prefix (str): The prefix, "" for all names.
+
+        Returns:
+            range: Positions in keys, names and ids.
+        """
+        prefix = prefix.lower()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + "\U0010ffff", start)
+        return range(start, end)
+
+
+class LabelIndex():
+    """
+    Case-folded prefix index of the names shown in the subject, object and predicate autocomplete.
+
+    The entity names are the display names of the taxonomy index (see TaxonomyIndex.displayName) of classes and of the
+    entities of classes, the predicate names are the plain labels of the verbs. Each entity name carries whether it belongs
+    to a class and the categories (top level classes) the entity is recommended in.
+
+    Attributes:
+        taxonomy (TaxonomyIndex): The index the entity ids refer to.
+        entities (PrefixTable): Display names of the classes and entities, ids are taxonomy node ids.
+        categories (tuple): (indptr, ids) of the category node ids of every taxonomy node, empty for classes.
+        predicates (PrefixTable): Labels of the verbs, ids are ids of the URI dictionary of the taxonomy.
+        predicateCount (int): Number of verbs.
+        fingerprint (str): SourceFingerprint of the verb labels, the names of the entities belong to the taxonomy.
+    """
+
+    def __init__(self, taxonomy, predicate_labels):
+        """
+        Builds the index.
+
+        Parameters:
+            taxonomy (TaxonomyIndex): Index of the classes and entities.
+            predicate_labels (iterable): (verb URI, label) pairs of all labels of the verbs.
+        """
+        self.taxonomy = taxonomy
+        self.entities = PrefixTable((name, node) for node in range(len(taxonomy)) for name in taxonomy.names[node])
+
+        # an entity is listed in a top level class it reaches through one of its classes below the top level
+        categories = []
+        for node in range(len(taxonomy)):
+            tops = set()
+            if not taxonomy.isClass[node]:
+                for cls in taxonomy.ancestorsOf(node):
+                    tops.update(int(top) for top in taxonomy.topsOf(cls))
+                tops = [top for top in tops if RDFS_NAMESPACE not in taxonomy.uri(top)]
+            categories.append(sorted(tops))
+        indptr = np.zeros(len(categories) + 1, dtype=np.int32)
+        indptr[1:] = np.cumsum([len(tops) for tops in categories])
+        self.categories = (indptr, np.array([top for tops in categories for top in tops], dtype=np.int32))
+
+        fingerprint = SourceFingerprint()
+        entries = [(label, taxonomy.dictionary.encode(uri)) for uri, label in fingerprint.rows("predicateLabel", predicate_labels)]
+        self.predicates = PrefixTable(entries)
+        self.predicateCount = len(np.unique(self.predicates.ids))
+        self.fingerprint = str(fingerprint)
+
+    @classmethod
+    def fromEndpoint(cls, transport, taxonomy, timeout=300):
+        """
+        Builds the index from the taxonomy index and the verb labels of a SPARQL endpoint.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            taxonomy (TaxonomyIndex): Index of the classes and entities.
+            timeout (float): Read timeout of the query in seconds.
+
+        Returns:
+            LabelIndex: The built index.
+        """
+        return cls(taxonomy, ((row.pre, row.label) for row in transport.stream(PREDICATE_LABEL_QUERY, timeout=timeout)))
+
+    @staticmethod
+    def sourceFingerprint(transport, timeout=300):
+        """
+        Returns the fingerprint an index built from the endpoint now would have, without building it.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of the query in seconds.
+
+        Returns:
+            str: The fingerprint, see SourceFingerprint.
+        """
+        fingerprint = SourceFingerprint()
+        for row in transport.stream(PREDICATE_LABEL_QUERY, timeout=timeout):
+            fingerprint.add("predicateLabel", row.pre, row.label)
+        return str(fingerprint)
+
+    def addTo(self, writer, name):
+        """
+        Adds the index to a snapshot, the taxonomy is added separately.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        writer.metadata[name] = {"predicateCount": self.predicateCount, "fingerprint": self.fingerprint}
+        self.entities.addTo(writer, name + ".entities")
+        self.predicates.addTo(writer, name + ".predicates")
+        writer.addCsr(name + ".categories", self.categories)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name, taxonomy):
+        """
+        Opens an index of a snapshot without copying its arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+            taxonomy (TaxonomyIndex): The taxonomy of the snapshot.
+
+        Returns:
+            LabelIndex: The index.
+        """
+        labels = cls.__new__(cls)
+        labels.taxonomy = taxonomy
+        labels.entities = PrefixTable.fromSnapshot(snapshot, name + ".entities")
+        labels.predicates = PrefixTable.fromSnapshot(snapshot, name + ".predicates")
+        labels.categories = snapshot.csr(name + ".categories")
+        labels.predicateCount = snapshot.metadata[name]["predicateCount"]
+        labels.fingerprint = snapshot.metadata[name]["fingerprint"]
+        return labels
+
+    def categoriesOf(self, node):
+        """
+        Returns the categories an entity is recommended in.
+
+        Parameters:
+            node (int): Taxonomy node id of the entity.
+
+        Returns:
+            ndarray: Node ids of the top level classes, empty for classes.
+        """
+        indptr, ids = self.categories
+        return ids[indptr[node]:indptr[node + 1]]
+
+    def entityNames(self, prefix):
+        """
+        Returns the classes and entities with a display name starting with the prefix, ignoring case.
+
+        Parameters:
+            prefix (str): The typed input.
+
+        Returns:
+            list: (name, node id) pairs
+        """
+        table = self.entities
+        return [(table.names[i], int(table.ids[i])) for i in table.lookup(prefix)]
+
+    def predicateNames(self, prefix):
+        """
+        Returns the verb labels starting with the prefix, ignoring case. For an empty prefix, the verbs are returned
+        with all their labels except the predicate_id ones, like in the list of all verbs.
+
+        Parameters:
+            prefix (str): The typed input.
+
+        Returns:
+            list: (label, verb URI) pairs
+        """
+        table = self.predicates
+        matches = table.lookup(prefix)
+        if prefix == "":
+            ids = table.lookup(PREDICATE_ID)
+            matches = [i for i in matches if i not in ids]
+        dictionary = self.taxonomy.dictionary
+        return [(table.names[i], dictionary.decode(table.ids[i])) for i in matches]
@@ -0,0 +1,233 @@
+import copy
+import datetime
+import os
+import time
+
+from services.AppearanceIndex import AppearanceIndex
+from services.CoinBitsetIndex import CoinBitsetIndex
+from services.IndexSnapshot import IndexSnapshot, SnapshotWriter
+from services.KeywordIndex import KeywordIndex
+from services.LabelIndex import LabelIndex
+from services.TaxonomyIndex import TaxonomyIndex
+from services.UriDictionary import UriDictionary
+
+
+# the indexes a refresh compares, with their names in the snapshot
+INDEX_NAMES = ("taxonomy", "labels", "appearances", "keywords", "coins")
+
+
+def _rebound(index, **references):
+    """
+    Returns a shallow copy of an index referring to other indexes, the arrays are shared.
+
+    Parameters:
+        index (object): The index.
+        references: Attributes to replace, e.g. dictionary=... or taxonomy=...
+
+    Returns:
+        object: The copy.
+    """
+    index = copy.copy(index)
+    for name, value in references.items():
+        setattr(index, name, value)
+    return index
+
+
+class LocalIndexes():
+    """
+    One generation of the local indexes. The indexes refer to each other through the ids of their shared URI dictionary, so they
+    are only used together: CoinSearchHandler holds the current generation in one attribute and replaces it with a single
+    assignment, requests that started on the previous generation finish on it.
+
+    A generation is built from the endpoint (build), opened from a snapshot (open) or derived from the previous generation
+    (refreshed). Every index keeps the SourceFingerprint of the rows it was built from; a refresh streams the queries of the
+    indexes, compares the fingerprints and only rebuilds the indexes whose rows changed.
+
+    Attributes:
+        dictionary (UriDictionary): The shared URI dictionary, frozen.
+        taxonomy (TaxonomyIndex): Class hierarchy.
+        labels (LabelIndex): Prefix index of the names.
+        appearances (AppearanceIndex): Triples and entities of the coin sides.
+        keywords (KeywordIndex): Full text index of the iconography descriptions.
+        coinIndex (CoinBitsetIndex): Bitsets of the coin searches.
+        datasetVersion (str): Version of the dataset the indexes were built from, None if unknown.
+        generation (int): Number of the generation, counted up by every refresh.
+    """
+
+    def __init__(self, dictionary, taxonomy, labels, appearances, keywords, coin_index, dataset_version=None, generation=1):
+        self.dictionary = dictionary
+        self.taxonomy = taxonomy
+        self.labels = labels
+        self.appearances = appearances
+        self.keywords = keywords
+        self.coinIndex = coin_index
+        self.datasetVersion = dataset_version
+        self.generation = generation
+
+    @classmethod
+    def build(cls, transport, timeout=300, dataset_version=None, generation=1):
+        """
+        Builds all indexes from the endpoint.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout in seconds of the queries the indexes are built from.
+            dataset_version (str): Version of the dataset behind the endpoint.
+            generation (int): Number of the generation.
+
+        Returns:
+            LocalIndexes: The indexes.
+        """
+        dictionary = UriDictionary()
+        taxonomy = TaxonomyIndex.fromEndpoint(transport, timeout=timeout, dictionary=dictionary)
+        labels = LabelIndex.fromEndpoint(transport, taxonomy, timeout=timeout)
+        appearances = AppearanceIndex.fromEndpoint(transport, taxonomy, timeout=timeout)
+        keywords = KeywordIndex.fromEndpoint(transport, dictionary, timeout=timeout)
+        coin_index = CoinBitsetIndex.fromEndpoint(transport, appearances, keywords, timeout=timeout)
+        dictionary.freeze()
+        return cls(dictionary, taxonomy, labels, appearances, keywords, coin_index, dataset_version, generation)
+
+    def fingerprints(self):
+        """
+        Returns the fingerprints of the rows the indexes were built from.
+
+        Returns:
+            dict: Index name (see INDEX_NAMES) -> fingerprint.
+        """
+        indexes = (self.taxonomy, self.labels, self.appearances, self.keywords, self.coinIndex)
+        return {name: index.fingerprint for name, index in zip(INDEX_NAMES, indexes)}
+
+    @staticmethod
+    def sourceFingerprints(transport, timeout=300):
+        """
+        Streams the queries of all indexes and returns the fingerprints indexes built now would have.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout in seconds of the queries.
+
+        Returns:
+            dict: Index name (see INDEX_NAMES) -> fingerprint.
+        """
+        classes = (TaxonomyIndex, LabelIndex, AppearanceIndex, KeywordIndex, CoinBitsetIndex)
+        return {name: index.sourceFingerprint(transport, timeout=timeout) for name, index in zip(INDEX_NAMES, classes)}
+
+    def changedIndexes(self, transport, timeout=300):
+        """
+        Returns the indexes whose rows in the endpoint differ from the rows they were built from.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout in seconds of the queries.
+
+        Returns:
+            set: Names of the changed indexes, see INDEX_NAMES.
+        """
+        current = self.fingerprints()
+        return {name for name, fingerprint in self.sourceFingerprints(transport, timeout).items() if fingerprint != current[name]}
+
+    def refreshed(self, transport, timeout=300, dataset_version=None, changed=None):
+        """
+        Returns the next generation of the indexes for the current data of the endpoint. This generation is not changed.
+
+        The indexes whose rows did not change are reused. If the class hierarchy changed, all indexes are rebuilt, because the
+        node ids of the taxonomy are the first ids of the dictionary. Otherwise the dictionary is extended with the new URIs, so
+        the unchanged indexes stay valid, the changed labels, appearance and coin indexes are rebuilt and the keyword index is
+        updated with the changed descriptions only (see KeywordIndex.updated).
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout in seconds of the queries.
+            dataset_version (str): Version of the dataset behind the endpoint.
+            changed (set): Names of the changed indexes, if None they are determined with changedIndexes.
+
+        Returns:
+            LocalIndexes: The next generation.
+        """
+        if changed is None:
+            changed = self.changedIndexes(transport, timeout)
+        generation = self.generation + 1
+        if "taxonomy" in changed:
+            return self.build(transport, timeout, dataset_version, generation)
+
+        dictionary = self.dictionary.extended() if changed else self.dictionary
+        taxonomy = _rebound(self.taxonomy, dictionary=dictionary)
+        if "labels" in changed:
+            labels = LabelIndex.fromEndpoint(transport, taxonomy, timeout=timeout)
+        else:
+            labels = _rebound(self.labels, taxonomy=taxonomy)
+        if "appearances" in changed:
+            appearances = AppearanceIndex.fromEndpoint(transport, taxonomy, timeout=timeout)
+        else:
+            appearances = _rebound(self.appearances, taxonomy=taxonomy, dictionary=dictionary)
+        if "keywords" in changed:
+            keywords = self.keywords.updatedFromEndpoint(transport, dictionary, timeout=timeout)
+        else:
+            keywords = _rebound(self.keywords, dictionary=dictionary)
+        if "appearances" in changed or "coins" in changed:
+            coin_index = CoinBitsetIndex.fromEndpoint(transport, appearances, keywords, timeout=timeout)
+        else:
+            coin_index = _rebound(self.coinIndex, appearances=appearances, dictionary=dictionary, keywords=keywords)
+        dictionary.freeze()
+        return LocalIndexes(dictionary, taxonomy, labels, appearances, keywords, coin_index, dataset_version, generation)
+
+    def write(self, path):
+        """
+        Writes the indexes to a snapshot, so worker processes open them instead of building them.
+
+        The arrays of all indexes go into one file that is mapped by the readers (see IndexSnapshot). The keyword index is a
+        SQLite database, it is copied next to the snapshot as <snapshot>.<timestamp>.keywords; older copies are removed.
+        The snapshot is replaced atomically, so running workers keep using their old files.
+
+        Parameters:
+            path (str): Path of the snapshot file.
+        """
+        path = str(path)
+        directory, name = os.path.split(os.path.abspath(path))
+        keyword_file = f"{name}.{time.time_ns()}.keywords"
+        self.keywords.copyTo(os.path.join(directory, keyword_file))
+
+        writer = SnapshotWriter()
+        writer.metadata["datasetVersion"] = self.datasetVersion
+        writer.metadata["generation"] = self.generation
+        writer.metadata["created"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        writer.metadata["keywords"] = {"file": keyword_file, "fingerprint": self.keywords.fingerprint}
+        self.dictionary.addTo(writer, "dictionary")
+        self.taxonomy.addTo(writer, "taxonomy")
+        self.labels.addTo(writer, "labels")
+        self.appearances.addTo(writer, "appearances")
+        self.coinIndex.addTo(writer, "coins")
+        writer.write(path)
+
+        for file in os.listdir(directory):
+            if file.startswith(name + ".") and file.endswith(".keywords") and file != keyword_file:
+                os.remove(os.path.join(directory, file))
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens the indexes of a snapshot written by write. The arrays are not copied, all processes opening the same snapshot
+        share its pages.
+
+        Parameters:
+            path (str): Path of the snapshot file.
+
+        Returns:
+            LocalIndexes: The indexes.
+        """
+        snapshot = IndexSnapshot(path)
+        dictionary = UriDictionary.fromSnapshot(snapshot, "dictionary")
+        taxonomy = TaxonomyIndex.fromSnapshot(snapshot, "taxonomy", dictionary)
+        labels = LabelIndex.fromSnapshot(snapshot, "labels", taxonomy)
+        appearances = AppearanceIndex.fromSnapshot(snapshot, "appearances", taxonomy)
+        keyword_file = snapshot.metadata["keywords"]
+        keywords = KeywordIndex.open(os.path.join(os.path.dirname(os.path.abspath(path)), keyword_file["file"]), dictionary, keyword_file["fingerprint"])
+        coin_index = CoinBitsetIndex.fromSnapshot(snapshot, "coins", appearances, keywords)
+        metadata = snapshot.metadata
+        return cls(dictionary, taxonomy, labels, appearances, keywords, coin_index, metadata["datasetVersion"], metadata["generation"])
+
+    def __str__(self):
+        return (
+            f"{len(self.dictionary)} URIs, {len(self.taxonomy)} entities, {self.labels.predicateCount} verbs, "
+            f"{len(self.appearances)} coin triples, {len(self.keywords)} descriptions and {len(self.coinIndex)} coins"
+        )
@@ -0,0 +1,100 @@
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+import contextvars
+import time
+
+
+class QueryTimeout(Exception):
+    """
+    Raised when the time budget of the current request is used up or the endpoint aborted a query because of it.
+    """
+
+
+# deadline (time.monotonic()) of the current request, None if the request has no budget
+_deadline = contextvars.ContextVar("query_deadline", default=None)
+
+
+@contextmanager
+def queryBudget(seconds):
+    """
+    Limits the time all queries executed in the block may take together.
+    A nested budget can only shorten the deadline of the enclosing one.
+
+    Parameters:
+        seconds (float): Budget in seconds, None for no limit.
+    """
+    deadline = None if seconds is None else time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def currentDeadline():
+    """
+    Returns the deadline of the current request.
+
+    Returns:
+        float: Deadline as time.monotonic() value, None if there is no budget.
+    """
+    return _deadline.get()
+
+
+def remainingBudget():
+    """
+    Returns the time left of the budget of the current request.
+
+    Returns:
+        float: Remaining seconds, None if there is no budget.
+
+    Raises:
+        QueryTimeout: If the budget is already used up.
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise QueryTimeout("The time budget of the request is used up")
+    return remaining
+
+
+def submitWithBudget(executor, function, *args):
+    """
+    Submits a function to an executor, the function runs with the budget of the current request.
+    Worker threads do not inherit context variables on their own.
+
+    Parameters:
+        executor (Executor): The executor to run the function on.
+        function (function): The function to run.
+        *args: Arguments of the function.
+
+    Returns:
+        Future: The future of the submitted function.
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+def waitForResult(future):
+    """
+    Waits for the result of a future at most until the deadline of the current request.
+
+    Parameters:
+        future (Future): The future to wait for.
+
+    Returns:
+        The result of the future.
+
+    Raises:
+        QueryTimeout: If the budget is used up before the future is done.
+    """
+    if future.done():
+        return future.result()
+    try:
+        return future.result(timeout=remainingBudget())
+    except FutureTimeoutError:
+        raise QueryTimeout("The time budget of the request is used up")
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+
+
+# string literals and IRIs are kept as they are, only whitespace outside of them is normalized
+_QUERY_TOKEN_PATTERN = re.compile(r'"""(?:[^\\]|\\.)*?"""|\'\'\'(?:[^\\]|\\.)*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|<[^<>"{}|^`\\\s]*>|\s+', re.DOTALL)
+
+
+def queryFingerprint(query):
+    """
+    Computes a fingerprint of a SPARQL query, which is equal for queries that only differ in whitespace
+    outside of literals and IRIs (the generated queries differ in indentation depending on the code path).
+
+    Parameters:
+        query (str): The SPARQL query.
+
+    Returns:
+        str: Hex digest identifying the query.
+    """
+    normalized = _QUERY_TOKEN_PATTERN.sub(lambda match: " " if match.group(0).isspace() else match.group(0), query).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class QueryResultCache():
+    """
+    Thread safe in-process LRU cache for SPARQL query results with a time to live.
+
+    An entry is fresh for ttl seconds. After that it is stale, but may still be served for stale_ttl more seconds
+    while the result is refreshed in the background (stale-while-revalidate). Older entries count as misses.
+
+    Attributes:
+        max_size (int): Maximum number of cached results, the least recently used result is evicted first.
+        ttl (float): Seconds an entry is fresh.
+        stale_ttl (float): Seconds an expired entry may still be served while it is refreshed.
+        hits (int): Number of lookups answered with a fresh entry.
+        stale_hits (int): Number of lookups answered with a stale entry.
+        misses (int): Number of lookups without a usable entry.
+        evictions (int): Number of entries removed because the cache was full.
+    """
+
+    def __init__(self, max_size=2048, ttl=3600, stale_ttl=86400):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+            max_size (int): Maximum number of cached results.
+            ttl (float): Seconds an entry is fresh.
+            stale_ttl (float): Seconds an expired entry may still be served while it is refreshed.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Looks up a cached result.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+
+        Returns:
+            tuple: (result, fresh) if a usable entry exists, fresh is False if the entry should be refreshed, otherwise None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, stored = entry
+            age = now - stored
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return result, False
+            self.hits += 1
+            return result, True
+
+    def set(self, key, result, age=0):
+        """
+        Stores a result, evicting the least recently used entries if the cache is full.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+            result: The query result.
+            age (float): Seconds since the result was fetched, for results taken over from another cache.
+        """
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() - age)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def startRefresh(self, key):
+        """
+        Marks an entry as being refreshed, so that concurrent stale hits do not start further refreshes.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+
+        Returns:
+            bool: True if the caller should refresh the entry, False if a refresh is already running.
+        """
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def finishRefresh(self, key):
+        """
+        Removes the refresh mark of an entry.
+
+        Parameters:
+            key (str): Fingerprint of the query.
+        """
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        """
+        Removes all entries. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the counters of the cache.
+
+        Returns:
+            dict: size, max_size, hits, stale_hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
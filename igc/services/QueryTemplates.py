@@ -0,0 +1,337 @@
+from collections import namedtuple
+import re
+
+
+# characters that are not allowed in an IRIREF of SPARQL, they are percent-encoded
+_IRI_FORBIDDEN_PATTERN = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+# characters that have to be escaped in a string literal of SPARQL
+_LITERAL_ESCAPE_PATTERN = re.compile(r'[\\"\n\r]')
+_LITERAL_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r"}
+
+# placeholders, string literals and IRIs, comments, whitespace and the text in between
+_TEMPLATE_TOKEN_PATTERN = re.compile(
+    r'\$\{(?P<directive>[^}]*)\}'
+    r'|(?P<literal>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|<[^<>"{}|^`\\\s]*>)'
+    r'|(?P<comment>#[^\n]*)'
+    r'|(?P<space>\s+)'
+    r'|(?P<text>[^\s"\'<#$]+|.)',
+    re.DOTALL
+)
+
+_VARIABLE_PATTERN = re.compile(r"\?[A-Za-z_]\w*")
+
+# a bound input of a template, see QueryTemplate
+_Value = namedtuple("_Value", ["kind", "name", "default"])
+
+# a part of a template that is only rendered if its argument is given (respectively not given)
+_Section = namedtuple("_Section", ["name", "included", "parts"])
+
+# a part of queries that is only included by templates, see defineFragment
+_Fragment = namedtuple("_Fragment", ["name", "text"])
+
+# name -> QueryTemplate respectively _Fragment of all defined templates and fragments
+_TEMPLATES = {}
+
+
+def sparqlIri(uri):
+    """
+    Encodes a URI as an IRI of a SPARQL query. Characters that are not allowed in an IRI (e.g. ">", spaces, quotes) are
+    percent-encoded, so the URI can not end the IRI early and change the query. Other characters, also non-ASCII ones, are
+    kept: RDF compares IRIs as strings, an encoded IRI would not match the data.
+
+    Parameters:
+        uri (str): The URI.
+
+    Returns:
+        str: The IRI, e.g. "<http://nomisma.org/ontology#hasObverse>".
+    """
+    if _IRI_FORBIDDEN_PATTERN.search(uri) is None:
+        return "<" + uri + ">"
+    return "<" + _IRI_FORBIDDEN_PATTERN.sub(lambda match: "".join(f"%{byte:02X}" for byte in match.group(0).encode("utf-8")), uri) + ">"
+
+
+def sparqlLiteral(text):
+    """
+    Encodes a text as a string literal of a SPARQL query, quotes, backslashes and line breaks are escaped.
+
+    Parameters:
+        text (str): The text, e.g. the input of the user.
+
+    Returns:
+        str: The literal in double quotes.
+    """
+    return '"' + _LITERAL_ESCAPE_PATTERN.sub(lambda match: _LITERAL_ESCAPES[match.group(0)], text) + '"'
+
+
+def _encodeIri(value, default):
+    if value is None:
+        raise ValueError("An IRI argument of a query template is missing")
+    return sparqlIri(value)
+
+
+def _encodeTerm(value, default):
+    return default if value is None else sparqlIri(value)
+
+
+def _encodeIris(value, default):
+    # sorted and without duplicates, so the same URIs always give the same query text
+    return " ".join(sparqlIri(uri) for uri in sorted(set(value)))
+
+
+def _encodeLiteral(value, default):
+    return sparqlLiteral(value)
+
+
+_ENCODERS = {
+    "iri": _encodeIri,
+    "term": _encodeTerm,
+    "iris": _encodeIris,
+    "literal": _encodeLiteral,
+}
+
+
+class QueryTemplate():
+    """
+    A SPARQL query with named inputs, prepared once when it is defined and rendered for every call.
+
+    The text of a template is SPARQL with placeholders:
+        - ${iri:name}: the URI of the argument as an IRI (see sparqlIri)
+        - ${term:name:?var}: the URI of the argument as an IRI, the variable ?var if the argument is None
+        - ${iris:name}: the URIs of the argument as IRIs separated by spaces, e.g. for a VALUES block
+        - ${literal:name}: the text of the argument as a string literal (see sparqlLiteral)
+        - ${#name} ... ${/name}: rendered if the argument is given, i.e. it is neither None nor False
+        - ${^name} ... ${/name}: rendered if the argument is not given
+        - ${>template key=value ...}: the text of another template or fragment, which has to be defined before. A key binds a
+          name used in the included text: ${>key} includes the template named value, ${=key} is replaced by value (e.g. a variable)
+    Arguments are only ever inserted encoded, so an input can not change the structure of the query.
+
+    When the template is prepared, comments are removed and whitespace outside of literals and IRIs is collapsed.
+    The rendered query text only depends on the arguments (it is byte-stable), so equal calls hit the same cache entries.
+
+    Attributes:
+        name (str): Name of the template.
+        text (str): Text of the template as it was defined.
+        parameters (frozenset): Names of the arguments render expects.
+    """
+
+    def __init__(self, name, text):
+        """
+        Prepares a template.
+
+        Parameters:
+            name (str): Name of the template.
+            text (str): Text of the template, see the class documentation.
+
+        Raises:
+            ValueError: If the text is malformed or includes a template that is not defined.
+        """
+        self.name = name
+        self.text = text
+        self._parts = self._prepare(text, {})
+        self.parameters = frozenset(self._parameterNames(self._parts))
+
+    def render(self, **arguments):
+        """
+        Renders the query.
+
+        Parameters:
+            **arguments: The arguments of the template, one for each of its parameters.
+
+        Returns:
+            str: SPARQL Query
+
+        Raises:
+            ValueError: If an argument is missing.
+        """
+        missing = self.parameters.difference(arguments)
+        if missing:
+            raise ValueError(f"Missing arguments of the query template {self.name}: {', '.join(sorted(missing))}")
+        rendered = []
+        self._render(self._parts, arguments, {}, rendered)
+        return " ".join(rendered)
+
+    def _render(self, parts, arguments, encoded, rendered):
+        # encoded: _Value -> its encoded argument, an argument used several times is only encoded once
+        for part in parts:
+            if part.__class__ is str:
+                rendered.append(part)
+            elif part.__class__ is _Section:
+                value = arguments[part.name]
+                if (value is not None and value is not False) == part.included:
+                    self._render(part.parts, arguments, encoded, rendered)
+            else:
+                text = encoded.get(part)
+                if text is None:
+                    text = encoded[part] = _ENCODERS[part.kind](arguments[part.name], part.default)
+                rendered.append(text)
+
+    def _prepare(self, text, bindings):
+        """
+        Parses the text of a template into its parts: runs of static text (whitespace collapsed), _Value and _Section.
+        Included templates are parsed in place with the given bindings.
+
+        Parameters:
+            text (str): Text of the template.
+            bindings (dict): Name -> value bound by the include of the text, empty for the template itself.
+
+        Returns:
+            list: The parts.
+        """
+        root = []
+        # open sections: (name, parts of the enclosing level)
+        stack = []
+        parts = root
+        words = []
+
+        def flush():
+            if words:
+                parts.append(" ".join(words))
+                words.clear()
+
+        word = ""
+        for match in _TEMPLATE_TOKEN_PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == "literal" or kind == "text":
+                word += match.group(0)
+                continue
+            if word:
+                words.append(word)
+                word = ""
+            if kind != "directive":
+                continue
+
+            directive = match.group("directive").strip()
+            if directive.startswith("="):
+                key = directive[1:]
+                if key not in bindings:
+                    raise ValueError(f"Unbound name {key} in the query template {self.name}")
+                words.append(bindings[key])
+                continue
+            if directive.startswith(">"):
+                flush()
+                included, included_bindings = self._include(directive[1:], bindings)
+                parts.extend(self._prepare(included.text, included_bindings))
+                continue
+            flush()
+            if directive[:1] in ("#", "^"):
+                stack.append((directive[1:], parts))
+                section = _Section(directive[1:], directive[0] == "#", [])
+                parts.append(section)
+                parts = section.parts
+            elif directive.startswith("/"):
+                if not stack or stack[-1][0] != directive[1:]:
+                    raise ValueError(f"Unexpected end of section {directive[1:]} in the query template {self.name}")
+                _, parts = stack.pop()
+            else:
+                kind, _, rest = directive.partition(":")
+                name, _, default = rest.partition(":")
+                if kind not in _ENCODERS or not name:
+                    raise ValueError(f"Malformed placeholder ${{{directive}}} in the query template {self.name}")
+                if kind == "term" and not _VARIABLE_PATTERN.fullmatch(default):
+                    raise ValueError(f"The placeholder ${{{directive}}} in the query template {self.name} needs a default variable")
+                parts.append(_Value(kind, name, default or None))
+        if word:
+            words.append(word)
+        if stack:
+            raise ValueError(f"Section {stack[-1][0]} is not closed in the query template {self.name}")
+        flush()
+        return self._merged(root)
+
+    def _include(self, directive, bindings):
+        """
+        Resolves an include "template key=value ...". The template name and the values may be names bound by the enclosing include.
+
+        Returns:
+            tuple: (QueryTemplate or _Fragment, bindings of the included text)
+        """
+        name, *pairs = directive.split()
+        name = bindings.get(name, name)
+        if name not in _TEMPLATES:
+            raise ValueError(f"The query template {self.name} includes the undefined template {name}")
+        included_bindings = dict(bindings)
+        for pair in pairs:
+            key, separator, value = pair.partition("=")
+            if not separator:
+                raise ValueError(f"Malformed binding {pair} in the query template {self.name}")
+            included_bindings[key] = bindings.get(value, value)
+        return _TEMPLATES[name], included_bindings
+
+    def _merged(self, parts):
+        """
+        Joins adjacent runs of static text, also inside sections.
+        """
+        merged = []
+        for part in parts:
+            if part.__class__ is _Section:
+                part = part._replace(parts=self._merged(part.parts))
+            if part.__class__ is str and merged and merged[-1].__class__ is str:
+                merged[-1] += " " + part
+            else:
+                merged.append(part)
+        return merged
+
+    def _parameterNames(self, parts):
+        for part in parts:
+            if part.__class__ is _Section:
+                yield part.name
+                yield from self._parameterNames(part.parts)
+            elif part.__class__ is _Value:
+                yield part.name
+
+
+def defineTemplate(name, text):
+    """
+    Prepares a query template and registers it under its name, so other templates can include it.
+
+    Parameters:
+        name (str): Unique name of the template.
+        text (str): Text of the template, see QueryTemplate.
+
+    Returns:
+        QueryTemplate: The prepared template.
+
+    Raises:
+        ValueError: If a template of the name is already defined or the text is malformed.
+    """
+    if name in _TEMPLATES:
+        raise ValueError(f"The query template {name} is already defined")
+    template = QueryTemplate(name, text)
+    _TEMPLATES[name] = template
+    return template
+
+
+def defineFragment(name, text):
+    """
+    Registers a part of queries that templates include, e.g. a pattern shared by several queries. A fragment is not rendered
+    on its own, it may use the names bound by the include (see QueryTemplate) and is prepared as part of the including templates.
+
+    Parameters:
+        name (str): Unique name of the fragment.
+        text (str): Text of the fragment, see QueryTemplate.
+
+    Raises:
+        ValueError: If a template or fragment of the name is already defined.
+    """
+    if name in _TEMPLATES:
+        raise ValueError(f"The query template {name} is already defined")
+    _TEMPLATES[name] = _Fragment(name, text)
+
+
+def queryTemplate(name):
+    """
+    Returns a defined query template.
+
+    Parameters:
+        name (str): Name of the template.
+
+    Returns:
+        QueryTemplate: The template.
+
+    Raises:
+        KeyError: If no template of the name is defined.
+    """
+    template = _TEMPLATES[name]
+    if template.__class__ is not QueryTemplate:
+        raise KeyError(name)
+    return template
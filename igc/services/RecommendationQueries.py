@@ -0,0 +1,498 @@
+from services.QueryTemplates import defineFragment, defineTemplate
+
+
+# The queries of the recommendations and of the hierarchy navigation, see CoinSearchHandler.sparqlQuery*.
+# Every query is defined once and prepared when the module is imported, the inputs are bound when it is rendered:
+#   subject, predicate, object: URIs of the entered triple elements, None if not entered
+#   sideProperty: URI of the property of the coin side, see sideProperty
+#   isSubject: True if the recommendations are for the subject, otherwise for the object
+#   withPredicateOrObject: True if a predicate or an object is entered (the recommendations for a subject are constrained by them)
+
+NMO = "http://nomisma.org/ontology#"
+
+
+def sideProperty(side):
+    """
+    Returns the URI of the property linking a coin to its side.
+
+    Parameters:
+        side (str): Coin side - 'obverse' or 'reverse'
+
+    Returns:
+        str: The URI, e.g. "http://nomisma.org/ontology#hasObverse"
+    """
+    return NMO + "has" + side.capitalize()
+
+
+# the coin appearance is in a triple with the entered subject, respectively with an entity of the entered subject class
+defineFragment("subjectConstraint", """
+    {
+        ?coinAppearance rdf:subject ${term:subject:?s} .
+    }
+    UNION
+    {
+        ?subEntity rdf:type ${term:subject:?s} .
+        ?coinAppearance rdf:subject ?subEntity.
+    }
+""")
+
+# the coin appearance is in a triple with the entered object, respectively with an entity of the entered object class
+defineFragment("objectConstraint", """
+    {
+        ?coinAppearance rdf:object ${term:object:?o} .
+    }
+    UNION
+    {
+        ?objEntity rdf:type ${term:object:?o} .
+        ?coinAppearance rdf:object ?objEntity.
+    }
+""")
+
+# the coin appearance is in a triple with the entered predicate
+defineFragment("predicateConstraint", """
+    ?coinAppearance rdf:predicate ${iri:predicate}.
+""")
+
+# the coin appearance is a triple on the given side of a coin
+defineFragment("appearanceOnSide", """
+    ?coinDesignIconography rdf:li ?coinAppearance .
+    ?coinDesignIconography rdf:type rdf:Bag .
+    ?coinIconography nmo:hasIconography ?coinDesignIconography .
+    ?coinSide nmo:hasIconography ?coinIconography .
+    ?coinURI ${iri:sideProperty} ?coinSide .
+""")
+
+# the coin appearance is a triple on the given side of a coin which has the type numismatic object
+defineFragment("appearanceOnCoin", """
+    ${>appearanceOnSide}
+    ?coinURI rdf:type nmo:NumismaticObject .
+""")
+
+# The recommended entity (${=candidate}) at a position (${=position}) of a coin appearance:
+# the entity itself, an entity (${=entity}) of the recommended class, or either of them
+defineFragment("entityAt", """
+    ?coinAppearance ${=position} ${=candidate} .
+""")
+
+defineFragment("classAt", """
+    ${=entity} rdf:type ${=candidate}.
+    ?coinAppearance ${=position} ${=entity} .
+""")
+
+defineFragment("eitherAt", """
+    {
+        ${>entityAt}
+    }
+    UNION
+    {
+        ${>classAt}
+    }
+""")
+
+# The recommended entities have to occur in a triple (on at least one coin) for the given coin side with the other entered triple elements.
+# Binds the fragment of the occurrence of a subject (match) and of an object (objectMatch), see entityAt.
+defineFragment("coinOccurrence", """
+    # searched entities have to occur in a triple (on at least one coin) for the given coin side as a subject
+    ${#isSubject}
+        # if the entered object is a class like animal , the entity has to occur in a triple (on at least one coin) for the given coin side with
+        #    the entered predicate and any animal, otherwise with the entered predicate and the specific object
+        # if predicate / object isn't entered yet it can be any predicate / object
+        ${#withPredicateOrObject}
+            Filter Exists {
+                ${>match position=rdf:subject entity=?subjEntity}
+                ${#predicate} ${>predicateConstraint} ${/predicate}
+                ${#object} ${>objectConstraint} ${/object}
+                ${>appearanceOnCoin}
+            }
+        ${/withPredicateOrObject}
+        # no entered predicate and no entered object
+        # searched entities only have to occur on at least one coin (with type numismatic object) for the given coin side -> single word search
+        ${^withPredicateOrObject}
+            Filter Exists {
+                ${>match position=rdf:li entity=?subjEntity}
+                ?coinIconography nmo:hasAppearance ?coinAppearance .
+                ?coinSide nmo:hasIconography ?coinIconography .
+                ?coinURI ${iri:sideProperty} ?coinSide .
+                ?coinURI rdf:type nmo:NumismaticObject .
+            }
+        ${/withPredicateOrObject}
+    ${/isSubject}
+    # searched entities have to occur in a triple (on at least one coin) for the given coin side as an object
+    ${^isSubject}
+        Filter Exists {
+            ${>objectMatch position=rdf:object entity=?objEntity}
+            # if the entered subject is a class like deities , the entity has to occur with any deity, otherwise with the specific entered subject
+            ${#subject} ${>subjectConstraint} ${/subject}
+            ${#predicate} ${>predicateConstraint} ${/predicate}
+            ${>appearanceOnCoin}
+        }
+    ${/isSubject}
+""")
+
+# the verb occurs (on at least one coin) for the given coin side in a triple with the entered subject and object, respectively any
+# subject / object if not entered (if the entered subject is a class like deities, with at least one deity)
+defineFragment("verbOnSide", """
+    ?coinAppearance rdf:predicate ?pre.
+    ${>subjectConstraint}
+    ${>objectConstraint}
+    ${>appearanceOnSide}
+""")
+
+# ?pre = URI of the verb
+# ?preName = Name of the verb
+# All verbs, respectively the verbs which start with the input if it is given (not None).
+# With an entered subject or object the verbs have to occur with them (withSubjectOrObject).
+PREDICATES = defineTemplate("predicates", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?pre ?preName WHERE{
+        ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?preName .
+        ?pre <http://www.w3.org/2004/02/skos/core#prefLabel> ?Type .
+        ${#input}
+            FILTER(STRSTARTS(LCASE(?preName), LCASE(${literal:input})) && STRSTARTS(LCASE(?Type), LCASE("predicate_id"))) .
+        ${/input}
+        ${^input}
+            FILTER(!STRSTARTS(LCASE(?preName), LCASE("predicate_id")) && STRSTARTS(LCASE(?Type), LCASE("predicate_id"))) .
+        ${/input}
+        ${#withSubjectOrObject}
+            Filter Exists {
+                ${>verbOnSide}
+            }
+        ${/withSubjectOrObject}
+    } ORDER BY ASC(?preName)
+""")
+
+# the given verbs (candidates) which occur with the entered subject and object, see verbOnSide
+PREDICATES_OCCURRING_ON_COINS = defineTemplate("predicatesOccurringOnCoins", """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?pre WHERE{
+        VALUES ?pre { ${iris:candidates} }
+        Filter Exists {
+            ${>verbOnSide}
+        }
+    }
+""")
+
+# ?subOrObj = URI of the entity
+# ?subOrObjName = edit label of the entity / name of the entity
+# ?subOrObjSuperClass = URI of the top Class / Category of the entity
+# all entities, which start with the given input and which are only an instance of a class and not a class
+SUBJECTS_OR_OBJECTS_APART_FROM_CLASSES = defineTemplate("subjectsOrObjectsApartFromClasses", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?subOrObj ?subOrObjName ?subOrObjSuperClass WHERE{
+        ?subOrObj rdf:type ?subOrObjClass .
+        ?subOrObjClass rdfs:subClassOf ?subOrObjSuperClass.
+        ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?subOrObjNameVar.
+        FILTER(!CONTAINS(str(?subOrObjSuperClass), "http://www.w3.org/2000/01/rdf-schema#")).
+        FILTER NOT EXISTS {
+                ?subOrObjSuperClass rdfs:subClassOf ?anyClass.
+                FILTER(?subOrObjSuperClass != ?anyClass).
+        }.
+        FILTER((?subOrObjClass != ?subOrObjSuperClass) && (?subOrObj != ?subOrObjSuperClass))
+        BIND(
+            CONCAT(
+                UCASE(SUBSTR(REPLACE(STR(?subOrObjNameVar), "^.*[/_#]", ""), 1, 1)),
+                LCASE(SUBSTR(REPLACE(STR(?subOrObjNameVar), "^.*[/_#]", ""), 2))
+            ) AS ?subOrObjName
+        ).
+        FILTER(STRSTARTS(LCASE(?subOrObjName), LCASE(${literal:input}))).
+        ${>coinOccurrence match=entityAt objectMatch=entityAt candidate=?subOrObj}
+    } ORDER BY ASC(?subOrObjName)
+""")
+
+# ?subOrObjClass = URI of the entity
+# ?subOrObjClassName = edit label of the entity / name of the entity
+# all entities, which start with the given input and which are only a class and not an instance of a class
+SUBJECT_OR_OBJECT_CLASSES = defineTemplate("subjectOrObjectClasses", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?subOrObjClass ?subOrObjClassName WHERE{
+        ?subOrObjClass rdf:type rdfs:Class .
+        ?subOrObjClass <http://www.w3.org/2004/02/skos/core#prefLabel> ?subOrObjClassNameVar.
+        BIND(
+            CONCAT(
+                UCASE(SUBSTR(REPLACE(STR(?subOrObjClassNameVar), "^.*[/_#]", ""), 1, 1)),
+                LCASE(SUBSTR(REPLACE(STR(?subOrObjClassNameVar), "^.*[/_#]", ""), 2))
+            ) AS ?subOrObjClassName
+        ).
+        FILTER(STRSTARTS(LCASE(STR(?subOrObjClassName)), LCASE(${literal:input}))).
+        Filter(?subOrObjClass != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
+        ${>coinOccurrence match=classAt objectMatch=classAt candidate=?subOrObjClass}
+    } ORDER BY ASC(?subOrObjClassName)
+""")
+
+# ?subOrObj = URI of the entity
+# ?subOrObjName = edit label of the entity / name of the entity
+# all entities, respectively all which start with the filter, which are exactly one level higher in the hierarchy than the input
+defineFragment("simpleGeneraliseBody", """
+    {
+        ${iri:input} rdfs:subClassOf ?subOrObj.
+        Filter not exists {
+            ${iri:input} rdfs:subClassOf ?anyClass.
+            ?anyClass rdfs:subClassOf ?subOrObj.
+            FILTER(?anyClass != ?subOrObj && ?anyClass != ${iri:input}).
+        }
+    }
+    UNION
+    {
+        ${iri:input} rdf:type ?subOrObj.
+        Filter not exists {
+            ${iri:input} rdf:type rdfs:Class.
+        }
+        Filter not exists{
+            ?subOrObj rdfs:subClassOf ${iri:input}.
+        }
+        Filter not exists {
+            ?subOrObj rdf:type ${iri:input}.
+        }
+        Filter not exists {
+            ${iri:input} rdf:type ?anyClass.
+            ?anyClass rdfs:subClassOf ?subOrObj.
+            FILTER(?anyClass != ?subOrObj && ?anyClass != ${iri:input}).
+        }
+    }
+    Filter(?subOrObj != ${iri:input}).
+    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?superClassName.
+    BIND(
+        CONCAT(
+            UCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 1, 1)),
+            LCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 2))
+        ) AS ?subOrObjName
+    ).
+    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase(${literal:filter}))).
+    Filter(?subOrObj != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
+    ${>coinOccurrence match=classAt objectMatch=classAt candidate=?subOrObj}
+""")
+
+SIMPLE_GENERALISE = defineTemplate("simpleGeneralise", """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT Distinct ?subOrObj ?subOrObjName WHERE{
+        ${>simpleGeneraliseBody}
+    } ORDER BY ASC(?subOrObjName)
+""")
+
+SIMPLE_GENERALISE_AVAILABLE = defineTemplate("simpleGeneraliseAvailable", """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    ASK WHERE {
+        ${>simpleGeneraliseBody}
+    }
+""")
+
+# ?subOrObj = URI of the entity
+# ?subOrObjName = edit label of the entity / name of the entity
+# all entities, respectively all which start with the filter, which are exactly one level lower in the hierarchy than the input
+defineFragment("simpleSpecialiseBody", """
+    ?subOrObj rdfs:subClassOf ${iri:input} .
+    Filter not exists {
+        ?subOrObj rdfs:subClassOf ?anyClass.
+        ?anyClass rdfs:subClassOf ${iri:input}.
+        FILTER(?subOrObj != ?anyClass && ?anyClass != ${iri:input}).
+    }
+    Filter(?subOrObj != ${iri:input}).
+    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?subClassName .
+    BIND(
+        CONCAT(
+            UCASE(SUBSTR(REPLACE(STR(?subClassName), "^.*[/_#]", ""), 1, 1)),
+            LCASE(SUBSTR(REPLACE(STR(?subClassName), "^.*[/_#]", ""), 2))
+        ) AS ?subOrObjName
+    ).
+    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase(${literal:filter}))).
+    Filter(?subOrObj != <http://www.dbis.cs.uni-frankfurt.de/cnt/id/ocre_object_object>).
+    ${>coinOccurrence match=classAt objectMatch=classAt candidate=?subOrObj}
+""")
+
+SIMPLE_SPECIALISE = defineTemplate("simpleSpecialise", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT Distinct ?subOrObj ?subOrObjName WHERE{
+        ${>simpleSpecialiseBody}
+    } ORDER BY ASC(?subOrObjName)
+""")
+
+# ?subOrObj = URI of the entity
+# ?subOrObjName = edit label of the entity / name of the entity
+# all entities, respectively all which start with the filter, which are on top level in the hierarchy and related to the input
+ABSOLUTE_GENERALISE = defineTemplate("absoluteGeneralise", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT Distinct ?subOrObj ?subOrObjName WHERE{
+        {
+            ${iri:input} rdfs:subClassOf ?subOrObj.
+        }
+        UNION
+        {
+            ${iri:input} rdf:type ?subOrObj.
+            Filter not exists {
+                ${iri:input} <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.
+            }
+        }
+        Filter not exists {
+            ?subOrObj rdfs:subClassOf ?anyClass.
+            FILTER(?subOrObj != ?anyClass).
+        }
+        Filter(?subOrObj != ${iri:input}).
+        ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?superClassName.
+        BIND(
+            CONCAT(
+                UCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 1, 1)),
+                LCASE(SUBSTR(REPLACE(STR(?superClassName), "^.*[/_#]", ""), 2))
+            ) AS ?subOrObjName
+        ).
+        Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase(${literal:filter}))).
+        ${>coinOccurrence match=classAt objectMatch=classAt candidate=?subOrObj}
+    } ORDER BY ASC(?subOrObjName)
+""")
+
+# ?subOrObj = URI of the entity
+# ?subOrObjName = edit label of the entity / name of the entity
+# ?superClass = URI of the top superclass of the entity
+# all entities, respectively all which start with the filter, which are on the bottom of the hierarchy and related to the input
+defineFragment("absoluteSpecialiseBody", """
+    OPTIONAL{
+        ${iri:input} rdfs:subClassOf ?superClass .
+        Filter not exists {
+            ?superClass rdfs:subClassOf ?anyClass.
+            FILTER(?superClass != ?anyClass).
+        }
+    }
+    ?subOrObj rdf:type ${iri:input}.
+    Filter not exists {
+        ?subOrObj <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2000/01/rdf-schema#Class>.
+    }
+    ?subOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?leafName.
+    BIND(
+        CONCAT(
+            UCASE(SUBSTR(REPLACE(STR(?leafName), "^.*[/_#]", ""), 1, 1)),
+            LCASE(SUBSTR(REPLACE(STR(?leafName), "^.*[/_#]", ""), 2))
+        ) AS ?subOrObjName
+    ).
+    Filter(Strstarts(Lcase(STR(?subOrObjName)), Lcase(${literal:filter}))).
+    ${>coinOccurrence match=entityAt objectMatch=entityAt candidate=?subOrObj}
+""")
+
+ABSOLUTE_SPECIALISE = defineTemplate("absoluteSpecialise", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT Distinct ?subOrObj ?subOrObjName ?superClass WHERE{
+        ${>absoluteSpecialiseBody}
+    } ORDER BY ASC(?subOrObjName)
+""")
+
+# both kinds of specialisation, child entities (absolute) and child classes (simple), the endpoint can stop at the first solution of either branch
+SPECIALISE_AVAILABLE = defineTemplate("specialiseAvailable", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    ASK WHERE {
+        {
+            ${>absoluteSpecialiseBody}
+        }
+        UNION
+        {
+            ${>simpleSpecialiseBody}
+        }
+    }
+""")
+
+# ?toInputEquivalentSubOrObj = URI of the to the selected entity equivalent entity
+# ?toInputEquivalentSubOrObjName = name of the to the selected entity equivalent entity
+# ?superClass = URI of the top superclass of the to the selected entity equivalent entity
+# all entities, respectively all which start with the filter, which are on the same level in the hierarchy as the input
+defineFragment("equivalentBody", """
+    OPTIONAL{
+        ${iri:input} rdf:type ?superClass .
+        Filter NOT EXISTS {
+            ?superClass rdfs:subClassOf ?anyClass.
+            FILTER(?superClass != ?anyClass).
+        }
+        FILTER NOT EXISTS {
+            ${iri:input} rdf:type rdfs:Class.
+        }
+    }
+    {
+        ${iri:input} rdfs:subClassOf ?simpleGeneralization.
+        FILTER NOT EXISTS {
+            ${iri:input} rdfs:subClassOf ?anyClass.
+            ?anyClass rdfs:subClassOf ?simpleGeneralization.
+            FILTER(?anyClass != ?simpleGeneralization && ?anyClass != ${iri:input}).
+        }
+        ?toInputEquivalentSubOrObj rdfs:subClassOf ?simpleGeneralization .
+        Filter NOT EXISTS {
+            ?toInputEquivalentSubOrObj rdfs:subClassOf ?anyClass.
+            ?anyClass rdfs:subClassOf ?simpleGeneralization.
+            FILTER(?toInputEquivalentSubOrObj != ?anyClass && ?toInputEquivalentSubOrObj != ?simpleGeneralization).
+        }
+        Filter(?toInputEquivalentSubOrObj != ?simpleGeneralization).
+        ?toInputEquivalentSubOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?equivalentSubOrObjName .
+        BIND(
+            CONCAT(
+                UCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 1, 1)),
+                LCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 2))
+            ) AS ?toInputEquivalentSubOrObjName
+        ).
+    }
+    UNION
+    {
+        ${iri:input} rdf:type ?simpleGeneralization.
+        FILTER NOT EXISTS { ${iri:input} rdf:type rdfs:Class. }
+        FILTER NOT EXISTS { ?simpleGeneralization rdfs:subClassOf ${iri:input}. }
+        FILTER NOT EXISTS { ?simpleGeneralization rdf:type ${iri:input}. }
+        FILTER NOT EXISTS {
+            ${iri:input} rdf:type ?anyClass.
+            ?anyClass rdfs:subClassOf ?simpleGeneralization.
+            FILTER(?anyClass != ?simpleGeneralization && ?anyClass != ${iri:input}).
+        }
+        ?toInputEquivalentSubOrObj rdf:type ?simpleGeneralization .
+        FILTER NOT EXISTS {
+            ?toInputEquivalentSubOrObj rdfs:subClassOf ?anyClass.
+            FILTER(?simpleGeneralization != ?anyClass).
+        }
+        Filter(?toInputEquivalentSubOrObj != ?simpleGeneralization).
+        ?toInputEquivalentSubOrObj <http://www.w3.org/2004/02/skos/core#prefLabel> ?equivalentSubOrObjName .
+        BIND(
+            CONCAT(
+                UCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 1, 1)),
+                LCASE(SUBSTR(REPLACE(STR(?equivalentSubOrObjName), "^.*[/_#]", ""), 2))
+            ) AS ?toInputEquivalentSubOrObjName
+        ).
+    }
+    Filter(Strstarts(Lcase(STR(?toInputEquivalentSubOrObjName)), Lcase(${literal:filter}))) .
+    FILTER(?simpleGeneralization != ${iri:input}).
+    FILTER(?toInputEquivalentSubOrObj != ${iri:input}).
+    ${>coinOccurrence match=eitherAt objectMatch=entityAt candidate=?toInputEquivalentSubOrObj}
+""")
+
+EQUIVALENT = defineTemplate("equivalent", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?toInputEquivalentSubOrObj ?toInputEquivalentSubOrObjName ?superClass  WHERE {
+        ${>equivalentBody}
+    } ORDER BY ASC(?toInputEquivalentSubOrObjName)
+""")
+
+EQUIVALENT_AVAILABLE = defineTemplate("equivalentAvailable", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    ASK WHERE {
+        ${>equivalentBody}
+    }
+""")
+
+# The given candidate entities which occur (on at least one coin) for the given coin side with the other entered triple elements,
+# see coinOccurrence. How a candidate has to occur: the candidate itself (entityMatch), an entity of the candidate class (classMatch)
+# or either of them (eitherMatch), exactly one of them is True.
+SUBJECTS_OR_OBJECTS_OCCURRING_ON_COINS = defineTemplate("subjectsOrObjectsOccurringOnCoins", """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    SELECT DISTINCT ?subOrObj WHERE {
+        VALUES ?subOrObj { ${iris:candidates} }
+        ${#entityMatch} ${>coinOccurrence match=entityAt objectMatch=entityAt candidate=?subOrObj} ${/entityMatch}
+        ${#classMatch} ${>coinOccurrence match=classAt objectMatch=classAt candidate=?subOrObj} ${/classMatch}
+        ${#eitherMatch} ${>coinOccurrence match=eitherAt objectMatch=eitherAt candidate=?subOrObj} ${/eitherMatch}
+    }
+""")
+
+# checks if there is at least one coin which contains a triple with the entered subject for the given coin side
+RECOMMENDATIONS_AVAILABLE = defineTemplate("recommendationsAvailable", """
+    PREFIX nmo: <http://nomisma.org/ontology#>
+    ASK WHERE{
+        ${>subjectConstraint}
+        ${>appearanceOnCoin}
+    }
+""")
@@ -0,0 +1,57 @@
+import threading
+
+
+class ResultCursor():
+    """
+    The result of one coin search held on the server, so its pages and orders are served without running the search again.
+
+    The cursor keeps the matched coins in the order of the search. The metadata rows of the coins and the values they are sorted
+    by are added as they are queried (see CoinSearchHandler.searchPage and cursorOrder), the orders are computed once.
+
+    Attributes:
+        key (str): Fingerprint of the search the cursor belongs to.
+        searchType (str): The type of the search ('NumismaticObject' or 'TypeSeriesItem').
+        uris (list): URIs of the matched coins (respectively types) in the order of the search.
+        complete (bool): False if the time budget was used up while the coins were matched, then uris is a partial result.
+        rows (dict): URI -> metadata rows of the coins queried so far, for a query edited by the user the rows it returned.
+        sortValues (dict): Variable -> (URI -> value) of the variables queried so far, coins without a value are missing.
+    """
+
+    def __init__(self, key, searchType, uris, rows=None, complete=True):
+        self.key = key
+        self.searchType = searchType
+        self.uris = uris
+        self.complete = complete
+        self.rows = {} if rows is None else rows
+        self.sortValues = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.uris)
+
+    def ordered(self, variable, key, descending=False):
+        """
+        Returns the coins sorted by a variable, the order is computed once per variable and direction.
+        Coins without a value come last in both directions, coins with equal values keep the order of the search.
+
+        Parameters:
+            variable (str): The variable, its values must be in sortValues.
+            key (function): Converts a value into the value compared, None if it can not be compared.
+            descending (bool): True to sort in descending order.
+
+        Returns:
+            list: The URIs of the coins.
+        """
+        with self._lock:
+            order = self._orders.get((variable, descending))
+            if order is None:
+                values = self.sortValues[variable]
+                keys = {}
+                for uri in self.uris:
+                    value = values.get(uri)
+                    keys[uri] = None if value is None else key(value)
+                order = sorted((uri for uri in self.uris if keys[uri] is not None), key=keys.get, reverse=descending)
+                order.extend(uri for uri in self.uris if keys[uri] is None)
+                self._orders[(variable, descending)] = order
+            return order
@@ -0,0 +1,225 @@
+import gzip
+import io
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDF, RDFS, SKOS
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser
+from rdflib.util import guess_format
+
+
+# predicates the rules of apache/rules.ttl read, all other triples of a dump are skipped
+_RULE_PREDICATES = (RDFS.subClassOf, RDF.type, SKOS.prefLabel)
+
+
+class _TripleSink():
+    """
+    Receives the triples of the N-Triples parser.
+    """
+
+    def __init__(self, materializer):
+        self.materializer = materializer
+
+    def triple(self, s, p, o):
+        self.materializer.add(s, p, o)
+
+
+class RuleMaterializer():
+    """
+    Computes the closure of the rules in apache/rules.ttl ahead of time, so the dataset can be served by a plain TDB
+    dataset instead of an InfModel with the GenericRuleReasoner. The rules are:
+        - rdfs:subClassOf is transitive
+        - rdf:type is inherited along rdfs:subClassOf
+        - everything with a subclass or a superclass is an rdfs:Class
+        - an rdfs:Class without skos:prefLabel gets its URI as label
+
+    The triples of one or more dumps are added with read or add, inferredTriples then yields the triples the reasoner
+    would infer and that are not in the dumps already. Only subClassOf, type and prefLabel triples are kept in memory.
+
+    Attributes:
+        triples (int): Number of triples read from dumps, including skipped ones.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty materializer.
+        """
+        self.triples = 0
+        self._supers = {}
+        self._members = {}
+        self._labelled = set()
+
+    def add(self, s, p, o):
+        """
+        Adds a triple of the dataset.
+
+        Parameters:
+            s (Node): Subject.
+            p (URIRef): Predicate.
+            o (Node): Object.
+        """
+        if p == RDFS.subClassOf:
+            self._supers.setdefault(s, set()).add(o)
+            self._supers.setdefault(o, set())
+        elif p == RDF.type:
+            self._members.setdefault(o, []).append(s)
+        elif p == SKOS.prefLabel:
+            self._labelled.add(s)
+
+    def read(self, path, format=None, batch_lines=100000):
+        """
+        Adds all triples of a dump file. Files ending with .gz are decompressed while reading.
+        N-Triples are read line by line and lines without one of the rule predicates are skipped before parsing,
+        other formats are parsed as a whole with rdflib.
+
+        Parameters:
+            path (str): Path of the dump.
+            format (str): rdflib format of the dump, guessed from the file name if None.
+            batch_lines (int): Number of N-Triples lines parsed at once.
+
+        Returns:
+            int: Number of triples read from the file.
+        """
+        path = str(path)
+        name = path[:-3] if path.endswith(".gz") else path
+        if format is None:
+            format = "nt" if name.endswith((".nt", ".ntriples")) else _guessFormat(name)
+        opener = gzip.open if path.endswith(".gz") else open
+        before = self.triples
+
+        if format in ("nt", "ntriples", "nt11"):
+            markers = tuple(f"<{predicate}>" for predicate in _RULE_PREDICATES)
+            # shared blank node ids, a blank node may occur in several batches
+            bnodes = {}
+            parser = W3CNTriplesParser(_TripleSink(self), bnode_context=bnodes)
+            with opener(path, "rt", encoding="utf-8") as f:
+                batch = []
+                for line in f:
+                    if any(marker in line for marker in markers):
+                        batch.append(line)
+                        if len(batch) >= batch_lines:
+                            parser.parse(io.StringIO("".join(batch)), bnode_context=bnodes)
+                            batch = []
+                    if line.strip() and not line.lstrip().startswith("#"):
+                        self.triples += 1
+                if batch:
+                    parser.parse(io.StringIO("".join(batch)), bnode_context=bnodes)
+        else:
+            graph = Graph()
+            with opener(path, "rb") as f:
+                graph.parse(f, format=format)
+            self.triples += len(graph)
+            for predicate in _RULE_PREDICATES:
+                for s, p, o in graph.triples((None, predicate, None)):
+                    self.add(s, p, o)
+        return self.triples - before
+
+    def _superClosure(self):
+        """
+        Returns the transitive superclasses of every class. A class is its own superclass only if it is part of a cycle.
+
+        Returns:
+            dict: class -> set of superclasses
+        """
+        closure = {}
+        for cls, supers in self._supers.items():
+            reached = set()
+            stack = list(supers)
+            while stack:
+                sup = stack.pop()
+                if sup not in reached:
+                    reached.add(sup)
+                    stack.extend(self._supers[sup])
+            closure[cls] = reached
+        return closure
+
+    def inferredTriples(self):
+        """
+        Yields the triples the rules infer from the added triples and that are not part of them, sorted by rule and subject.
+
+        Returns:
+            generator: (subject, predicate, object) triples of rdflib terms
+        """
+        closure = self._superClosure()
+
+        for cls in sorted(closure):
+            for sup in sorted(closure[cls] - self._supers[cls]):
+                yield cls, RDFS.subClassOf, sup
+
+        # asserted types of the entities whose types are inherited; classes are typed rdfs:Class by the rules
+        types = {}
+        for cls, members in self._members.items():
+            if cls in closure or cls == RDFS.Class:
+                for member in members:
+                    types.setdefault(member, set()).add(cls)
+        asserted = {entity: set(classes) for entity, classes in types.items()}
+        for cls in closure:
+            types.setdefault(cls, set()).add(RDFS.Class)
+
+        classes = set()
+        for entity in sorted(types):
+            inferred = set(types[entity])
+            for cls in types[entity]:
+                inferred |= closure.get(cls, set())
+            if RDFS.Class in inferred:
+                classes.add(entity)
+            for cls in sorted(inferred - asserted.get(entity, set())):
+                yield entity, RDF.type, cls
+
+        # the rule engine writes the lexical form of the class URI as label, blank nodes have no stable one
+        for cls in sorted(classes - self._labelled):
+            if not isinstance(cls, BNode):
+                yield cls, SKOS.prefLabel, Literal(str(cls))
+
+    def write(self, path):
+        """
+        Writes the inferred triples as N-Triples, compressed if the path ends with .gz.
+
+        Parameters:
+            path (str): Path of the output file.
+
+        Returns:
+            int: Number of triples written.
+        """
+        path = str(path)
+        opener = gzip.open if path.endswith(".gz") else open
+        written = 0
+        with opener(path, "wt", encoding="utf-8") as f:
+            for s, p, o in self.inferredTriples():
+                f.write(f"{_ntTerm(s)} {_ntTerm(p)} {_ntTerm(o)} .\n")
+                written += 1
+        return written
+
+
+def _guessFormat(name):
+    """
+    Guesses the rdflib format of a dump from its file name.
+
+    Parameters:
+        name (str): File name without .gz.
+
+    Returns:
+        str: rdflib format name, "turtle" if the extension is unknown.
+    """
+    return guess_format(name) or "turtle"
+
+
+def _ntTerm(term):
+    """
+    Returns the N-Triples form of a term. Unlike Node.n3, literals are always written on one line.
+
+    Parameters:
+        term (Node): URIRef, BNode or Literal.
+
+    Returns:
+        str: The term in N-Triples syntax.
+    """
+    if isinstance(term, Literal):
+        value = str(term).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+        if term.language:
+            return f'"{value}"@{term.language}'
+        if term.datatype:
+            return f'"{value}"^^<{term.datatype}>'
+        return f'"{value}"'
+    if isinstance(term, URIRef):
+        return f"<{term}>"
+    return term.n3()
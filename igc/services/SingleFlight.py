@@ -0,0 +1,67 @@
+from concurrent.futures import Future
+import threading
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent calls with the same key: the first caller executes the function,
+    callers arriving while it is running wait for its result instead of executing it again.
+
+    Unlike a cache, nothing is kept after the call finished, the next call with the key executes the function again.
+    """
+
+    def __init__(self):
+        """
+        Initializes the registry of running calls.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function, *args, timeout=None):
+        """
+        Executes function(*args) unless a call with the same key is already running, in which case its result is returned.
+        If the function raises an exception, all waiting callers receive it.
+
+        Parameters:
+            key (str): Key identifying calls with the same result.
+            function (function): The function to execute.
+            *args: Arguments of the function.
+            timeout (float): Seconds a waiting caller waits for the running call, None to wait until it is done.
+
+        Returns:
+            The result of the function.
+
+        Raises:
+            concurrent.futures.TimeoutError: If a waiting caller's timeout expired before the running call finished.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def inFlight(self):
+        """
+        Returns the number of currently running calls.
+
+        Returns:
+            int: Number of distinct keys being executed.
+        """
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,42 @@
+import hashlib
+
+
+class SourceFingerprint():
+    """
+    Order independent fingerprint of the rows an index is built from: the number of rows and the sum of their 64 bit hashes.
+    Two result sets with the same rows have the same fingerprint in whatever order the endpoint sends them, so a refresh can
+    tell whether an index has to be rebuilt by streaming its queries without building anything.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._sum = 0
+
+    def add(self, *values):
+        """
+        Adds a row.
+
+        Parameters:
+            values (str): The values of the row, None for unbound values. The first value should name the query of the row.
+        """
+        data = "\x1f".join("\x00" if value is None else value for value in values).encode("utf-8")
+        self.count += 1
+        self._sum = (self._sum + int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")) & 0xFFFFFFFFFFFFFFFF
+
+    def rows(self, source, rows):
+        """
+        Adds rows while they are consumed.
+
+        Parameters:
+            source (str): Name of the query of the rows.
+            rows (iterable): Tuples of the values of the rows.
+
+        Returns:
+            generator: The rows.
+        """
+        for row in rows:
+            self.add(source, *row)
+            yield row
+
+    def __str__(self):
+        return f"{self.count}:{self._sum:016x}"
@@ -0,0 +1,219 @@
+from collections import namedtuple
+from io import BytesIO
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from rdflib import Graph
+from rdflib.query import Result
+
+from services.QueryBudget import QueryTimeout
+
+
+_TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+_TSV_ESCAPE_PATTERN = re.compile(r"\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)")
+
+
+def _unescapeTsv(match):
+    """
+    Replaces a single escape sequence of a TSV literal.
+
+    Parameters:
+        match (re.Match): Match of _TSV_ESCAPE_PATTERN.
+
+    Returns:
+        str: The unescaped character.
+    """
+    escape = match.group(1)
+    if escape[0] in "uU" and len(escape) > 1:
+        return chr(int(escape[1:], 16))
+    return _TSV_ESCAPES.get(escape, escape)
+
+
+def parseTerm(term):
+    """
+    Converts an RDF term of a SPARQL TSV result or of an N-Triples dump into a plain string.
+
+    Parameters:
+        term (str): Term in N-Triples syntax, e.g. <http://...>, "Artemis"@en, "12.5"^^<...#decimal> or 12.5
+
+    Returns:
+        str: IRI or lexical form of the term, None if the variable is unbound.
+    """
+    if term == "":
+        return None
+    if term[0] == "<" and term[-1] == ">":
+        return term[1:-1]
+    if term[0] == '"':
+        # language tags and datatypes follow the closing quote
+        return _TSV_ESCAPE_PATTERN.sub(_unescapeTsv, term[1:term.rfind('"')])
+    # numbers and booleans in abbreviated form, blank nodes
+    return term
+
+
+class SparqlTransport():
+    """
+    HTTP transport for SPARQL queries against a single endpoint.
+
+    All threads share one keep-alive connection pool, so repeated queries (for example the
+    recommendations triggered by every keystroke) reuse already open TCP connections instead
+    of opening a new one per query. Responses are requested gzip compressed.
+
+    Attributes:
+        endpoint (str): SPARQL endpoint URL.
+        pool_size (int): Maximum number of open connections to the endpoint.
+        connect_timeout (float): Default timeout in seconds for establishing a connection.
+        read_timeout (float): Default timeout in seconds for waiting on the response.
+    """
+
+    def __init__(self, endpoint, pool_size=10, connect_timeout=3.05, read_timeout=60):
+        """
+        Initializes the transport and its connection pool.
+
+        Parameters:
+            endpoint (str): SPARQL endpoint URL.
+            pool_size (int): Maximum number of open connections to the endpoint.
+            connect_timeout (float): Default timeout in seconds for establishing a connection.
+            read_timeout (float): Default timeout in seconds for waiting on the response.
+        """
+        self.endpoint = endpoint
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        # one adapter (= one urllib3 pool) shared by the sessions of all threads,
+        # pool_block makes threads wait for a free connection instead of opening extra ones
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self._local = threading.local()
+
+        # the rdflib SPARQLStore used before prepended the default namespaces of an rdflib Graph to every query,
+        # some queries (e.g. rdf: and rdfs: in the recommendation queries) rely on that
+        self._prefixes = "\n".join(f"PREFIX {prefix}: <{namespace}>" for prefix, namespace in Graph().namespaces())
+
+    def _session(self):
+        """
+        Returns the session of the current thread. Sessions are not thread safe, the underlying connection pool is.
+
+        Returns:
+            requests.Session: Session of the current thread using the shared connection pool.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            session.headers.update({
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+            })
+            self._local.session = session
+        return session
+
+    def _timeout(self, timeout):
+        """
+        Resolves the timeout for a single call.
+
+        Parameters:
+            timeout (None, float or tuple): None for the defaults, a number for the read timeout or a (connect, read) tuple.
+
+        Returns:
+            tuple: (connect timeout, read timeout) in seconds.
+        """
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, timeout)
+
+    def post(self, query, accept="application/sparql-results+json", timeout=None, stream=False, server_timeout=None):
+        """
+        Sends a SPARQL query to the endpoint.
+
+        Parameters:
+            query (str): The SPARQL query.
+            accept (str): Requested result format.
+            timeout (None, float or tuple): Timeout of this call, see _timeout.
+            stream (bool): If true the response body is not read in advance.
+            server_timeout (float): Seconds after which the endpoint should abort the query (ARQ timeout parameter of Fuseki), None for the endpoint default.
+
+        Returns:
+            requests.Response: The response of the endpoint.
+
+        Raises:
+            QueryTimeout: If the response did not arrive in time or the endpoint aborted the query because of server_timeout.
+        """
+        data = {"query": f"{self._prefixes}\n\n{query}"}
+        if server_timeout is not None:
+            data["timeout"] = str(max(1, int(server_timeout * 1000)))
+        try:
+            response = self._session().post(
+                self.endpoint,
+                data=data,
+                headers={"Accept": accept},
+                timeout=self._timeout(timeout),
+                stream=stream,
+            )
+        except requests.exceptions.Timeout as e:
+            raise QueryTimeout(f"The SPARQL endpoint did not answer in time: {e}")
+        # fuseki answers a query cancelled by its timeout with 503
+        if server_timeout is not None and response.status_code == 503:
+            response.close()
+            raise QueryTimeout("The SPARQL endpoint aborted the query after its timeout")
+        response.raise_for_status()
+        return response
+
+    def query(self, query, timeout=None, server_timeout=None):
+        """
+        Executes a SPARQL query and parses the complete response.
+
+        Parameters:
+            query (str): The SPARQL query.
+            timeout (None, float or tuple): Timeout of this call, see _timeout.
+            server_timeout (float): Seconds after which the endpoint should abort the query, see post.
+
+        Returns:
+            Result: The parsed rdflib query result.
+        """
+        response = self.post(query, timeout=timeout, server_timeout=server_timeout)
+        content_type = response.headers.get("Content-Type", "application/sparql-results+json").split(";")[0]
+        return Result.parse(BytesIO(response.content), content_type=content_type)
+
+    def stream(self, query, timeout=None, server_timeout=None, deadline=None):
+        """
+        Executes a SPARQL SELECT query and yields the result rows while the endpoint is still sending.
+
+        The results are requested as tab separated values, which can be parsed line by line.
+        Each row is a namedtuple with one field per variable, bound values are plain strings and unbound values are None.
+
+        Parameters:
+            query (str): The SPARQL SELECT query.
+            timeout (None, float or tuple): Timeout of this call, see _timeout. It applies to every single read.
+            server_timeout (float): Seconds after which the endpoint should abort the query, see post.
+            deadline (float): time.monotonic() value after which reading is stopped, None for no limit.
+
+        Returns:
+            generator: The result rows.
+
+        Raises:
+            QueryTimeout: If the deadline passed before all rows were read. The rows yielded before are valid.
+        """
+        response = self.post(query, accept="text/tab-separated-values", timeout=timeout, stream=True, server_timeout=server_timeout)
+        with response:
+            row_type = None
+            buffer = b""
+            for chunk in response.iter_content(chunk_size=65536):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise QueryTimeout("The time budget of the request is used up")
+                buffer += chunk
+                lines = buffer.split(b"\n")
+                buffer = lines.pop()
+                for line in lines:
+                    line = line.decode("utf-8").rstrip("\r")
+                    if row_type is None:
+                        row_type = namedtuple("SparqlRow", [var.lstrip("?$") for var in line.split("\t")], rename=True)
+                    else:
+                        yield row_type(*[parseTerm(term) for term in line.split("\t")])
+            if buffer and row_type is not None:
+                yield row_type(*[parseTerm(term) for term in buffer.decode("utf-8").rstrip("\r").split("\t")])
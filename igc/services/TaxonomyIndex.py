@@ -0,0 +1,444 @@
+import re
+
+import numpy as np
+
+from services.SourceFingerprint import SourceFingerprint
+from services.UriDictionary import UriDictionary
+
+
+# queries the index is built from, they return the inferred triples if the endpoint uses the reasoner
+SUBCLASS_QUERY = """
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?sub ?super WHERE {
+        ?sub rdfs:subClassOf ?super .
+    }
+    """
+
+TYPE_QUERY = """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    SELECT ?entity ?class WHERE {
+        ?class rdf:type rdfs:Class .
+        ?entity rdf:type ?class .
+    }
+    """
+
+LABEL_QUERY = """
+    PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+    SELECT DISTINCT ?node ?label WHERE {
+        {
+            ?node rdf:type rdfs:Class .
+        }
+        UNION
+        {
+            ?class rdf:type rdfs:Class .
+            ?node rdf:type ?class .
+        }
+        ?node skos:prefLabel ?label .
+    }
+    """
+
+
+def displayName(label):
+    """
+    Turns a label into the name shown in the recommendations, the same way the recommendation queries do:
+    everything up to the last '/', '_' or '#' is removed, the first character is upper case and the rest lower case.
+
+    Parameters:
+        label (str): The skos:prefLabel of an entity.
+
+    Returns:
+        str: The display name.
+    """
+    name = re.sub(r"^.*[/_#]", "", label)
+    return name[:1].upper() + name[1:].lower()
+
+
+def _csr(lists):
+    """
+    Packs a list of integer lists into compressed sparse row arrays.
+
+    Parameters:
+        lists (list): One list of node ids per node.
+
+    Returns:
+        tuple: (indptr, indices) as int32 arrays, the ids of node n are indices[indptr[n]:indptr[n + 1]].
+    """
+    indptr = np.zeros(len(lists) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(ids) for ids in lists], dtype=np.int64)
+    indices = np.fromiter((i for ids in lists for i in ids), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+
+class _NameLists():
+    """
+    The display names of the nodes of a snapshot: node n has the names at indices[indptr[n]:indptr[n + 1]] of a StringTable.
+    """
+
+    def __init__(self, relation, strings):
+        self.relation = relation
+        self.strings = strings
+
+    def __len__(self):
+        return len(self.relation[0]) - 1
+
+    def __getitem__(self, node):
+        indptr, indices = self.relation
+        return tuple(self.strings[int(i)] for i in indices[indptr[node]:indptr[node + 1]])
+
+
+class TaxonomyIndex():
+    """
+    In-memory index of the class hierarchy (rdfs:subClassOf) and the class memberships (rdf:type) of the dataset.
+
+    The hierarchy is built once, e.g. from the endpoint with fromEndpoint, and answers the generalise, specialise and
+    equivalent recommendations without the nested FILTER NOT EXISTS queries. Nodes are numbered, all relations are stored
+    as compressed sparse row arrays of node ids: the ids related to node n are array[indptr[n]:indptr[n + 1]].
+    The node ids are the ids of the URI dictionary, the taxonomy is the first index built on it, so its nodes are the
+    first ids and the ids of the other indexes follow.
+
+    The relations follow the recommendation queries and the rules of the reasoner (apache/rules.ttl): a class is
+    anything in a subClassOf relation, the ancestors of a class are its superclasses (transitively), the ancestors of
+    any other entity are its classes and their superclasses.
+
+    Attributes:
+        dictionary (UriDictionary): URI encoding shared with the other local indexes.
+        nodes (int): Number of nodes, the node ids are 0 to nodes - 1.
+        isClass (ndarray): bool per node, True if the node is a class.
+        names (list): Display names (see displayName) of every node, a node can have several labels.
+        ancestors (tuple): (indptr, ids) of all ancestors of a node, without the node itself.
+        parents (tuple): (indptr, ids) of the direct parents, i.e. ancestors that are not an ancestor of another ancestor.
+        children (tuple): (indptr, ids) of the direct subclasses of a class.
+        tops (tuple): (indptr, ids) of the top level ancestors, i.e. ancestors without a superclass.
+        instances (tuple): (indptr, ids) of the entities that are not classes and are a member of a class (leaves).
+        depth (ndarray): int16 per node, number of direct parent steps to a top level class, 0 for nodes without ancestors.
+        fingerprint (str): SourceFingerprint of the triples the index is built from, see sourceFingerprint.
+    """
+
+    def __init__(self, subclass_pairs, type_pairs, labels, dictionary=None):
+        """
+        Builds the index.
+
+        Parameters:
+            subclass_pairs (iterable): (subclass URI, superclass URI) pairs. They do not have to be transitively closed.
+            type_pairs (iterable): (entity URI, class URI) pairs. Pairs with a class that is in no subClassOf relation are ignored.
+            labels (iterable): (URI, skos:prefLabel) pairs. Labels of URIs that are not part of the index are ignored.
+            dictionary (UriDictionary): Empty URI dictionary the nodes are encoded in, a new one if None.
+
+        Raises:
+            ValueError: If the dictionary is not empty.
+        """
+        if dictionary is None:
+            dictionary = UriDictionary()
+        if len(dictionary):
+            raise ValueError("The taxonomy has to be the first index of a URI dictionary")
+        self.dictionary = dictionary
+        fingerprint = SourceFingerprint()
+
+        supers = {}
+        for sub, sup in subclass_pairs:
+            fingerprint.add("subclass", sub, sup)
+            sub, sup = self._node(sub), self._node(sup)
+            supers.setdefault(sub, set()).add(sup)
+            supers.setdefault(sup, set())
+        classes = len(dictionary)
+
+        types = {}
+        for entity_uri, cls_uri in type_pairs:
+            cls = dictionary.lookup(cls_uri)
+            if cls is None:
+                continue
+            entity = self._node(entity_uri)
+            if entity >= classes:
+                fingerprint.add("type", entity_uri, cls_uri)
+                types.setdefault(entity, set()).add(cls)
+
+        nodes = self.nodes = len(dictionary)
+        self.isClass = np.zeros(nodes, dtype=bool)
+        self.isClass[:classes] = True
+
+        # transitive superclasses, the endpoint may already deliver them closed
+        ancestors = [None] * nodes
+        for node in range(classes):
+            closure = set()
+            stack = list(supers[node])
+            while stack:
+                sup = stack.pop()
+                if sup not in closure:
+                    closure.add(sup)
+                    stack.extend(supers[sup])
+            closure.discard(node)
+            ancestors[node] = closure
+        for node in range(classes, nodes):
+            closure = set(types.get(node, ()))
+            for cls in list(closure):
+                closure |= ancestors[cls]
+            closure.discard(node)
+            ancestors[node] = closure
+
+        # an ancestor is a direct parent if no other ancestor is below it
+        parents = []
+        for node in range(nodes):
+            parents.append([
+                parent for parent in ancestors[node]
+                if not any(parent in ancestors[other] for other in ancestors[node] if other != parent)
+            ])
+
+        children = [[] for _ in range(nodes)]
+        for node in range(classes):
+            for parent in parents[node]:
+                children[parent].append(node)
+
+        tops = [[ancestor for ancestor in ancestors[node] if not ancestors[ancestor]] for node in range(nodes)]
+
+        instances = [[] for _ in range(nodes)]
+        for node in range(classes, nodes):
+            for cls in ancestors[node]:
+                instances[cls].append(node)
+
+        self.depth = np.zeros(nodes, dtype=np.int16)
+        level = [node for node in range(classes) if not parents[node]]
+        seen = set(level)
+        steps = 0
+        while level:
+            self.depth[level] = steps
+            steps += 1
+            level = [child for node in level for child in children[node] if child not in seen]
+            seen.update(level)
+        for node in range(classes, nodes):
+            if parents[node]:
+                self.depth[node] = max(self.depth[parent] for parent in parents[node]) + 1
+
+        self.ancestors = _csr([sorted(ids) for ids in ancestors])
+        self.parents = _csr([sorted(ids) for ids in parents])
+        self.children = _csr([sorted(ids) for ids in children])
+        self.tops = _csr([sorted(ids) for ids in tops])
+        self.instances = _csr(instances)
+
+        self.names = [() for _ in range(nodes)]
+        for uri, label in labels:
+            node = self.nodeId(uri)
+            if node is not None:
+                fingerprint.add("label", uri, label)
+                name = displayName(label)
+                if name not in self.names[node]:
+                    self.names[node] += (name,)
+        self.fingerprint = str(fingerprint)
+
+    @classmethod
+    def fromEndpoint(cls, transport, timeout=300, dictionary=None):
+        """
+        Builds the index from the (reasoner inferred) subClassOf, type and label triples of a SPARQL endpoint.
+        The triples are streamed, so the result sets are never held as a whole.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of each query in seconds.
+            dictionary (UriDictionary): Empty URI dictionary the nodes are encoded in, a new one if None.
+
+        Returns:
+            TaxonomyIndex: The built index.
+        """
+        subclass_pairs = [(row.sub, row.super) for row in transport.stream(SUBCLASS_QUERY, timeout=timeout)]
+        type_pairs = ((row.entity, row[1]) for row in transport.stream(TYPE_QUERY, timeout=timeout))
+        labels = ((row.node, row.label) for row in transport.stream(LABEL_QUERY, timeout=timeout))
+        return cls(subclass_pairs, type_pairs, labels, dictionary)
+
+    @staticmethod
+    def sourceFingerprint(transport, timeout=300):
+        """
+        Returns the fingerprint an index built from the endpoint now would have, without building it.
+        Only the triples the index uses count: memberships in classes of the hierarchy and labels of its nodes.
+
+        Parameters:
+            transport (SparqlTransport): Transport to the endpoint.
+            timeout (float): Read timeout of each query in seconds.
+
+        Returns:
+            str: The fingerprint, see SourceFingerprint.
+        """
+        fingerprint = SourceFingerprint()
+        classes = set()
+        for row in transport.stream(SUBCLASS_QUERY, timeout=timeout):
+            fingerprint.add("subclass", row.sub, row.super)
+            classes.update((row.sub, row.super))
+        entities = set()
+        for row in transport.stream(TYPE_QUERY, timeout=timeout):
+            if row[1] in classes and row.entity not in classes:
+                fingerprint.add("type", row.entity, row[1])
+                entities.add(row.entity)
+        for row in transport.stream(LABEL_QUERY, timeout=timeout):
+            if row.node in classes or row.node in entities:
+                fingerprint.add("label", row.node, row.label)
+        return str(fingerprint)
+
+    def _node(self, uri):
+        """
+        Returns the id of a URI, adding it as a new node if it is not known yet.
+
+        Parameters:
+            uri (str): The URI.
+
+        Returns:
+            int: The node id.
+        """
+        return self.dictionary.encode(uri)
+
+    def __len__(self):
+        return self.nodes
+
+    def __contains__(self, uri):
+        return self.nodeId(uri) is not None
+
+    def nodeId(self, uri):
+        """
+        Returns the id of a URI.
+
+        Parameters:
+            uri (str): The URI.
+
+        Returns:
+            int: The node id, None if the URI is not part of the index.
+        """
+        node = self.dictionary.lookup(uri)
+        if node is None or node >= self.nodes:
+            return None
+        return node
+
+    def uri(self, node):
+        """
+        Returns the URI of a node.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            str: The URI.
+        """
+        return self.dictionary.decode(node)
+
+    def addTo(self, writer, name):
+        """
+        Adds the index to a snapshot, the dictionary is added separately.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        strings = sorted({label for node in range(self.nodes) for label in self.names[node]})
+        positions = {label: position for position, label in enumerate(strings)}
+        writer.metadata[name] = {"nodes": self.nodes, "fingerprint": self.fingerprint}
+        writer.addStrings(name + ".names", strings)
+        writer.addCsr(name + ".nodeNames", _csr([[positions[label] for label in self.names[node]] for node in range(self.nodes)]))
+        writer.add(name + ".isClass", self.isClass)
+        writer.add(name + ".depth", self.depth)
+        for relation in ("ancestors", "parents", "children", "tops", "instances"):
+            writer.addCsr(f"{name}.{relation}", getattr(self, relation))
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name, dictionary):
+        """
+        Opens an index of a snapshot without copying its arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+            dictionary (UriDictionary): The dictionary of the snapshot.
+
+        Returns:
+            TaxonomyIndex: The index.
+        """
+        taxonomy = cls.__new__(cls)
+        taxonomy.dictionary = dictionary
+        taxonomy.nodes = snapshot.metadata[name]["nodes"]
+        taxonomy.fingerprint = snapshot.metadata[name]["fingerprint"]
+        taxonomy.names = _NameLists(snapshot.csr(name + ".nodeNames"), snapshot.strings(name + ".names"))
+        taxonomy.isClass = snapshot.array(name + ".isClass")
+        taxonomy.depth = snapshot.array(name + ".depth")
+        for relation in ("ancestors", "parents", "children", "tops", "instances"):
+            setattr(taxonomy, relation, snapshot.csr(f"{name}.{relation}"))
+        return taxonomy
+
+    def _related(self, relation, node):
+        indptr, ids = relation
+        return ids[indptr[node]:indptr[node + 1]]
+
+    def ancestorsOf(self, node):
+        """
+        Returns all superclasses of a class, respectively all classes of an entity.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            ndarray: Node ids of the ancestors.
+        """
+        return self._related(self.ancestors, node)
+
+    def parentsOf(self, node):
+        """
+        Returns the direct superclasses of a class, respectively the most specific classes of an entity.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            ndarray: Node ids of the direct parents.
+        """
+        return self._related(self.parents, node)
+
+    def childrenOf(self, node):
+        """
+        Returns the direct subclasses of a class.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            ndarray: Node ids of the direct subclasses.
+        """
+        return self._related(self.children, node)
+
+    def topsOf(self, node):
+        """
+        Returns the top level classes above a node.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            ndarray: Node ids of the top level ancestors.
+        """
+        return self._related(self.tops, node)
+
+    def instancesOf(self, node):
+        """
+        Returns the entities that are members of a class or one of its subclasses and are no classes themselves.
+
+        Parameters:
+            node (int): The node id of a class.
+
+        Returns:
+            ndarray: Node ids of the entities.
+        """
+        return self._related(self.instances, node)
+
+    def siblingsOf(self, node):
+        """
+        Returns the nodes sharing a direct parent with a node: the direct subclasses of the direct superclasses of a class,
+        respectively the entities of the most specific classes of an entity. Entities of a class that also are a member
+        of a class outside the hierarchy of the parent are siblings as well.
+
+        Parameters:
+            node (int): The node id.
+
+        Returns:
+            list: (sibling id, parent id) pairs, a sibling of several parents occurs once per parent.
+        """
+        siblings = []
+        for parent in self.parentsOf(node):
+            related = self.childrenOf(parent) if self.isClass[node] else self.instancesOf(parent)
+            siblings.extend((int(sibling), int(parent)) for sibling in related if sibling != node)
+        return siblings
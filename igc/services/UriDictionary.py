@@ -0,0 +1,297 @@
+import hashlib
+from array import array
+
+import numpy as np
+
+from services.IndexSnapshot import StringTable
+
+
+def uriHash(uri):
+    """
+    Returns a 64 bit hash of a URI that is the same in every process (unlike hash()).
+
+    Parameters:
+        uri (str): The URI.
+
+    Returns:
+        int: The signed hash.
+    """
+    return int.from_bytes(hashlib.blake2b(uri.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def splitUri(uri):
+    """
+    Splits a URI into its namespace prefix (up to the last '/' or '#') and its local name.
+
+    Parameters:
+        uri (str): The URI.
+
+    Returns:
+        tuple: (prefix, local name), the prefix is "" if the URI has neither '/' nor '#'.
+    """
+    cut = max(uri.rfind("/"), uri.rfind("#")) + 1
+    return uri[:cut], uri[cut:]
+
+
+class UriDictionary():
+    """
+    Dictionary encoding of the URIs shared by the local indexes: every URI is an int32 id, the indexes only hold these ids
+    and the URIs are decoded when the answers are put together.
+
+    The URIs are prefix compressed: the dataset only uses a handful of namespaces (e.g. http://nomisma.org/id/ or
+    http://www.dbis.cs.uni-frankfurt.de/cnt/id/), every namespace is stored once and per URI only the code of its namespace
+    and its local name are kept.
+
+    While the indexes are built, the lookup of a URI is a dict per namespace keyed by the local names. When all indexes are
+    built, freeze packs the dictionary: the UTF-8 local names go into a StringTable and a URI is found by binary search of
+    its hash (see uriHash) in the sorted hashes of all URIs, so a URI costs about the length of its local name plus 24 bytes
+    instead of several Python objects. A frozen dictionary can not be extended, it is the form written to index snapshots.
+
+    Ids are assigned in the order the URIs are encoded, starting at 0, so the first index built on a dictionary gets dense ids.
+    The dictionary only grows while the indexes are built, afterwards it is only read, e.g. by several request threads.
+
+    Attributes:
+        prefixes (list): The namespace prefixes, indexed by prefix code.
+        frozen (bool): Whether the dictionary is packed and read-only.
+    """
+
+    def __init__(self):
+        self.prefixes = []
+        self.frozen = False
+        self._prefixCodes = {}
+        # per id: code of the namespace prefix, local name and hash of the URI
+        self._codes = array("i")
+        self._names = []
+        self._uriHashes = array("q")
+        # per prefix code: local name -> id
+        self._ids = []
+        # packed form, see freeze: local names, hashes sorted and the ids in the order of the sorted hashes
+        self._packedNames = None
+        self._hashes = None
+        self._order = None
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __contains__(self, uri):
+        return self.lookup(uri) is not None
+
+    def encode(self, uri):
+        """
+        Returns the id of a URI, adding it if it is not known yet.
+
+        Parameters:
+            uri (str): The URI.
+
+        Returns:
+            int: The id.
+
+        Raises:
+            RuntimeError: If the URI is new and the dictionary is frozen.
+        """
+        if self.frozen:
+            id = self.lookup(uri)
+            if id is None:
+                raise RuntimeError("A frozen URI dictionary can not be extended")
+            return id
+        prefix, name = splitUri(uri)
+        code = self._prefixCodes.get(prefix)
+        if code is None:
+            code = len(self.prefixes)
+            self._prefixCodes[prefix] = code
+            self.prefixes.append(prefix)
+            self._ids.append({})
+        ids = self._ids[code]
+        id = ids.get(name)
+        if id is None:
+            id = len(self._names)
+            ids[name] = id
+            self._names.append(name)
+            self._codes.append(code)
+            self._uriHashes.append(uriHash(uri))
+        return id
+
+    def lookup(self, uri):
+        """
+        Returns the id of a URI.
+
+        Parameters:
+            uri (str): The URI.
+
+        Returns:
+            int: The id, None if the URI is not part of the dictionary.
+        """
+        prefix, name = splitUri(uri)
+        code = self._prefixCodes.get(prefix)
+        if code is None:
+            return None
+        if not self.frozen:
+            return self._ids[code].get(name)
+        hash = uriHash(uri)
+        return self._find(code, name.encode("utf-8"), hash, int(np.searchsorted(self._hashes, hash)))
+
+    def _find(self, code, name, hash, position):
+        """
+        Returns the id of a URI in a frozen dictionary, None if it is not part of it.
+
+        Parameters:
+            code (int): Prefix code of the URI.
+            name (bytes): UTF-8 local name of the URI.
+            hash (int): uriHash of the URI.
+            position (int): Position of the hash in the sorted hashes.
+        """
+        hashes, order, codes = self._hashes, self._order, self._codes
+        # the ids with the same hash, more than one only for a hash collision
+        while position < len(hashes) and hashes[position] == hash:
+            id = order[position]
+            if codes[id] == code and self._packedNames.raw(id) == name:
+                return id
+            position += 1
+        return None
+
+    def lookupAll(self, uris):
+        """
+        Returns the ids of several URIs.
+
+        Parameters:
+            uris (iterable): The URIs.
+
+        Returns:
+            ndarray: int64 id per URI, -1 for URIs that are not part of the dictionary.
+        """
+        if not self.frozen:
+            ids = [self.lookup(uri) for uri in uris]
+            return np.array([-1 if id is None else id for id in ids], dtype=np.int64)
+        uris = list(uris)
+        hashes = [uriHash(uri) for uri in uris]
+        positions = np.searchsorted(self._hashes, np.array(hashes, dtype=np.int64)).tolist()
+        ids = np.full(len(uris), -1, dtype=np.int64)
+        for i, uri in enumerate(uris):
+            prefix, name = splitUri(uri)
+            code = self._prefixCodes.get(prefix)
+            if code is not None:
+                id = self._find(code, name.encode("utf-8"), hashes[i], positions[i])
+                if id is not None:
+                    ids[i] = id
+        return ids
+
+    def decode(self, id):
+        """
+        Returns the URI of an id.
+
+        Parameters:
+            id (int): The id.
+
+        Returns:
+            str: The URI.
+        """
+        id = int(id)
+        if self.frozen:
+            return self.prefixes[self._codes[id]] + self._packedNames[id]
+        return self.prefixes[self._codes[id]] + self._names[id]
+
+    def freeze(self):
+        """
+        Packs the dictionary into arrays, see the class description. Afterwards only known URIs can be encoded.
+        """
+        if self.frozen:
+            return
+        hashes = np.array(self._uriHashes, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable").astype(np.int32)
+        self._pack(StringTable.fromStrings(self._names), np.array(self._codes, dtype=np.int32), hashes[order], order)
+        self._uriHashes = None
+        self._names = None
+        self._ids = None
+
+    def _pack(self, names, codes, hashes, order):
+        """
+        Switches to the packed form.
+
+        Parameters:
+            names (StringTable): Local name per id.
+            codes (ndarray): int32 prefix code per id.
+            hashes (ndarray): int64 uriHash of all URIs, sorted.
+            order (ndarray): int32 id per sorted hash.
+        """
+        self._packedNames = names
+        self._codeArray, self._orderArray = codes, order
+        # memoryviews index faster than numpy arrays element by element
+        self._codes = memoryview(codes).cast("B").cast("i")
+        self._order = memoryview(order).cast("B").cast("i")
+        self._hashes = hashes
+        self.frozen = True
+
+    def extended(self):
+        """
+        Returns a copy that can be extended, e.g. to refresh some of the indexes: the URIs keep their ids, new URIs get the
+        ids after them, so the indexes that are not rebuilt stay valid with the copy. The dictionary itself is not changed.
+
+        Returns:
+            UriDictionary: The unfrozen copy.
+        """
+        copy = UriDictionary()
+        copy.prefixes = list(self.prefixes)
+        copy._prefixCodes = dict(self._prefixCodes)
+        if self.frozen:
+            hashes = np.empty(len(self), dtype=np.int64)
+            hashes[np.asarray(self._orderArray)] = self._hashes
+            copy._codes = array("i", np.asarray(self._codeArray, dtype=np.int32).tobytes())
+            copy._names = list(self._packedNames)
+            copy._uriHashes = array("q", hashes.tobytes())
+        else:
+            copy._codes = array("i", self._codes)
+            copy._names = list(self._names)
+            copy._uriHashes = array("q", self._uriHashes)
+        copy._ids = [{} for _ in copy.prefixes]
+        for id, (code, name) in enumerate(zip(copy._codes, copy._names)):
+            copy._ids[code][name] = id
+        return copy
+
+    def addTo(self, writer, name):
+        """
+        Adds the frozen dictionary to a snapshot.
+
+        Parameters:
+            writer (SnapshotWriter): The snapshot.
+            name (str): Name prefix of the arrays.
+        """
+        if not self.frozen:
+            raise RuntimeError("Only a frozen URI dictionary can be written to a snapshot")
+        writer.metadata[name] = {"prefixes": self.prefixes}
+        writer.addStrings(name + ".names", self._packedNames)
+        writer.add(name + ".codes", self._codeArray)
+        writer.add(name + ".hashes", self._hashes)
+        writer.add(name + ".order", self._orderArray)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, name):
+        """
+        Opens a dictionary of a snapshot, frozen and without copying the arrays.
+
+        Parameters:
+            snapshot (IndexSnapshot): The snapshot.
+            name (str): Name prefix of the arrays.
+
+        Returns:
+            UriDictionary: The dictionary.
+        """
+        dictionary = cls()
+        dictionary.prefixes = list(snapshot.metadata[name]["prefixes"])
+        dictionary._prefixCodes = {prefix: code for code, prefix in enumerate(dictionary.prefixes)}
+        dictionary._names = None
+        dictionary._ids = None
+        dictionary._uriHashes = None
+        dictionary._pack(snapshot.strings(name + ".names"), snapshot.array(name + ".codes"), snapshot.array(name + ".hashes"), snapshot.array(name + ".order"))
+        return dictionary
+
+    def decodeAll(self, ids):
+        """
+        Returns the URIs of several ids.
+
+        Parameters:
+            ids (iterable): The ids.
+
+        Returns:
+            list: The URIs in the order of the ids.
+        """
+        return [self.decode(id) for id in ids]